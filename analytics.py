@@ -0,0 +1,283 @@
+"""
+Columnar sales analytics shared by the SQL and DynamoDB backends.
+
+Sales and products are loaded once into compact NumPy columns with
+dictionary-encoded store/category/product ids, and every report is
+computed with vectorized passes over those columns.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Cumulative revenue share boundaries for ABC classification
+ABC_BOUNDARIES = (0.80, 0.95)
+ABC_CLASSES = ('A', 'B', 'C')
+
+
+def _encode(values):
+    """Dictionary-encode a sequence into (dictionary, int32 codes)"""
+    values = np.asarray(values)
+    if values.size == 0:
+        return values, np.zeros(0, dtype=np.int32)
+    dictionary, codes = np.unique(values, return_inverse=True)
+    return dictionary, codes.astype(np.int32)
+
+
+def _column(values, dtype, count):
+    """Build a numeric column from any iterable (Decimal-safe)"""
+    return np.fromiter(values, dtype=dtype, count=count)
+
+
+def _dates(values):
+    """Parse datetimes or ISO strings into a datetime64[s] column"""
+    values = [v if v is not None else 'NaT' for v in values]
+    if values and isinstance(values[0], str):
+        return np.array(values, dtype='datetime64[us]').astype('datetime64[s]')
+    return np.array(values, dtype='datetime64[s]')
+
+
+class SalesColumns:
+    """Sales and products held as dictionary-encoded NumPy columns.
+
+    ``products`` rows are ``(id, store_id, name, sku, category,
+    stock_quantity, low_stock_threshold)`` and ``sales`` rows are
+    ``(product_id, store_id, quantity, total_amount, sale_date)``.
+    ``stores`` maps store id to display name. ``archived`` holds daily
+    summary columns from sales_archive, each row standing for
+    ``transactions`` sales.
+    """
+
+    def __init__(self, products, sales, stores=None, archived=None):
+        products = list(products)
+        sales = list(sales)
+        stores = dict(stores or {})
+        n_products = len(products)
+        n_sales = len(sales)
+
+        # Product dimension, sorted by id so sales can be joined by searchsorted
+        product_ids = np.asarray([str(p[0]) for p in products])
+        order = np.argsort(product_ids, kind='stable')
+        products = [products[i] for i in order]
+        self.product_keys = product_ids[order]
+        self.product_names = np.asarray([p[2] or '' for p in products], dtype=object)
+        self.product_skus = np.asarray([p[3] or '' for p in products], dtype=object)
+        self.stock = _column((p[5] or 0 for p in products), np.int64, n_products)
+        self.threshold = _column((10 if p[6] is None else p[6] for p in products), np.int64, n_products)
+        self.categories, self.product_category = _encode(
+            [p[4] or 'Uncategorized' for p in products])
+
+        # Store dimension covers every store seen in any input
+        store_keys = [str(k) for k in stores]
+        store_keys += [str(p[1]) for p in products]
+        store_keys += [str(s[1]) for s in sales]
+        if archived:
+            store_keys += archived['store_id'].tolist()
+        self.store_keys = np.unique(np.asarray(store_keys)) if store_keys else np.asarray([])
+        names = {str(k): v for k, v in stores.items()}
+        self.store_names = np.asarray(
+            [names.get(k, k) for k in self.store_keys], dtype=object)
+        self.product_store = self._store_codes([p[1] for p in products])
+
+        # Sales fact columns, joined to the product dimension
+        facts = self._facts(
+            np.asarray([str(s[0]) for s in sales]), [s[1] for s in sales],
+            _column((s[2] or 0 for s in sales), np.int64, n_sales),
+            _column((s[3] or 0 for s in sales), np.float64, n_sales),
+            _dates([s[4] for s in sales]) if n_sales else np.zeros(0, 'datetime64[s]'),
+            np.ones(n_sales, np.int64))
+        if archived:
+            archived_facts = self._facts(
+                archived['product_id'], archived['store_id'].tolist(), archived['quantity'],
+                archived['amount'], archived['day'].astype('datetime64[s]'), archived['transactions'])
+            facts = [np.concatenate(pair) for pair in zip(facts, archived_facts)]
+        (self.sale_product, self.sale_store, self.quantity, self.amount,
+         self.sale_date, self.transactions) = facts
+
+    @classmethod
+    def from_items(cls, products, sales, stores=(), archived=None):
+        """Build columns from DynamoDB-style item dicts"""
+        product_rows = [
+            (p.get('product_id'), p.get('store_id'), p.get('name'), p.get('sku'),
+             p.get('category'), p.get('stock_quantity'), p.get('low_stock_threshold'))
+            for p in products
+        ]
+        sale_rows = [
+            (s.get('product_id'), s.get('store_id'), s.get('quantity'),
+             s.get('total_amount'), s.get('sale_date'))
+            for s in sales
+        ]
+        store_names = {s.get('store_id'): s.get('name') for s in stores}
+        return cls(product_rows, sale_rows, store_names, archived)
+
+    def _facts(self, sale_products, store_ids, quantity, amount, dates, transactions):
+        """Sale columns with product codes, dropping sales of unknown products"""
+        n_products, n_sales = len(self.product_keys), len(sale_products)
+        codes = np.searchsorted(self.product_keys, sale_products) if n_sales else np.zeros(0, np.intp)
+        codes = np.minimum(codes, max(n_products - 1, 0))
+        known = (self.product_keys[codes] == sale_products) if n_products else np.zeros(n_sales, bool)
+        return (codes.astype(np.int32)[known], self._store_codes(store_ids)[known], quantity[known],
+                amount[known], dates[known], transactions[known])
+
+    def _store_codes(self, store_ids):
+        if not len(store_ids):
+            return np.zeros(0, dtype=np.int32)
+        keys = np.asarray([str(s) for s in store_ids])
+        return np.searchsorted(self.store_keys, keys).astype(np.int32)
+
+    @property
+    def n_products(self):
+        return len(self.product_keys)
+
+    @property
+    def n_stores(self):
+        return len(self.store_keys)
+
+    def _store_code(self, store_id):
+        """Resolve a store id to its dictionary code, or None if unknown"""
+        key = str(store_id)
+        code = int(np.searchsorted(self.store_keys, key))
+        if code < self.n_stores and self.store_keys[code] == key:
+            return code
+        return None
+
+    # ---- per-product aggregates ----
+
+    def product_revenue(self, mask=None):
+        """Revenue per product code"""
+        codes, amount = self.sale_product, self.amount
+        if mask is not None:
+            codes, amount = codes[mask], amount[mask]
+        return np.bincount(codes, weights=amount, minlength=self.n_products)
+
+    def product_units(self, mask=None):
+        """Units sold per product code"""
+        codes, quantity = self.sale_product, self.quantity
+        if mask is not None:
+            codes, quantity = codes[mask], quantity[mask]
+        return np.bincount(codes, weights=quantity, minlength=self.n_products).astype(np.int64)
+
+    # ---- reports ----
+
+    def sales_by_store(self):
+        """(store name, total sales, transaction count) ordered by sales"""
+        totals = np.bincount(self.sale_store, weights=self.amount, minlength=self.n_stores)
+        counts = np.bincount(self.sale_store, weights=self.transactions, minlength=self.n_stores)
+        order = np.argsort(-totals, kind='stable')
+        return [(self.store_names[i], float(totals[i]), int(counts[i]))
+                for i in order if counts[i]]
+
+    def low_stock_by_store(self):
+        """(store name, low stock product count) for stores with low stock"""
+        low = self.stock <= self.threshold
+        counts = np.bincount(self.product_store[low], minlength=self.n_stores)
+        return [(self.store_names[i], int(counts[i])) for i in np.flatnonzero(counts)]
+
+    def revenue_by_category(self):
+        """(category, revenue) for categories with sales"""
+        categories = self.product_category[self.sale_product]
+        totals = np.bincount(categories, weights=self.amount, minlength=len(self.categories))
+        counts = np.bincount(categories, minlength=len(self.categories))
+        return [(str(self.categories[i]), float(totals[i])) for i in np.flatnonzero(counts)]
+
+    def abc_classes(self):
+        """ABC class index (0=A, 1=B, 2=C) per product by cumulative revenue share"""
+        revenue = self.product_revenue()
+        classes = np.full(self.n_products, 2, dtype=np.int8)
+        total = revenue.sum()
+        if total <= 0:
+            return classes
+        order = np.argsort(-revenue, kind='stable')
+        share = revenue[order] / total
+        # Share of revenue already covered before each product is counted
+        prior = np.cumsum(share) - share
+        ranked = np.searchsorted(np.asarray(ABC_BOUNDARIES), prior, side='right').astype(np.int8)
+        ranked[revenue[order] <= 0] = 2
+        classes[order] = ranked
+        return classes
+
+    def abc_summary(self):
+        """(class, product count, revenue, revenue share) per ABC class"""
+        classes = self.abc_classes()
+        revenue = self.product_revenue()
+        counts = np.bincount(classes, minlength=3)
+        totals = np.bincount(classes, weights=revenue, minlength=3)
+        grand = totals.sum()
+        return [(ABC_CLASSES[i], int(counts[i]), float(totals[i]),
+                 float(totals[i] / grand) if grand else 0.0) for i in range(3)]
+
+    def sell_through_by_category(self):
+        """(category, units sold, on hand, sell-through rate) per category"""
+        units = self.product_units()
+        sold = np.bincount(self.product_category, weights=units, minlength=len(self.categories))
+        on_hand = np.bincount(self.product_category, weights=self.stock, minlength=len(self.categories))
+        received = sold + on_hand
+        rate = np.divide(sold, received, out=np.zeros(len(sold)), where=received > 0)
+        return [(str(self.categories[i]), int(sold[i]), int(on_hand[i]), float(rate[i]))
+                for i in range(len(self.categories))]
+
+    def top_n_per_store(self, n=5):
+        """{store code: [(name, sku, units, revenue), ...]} best sellers per store"""
+        revenue = self.product_revenue()
+        units = self.product_units()
+        sold = np.flatnonzero(units > 0)
+        if not len(sold):
+            return {}
+        # Sort by store, then revenue descending, and rank within each store
+        order = sold[np.lexsort((-revenue[sold], self.product_store[sold]))]
+        stores = self.product_store[order]
+        starts = np.flatnonzero(np.r_[True, stores[1:] != stores[:-1]])
+        rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+        keep = order[rank < n]
+        result = {}
+        for i in keep:
+            result.setdefault(int(self.product_store[i]), []).append(
+                (self.product_names[i], self.product_skus[i], int(units[i]), float(revenue[i])))
+        return result
+
+    def top_products(self, n=10, store_id=None):
+        """(name, sku, units, revenue) best sellers overall or for one store"""
+        if store_id is not None:
+            code = self._store_code(store_id)
+            return self.top_n_per_store(n).get(code, []) if code is not None else []
+        revenue = self.product_revenue()
+        units = self.product_units()
+        sold = np.flatnonzero(units > 0)
+        order = sold[np.argsort(-revenue[sold], kind='stable')][:n]
+        return [(self.product_names[i], self.product_skus[i], int(units[i]), float(revenue[i]))
+                for i in order]
+
+    def period_growth(self, days=30, now=None):
+        """(store name, current, previous, growth) comparing the last two periods"""
+        now = np.datetime64(now or datetime.utcnow(), 's')
+        period = np.timedelta64(timedelta(days=days)).astype('timedelta64[s]')
+        current = (self.sale_date >= now - period) & (self.sale_date < now)
+        previous = (self.sale_date >= now - 2 * period) & (self.sale_date < now - period)
+        cur = np.bincount(self.sale_store[current], weights=self.amount[current], minlength=self.n_stores)
+        prev = np.bincount(self.sale_store[previous], weights=self.amount[previous], minlength=self.n_stores)
+        growth = np.divide(cur - prev, prev, out=np.full(self.n_stores, np.nan), where=prev > 0)
+        active = np.flatnonzero((cur > 0) | (prev > 0))
+        return [(self.store_names[i], float(cur[i]), float(prev[i]),
+                 None if np.isnan(growth[i]) else float(growth[i])) for i in active]
+
+    def store_totals(self, store_id):
+        """(total sales, transaction count) for one store"""
+        code = self._store_code(store_id)
+        if code is None:
+            return 0.0, 0
+        mask = self.sale_store == code
+        return float(self.amount[mask].sum()), int(self.transactions[mask].sum())
+
+    def report(self, top_n=10, period_days=30, now=None):
+        """All admin report sections keyed by template variable name"""
+        top_by_store = self.top_n_per_store(5)
+        return {
+            'sales_by_store': self.sales_by_store(),
+            'low_stock_by_store': self.low_stock_by_store(),
+            'top_products': self.top_products(top_n),
+            'top_by_store': [(self.store_names[code], rows)
+                             for code, rows in sorted(top_by_store.items())],
+            'abc_summary': self.abc_summary(),
+            'sell_through': self.sell_through_by_category(),
+            'growth_by_store': self.period_growth(period_days, now),
+            'period_days': period_days,
+        }
@@ -1,92 +1,219 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, abort
 from werkzeug.utils import secure_filename
 import os
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from models import db, User, Store, Product, Sale, RestockRequest, Shipment
+from models import db, upgrade_schema, User, Store, Product, Sale, RestockRequest, Shipment, JobLock, IdempotencyKey
 from auth import admin_required, store_manager_required, supplier_required
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
-
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///stylane.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'products')
-app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+from sqlalchemy.orm import joinedload
+import sql_metrics
+import supplier_bulk
+import metrics
+import profiling
+import restock
+import scheduler
+import search
+import pos
+import facets
+import sales_archive
+import idempotency
+import streaming
+import template_cache
+import passwords
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
-
-db.init_app(app)
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 # Flask-Login setup
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'login'
+login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Please log in to access this page.'
 
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-@app.template_filter('datetime')
+def search_products(query, store_id=None):
+    """Products matching ``query`` (see search.py), best match first"""
+    ids = current_app.extensions['search'].search(
+        query, store_id, current_app.config['SEARCH_LIMIT'], current_app.config['SEARCH_RANK_LIMIT'])
+    if not ids:
+        return []
+    products = {p.id: p for p in Product.query.options(joinedload(Product.store)).filter(Product.id.in_(ids))}
+    return [products[i] for i in ids if i in products]
+
+def product_dict(product):
+    return {'id': product.id, 'name': product.name, 'sku': product.sku, 'category': product.category,
+            'size': product.size, 'color': product.color, 'price': product.price,
+            'stock_quantity': product.stock_quantity, 'store_id': product.store_id}
+
+def adjust_stock(product, delta):
+    """Add ``delta`` to the stock with one conditional UPDATE (not committed).
+
+    The change is made in SQL, ``stock_quantity = stock_quantity + delta``,
+    so concurrent sales, deliveries and edits never overwrite each other and
+    no row lock is held while the request runs. Bumps the product's version.
+    Returns False, changing nothing, when the stock would go below zero.
+    """
+    query = Product.query.filter(Product.id == product.id)
+    if delta < 0:
+        query = query.filter(Product.stock_quantity >= -delta)
+    updated = query.update({Product.stock_quantity: Product.stock_quantity + delta,
+                            Product.version: Product.version + 1,
+                            Product.updated_at: datetime.utcnow()}, synchronize_session=False)
+    db.session.expire(product, ['stock_quantity', 'version', 'updated_at'])
+    if not updated:
+        return False
+    threshold = product.low_stock_threshold
+    restock.stock_adjusted(product.id, (product.stock_quantity - delta, threshold),
+                           (product.stock_quantity, threshold))
+    return True
+
+def record_sale(product, quantity):
+    """Add a sale of ``quantity`` units and take them off the stock (not
+    committed); None, writing nothing, when less than that is in stock"""
+    if not adjust_stock(product, -quantity):
+        return None
+    sale = Sale(
+        product_id=product.id,
+        store_id=product.store_id,
+        quantity=quantity,
+        unit_price=product.price,
+        total_amount=product.price * quantity
+    )
+    db.session.add(sale)
+    return sale
+
+def find_by_sku(store_id, sku):
+    """Product for a scanned SKU, through the hot-SKU cache (see pos.py)"""
+    def find(store_id, sku):
+        product = Product.query.filter_by(store_id=store_id, sku=sku).first()
+        return (product.id, product) if product else None
+
+    def fetch(product_id):
+        product = db.session.get(Product, product_id)
+        return product if product and product.store_id == store_id and product.sku == sku else None
+
+    return pos.lookup(store_id, sku, find, fetch)
+
+def load_sales_columns(store_id=None, start=None, end=None):
+    """Load products and sales (optionally for one store, and dated in
+    [start, end)) into analytics columns, archived sales included"""
+    # numpy is only imported once a report is requested
+    from analytics import SalesColumns
+    archive = current_app.extensions['sales_archive']
+    product_query = db.session.query(
+        Product.id, Product.store_id, Product.name, Product.sku, Product.category,
+        Product.stock_quantity, Product.low_stock_threshold
+    )
+    sale_query = db.session.query(
+        Sale.product_id, Sale.store_id, Sale.quantity, Sale.total_amount, Sale.sale_date
+    )
+    store_query = db.session.query(Store.id, Store.name)
+    if store_id is not None:
+        product_query = product_query.filter(Product.store_id == store_id)
+        sale_query = sale_query.filter(Sale.store_id == store_id)
+        store_query = store_query.filter(Store.id == store_id)
+    since = sales_archive.hot_since(archive, start)
+    if since is not None:
+        sale_query = sale_query.filter(Sale.sale_date >= since)
+    if end is not None:
+        sale_query = sale_query.filter(Sale.sale_date < sales_archive.midnight(end))
+    return SalesColumns(product_query.all(), sale_query.all(), dict(store_query.all()),
+                        archive.read(start, end, store_id))
+
+def report_range():
+    """(start, end) from the reports' from/to arguments; 400 when malformed"""
+    try:
+        return sales_archive.parse_range(request.args)
+    except ValueError:
+        abort(400)
+
+def load_archivable_sales(before):
+    return db.session.query(
+        Sale.product_id, Sale.store_id, Sale.quantity, Sale.total_amount, Sale.sale_date
+    ).filter(Sale.sale_date < before).yield_per(5000)
+
+def delete_archived_sales(before):
+    Sale.query.filter(Sale.sale_date < before).delete(synchronize_session=False)
+    db.session.commit()
+
 def format_datetime(value, format='%Y-%m-%d %H:%M'):
     """Format a datetime object."""
     if value is None:
         return ""
     return value.strftime(format)
 
+# ==================== BLUEPRINTS ====================
+# One per role; endpoints are '<blueprint>.<view>'
+
+auth_bp = Blueprint('auth', __name__)
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+store_manager_bp = Blueprint('store_manager', __name__, url_prefix='/store-manager')
+supplier_bp = Blueprint('supplier', __name__, url_prefix='/supplier')
+
 # ==================== AUTHENTICATION ROUTES ====================
 
-@app.route('/')
+@auth_bp.route('/')
 def index():
     """Splash screen"""
     return render_template('splash.html')
 
-@app.route('/home')
+@auth_bp.route('/home')
 def home():
     """Home page - redirects based on user role"""
     if current_user.is_authenticated:
         if current_user.role == 'admin':
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('admin.dashboard'))
         elif current_user.role == 'store_manager':
-            return redirect(url_for('store_manager_dashboard'))
+            return redirect(url_for('store_manager.dashboard'))
         elif current_user.role == 'supplier':
-            return redirect(url_for('supplier_dashboard'))
-    return redirect(url_for('login'))
+            return redirect(url_for('supplier.dashboard'))
+    return redirect(url_for('auth.login'))
 
-@app.route('/login', methods=['GET', 'POST'])
+@auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     """User login"""
     if current_user.is_authenticated:
-        return redirect(url_for('home'))
+        return redirect(url_for('auth.home'))
     
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         
+        # Before the lookup and the (deliberately slow) hash check
+        wait = passwords.throttle(username)
+        if wait:
+            flash(f'Too many login attempts. Try again in {wait} seconds.', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(wait)}
+        
         user = User.query.filter_by(username=username).first()
         
         if user and user.check_password(password) and user.is_active:
+            passwords.record(True)
             login_user(user)
+            # check_password re-hashed it if the hash settings changed
+            db.session.commit()
             flash(f'Welcome back, {user.username}!', 'success')
-            return redirect(url_for('home'))
+            return redirect(url_for('auth.home'))
         else:
+            passwords.record(False)
             flash('Invalid username or password.', 'error')
     
     return render_template('login.html')
 
-@app.route('/logout')
+@auth_bp.route('/logout')
 @login_required
 def logout():
     """User logout"""
     logout_user()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('auth.login'))
 
 # ==================== ADMIN ROUTES ====================
 
-@app.route('/admin/dashboard')
+@admin_bp.route('/dashboard', endpoint='dashboard')
 @login_required
 @admin_required
 def admin_dashboard():
@@ -143,7 +270,7 @@ def admin_dashboard():
                          sales_dates=sales_dates,
                          sales_values=sales_values)
 
-@app.route('/admin/users')
+@admin_bp.route('/users', endpoint='users')
 @login_required
 @admin_required
 def admin_users():
@@ -152,7 +279,7 @@ def admin_users():
     stores = Store.query.all()
     return render_template('admin/users.html', users=users, stores=stores)
 
-@app.route('/admin/users/create', methods=['POST'])
+@admin_bp.route('/users/create', methods=['POST'], endpoint='create_user')
 @login_required
 @admin_required
 def admin_create_user():
@@ -165,11 +292,11 @@ def admin_create_user():
     
     if User.query.filter_by(username=username).first():
         flash('Username already exists.', 'error')
-        return redirect(url_for('admin_users'))
+        return redirect(url_for('admin.users'))
     
     if User.query.filter_by(email=email).first():
         flash('Email already exists.', 'error')
-        return redirect(url_for('admin_users'))
+        return redirect(url_for('admin.users'))
     
     user = User(username=username, email=email, role=role)
     user.set_password(password)
@@ -179,9 +306,9 @@ def admin_create_user():
     db.session.add(user)
     db.session.commit()
     flash(f'User {username} created successfully.', 'success')
-    return redirect(url_for('admin_users'))
+    return redirect(url_for('admin.users'))
 
-@app.route('/admin/users/<int:user_id>/update', methods=['POST'])
+@admin_bp.route('/users/<int:user_id>/update', methods=['POST'], endpoint='update_user')
 @login_required
 @admin_required
 def admin_update_user(user_id):
@@ -197,9 +324,9 @@ def admin_update_user(user_id):
     
     db.session.commit()
     flash(f'User {user.username} updated successfully.', 'success')
-    return redirect(url_for('admin_users'))
+    return redirect(url_for('admin.users'))
 
-@app.route('/admin/stores')
+@admin_bp.route('/stores', endpoint='stores')
 @login_required
 @admin_required
 def admin_stores():
@@ -207,7 +334,7 @@ def admin_stores():
     stores = Store.query.all()
     return render_template('admin/stores.html', stores=stores)
 
-@app.route('/admin/stores/create', methods=['POST'])
+@admin_bp.route('/stores/create', methods=['POST'], endpoint='create_store')
 @login_required
 @admin_required
 def admin_create_store():
@@ -220,9 +347,9 @@ def admin_create_store():
     db.session.add(store)
     db.session.commit()
     flash(f'Store {store.name} created successfully.', 'success')
-    return redirect(url_for('admin_stores'))
+    return redirect(url_for('admin.stores'))
 
-@app.route('/admin/stores/<int:store_id>/update', methods=['POST'])
+@admin_bp.route('/stores/<int:store_id>/update', methods=['POST'], endpoint='update_store')
 @login_required
 @admin_required
 def admin_update_store(store_id):
@@ -233,61 +360,101 @@ def admin_update_store(store_id):
     store.phone = request.form.get('phone')
     db.session.commit()
     flash(f'Store {store.name} updated successfully.', 'success')
-    return redirect(url_for('admin_stores'))
+    return redirect(url_for('admin.stores'))
 
-@app.route('/admin/inventory')
+@admin_bp.route('/inventory', endpoint='inventory')
 @login_required
 @admin_required
 def admin_inventory():
-    """View all inventory across stores"""
+    """View all inventory across stores, narrowed by store and facets, or search it with ?q="""
     stores = Store.query.all()
     store_id = request.args.get('store_id', type=int)
-    
-    if store_id:
-        products = Product.query.filter_by(store_id=store_id).all()
+    query = request.args.get('q', '').strip()
+    facet_counts = current_app.extensions['facets']
+    filters = facets.parse_filters(request.args)
+    
+    if query:
+        # Counted over the search matches, so they describe what is listed
+        matched = search_products(query, store_id)
+        counts = facets.count_products(matched, filters)
+        products = [p for p in matched if facets.matches(p, filters)]
     else:
-        products = Product.query.all()
-    
-    return render_template('admin/inventory.html', products=products, stores=stores, selected_store=store_id)
+        products = Product.query.options(joinedload(Product.store))
+        if store_id:
+            products = products.filter_by(store_id=store_id)
+        products = streaming.rows(facet_counts.filter(products, filters))
+        counts = facet_counts.counts(store_id, filters)
+    if request.args.get('format') == 'json':
+        return jsonify({'facets': counts, 'products': [product_dict(p) for p in products]})
+    
+    return streaming.stream_page('admin/inventory.html', products=products, stores=stores,
+                                 selected_store=store_id, query=query, facets=facets.FACETS,
+                                 facet_counts=counts, filters=filters, no_value=facets.NONE)
 
-@app.route('/admin/reports')
+@admin_bp.route('/reports', endpoint='reports')
 @login_required
 @admin_required
 def admin_reports():
     """View reports"""
-    # Sales summary by store
-    sales_by_store = db.session.query(
-        Store.name,
-        func.sum(Sale.total_amount).label('total_sales'),
-        func.count(Sale.id).label('transaction_count')
-    ).join(Sale).group_by(Store.id).all()
-    
-    # Low stock summary
-    low_stock_by_store = db.session.query(
-        Store.name,
-        func.count(Product.id).label('low_stock_count')
-    ).join(Product).filter(
-        Product.stock_quantity <= Product.low_stock_threshold
-    ).group_by(Store.id).all()
-    
-    # Top selling products
-    top_products = db.session.query(
-        Product.name,
-        Product.sku,
-        func.sum(Sale.quantity).label('total_sold'),
-        func.sum(Sale.total_amount).label('revenue')
-    ).join(Sale).group_by(Product.id).order_by(
-        func.sum(Sale.total_amount).desc()
-    ).limit(10).all()
-    
-    return render_template('admin/reports.html',
-                         sales_by_store=sales_by_store,
-                         low_stock_by_store=low_stock_by_store,
-                         top_products=top_products)
+    start, end = report_range()
+    columns = load_sales_columns(start=start, end=end)
+    return render_template('admin/reports.html', **columns.report())
+
+@admin_bp.route('/sql-stats', endpoint='sql_stats')
+@login_required
+@admin_required
+def admin_sql_stats():
+    """Per-route query counts, time and N+1 warnings recorded by sql_metrics"""
+    return jsonify(sql_metrics.route_stats(current_app))
+
+@admin_bp.route('/profiles', endpoint='profiles')
+@login_required
+@admin_required
+def admin_profiles():
+    """Stored request profiles and a signed header to trigger new ones"""
+    return render_template('admin/profiles.html',
+                         profiles=profiling.list_profiles(current_app),
+                         header=profiling.HEADER,
+                         token=profiling.make_token(current_app.secret_key),
+                         sample_rate=current_app.config['PROFILE_SAMPLE_RATE'])
+
+@admin_bp.route('/profiles/<path:filename>', endpoint='profile_file')
+@login_required
+@admin_required
+def admin_profile_file(filename):
+    """Download one profile file (collapsed stacks, allocations, pstats)"""
+    if not filename.endswith(profiling.SUFFIXES):
+        abort(404)
+    return send_from_directory(current_app.config['PROFILE_DIR'], filename, mimetype='text/plain')
+
+@admin_bp.route('/jobs', endpoint='jobs')
+@login_required
+@admin_required
+def admin_jobs():
+    """Scheduled jobs with their last run and totals"""
+    sched = current_app.extensions['scheduler']
+    if request.args.get('format') == 'json':
+        return jsonify(sched.stats())
+    return render_template('admin/jobs.html', jobs=sched.stats(),
+                         enabled=current_app.config['SCHEDULER_ENABLED'])
+
+@admin_bp.route('/jobs/<name>/run', methods=['POST'], endpoint='run_job')
+@login_required
+@admin_required
+def admin_run_job(name):
+    """Queue a job now, outside its schedule"""
+    sched = current_app.extensions['scheduler']
+    if name not in sched.jobs:
+        abort(404)
+    if sched.run_now(name):
+        flash(f'Job {name} queued.', 'success')
+    else:
+        flash(f'Job {name} is already running.', 'info')
+    return redirect(url_for('admin.jobs'))
 
 # ==================== STORE MANAGER ROUTES ====================
 
-@app.route('/store-manager/dashboard')
+@store_manager_bp.route('/dashboard', endpoint='dashboard')
 @login_required
 @store_manager_required
 def store_manager_dashboard():
@@ -316,16 +483,22 @@ def store_manager_dashboard():
                          recent_sales=recent_sales,
                          pending_requests=pending_requests)
 
-@app.route('/store-manager/products')
+@store_manager_bp.route('/products', endpoint='products')
 @login_required
 @store_manager_required
 def store_manager_products():
-    """View and manage products"""
+    """View and manage products, or search them with ?q="""
     store = Store.query.get_or_404(current_user.store_id)
-    products = Product.query.filter_by(store_id=store.id).all()
-    return render_template('store_manager/products.html', products=products, store=store)
+    query = request.args.get('q', '').strip()
+    if query:
+        products = search_products(query, store.id)
+        if request.args.get('format') == 'json':
+            return jsonify([product_dict(p) for p in products])
+    else:
+        products = Product.query.filter_by(store_id=store.id).all()
+    return render_template('store_manager/products.html', products=products, store=store, query=query)
 
-@app.route('/store-manager/products/create', methods=['POST'])
+@store_manager_bp.route('/products/create', methods=['POST'], endpoint='create_product')
 @login_required
 @store_manager_required
 def store_manager_create_product():
@@ -355,57 +528,82 @@ def store_manager_create_product():
             filename = f"{timestamp}_{filename}"
             
             # Ensure upload directory exists
-            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+            os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
             
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+            file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
             product.image_filename = filename
     
     db.session.add(product)
     db.session.commit()
     flash(f'Product {product.name} added successfully.', 'success')
-    return redirect(url_for('store_manager_products'))
+    return redirect(url_for('store_manager.products'))
 
-@app.route('/store-manager/products/<int:product_id>/update', methods=['POST'])
+@store_manager_bp.route('/products/<int:product_id>/update', methods=['POST'], endpoint='update_product')
 @login_required
 @store_manager_required
 def store_manager_update_product(product_id):
-    """Update product"""
+    """Update product.
+
+    The form carries the ``version`` it was rendered from. Only the fields
+    the manager changed are written, in an UPDATE conditional on that
+    version; if a sale, a delivery or another edit wrote the product in
+    the meantime nothing is saved and the manager is asked to review the
+    current values.
+    """
     product = Product.query.get_or_404(product_id)
     
     if product.store_id != current_user.store_id:
         flash('You do not have permission to update this product.', 'error')
-        return redirect(url_for('store_manager_products'))
-    
-    product.name = request.form.get('name')
-    product.description = request.form.get('description')
-    product.category = request.form.get('category')
-    product.size = request.form.get('size')
-    product.color = request.form.get('color')
-    product.price = float(request.form.get('price'))
-    product.stock_quantity = int(request.form.get('stock_quantity'))
-    product.low_stock_threshold = int(request.form.get('low_stock_threshold'))
-    product.updated_at = datetime.utcnow()
+        return redirect(url_for('store_manager.products'))
+    
+    submitted = {
+        'name': request.form.get('name'),
+        'description': request.form.get('description'),
+        'category': request.form.get('category'),
+        'size': request.form.get('size'),
+        'color': request.form.get('color'),
+        'price': float(request.form.get('price')),
+        'stock_quantity': int(request.form.get('stock_quantity')),
+        'low_stock_threshold': int(request.form.get('low_stock_threshold')),
+    }
+    # Without the version there is nothing to compare against
+    version = request.form.get('version', type=int)
+    if version is None:
+        abort(400)
 
-    if 'image' in request.files:
-        file = request.files['image']
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Make filename unique
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            filename = f"{timestamp}_{filename}"
-            
-            # Ensure upload directory exists
-            os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-            
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            product.image_filename = filename
+    file = request.files.get('image')
+    if file and allowed_file(file.filename):
+        filename = secure_filename(file.filename)
+        # Make filename unique
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        submitted['image_filename'] = f"{timestamp}_{filename}"
+    
+    changes = {field: value for field, value in submitted.items()
+               if getattr(product, field) != value and not (getattr(product, field) is None and value == '')}
+    before = (product.stock_quantity, product.low_stock_threshold)
+    updated = version == product.version
+    if updated and changes:
+        updated = Product.query.filter_by(id=product.id, version=version).update(
+            dict(changes, version=Product.version + 1, updated_at=datetime.utcnow()), synchronize_session=False)
+        db.session.expire(product)
+    if not updated:
+        db.session.rollback()
+        flash(f'{product.name} was changed by someone else while you were editing it (stock is now '
+              f'{product.stock_quantity}). Your changes were not saved; check the current values and '
+              f'save again.', 'error')
+        return redirect(url_for('store_manager.products'))
+    if 'image_filename' in submitted:
+        # Saved only once the edit is accepted, so a rejected one leaves no upload behind
+        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], submitted['image_filename']))
+    if changes:
+        restock.stock_adjusted(product.id, before, (product.stock_quantity, product.low_stock_threshold))
     
     db.session.commit()
     flash(f'Product {product.name} updated successfully.', 'success')
-    return redirect(url_for('store_manager_products'))
+    return redirect(url_for('store_manager.products'))
 
-@app.route('/store-manager/products/<int:product_id>/delete', methods=['POST'])
+@store_manager_bp.route('/products/<int:product_id>/delete', methods=['POST'], endpoint='delete_product')
 @login_required
 @store_manager_required
 def store_manager_delete_product(product_id):
@@ -414,29 +612,30 @@ def store_manager_delete_product(product_id):
     
     if product.store_id != current_user.store_id:
         flash('You do not have permission to delete this product.', 'error')
-        return redirect(url_for('store_manager_products'))
+        return redirect(url_for('store_manager.products'))
     
     db.session.delete(product)
     db.session.commit()
     flash(f'Product {product.name} deleted successfully.', 'success')
-    return redirect(url_for('store_manager_products'))
+    return redirect(url_for('store_manager.products'))
 
-@app.route('/store-manager/sales')
+@store_manager_bp.route('/sales', endpoint='sales')
 @login_required
 @store_manager_required
 def store_manager_sales():
     """View and record sales"""
     store = Store.query.get_or_404(current_user.store_id)
     products = Product.query.filter_by(store_id=store.id).all()
-    sales = Sale.query.filter_by(store_id=store.id).order_by(
+    sales = streaming.rows(Sale.query.options(joinedload(Sale.product)).filter_by(store_id=store.id).order_by(
         Sale.sale_date.desc()
-    ).all()
+    ))
     
-    return render_template('store_manager/sales.html', products=products, sales=sales, store=store)
+    return streaming.stream_page('store_manager/sales.html', products=products, sales=sales, store=store)
 
-@app.route('/store-manager/sales/create', methods=['POST'])
+@store_manager_bp.route('/sales/create', methods=['POST'], endpoint='create_sale')
 @login_required
 @store_manager_required
+@idempotency.idempotent
 def store_manager_create_sale():
     """Record a new sale"""
     store = Store.query.get_or_404(current_user.store_id)
@@ -447,32 +646,46 @@ def store_manager_create_sale():
     
     if product.store_id != store.id:
         flash('Invalid product for this store.', 'error')
-        return redirect(url_for('store_manager_sales'))
+        return redirect(url_for('store_manager.sales'))
     
-    if product.stock_quantity < quantity:
+    sale = record_sale(product, quantity)
+    if sale is None:
         flash(f'Insufficient stock. Available: {product.stock_quantity}', 'error')
-        return redirect(url_for('store_manager_sales'))
-    
-    # Create sale
-    sale = Sale(
-        product_id=product_id,
-        store_id=store.id,
-        quantity=quantity,
-        unit_price=product.price,
-        total_amount=product.price * quantity
-    )
-    
-    # Update stock
-    product.stock_quantity -= quantity
-    product.updated_at = datetime.utcnow()
-    
-    db.session.add(sale)
+        return redirect(url_for('store_manager.sales'))
     db.session.commit()
     
     flash(f'Sale recorded successfully. Total: ${sale.total_amount:.2f}', 'success')
-    return redirect(url_for('store_manager_sales'))
+    return redirect(url_for('store_manager.sales'))
 
-@app.route('/store-manager/restock-requests')
+@store_manager_bp.route('/pos/sku/<sku>', methods=['GET', 'POST'], endpoint='pos_sku')
+@login_required
+@store_manager_required
+@idempotency.idempotent
+def store_manager_pos_sku(sku):
+    """Till lookup: the store's product and stock for a scanned SKU.
+
+    POST with a ``quantity`` (JSON or form) also records the sale.
+    """
+    product = find_by_sku(current_user.store_id, sku.strip())
+    if product is None:
+        return jsonify({'error': f'unknown SKU {sku!r}'}), 404
+    if request.method == 'GET':
+        return jsonify({'product': product_dict(product)})
+    try:
+        quantity = pos.parse_quantity(request.get_json(silent=True) or request.form)
+    except ValueError:
+        return jsonify({'error': 'quantity must be a positive integer'}), 400
+    if quantity is None:
+        return jsonify({'product': product_dict(product)})
+    sale = record_sale(product, quantity)
+    if sale is None:
+        return jsonify({'error': 'insufficient stock', 'product': product_dict(product)}), 409
+    db.session.commit()
+    return jsonify({'product': product_dict(product),
+                    'sale': {'id': sale.id, 'quantity': sale.quantity, 'unit_price': sale.unit_price,
+                             'total_amount': sale.total_amount}}), 201
+
+@store_manager_bp.route('/restock-requests', endpoint='restock_requests')
 @login_required
 @store_manager_required
 def store_manager_restock_requests():
@@ -488,9 +701,10 @@ def store_manager_restock_requests():
                          requests=requests,
                          store=store)
 
-@app.route('/store-manager/restock-requests/create', methods=['POST'])
+@store_manager_bp.route('/restock-requests/create', methods=['POST'], endpoint='create_restock_request')
 @login_required
 @store_manager_required
+@idempotency.idempotent
 def store_manager_create_restock_request():
     """Create a restock request"""
     store = Store.query.get_or_404(current_user.store_id)
@@ -502,7 +716,7 @@ def store_manager_create_restock_request():
     
     if product.store_id != store.id:
         flash('Invalid product for this store.', 'error')
-        return redirect(url_for('store_manager_restock_requests'))
+        return redirect(url_for('store_manager.restock_requests'))
     
     request_obj = RestockRequest(
         store_id=store.id,
@@ -516,48 +730,37 @@ def store_manager_create_restock_request():
     db.session.commit()
     
     flash(f'Restock request created successfully.', 'success')
-    return redirect(url_for('store_manager_restock_requests'))
+    return redirect(url_for('store_manager.restock_requests'))
 
-@app.route('/store-manager/reports')
+@store_manager_bp.route('/reports', endpoint='reports')
 @login_required
 @store_manager_required
 def store_manager_reports():
     """View store reports"""
     store = Store.query.get_or_404(current_user.store_id)
-    
-    # Sales summary
-    total_sales = db.session.query(func.sum(Sale.total_amount)).filter_by(
-        store_id=store.id
-    ).scalar() or 0
-    
-    total_transactions = Sale.query.filter_by(store_id=store.id).count()
+    start, end = report_range()
+    columns = load_sales_columns(store.id, start, end)
+    total_sales, total_transactions = columns.store_totals(store.id)
     
     # Low stock products
     low_stock_products = Product.query.filter_by(store_id=store.id).filter(
         Product.stock_quantity <= Product.low_stock_threshold
     ).all()
     
-    # Top selling products
-    top_products = db.session.query(
-        Product.name,
-        func.sum(Sale.quantity).label('total_sold'),
-        func.sum(Sale.total_amount).label('revenue')
-    ).join(Sale).filter(
-        Product.store_id == store.id
-    ).group_by(Product.id).order_by(
-        func.sum(Sale.total_amount).desc()
-    ).limit(10).all()
-    
     return render_template('store_manager/reports.html',
                          store=store,
                          total_sales=total_sales,
                          total_transactions=total_transactions,
                          low_stock_products=low_stock_products,
-                         top_products=top_products)
+                         top_products=columns.top_products(10, store_id=store.id),
+                         abc_summary=columns.abc_summary(),
+                         sell_through=columns.sell_through_by_category(),
+                         growth_by_store=columns.period_growth(30),
+                         period_days=30)
 
 # ==================== SUPPLIER ROUTES ====================
 
-@app.route('/supplier/dashboard')
+@supplier_bp.route('/dashboard', endpoint='dashboard')
 @login_required
 @supplier_required
 def supplier_dashboard():
@@ -576,7 +779,7 @@ def supplier_dashboard():
                          shipments=shipments,
                          recent_requests=recent_requests)
 
-@app.route('/supplier/restock-requests')
+@supplier_bp.route('/restock-requests', endpoint='restock_requests')
 @login_required
 @supplier_required
 def supplier_restock_requests():
@@ -600,7 +803,7 @@ def supplier_restock_requests():
                          requests=requests,
                          status_filter=status_filter)
 
-@app.route('/supplier/restock-requests/<int:request_id>/approve', methods=['POST'])
+@supplier_bp.route('/restock-requests/<int:request_id>/approve', methods=['POST'], endpoint='approve_request')
 @login_required
 @supplier_required
 def supplier_approve_request(request_id):
@@ -609,7 +812,7 @@ def supplier_approve_request(request_id):
     
     if request_obj.status != 'pending':
         flash('This request has already been processed.', 'error')
-        return redirect(url_for('supplier_restock_requests'))
+        return redirect(url_for('supplier.restock_requests'))
     
     request_obj.status = 'approved'
     request_obj.supplier_id = current_user.id
@@ -628,9 +831,9 @@ def supplier_approve_request(request_id):
     db.session.commit()
     
     flash('Restock request approved and shipment created.', 'success')
-    return redirect(url_for('supplier_restock_requests'))
+    return redirect(url_for('supplier.restock_requests'))
 
-@app.route('/supplier/restock-requests/<int:request_id>/reject', methods=['POST'])
+@supplier_bp.route('/restock-requests/<int:request_id>/reject', methods=['POST'], endpoint='reject_request')
 @login_required
 @supplier_required
 def supplier_reject_request(request_id):
@@ -639,7 +842,7 @@ def supplier_reject_request(request_id):
     
     if request_obj.status != 'pending':
         flash('This request has already been processed.', 'error')
-        return redirect(url_for('supplier_restock_requests'))
+        return redirect(url_for('supplier.restock_requests'))
     
     request_obj.status = 'rejected'
     request_obj.supplier_id = current_user.id
@@ -648,20 +851,74 @@ def supplier_reject_request(request_id):
     
     db.session.commit()
     flash('Restock request rejected.', 'info')
-    return redirect(url_for('supplier_restock_requests'))
+    return redirect(url_for('supplier.restock_requests'))
 
-@app.route('/supplier/shipments')
+def bulk_input(key):
+    """(payload, ids) from a JSON body or a form with repeated ``key`` fields"""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        return data, data.get(key) or []
+    return request.form, request.form.getlist(key)
+
+def bulk_response(results, endpoint, label):
+    """Per-item results as JSON, or a flash summary and redirect for forms"""
+    summary = supplier_bulk.summarize(results)
+    if request.is_json:
+        return jsonify(summary)
+    message = f"{label}: {summary['succeeded']} succeeded, {summary['failed']} failed."
+    errors = [f"#{r['id']} {r['error']}" for r in results if not r['ok']]
+    if errors:
+        message += ' ' + '; '.join(errors[:5]) + (' ...' if len(errors) > 5 else '')
+    flash(message, 'error' if summary['failed'] else 'success')
+    return redirect(url_for(endpoint))
+
+def bulk_too_large(count, endpoint):
+    limit = current_app.config['BULK_MAX_ITEMS']
+    if count <= limit:
+        return None
+    if request.is_json:
+        return jsonify({'error': f'at most {limit} items per request'}), 400
+    flash(f'Select at most {limit} items at a time.', 'error')
+    return redirect(url_for(endpoint))
+
+@supplier_bp.route('/restock-requests/bulk', methods=['POST'], endpoint='bulk_requests')
+@login_required
+@supplier_required
+def supplier_bulk_requests():
+    """Approve or reject many restock requests in one transaction"""
+    data, values = bulk_input('request_ids')
+    too_large = bulk_too_large(len(values), 'supplier.restock_requests')
+    if too_large:
+        return too_large
+    ids, results = supplier_bulk.parse_ids(values)
+    action = data.get('action')
+    if action == 'approve':
+        results += supplier_bulk.approve_requests(
+            ids, current_user.id,
+            tracking_number=data.get('tracking_number', ''),
+            notes=data.get('notes', ''),
+            expected_delivery=bool(data.get('expected_delivery_date')))
+        label = 'Approved'
+    elif action == 'reject':
+        results += supplier_bulk.reject_requests(ids, current_user.id, data.get('rejection_reason', ''))
+        label = 'Rejected'
+    else:
+        results += [supplier_bulk.failed(i, f'unknown action {action!r}') for i in ids]
+        label = 'Bulk update'
+    return bulk_response(results, 'supplier.restock_requests', label)
+
+@supplier_bp.route('/shipments', endpoint='shipments')
 @login_required
 @supplier_required
 def supplier_shipments():
     """View and manage shipments"""
-    shipments = Shipment.query.filter_by(supplier_id=current_user.id).order_by(
-        Shipment.created_at.desc()
-    ).all()
+    shipments = streaming.rows(Shipment.query.options(joinedload(Shipment.restock_request)).filter_by(
+        supplier_id=current_user.id
+    ).order_by(Shipment.created_at.desc()))
     
-    return render_template('supplier/shipments.html', shipments=shipments)
+    return streaming.stream_page('supplier/shipments.html', shipments=shipments)
 
-@app.route('/supplier/shipments/<int:shipment_id>/update-status', methods=['POST'])
+@supplier_bp.route('/shipments/<int:shipment_id>/update-status', methods=['POST'], endpoint='update_shipment_status')
 @login_required
 @supplier_required
 def supplier_update_shipment_status(shipment_id):
@@ -670,7 +927,7 @@ def supplier_update_shipment_status(shipment_id):
     
     if shipment.supplier_id != current_user.id:
         flash('You do not have permission to update this shipment.', 'error')
-        return redirect(url_for('supplier_shipments'))
+        return redirect(url_for('supplier.shipments'))
     
     new_status = request.form.get('status')
     shipment.status = new_status
@@ -683,9 +940,7 @@ def supplier_update_shipment_status(shipment_id):
     if new_status == 'delivered' and not shipment.actual_delivery_date:
         shipment.actual_delivery_date = datetime.utcnow()
         # Update product stock
-        product = shipment.restock_request.product
-        product.stock_quantity += shipment.restock_request.requested_quantity
-        product.updated_at = datetime.utcnow()
+        adjust_stock(shipment.restock_request.product, shipment.restock_request.requested_quantity)
     
     shipment.tracking_number = request.form.get('tracking_number', shipment.tracking_number)
     shipment.notes = request.form.get('notes', shipment.notes)
@@ -693,9 +948,89 @@ def supplier_update_shipment_status(shipment_id):
     
     db.session.commit()
     flash('Shipment status updated successfully.', 'success')
-    return redirect(url_for('supplier_shipments'))
+    return redirect(url_for('supplier.shipments'))
+
+@supplier_bp.route('/shipments/bulk-update-status', methods=['POST'], endpoint='bulk_update_shipments')
+@login_required
+@supplier_required
+def supplier_bulk_update_shipments():
+    """Advance many shipments in one transaction.
+
+    JSON: ``{"updates": [{"id": 1, "status": "delivered", ...}]}`` or
+    ``{"shipment_ids": [...], "status": ...}``; forms send repeated
+    ``shipment_ids`` with one ``status``.
+    """
+    data, values = bulk_input('shipment_ids')
+    updates = data.get('updates') if request.is_json else None
+    too_large = bulk_too_large(len(updates or values), 'supplier.shipments')
+    if too_large:
+        return too_large
+    results = []
+    if updates is None:
+        ids, results = supplier_bulk.parse_ids(values)
+        updates = [{'id': i, 'status': data.get('status'), 'notes': data.get('notes') or None} for i in ids]
+    else:
+        updates, results = supplier_bulk.parse_updates(updates)
+    results += supplier_bulk.update_shipments(updates, current_user.id)
+    return bulk_response(results, 'supplier.shipments', 'Shipments updated')
+
+# ==================== APPLICATION FACTORY ====================
+
+def warmup_sessions():
+    """Login sessions of the first user of each role, for the template warmup"""
+    sessions = {}
+    for role in template_cache.ROLES:
+        user = User.query.filter_by(role=role).first()
+        if user:
+            sessions[role] = {'_user_id': str(user.id), '_fresh': True}
+    return sessions
+
+def create_app(config=None):
+    """Build the app; ``config`` overrides the defaults below"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'your-secret-key-change-in-production'
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///stylane.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'products')
+    app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+    app.config['BULK_MAX_ITEMS'] = 500
+    app.config.update(config or {})
+
+    db.init_app(app)
+    # Columns, constraints and indexes changed since the database was created
+    upgrade_schema(app)
+    # FTS5 index on products, maintained by triggers
+    search.init_app(app, search.FtsIndex(db, Product))
+    # Facet counts for the admin inventory, also maintained by triggers
+    facets.init_app(app, facets.FacetCounts(db, Product))
+    metrics.init_app(app)
+    sql_metrics.init_app(app, db)
+    profiling.init_app(app)
+    restock.init_app(app)
+    pos.init_app(app)
+    # Leader lock in the job_locks table, so any number of workers can run it
+    scheduler.init_app(app, scheduler.DatabaseLock(db, JobLock))
+    # Nightly job moving old sales into compressed monthly summaries; a
+    # SQLite database is on one host, like the archive directory beside it
+    sales_archive.init_app(app, load_archivable_sales, delete_archived_sales,
+                           shared=app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'))
+    # Idempotency keys for sale and restock submissions, purged hourly
+    idempotency.init_app(app, idempotency.SqlKeyStore(db, IdempotencyKey), lambda: current_user.get_id())
+    # Long list pages render while they are sent
+    streaming.init_app(app)
+    # Password hash settings and the login throttle
+    passwords.init_app(app)
+    login_manager.init_app(app)
+
+    app.add_template_filter(format_datetime, 'datetime')
+    for blueprint in (auth_bp, admin_bp, store_manager_bp, supplier_bp):
+        app.register_blueprint(blueprint)
+    # Compiled templates cached on disk; dashboards rendered once with STYLANE_TEMPLATE_WARMUP=1
+    template_cache.init_app(app, warmup_sessions)
+    return app
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
     app.run(debug=True)
@@ -1,28 +1,141 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, Flask, current_app, render_template, request, redirect, url_for, flash, session, jsonify, send_from_directory, abort
 import os
-import boto3
+import random
+import threading
+import time
 import uuid
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
+from decimal import Decimal
+from werkzeug.local import LocalProxy
 from werkzeug.utils import secure_filename
-from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError, NoCredentialsError, PartialCredentialsError
+import aws_clients
+import aws_metrics
+import metrics
+import profiling
+import scheduler
+import search
+import pos
+import cdc
+import sales_archive
+import sales_shards
+import idempotency
+import template_cache
+import passwords
+import fanout
+import dynamo_records
+from dynamo_records import ProductRecord, SaleRecord
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-change-in-production-aws'
+# AWS Configuration
+REGION = 'us-east-1'
+
+# SNS Topic ARN (Set this in environment variables during deployment)
+DEFAULT_SNS_TOPIC_ARN = "arn:aws:sns:us-east-1:897722702935:Stylane_project"
+
+# DynamoDB Tables (Create these tables in DynamoDB manually)
+TABLE_NAMES = {
+    'users': 'StyleLaneUsers',
+    'stores': 'StyleLaneStores',
+    'products': 'StyleLaneProducts',
+    'sales': 'StyleLaneSales',
+    'restock_requests': 'StyleLaneRestockRequests',
+    'shipments': 'StyleLaneShipments',
+    'idempotency': 'StyleLaneIdempotency',
+    'jobs': 'StyleLaneJobs',
+}
+
+
+class AwsServices:
+    """DynamoDB resource, tables and SNS client, created on first use.
+
+    Building boto3 clients costs tens of milliseconds (and importing boto3
+    more), so the app starts without them; worker processes pay once, on the
+    first request that touches AWS. ``DYNAMODB_RESOURCE`` / ``SNS_CLIENT``
+    config values replace the real ones (tests, the local stand-in).
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._dynamodb = None
+        self._sns = None
+        self._streams = None
+        self._tables = {}
+
+    @property
+    def dynamodb(self):
+        if self._dynamodb is None:
+            with self._lock:
+                if self._dynamodb is None:
+                    dynamodb = self._create_dynamodb()
+                    aws_metrics.instrument(dynamodb)
+                    self._dynamodb = dynamodb
+        return self._dynamodb
+
+    def _create_dynamodb(self):
+        if self.config.get('DYNAMODB_RESOURCE') is not None:
+            return self.config['DYNAMODB_RESOURCE']
+        local = self.config.get('LOCAL_DYNAMODB')
+        if local:
+            from dynamo_local import LocalDynamoResource
+            return LocalDynamoResource.load(local) if os.path.exists(local) else LocalDynamoResource()
+        return aws_clients.resource('dynamodb', region_name=REGION)
+
+    @property
+    def sns(self):
+        if self._sns is None:
+            with self._lock:
+                if self._sns is None:
+                    client = self.config.get('SNS_CLIENT')
+                    if client is None:
+                        client = aws_clients.client('sns', region_name=REGION)
+                    aws_metrics.instrument(client)
+                    self._sns = client
+        return self._sns
+
+    @property
+    def streams(self):
+        """DynamoDB Streams client (the local stand-in's when DynamoDB is local)"""
+        if self._streams is None:
+            dynamodb = self.dynamodb
+            with self._lock:
+                if self._streams is None:
+                    client = self.config.get('STREAMS_CLIENT')
+                    if client is None:
+                        from dynamo_local import LocalDynamoResource, LocalStreamsClient
+                        if isinstance(dynamodb, LocalDynamoResource):
+                            client = LocalStreamsClient(dynamodb)
+                        else:
+                            client = aws_clients.client('dynamodbstreams', region_name=REGION)
+                            aws_metrics.instrument(client)
+                    self._streams = client
+        return self._streams
+
+    def table(self, key):
+        """Table handle by TABLE_NAMES key, cached"""
+        table = self._tables.get(key)
+        if table is None:
+            table = self._tables[key] = self.dynamodb.Table(TABLE_NAMES[key])
+        return table
 
-# Configuration for File Uploads
-app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'products')
-app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+    users_table = property(lambda self: self.table('users'))
+    stores_table = property(lambda self: self.table('stores'))
+    products_table = property(lambda self: self.table('products'))
+    sales_table = property(lambda self: self.table('sales'))
+    restock_requests_table = property(lambda self: self.table('restock_requests'))
+    shipments_table = property(lambda self: self.table('shipments'))
+    idempotency_table = property(lambda self: self.table('idempotency'))
+    jobs_table = property(lambda self: self.table('jobs'))
+
+
+# The current app's AwsServices
+aws = LocalProxy(lambda: current_app.extensions['aws_services'])
 
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 # Jinja2 filter for date formatting
-@app.template_filter('datetime')
 def datetime_filter(value):
     """Format ISO datetime string to readable format"""
     if not value:
@@ -35,43 +148,38 @@ def datetime_filter(value):
             return value
     return value
 
-# AWS Configuration
-REGION = 'us-east-1'
-
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb', region_name=REGION)
-sns = boto3.client('sns', region_name=REGION)
-
-# DynamoDB Tables (Create these tables in DynamoDB manually)
-users_table = dynamodb.Table('StyleLaneUsers')
-stores_table = dynamodb.Table('StyleLaneStores')
-products_table = dynamodb.Table('StyleLaneProducts')
-sales_table = dynamodb.Table('StyleLaneSales')
-restock_requests_table = dynamodb.Table('StyleLaneRestockRequests')
-shipments_table = dynamodb.Table('StyleLaneShipments')
-
-# SNS Topic ARN (Set this in environment variables during deployment)
-SNS_TOPIC_ARN = "arn:aws:sns:us-east-1:897722702935:Stylane_project"
-
 # Helper Functions
 def send_notification(subject, message):
     """Send notification via SNS if ARN is configured"""
-    if not SNS_TOPIC_ARN:
+    topic_arn = current_app.config['SNS_TOPIC_ARN']
+    if not topic_arn:
         print(f"SNS Notification (Simulated): {subject} - {message}")
         return
 
     try:
-        sns.publish(
-            TopicArn=SNS_TOPIC_ARN,
+        aws.sns.publish(
+            TopicArn=topic_arn,
             Subject=subject,
             Message=message
         )
     except ClientError as e:
         print(f"Error sending notification: {e}")
 
+def rehash_password(user, new_hash):
+    """Store ``new_hash`` unless the password was changed since ``user`` was read"""
+    from boto3.dynamodb.conditions import Attr
+    try:
+        aws.users_table.update_item(
+            Key={'username': user['username']},
+            UpdateExpression='SET password_hash = :new',
+            ConditionExpression=Attr('password_hash').eq(user['password_hash']),
+            ExpressionAttributeValues={':new': new_hash})
+    except ClientError as e:
+        print(f"Password rehash skipped for {user['username']}: {e}")
+
 def get_user(username):
     try:
-        response = users_table.get_item(Key={'username': username})
+        response = aws.users_table.get_item(Key={'username': username})
         return response.get('Item')
     except (ClientError, NoCredentialsError, PartialCredentialsError) as e:
         # Re-raise to let the caller handle the connection error
@@ -83,33 +191,294 @@ def get_user(username):
 def get_store(store_id):
     if not store_id: return None
     try:
-        response = stores_table.get_item(Key={'store_id': store_id})
+        response = aws.stores_table.get_item(Key={'store_id': store_id})
         return response.get('Item')
     except ClientError:
         return None
 
 def get_product(product_id):
     try:
-        response = products_table.get_item(Key={'product_id': product_id})
+        response = aws.products_table.get_item(Key={'product_id': product_id})
         return response.get('Item')
     except ClientError:
         return None
 
+def scan_all(table, **kwargs):
+    """Every item of a table, following LastEvaluatedKey past the 1 MB page"""
+    items = []
+    while True:
+        page = table.scan(**kwargs)
+        items.extend(page.get('Items', []))
+        if 'LastEvaluatedKey' not in page:
+            return items
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
 def get_all_stores():
-    return stores_table.scan().get('Items', [])
+    return scan_all(aws.stores_table)
+
+# Attributes each list view renders; they read these alone (see dynamo_records.py)
+PRODUCT_LIST_FIELDS = tuple(name for name, _ in ProductRecord.FIELDS)
+PRODUCT_SUMMARY_FIELDS = ('product_id', 'store_id', 'name', 'sku', 'category', 'stock_quantity', 'low_stock_threshold')
+SALE_SUMMARY_FIELDS = ('product_id', 'store_id', 'quantity', 'total_amount', 'sale_date')
+
+def list_products(store_id=None, fields=PRODUCT_LIST_FIELDS):
+    """Product records, one store's through its StoreIdIndex partition"""
+    client = aws.dynamodb.meta.client
+    if store_id is None:
+        return dynamo_records.scan(client, TABLE_NAMES['products'], ProductRecord, fields)
+    return dynamo_records.query(client, TABLE_NAMES['products'], 'StoreIdIndex', 'store_id', store_id,
+                                ProductRecord, fields)
+
+def list_sales(store_id=None, fields=SALE_SUMMARY_FIELDS, limit=None):
+    """Sale records; a store's come newest first, gathered from its
+    StoreShardIndex shards (see sales_shards.py)"""
+    client = aws.dynamodb.meta.client
+    if store_id is None:
+        return dynamo_records.scan(client, TABLE_NAMES['sales'], SaleRecord, fields)
+
+    def query_shard(shard):
+        return dynamo_records.query(client, TABLE_NAMES['sales'], 'StoreShardIndex', 'store_shard', shard,
+                                    SaleRecord, fields, limit=limit, ScanIndexForward=False)
+
+    return current_app.extensions['sales_shards'].gather(store_id, query_shard, limit)
+
+def load_search_items(services):
+    """Searchable attributes of every product, one paginated scan"""
+    kwargs = {'ProjectionExpression': 'product_id, store_id, #n, description, sku, category, color',
+              'ExpressionAttributeNames': {'#n': 'name'}}
+    while True:
+        page = services.products_table.scan(**kwargs)
+        yield from page.get('Items', [])
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+def load_low_stock_items(services):
+    """Products at or below their threshold, one paginated scan"""
+    kwargs = {'ProjectionExpression': 'product_id, store_id, #n, sku, stock_quantity, low_stock_threshold',
+              'ExpressionAttributeNames': {'#n': 'name'}}
+    while True:
+        page = services.products_table.scan(**kwargs)
+        yield from (i for i in page.get('Items', []) if cdc.is_low_stock(i))
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+def search_products(query, store_id=None):
+    """Products matching ``query`` (see search.py), best match first"""
+    ids = current_app.extensions['search'].search(
+        query, store_id, current_app.config['SEARCH_LIMIT'], current_app.config['SEARCH_RANK_LIMIT'])
+    if not ids:
+        return []
+    # One BatchGetItem (up to 100 keys, more than SEARCH_LIMIT), retrying unprocessed keys
+    table_name = TABLE_NAMES['products']
+    items, request_items = {}, {table_name: {'Keys': [{'product_id': i} for i in ids]}}
+    while request_items:
+        response = aws.dynamodb.batch_get_item(RequestItems=request_items)
+        for item in response.get('Responses', {}).get(table_name, []):
+            items[item['product_id']] = item
+        request_items = response.get('UnprocessedKeys')
+    return [items[i] for i in ids if i in items]
+
+def product_dict(item):
+    return {'id': item['product_id'], 'name': item.get('name'), 'sku': item.get('sku'),
+            'category': item.get('category'), 'size': item.get('size'), 'color': item.get('color'),
+            'price': float(item['price']) if item.get('price') is not None else None,
+            'stock_quantity': int(item.get('stock_quantity', 0)), 'store_id': item.get('store_id')}
+
+def find_by_sku(store_id, sku):
+    """Product for a scanned SKU, through the hot-SKU cache (see pos.py)"""
+    from boto3.dynamodb.conditions import Key
 
-def get_all_products():
-    return products_table.scan().get('Items', [])
+    def find(store_id, sku):
+        # GSI reads are eventually consistent: take the id, re-read the item
+        items = aws.products_table.query(
+            IndexName='StoreSkuIndex', KeyConditionExpression=Key('store_id').eq(store_id) & Key('sku').eq(sku),
+            ProjectionExpression='product_id', Limit=1).get('Items', [])
+        product = fetch(items[0]['product_id']) if items else None
+        return (product['product_id'], product) if product else None
 
-def get_products_by_store(store_id):
-    # Ideally use GSI, using scan for simplicity if GSI not set up
-    items = products_table.scan().get('Items', [])
-    return [i for i in items if i.get('store_id') == store_id]
+    def fetch(product_id):
+        item = aws.products_table.get_item(Key={'product_id': product_id}, ConsistentRead=True).get('Item')
+        return item if item and item.get('store_id') == store_id and item.get('sku') == sku else None
+
+    return pos.lookup(store_id, sku, find, fetch)
+
+# Transactions tried per sale, and the base of the backoff between them (seconds)
+SALE_ATTEMPTS = 4
+SALE_BACKOFF = 0.025
+
+def record_sale(product, quantity):
+    """Take ``quantity`` off the stock and write the sale, in one transaction.
+
+    The stock update is conditional on that much being left and on the
+    price the sale is charged at; either both writes land or neither does.
+    A transaction cancelled by a concurrent one on the same product is
+    retried after a jittered backoff. Returns (sale, updated product),
+    (None, current product) when the stock is short, or (None, None) when
+    the product stayed contended through every attempt (nothing written).
+    """
+    from boto3.dynamodb.types import TypeSerializer
+    serialize = TypeSerializer().serialize
+    key = {'product_id': product['product_id']}
+    for attempt in range(SALE_ATTEMPTS):
+        if attempt:
+            # Full jitter, so tills selling one hot SKU spread their retries
+            delay = random.uniform(0, SALE_BACKOFF * 2 ** attempt)
+            left = aws_clients.remaining()
+            if left is not None and delay >= left:
+                break
+            time.sleep(delay)
+        price = product.get('price')
+        unit_price = Decimal(str(price or 0))
+        sale_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        sale = {
+            'sale_id': sale_id,
+            'store_shard': current_app.extensions['sales_shards'].key(product['store_id'], sale_id),
+            'product_id': product['product_id'],
+            'store_id': product['store_id'],
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_amount': unit_price * quantity,
+            'sale_date': now,
+        }
+        values = {':q': quantity, ':store': product['store_id'], ':now': now, ':one': 1}
+        if price is None:
+            charged = 'attribute_not_exists(price)'
+        else:
+            charged, values[':price'] = 'price = :price', price
+        try:
+            aws.dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Update': {
+                    'TableName': TABLE_NAMES['products'],
+                    'Key': {name: serialize(value) for name, value in key.items()},
+                    # ADD, unlike SET, also works on items written before versions
+                    'UpdateExpression': 'SET stock_quantity = stock_quantity - :q, updated_at = :now ADD #v :one',
+                    'ConditionExpression': f'stock_quantity >= :q AND store_id = :store AND {charged}',
+                    'ExpressionAttributeNames': {'#v': 'version'},
+                    'ExpressionAttributeValues': {name: serialize(value) for name, value in values.items()},
+                }},
+                {'Put': {
+                    'TableName': TABLE_NAMES['sales'],
+                    'Item': {name: serialize(value) for name, value in sale.items()},
+                    'ConditionExpression': 'attribute_not_exists(sale_id)',
+                }},
+            ])
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            current = aws.products_table.get_item(Key=key, ConsistentRead=True).get('Item')
+            if current is None or current.get('store_id') != product['store_id'] \
+                    or int(current.get('stock_quantity', 0)) < quantity:
+                return None, current or product
+            # Repriced, or another transaction on the product got in first
+            product = current
+            continue
+        return sale, aws.products_table.get_item(Key=key, ConsistentRead=True).get('Item') or product
+    return None, None
+
+def update_product(product, version, changes):
+    """Write ``changes`` to a product if it is still at ``version`` (0: an
+    item from before versions), bumping it. Returns the updated item, or
+    None when a sale or another edit wrote the product first.
+    """
+    from boto3.dynamodb.conditions import Attr
+    names = {f'#f{i}': field for i, field in enumerate(changes)}
+    values = {f':f{i}': value for i, value in enumerate(changes.values())}
+    sets = ''.join(f'{name} = {value}, ' for name, value in zip(names, values))
+    current = Attr('version').eq(version) if version else Attr('version').not_exists()
+    try:
+        return aws.products_table.update_item(
+            Key={'product_id': product['product_id']},
+            UpdateExpression=f'SET {sets}#v = :v, updated_at = :now',
+            ConditionExpression=current & Attr('store_id').eq(product['store_id']),
+            ExpressionAttributeNames=dict(names, **{'#v': 'version'}),
+            ExpressionAttributeValues=dict(values, **{':v': version + 1, ':now': datetime.now().isoformat()}),
+            ReturnValues='ALL_NEW')['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        return None
 
 def get_sales_by_store(store_id):
-    items = sales_table.scan().get('Items', [])
-    store_sales = [i for i in items if i.get('store_id') == store_id]
-    return sorted(store_sales, key=lambda x: x.get('sale_date', ''), reverse=True)
+    return list_sales(store_id, SALE_SUMMARY_FIELDS + ('sale_id', 'unit_price'))
+
+def load_sales_columns(store_id=None, start=None, end=None):
+    """Load products and sales (optionally for one store, and dated in
+    [start, end)) into analytics columns, archived sales included"""
+    from analytics import SalesColumns
+    archive = current_app.extensions['sales_archive']
+    since = sales_archive.hot_since(archive, start)
+    # ISO strings order as the dates they hold
+    since = since.isoformat() if since else None
+    until = end.isoformat() if end else None
+
+    def in_range(sales):
+        return [s for s in sales if (since is None or s.get('sale_date', '') >= since)
+                and (until is None or s.get('sale_date', '') < until)]
+
+    # Paginated reads: a single scan page would cover only the first 1 MB
+    archived = archive.read(start, end, store_id)
+    products = list_products(store_id, PRODUCT_SUMMARY_FIELDS)
+    if store_id:
+        store = get_store(store_id)
+        return SalesColumns.from_items(products, in_range(list_sales(store_id)), [store] if store else [], archived)
+    return SalesColumns.from_items(products, in_range(list_sales()), get_all_stores(), archived)
+
+def report_range():
+    """(start, end) from the reports' from/to arguments; 400 when malformed"""
+    try:
+        return sales_archive.parse_range(request.args)
+    except ValueError:
+        abort(400)
+
+def load_archivable_sales(before):
+    """(product_id, store_id, quantity, total_amount, sale_date) of sales before ``before``"""
+    from boto3.dynamodb.conditions import Attr
+    kwargs = {'FilterExpression': Attr('sale_date').lt(before.isoformat()),
+              'ProjectionExpression': 'product_id, store_id, quantity, total_amount, sale_date'}
+    while True:
+        page = aws.sales_table.scan(**kwargs)
+        for s in page.get('Items', []):
+            yield s['product_id'], s['store_id'], s.get('quantity'), s.get('total_amount'), s['sale_date']
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+def delete_archived_sales(before):
+    from boto3.dynamodb.conditions import Attr
+    kwargs = {'FilterExpression': Attr('sale_date').lt(before.isoformat()), 'ProjectionExpression': 'sale_id'}
+    with aws.sales_table.batch_writer() as batch:
+        while True:
+            page = aws.sales_table.scan(**kwargs)
+            for s in page.get('Items', []):
+                batch.delete_item(Key={'sale_id': s['sale_id']})
+            if 'LastEvaluatedKey' not in page:
+                return
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+def expire_archived_sales(before, seconds):
+    """Have DynamoDB TTL remove sales before ``before`` in ``seconds``;
+    sales already marked are left as they are"""
+    from boto3.dynamodb.conditions import Attr
+    expires_at = int(time.time() + seconds)
+    kwargs = {'FilterExpression': Attr('sale_date').lt(before.isoformat()) & Attr('expires_at').not_exists(),
+              'ProjectionExpression': 'sale_id'}
+    while True:
+        page = aws.sales_table.scan(**kwargs)
+        for s in page.get('Items', []):
+            try:
+                aws.sales_table.update_item(Key={'sale_id': s['sale_id']}, UpdateExpression='SET expires_at = :e',
+                                            ConditionExpression=Attr('sale_id').exists(),
+                                            ExpressionAttributeValues={':e': expires_at})
+            except ClientError as e:
+                # Removed since the scan read it
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
 
 # Authentication Decorators
 def login_required(f):
@@ -118,7 +487,7 @@ def login_required(f):
     def decorated_function(*args, **kwargs):
         if 'username' not in session:
             flash('Please log in to access this page.', 'error')
-            return redirect(url_for('login'))
+            return redirect(url_for('auth.login'))
         return f(*args, **kwargs)
     return decorated_function
 
@@ -128,10 +497,10 @@ def role_required(role):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if 'username' not in session:
-                return redirect(url_for('login'))
+                return redirect(url_for('auth.login'))
             if session.get('role') != role:
                 flash(f'Access denied. {role.title()} privileges required.', 'error')
-                return redirect(url_for('home'))
+                return redirect(url_for('auth.home'))
             return f(*args, **kwargs)
         return decorated_function
     return decorator
@@ -147,52 +516,66 @@ class UserWrapper:
     def is_authenticated(self):
         return self.username is not None
 
-@app.context_processor
 def inject_user():
     if 'username' in session:
         return {'current_user': UserWrapper(session['username'], session.get('role'), session.get('store_id'))}
     return {'current_user': UserWrapper()}
 
-# Routes
+# Routes, one blueprint per role; endpoints are '<blueprint>.<view>'
 
-@app.route('/')
+auth_bp = Blueprint('auth', __name__)
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+store_manager_bp = Blueprint('store_manager', __name__, url_prefix='/store-manager')
+supplier_bp = Blueprint('supplier', __name__, url_prefix='/supplier')
+
+@auth_bp.route('/')
 def index():
     """Splash screen"""
     return render_template('splash.html')
 
-@app.route('/home')
+@auth_bp.route('/home')
 def home():
     if 'username' in session:
         role = session.get('role')
         if role == 'admin':
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('admin.dashboard'))
         elif role == 'store_manager':
-            return redirect(url_for('store_manager_dashboard'))
+            return redirect(url_for('store_manager.dashboard'))
         elif role == 'supplier':
-            return redirect(url_for('supplier_dashboard'))
-    return redirect(url_for('login'))
+            return redirect(url_for('supplier.dashboard'))
+    return redirect(url_for('auth.login'))
 
 
-@app.route('/login', methods=['GET', 'POST'])
+@auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if 'username' in session:
-        return redirect(url_for('home'))
+        return redirect(url_for('auth.home'))
         
     error = None
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
         
+        # Before the lookup and the (deliberately slow) hash check
+        wait = passwords.throttle(username)
+        if wait:
+            flash(f'Too many login attempts. Try again in {wait} seconds.', 'error')
+            return render_template('login.html'), 429, {'Retry-After': str(wait)}
+        
         try:
             user = get_user(username)
+            matches, new_hash = passwords.verify(user.get('password_hash'), password) if user else (False, None)
+            passwords.record(matches)
             
-            if user and check_password_hash(user.get('password_hash'), password):
+            if matches:
+                if new_hash:
+                    rehash_password(user, new_hash)
                 session['username'] = username
                 session['role'] = user.get('role')
                 session['store_id'] = user.get('store_id')
                 flash(f'Welcome back, {username}!', 'success')
                 send_notification("User Login", f"User {username} has logged in.")
-                return redirect(url_for('home'))
+                return redirect(url_for('auth.home'))
             else:
                 error = 'Invalid username or password.'
                 
@@ -208,50 +591,56 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/logout')
+@auth_bp.route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('auth.login'))
 
 # --- ADMIN ROUTES ---
 
-@app.route('/admin/dashboard')
+@admin_bp.route('/dashboard', endpoint='dashboard')
 @login_required
 @role_required('admin')
 def admin_dashboard():
-    stores = get_all_stores()
-    products = get_all_products()
-    users = users_table.scan().get('Items', [])
-    requests = restock_requests_table.scan().get('Items', [])
-    sales = sales_table.scan().get('Items', [])
+    # Five independent scans, in parallel; one that misses the deadline is left out
+    reads, missing = fanout.gather('admin_dashboard', {
+        'stores': get_all_stores,
+        'products': lambda: list_products(fields=PRODUCT_SUMMARY_FIELDS),
+        'users': lambda: aws.users_table.scan().get('Items', []),
+        'requests': lambda: aws.restock_requests_table.scan().get('Items', []),
+        'sales': list_sales,
+    })
+    stores, products, users, requests, sales = (
+        reads.get(name, []) for name in ('stores', 'products', 'users', 'requests', 'sales'))
+    if missing:
+        flash(f"Not loaded in time, left out of the figures below: {', '.join(missing)}.", 'info')
     
     pending_requests = len([r for r in requests if r.get('status') == 'pending'])
     
-    # Enrichment
-    low_stock_products = []
-    for p in products:
-        if int(p.get('stock_quantity', 0)) <= int(p.get('low_stock_threshold', 10)):
-            p['store'] = get_store(p.get('store_id'))
-            p['is_low_stock'] = True
-            low_stock_products.append(p)
+    # Enrichment from what is loaded already, not a GetItem per row; the
+    # CDC-maintained view, once loaded, saves the filter
+    stores_by_id = {s['store_id']: s for s in stores}
+    view = current_app.extensions.get('low_stock')
+    if view is not None and view.ready:
+        low_stock_products = view.products()
+    else:
+        low_stock_products = [p for p in products if p.is_low_stock]
+    for p in low_stock_products:
+        p['store'] = stores_by_id.get(p.get('store_id'))
             
     # Recent sales
-    recent_sales = sorted(sales, key=lambda x: x.get('sale_date', ''), reverse=True)[:10]
+    products_by_id = {p.product_id: p for p in products}
+    recent_sales = sorted(sales, key=lambda x: x.sale_date or '', reverse=True)[:10]
     for s in recent_sales:
-        s['product'] = get_product(s.get('product_id'))
-        s['store'] = get_store(s.get('store_id'))
+        s.product = products_by_id.get(s.product_id)
+        s.store = stores_by_id.get(s.store_id)
 
     # Helper for charts
-    sales_by_cat = {}
-    for s in sales:
-        p = get_product(s.get('product_id'))
-        if p:
-            cat = p.get('category', 'Uncategorized')
-            sales_by_cat[cat] = sales_by_cat.get(cat, 0) + float(s.get('total_amount', 0))
-    
-    cat_labels = list(sales_by_cat.keys())
-    cat_data = list(sales_by_cat.values())
+    from analytics import SalesColumns
+    sales_by_cat = SalesColumns.from_items(products, sales).revenue_by_category()
+    cat_labels = [cat for cat, _ in sales_by_cat]
+    cat_data = [total for _, total in sales_by_cat]
             
     return render_template('admin/dashboard.html',
                          total_stores=len(stores),
@@ -264,57 +653,116 @@ def admin_dashboard():
                          category_data=cat_data,
                          sales_dates=[], sales_values=[]) # simplified for aws demo
 
-@app.route('/admin/users', methods=['GET'])
+@admin_bp.route('/users', methods=['GET'], endpoint='users')
 @login_required
 @role_required('admin')
 def admin_users():
-    users = users_table.scan().get('Items', [])
+    users = aws.users_table.scan().get('Items', [])
     stores = get_all_stores()
     return render_template('admin/users.html', users=users, stores=stores)
 
-@app.route('/admin/users/create', methods=['POST'])
+@admin_bp.route('/users/create', methods=['POST'], endpoint='create_user')
 @login_required
 @role_required('admin')
 def admin_create_user():
     username = request.form.get('username')
     if get_user(username):
         flash('User exists', 'error')
-        return redirect(url_for('admin_users'))
+        return redirect(url_for('admin.users'))
         
     item = {
         'username': username,
         'email': request.form.get('email'),
-        'password_hash': generate_password_hash(request.form.get('password')),
+        'password_hash': passwords.hash_password(request.form.get('password')),
         'role': request.form.get('role'),
         'store_id': request.form.get('store_id') or None,
         'created_at': datetime.now().isoformat()
     }
-    users_table.put_item(Item=item)
+    aws.users_table.put_item(Item=item)
     flash('User created', 'success')
-    return redirect(url_for('admin_users'))
+    return redirect(url_for('admin.users'))
 
-@app.route('/admin/stores')
+@admin_bp.route('/stores', endpoint='stores')
 @login_required
 @role_required('admin')
 def admin_stores():
     stores = get_all_stores()
-    return render_template('admin/stores.html', stores=stores) if os.path.exists(os.path.join(app.root_path, 'templates/admin/stores.html')) else "Stores Page Placeholder"
+    return render_template('admin/stores.html', stores=stores) if os.path.exists(os.path.join(current_app.root_path, 'templates/admin/stores.html')) else "Stores Page Placeholder"
 
-@app.route('/admin/inventory')
+@admin_bp.route('/inventory', endpoint='inventory')
 @login_required
 @role_required('admin')
 def admin_inventory():
+    query = request.args.get('q', '').strip()
+    if query:
+        # Search results as JSON until this page has a template
+        products = search_products(query, request.args.get('store_id') or None)
+        return jsonify([product_dict(p) for p in products])
     return "Inventory Page Placeholder"
 
-@app.route('/admin/reports')
+@admin_bp.route('/reports', endpoint='reports')
 @login_required
 @role_required('admin')
 def admin_reports():
-    return "Reports Page Placeholder"
+    start, end = report_range()
+    columns = load_sales_columns(start=start, end=end)
+    return render_template('admin/reports.html', **columns.report())
+
+@admin_bp.route('/aws-calls', endpoint='aws_calls')
+@login_required
+@role_required('admin')
+def admin_aws_calls():
+    """Per-route AWS call histograms recorded by aws_metrics"""
+    return jsonify(aws_metrics.route_stats(current_app))
+
+@admin_bp.route('/profiles', endpoint='profiles')
+@login_required
+@role_required('admin')
+def admin_profiles():
+    """Stored request profiles and a signed header to trigger new ones"""
+    return render_template('admin/profiles.html',
+                         profiles=profiling.list_profiles(current_app),
+                         header=profiling.HEADER,
+                         token=profiling.make_token(current_app.secret_key),
+                         sample_rate=current_app.config['PROFILE_SAMPLE_RATE'])
+
+@admin_bp.route('/profiles/<path:filename>', endpoint='profile_file')
+@login_required
+@role_required('admin')
+def admin_profile_file(filename):
+    """Download one profile file (collapsed stacks, allocations, pstats)"""
+    if not filename.endswith(profiling.SUFFIXES):
+        abort(404)
+    return send_from_directory(current_app.config['PROFILE_DIR'], filename, mimetype='text/plain')
+
+@admin_bp.route('/jobs', endpoint='jobs')
+@login_required
+@role_required('admin')
+def admin_jobs():
+    """Scheduled jobs with their last run and totals"""
+    sched = current_app.extensions['scheduler']
+    if request.args.get('format') == 'json':
+        return jsonify(sched.stats())
+    return render_template('admin/jobs.html', jobs=sched.stats(),
+                         enabled=current_app.config['SCHEDULER_ENABLED'])
+
+@admin_bp.route('/jobs/<name>/run', methods=['POST'], endpoint='run_job')
+@login_required
+@role_required('admin')
+def admin_run_job(name):
+    """Queue a job now, outside its schedule"""
+    sched = current_app.extensions['scheduler']
+    if name not in sched.jobs:
+        abort(404)
+    if sched.run_now(name):
+        flash(f'Job {name} queued.', 'success')
+    else:
+        flash(f'Job {name} is already running.', 'info')
+    return redirect(url_for('admin.jobs'))
 
 # --- STORE MANAGER ROUTES ---
 
-@app.route('/store-manager/dashboard')
+@store_manager_bp.route('/dashboard', endpoint='dashboard')
 @login_required
 @role_required('store_manager')
 def store_manager_dashboard():
@@ -322,35 +770,42 @@ def store_manager_dashboard():
     if not store_id: return "No store assigned"
     
     store = get_store(store_id)
-    products = get_products_by_store(store_id)
-    sales = get_sales_by_store(store_id)
+    products = list_products(store_id, PRODUCT_SUMMARY_FIELDS)
+    sales = list_sales(store_id, limit=10)
     
-    low_stock = [p for p in products if int(p.get('stock_quantity',0)) <= int(p.get('low_stock_threshold',10))]
+    low_stock = [p for p in products if p.is_low_stock]
     
-    # Enrich sales
+    # Enrich sales from the store's products, not a GetItem per sale
+    products_by_id = {p.product_id: p for p in products}
     for s in sales:
-        s['product'] = get_product(s.get('product_id'))
+        s.product = products_by_id.get(s.product_id)
         
     return render_template('store_manager/dashboard.html',
                          store=store,
                          products=products,
                          low_stock_products=low_stock,
                          low_stock_count=len(low_stock),
-                         recent_sales=sales[:10],
+                         recent_sales=sales,
                          pending_requests=0) # Simplified
 
-@app.route('/store-manager/products')
+@store_manager_bp.route('/products', endpoint='products')
 @login_required
 @role_required('store_manager')
 def store_manager_products():
     store_id = session.get('store_id')
     store = get_store(store_id)
-    products = get_products_by_store(store_id)
-    # Add id alias
-    for p in products: p['id'] = p['product_id']
-    return render_template('store_manager/products.html', products=products, store=store)
+    query = request.args.get('q', '').strip()
+    if query:
+        products = search_products(query, store_id)
+        if request.args.get('format') == 'json':
+            return jsonify([product_dict(p) for p in products])
+        # Add id alias
+        for p in products: p['id'] = p['product_id']
+    else:
+        products = list_products(store_id)
+    return render_template('store_manager/products.html', products=products, store=store, query=query)
 
-@app.route('/store-manager/products/create', methods=['POST'])
+@store_manager_bp.route('/products/create', methods=['POST'], endpoint='create_product')
 @login_required
 @role_required('store_manager')
 def store_manager_create_product():
@@ -364,7 +819,8 @@ def store_manager_create_product():
             filename = secure_filename(file.filename)
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             image_filename = f"{timestamp}_{filename}"
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], image_filename))
+            os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+            file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], image_filename))
 
     item = {
         'product_id': str(uuid.uuid4()),
@@ -379,14 +835,70 @@ def store_manager_create_product():
         'stock_quantity': int(request.form.get('stock_quantity', 0)),
         'low_stock_threshold': int(request.form.get('low_stock_threshold', 10)),
         'image_filename': image_filename,
-        'created_at': datetime.now().isoformat()
+        'created_at': datetime.now().isoformat(),
+        'version': 1
     }
-    products_table.put_item(Item=item)
+    aws.products_table.put_item(Item=item)
+    current_app.extensions['search'].add(item)
     flash(f'Product {item["name"]} created', 'success')
     send_notification("New Product", f"Product {item['name']} added.")
-    return redirect(url_for('store_manager_products'))
+    return redirect(url_for('store_manager.products'))
 
-@app.route('/store-manager/sales')
+@store_manager_bp.route('/products/<product_id>/update', methods=['POST'], endpoint='update_product')
+@login_required
+@role_required('store_manager')
+def store_manager_update_product(product_id):
+    """Write the fields the manager changed, if the product is still at the
+    ``version`` the form was rendered from (see update_product)"""
+    product = get_product(product_id)
+    if product is None or product.get('store_id') != session.get('store_id'):
+        flash('You do not have permission to update this product.', 'error')
+        return redirect(url_for('store_manager.products'))
+
+    submitted = {name: request.form.get(name) for name in ('name', 'description', 'category', 'size', 'color')}
+    submitted['price'] = Decimal(request.form.get('price'))
+    submitted['stock_quantity'] = int(request.form.get('stock_quantity'))
+    submitted['low_stock_threshold'] = int(request.form.get('low_stock_threshold'))
+    # Without the version there is nothing to compare against
+    expected = request.form.get('version', type=int)
+    if expected is None:
+        abort(400)
+    file = request.files.get('image')
+    if file and allowed_file(file.filename):
+        filename = secure_filename(file.filename)
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        submitted['image_filename'] = f"{timestamp}_{filename}"
+
+    def changed(field, value):
+        current = product.get(field)
+        if isinstance(value, Decimal):
+            return current is None or Decimal(str(current)) != value
+        return current != value and not (current is None and value == '')
+
+    version = int(product.get('version', 0))
+    changes = {field: value for field, value in submitted.items() if changed(field, value)}
+    if expected != version:
+        updated = None
+    elif changes:
+        updated = update_product(product, version, changes)
+    else:
+        updated = product
+    if updated is None:
+        current = get_product(product_id) or product
+        flash(f'{current.get("name")} was changed by someone else while you were editing it (stock is now '
+              f'{current.get("stock_quantity")}). Your changes were not saved; check the current values and '
+              f'save again.', 'error')
+        return redirect(url_for('store_manager.products'))
+    if 'image_filename' in submitted:
+        # Saved only once the edit is accepted, so a rejected one leaves no upload behind
+        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
+        file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], submitted['image_filename']))
+    if changes:
+        current_app.extensions['search'].add(updated)
+    flash(f'Product {updated.get("name")} updated successfully.', 'success')
+    return redirect(url_for('store_manager.products'))
+
+@store_manager_bp.route('/sales', endpoint='sales')
 @login_required
 @role_required('store_manager')
 def store_manager_sales():
@@ -397,39 +909,91 @@ def store_manager_sales():
     # User just wants "correct" check.
     return "Sales Page (Under Construction)"
 
-@app.route('/store-manager/restock-requests')
+@store_manager_bp.route('/pos/sku/<sku>', methods=['GET', 'POST'], endpoint='pos_sku')
+@login_required
+@role_required('store_manager')
+@idempotency.idempotent
+def store_manager_pos_sku(sku):
+    """Till lookup: the store's product and stock for a scanned SKU.
+
+    POST with a ``quantity`` (JSON or form) also records the sale.
+    """
+    product = find_by_sku(session.get('store_id'), sku.strip())
+    if product is None:
+        return jsonify({'error': f'unknown SKU {sku!r}'}), 404
+    if request.method == 'GET':
+        return jsonify({'product': product_dict(product)})
+    try:
+        quantity = pos.parse_quantity(request.get_json(silent=True) or request.form)
+    except ValueError:
+        return jsonify({'error': 'quantity must be a positive integer'}), 400
+    if quantity is None:
+        return jsonify({'product': product_dict(product)})
+    sale, product = record_sale(product, quantity)
+    if product is None:
+        # Still contended after the retries; nothing was written, so the key is released
+        response = jsonify({'error': 'the product is busy, retry the sale'})
+        response.status_code = 409
+        response.headers['Retry-After'] = '1'
+        return response
+    if sale is None:
+        return jsonify({'error': 'insufficient stock', 'product': product_dict(product)}), 409
+    return jsonify({'product': product_dict(product),
+                    'sale': {'id': sale['sale_id'], 'quantity': quantity, 'unit_price': float(sale['unit_price']),
+                             'total_amount': float(sale['total_amount'])}}), 201
+
+@store_manager_bp.route('/restock-requests', endpoint='restock_requests')
 @login_required
 @role_required('store_manager')
 def store_manager_restock_requests():
     return "Restock Requests Placeholder"
 
-@app.route('/store-manager/reports')
+@store_manager_bp.route('/reports', endpoint='reports')
 @login_required
 @role_required('store_manager')
 def store_manager_reports():
-    return "Reports Placeholder"
+    store_id = session.get('store_id')
+    if not store_id: return "No store assigned"
+    
+    store = get_store(store_id)
+    start, end = report_range()
+    columns = load_sales_columns(store_id, start, end)
+    total_sales, total_transactions = columns.store_totals(store_id)
+    products = list_products(store_id, PRODUCT_SUMMARY_FIELDS)
+    low_stock = [p for p in products if int(p.get('stock_quantity',0)) <= int(p.get('low_stock_threshold',10))]
+    
+    return render_template('store_manager/reports.html',
+                         store=store,
+                         total_sales=total_sales,
+                         total_transactions=total_transactions,
+                         low_stock_products=low_stock,
+                         top_products=columns.top_products(10, store_id=store_id),
+                         abc_summary=columns.abc_summary(),
+                         sell_through=columns.sell_through_by_category(),
+                         growth_by_store=columns.period_growth(30),
+                         period_days=30)
 
-@app.route('/store-manager/products/delete/<product_id>', methods=['POST'])
+@store_manager_bp.route('/products/delete/<product_id>', methods=['POST'], endpoint='delete_product')
 @login_required
 @role_required('store_manager')
 def store_manager_delete_product(product_id):
     flash('Product deleted (simulated)', 'info')
-    return redirect(url_for('store_manager_products'))
+    return redirect(url_for('store_manager.products'))
 
-@app.route('/store-manager/restock-requests/create', methods=['POST'])
+@store_manager_bp.route('/restock-requests/create', methods=['POST'], endpoint='create_restock_request')
 @login_required
 @role_required('store_manager')
 def store_manager_create_restock_request():
     return "Create Restock Placeholder"
 
-@app.route('/store-manager/sales/create', methods=['POST'])
+@store_manager_bp.route('/sales/create', methods=['POST'], endpoint='create_sale')
 @login_required
 @role_required('store_manager')
 def store_manager_create_sale():
     return "Create Sale Placeholder"
 
 # --- SUPPLIER ROUTES ---
-@app.route('/supplier/dashboard')
+@supplier_bp.route('/dashboard', endpoint='dashboard')
 @login_required
 @role_required('supplier')
 def supplier_dashboard():
@@ -437,17 +1001,96 @@ def supplier_dashboard():
     return render_template('supplier/dashboard.html', 
                          pending_requests=0, approved_requests=0, shipments=0, recent_requests=[])
 
-@app.route('/supplier/restock-requests')
+@supplier_bp.route('/restock-requests', endpoint='restock_requests')
 @login_required
 @role_required('supplier')
 def supplier_restock_requests():
     return "Supplier Restock Requests Placeholder"
 
-@app.route('/supplier/shipments')
+@supplier_bp.route('/shipments', endpoint='shipments')
 @login_required
 @role_required('supplier')
 def supplier_shipments():
     return "Supplier Shipments Placeholder"
 
+
+def warmup_sessions():
+    """Sessions for the template warmup. Not admin: its dashboard scans every table"""
+    sessions = {'supplier': {'username': 'warmup', 'role': 'supplier'}}
+    stores = get_all_stores()
+    if stores:
+        sessions['store_manager'] = {'username': 'warmup', 'role': 'store_manager',
+                                     'store_id': stores[0]['store_id']}
+    return sessions
+
+
+def create_app(config=None):
+    """Build the app; no AWS client is created until a request needs one.
+
+    ``config`` overrides the defaults, e.g. ``DYNAMODB_RESOURCE`` /
+    ``SNS_CLIENT`` to inject stand-ins, or ``SNS_TOPIC_ARN = None`` to only
+    log notifications.
+    """
+    app = Flask(__name__)
+    app.secret_key = 'your-secret-key-change-in-production-aws'
+
+    # Configuration for File Uploads (the folder is created on first upload)
+    app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'products')
+    app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
+    # Set STYLANE_LOCAL_DYNAMODB to a snapshot written by generate_data.py
+    # (--backend local) to run against the in-process stand-in instead of AWS
+    app.config['LOCAL_DYNAMODB'] = os.environ.get('STYLANE_LOCAL_DYNAMODB')
+    app.config.update(config or {})
+    app.config.setdefault('SNS_TOPIC_ARN', None if app.config['LOCAL_DYNAMODB'] else DEFAULT_SNS_TOPIC_ARN)
+
+    # Prometheus-style /metrics (set STYLANE_METRICS_DIR to merge worker processes)
+    metrics.init_app(app)
+    # Profile requests carrying a signed X-Stylane-Profile header (see /admin/profiles)
+    profiling.init_app(app)
+    # Cap the AWS time a single request may spend (STYLANE_AWS_DEADLINE)
+    aws_clients.init_app(app)
+    # Record every DynamoDB/SNS call per request (header, log line, route
+    # histograms); AwsServices instruments the clients as it creates them
+    aws_metrics.init_app(app)
+    services = app.extensions['aws_services'] = AwsServices(app.config)
+    # Derived views follow the products table's stream instead of rescanning
+    # it (STYLANE_CDC=1; the table needs a NEW_AND_OLD_IMAGES stream)
+    app.config.setdefault('CDC_ENABLED', os.environ.get('STYLANE_CDC') == '1')
+    # In-memory product index, loaded by one scan on the first search
+    index = search.init_app(app, search.MemoryIndex(
+        lambda: load_search_items(services),
+        None if app.config['CDC_ENABLED'] else app.config.get('SEARCH_INDEX_MAX_AGE', 300.0)))
+    if app.config['CDC_ENABLED']:
+        consumer = cdc.StreamConsumer(lambda: services.streams, batch_size=app.config.get('CDC_BATCH_SIZE', 100))
+        low_stock = app.extensions['low_stock'] = cdc.LowStockView(lambda: load_low_stock_items(services))
+        consumer.subscribe(lambda: services.products_table.latest_stream_arn, cdc.IndexSync(index), low_stock)
+        cdc.init_app(app, consumer)
+    # Hot-SKU cache in front of the StoreSkuIndex GSI for till lookups
+    pos.init_app(app)
+    # Shards per store of the StoreShardIndex sales key
+    sales_shards.init_app(app)
+    # Maintenance jobs (see /admin/jobs); leader lock and run statistics in
+    # StyleLaneJobs, shared by every host
+    scheduler.init_app(app, scheduler.DynamoLock(lambda: services.jobs_table))
+    # Nightly job moving old sales into compressed monthly summaries. Unless
+    # SALES_ARCHIVE_DIR is storage every host shares (STYLANE_SALES_ARCHIVE_SHARED=1),
+    # every host archives them and StyleLaneSales TTL removes them a week later
+    sales_archive.init_app(app, load_archivable_sales, delete_archived_sales, expire=expire_archived_sales)
+    # Idempotency keys for till sales, expired by DynamoDB TTL
+    idempotency.init_app(app, idempotency.DynamoKeyStore(lambda: services.idempotency_table),
+                         lambda: session.get('username'))
+    # Password hash settings and the login throttle
+    passwords.init_app(app)
+    # Thread pool for a view's independent reads, as large as the connection pool
+    fanout.init_app(app)
+
+    app.add_template_filter(datetime_filter, 'datetime')
+    app.context_processor(inject_user)
+    for blueprint in (auth_bp, admin_bp, store_manager_bp, supplier_bp):
+        app.register_blueprint(blueprint)
+    # Compiled templates cached on disk; dashboards rendered once with STYLANE_TEMPLATE_WARMUP=1
+    template_cache.init_app(app, warmup_sessions)
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,135 @@
+"""
+Tuned boto3 clients for app_aws.py.
+
+botocore defaults (10 pooled connections, legacy retries, 60 s timeouts)
+starve threaded workers and let one slow call stall a request for minutes.
+Clients made here share one session and a Config sized for the worker
+thread count, with adaptive retries, short timeouts and TCP keep-alive.
+``init_app`` adds a per-request deadline: once a request has spent its AWS
+budget, further calls and retry attempts fail fast with a ClientError.
+
+Settings come from the environment so they apply before the app is created:
+
+    STYLANE_WORKER_THREADS       threads per process (pool size default)  16
+    STYLANE_AWS_MAX_POOL         max_pool_connections         threads + 4
+    STYLANE_AWS_CONNECT_TIMEOUT  seconds                              1.0
+    STYLANE_AWS_READ_TIMEOUT     seconds per attempt                  3.0
+    STYLANE_AWS_MAX_ATTEMPTS     including the first attempt            4
+    STYLANE_AWS_RETRY_MODE       adaptive | standard | legacy    adaptive
+    STYLANE_AWS_DEADLINE         seconds of AWS time per request  5.0 (0 = off)
+    STYLANE_AWS_ENDPOINT_URL     e.g. DynamoDB Local / a load-test server
+"""
+import os
+import threading
+import time
+
+from botocore.exceptions import ClientError
+from flask import g, has_app_context
+
+DEADLINE_ERROR_CODE = 'RequestDeadlineExceeded'
+
+_session = None
+# boto3 sessions are not safe for concurrent client creation
+_session_lock = threading.Lock()
+
+
+def settings(environ=None):
+    """Client settings from the environment, with defaults"""
+    environ = os.environ if environ is None else environ
+    threads = int(environ.get('STYLANE_WORKER_THREADS', 16))
+    return {
+        'max_pool_connections': int(environ.get('STYLANE_AWS_MAX_POOL', threads + 4)),
+        'connect_timeout': float(environ.get('STYLANE_AWS_CONNECT_TIMEOUT', 1.0)),
+        'read_timeout': float(environ.get('STYLANE_AWS_READ_TIMEOUT', 3.0)),
+        'max_attempts': int(environ.get('STYLANE_AWS_MAX_ATTEMPTS', 4)),
+        'retry_mode': environ.get('STYLANE_AWS_RETRY_MODE', 'adaptive'),
+        'deadline': float(environ.get('STYLANE_AWS_DEADLINE', 5.0)),
+        'endpoint_url': environ.get('STYLANE_AWS_ENDPOINT_URL') or None,
+    }
+
+
+CONFIG_KEYS = ('max_pool_connections', 'connect_timeout', 'read_timeout', 'max_attempts', 'retry_mode')
+
+
+def make_config(**overrides):
+    """botocore Config built from settings(), with keyword overrides"""
+    from botocore.config import Config
+    options = dict(settings(), **overrides)
+    return Config(
+        max_pool_connections=options['max_pool_connections'],
+        connect_timeout=options['connect_timeout'],
+        read_timeout=options['read_timeout'],
+        retries={'mode': options['retry_mode'], 'total_max_attempts': options['max_attempts']},
+        tcp_keepalive=True,
+    )
+
+
+def _create(factory, service, kwargs):
+    # boto3 takes ~100 ms to import; only pay for it when a client is built
+    import boto3
+    global _session
+    overrides = {key: kwargs.pop(key) for key in CONFIG_KEYS if key in kwargs}
+    kwargs.setdefault('endpoint_url', settings()['endpoint_url'])
+    kwargs.setdefault('config', make_config(**overrides))
+    with _session_lock:
+        if _session is None:
+            _session = boto3.session.Session()
+        return getattr(_session, factory)(service, **kwargs)
+
+
+def client(service, **kwargs):
+    """Tuned low-level client; Config fields can be overridden by keyword"""
+    return enforce_deadline(_create('client', service, kwargs))
+
+
+def resource(service, **kwargs):
+    """Tuned resource (its meta.client carries the same config and deadline)"""
+    res = _create('resource', service, kwargs)
+    enforce_deadline(res.meta.client)
+    return res
+
+
+# ==================== DEADLINE ====================
+
+def remaining():
+    """Seconds left in the active request's AWS budget, or None"""
+    if not has_app_context():
+        return None
+    deadline = g.get('aws_deadline')
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _check_deadline(event_name=None, **kwargs):
+    left = remaining()
+    if left is not None and left <= 0:
+        operation = event_name.rsplit('.', 1)[-1] if event_name else 'Unknown'
+        raise ClientError({'Error': {
+            'Code': DEADLINE_ERROR_CODE,
+            'Message': f'AWS time budget for this request exhausted ({-left:.3f}s over)',
+        }}, operation)
+
+
+def enforce_deadline(aws_client):
+    """Fail calls (and retry attempts) once the request deadline has passed"""
+    service = aws_client.meta.service_model.service_id.hyphenize()
+    events = aws_client.meta.events
+    # before-send fires once per attempt; check before and after the adaptive
+    # rate limiter, whose token bucket may block the caller
+    events.register_first(f'before-send.{service}', _check_deadline,
+                          unique_id=f'stylane-deadline-{service}')
+    events.register_last(f'before-send.{service}', _check_deadline,
+                         unique_id=f'stylane-deadline-after-limiter-{service}')
+    return aws_client
+
+
+def init_app(app):
+    """Start each request with ``AWS_REQUEST_DEADLINE`` seconds of AWS time"""
+    app.config.setdefault('AWS_REQUEST_DEADLINE', settings()['deadline'])
+
+    @app.before_request
+    def _start_aws_deadline():
+        budget = app.config['AWS_REQUEST_DEADLINE']
+        if budget:
+            g.aws_deadline = time.monotonic() + budget
@@ -0,0 +1,281 @@
+"""
+Per-request instrumentation of AWS calls made by app_aws.py.
+
+botocore event hooks record, for every DynamoDB/SNS call made while a
+Flask request is active, the operation, table, latency, items returned and
+consumed capacity (``ReturnConsumedCapacity`` is switched on for DynamoDB).
+Each request's calls are summarised in a debug response header and a
+structured log line, and folded into per-route histograms.
+"""
+import bisect
+import json
+import logging
+import threading
+import time
+
+from flask import g, has_app_context, request
+
+import metrics
+
+logger = logging.getLogger('stylane.aws')
+
+# DynamoDB operations that accept ReturnConsumedCapacity
+CAPACITY_OPERATIONS = {
+    'GetItem', 'PutItem', 'UpdateItem', 'DeleteItem', 'Query', 'Scan',
+    'BatchGetItem', 'BatchWriteItem', 'TransactGetItems', 'TransactWriteItems',
+}
+WRITE_OPERATIONS = {'PutItem', 'UpdateItem', 'DeleteItem', 'BatchWriteItem', 'TransactWriteItems'}
+
+# Upper bounds of histogram buckets; the last bucket is open-ended
+CALL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_STARTED = 'stylane_started'
+_TABLE = 'stylane_table'
+
+
+class AwsCall:
+    """One AWS API call made during a request"""
+    __slots__ = ('service', 'operation', 'table', 'latency_ms', 'items', 'capacity', 'error')
+
+    def __init__(self, service, operation, table, latency_ms, items=0, capacity=0.0, error=None):
+        self.service = service
+        self.operation = operation
+        self.table = table
+        self.latency_ms = latency_ms
+        self.items = items
+        self.capacity = capacity
+        self.error = error
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def record_call(service, operation, table, latency_ms, items=0, capacity=0.0, error=None):
+    """Attach a call to the active request, if there is one"""
+    if not has_app_context():
+        return
+    calls = g.get('aws_calls')
+    if calls is not None:
+        calls.append(AwsCall(service, operation, table, latency_ms, items, capacity, error))
+
+
+def _table_name(params):
+    if 'TableName' in params:
+        return params['TableName']
+    request_items = params.get('RequestItems') or {}
+    if request_items:
+        return ','.join(sorted(request_items))
+    if 'TopicArn' in params:
+        return params['TopicArn'].rsplit(':', 1)[-1]
+    return None
+
+
+def _items_returned(parsed):
+    if 'Items' in parsed:
+        return len(parsed['Items'])
+    if 'Item' in parsed:
+        return 1
+    if 'Responses' in parsed:
+        return sum(len(items) for items in parsed['Responses'].values())
+    return 0
+
+
+def _consumed_capacity(parsed):
+    consumed = parsed.get('ConsumedCapacity')
+    if not consumed:
+        return 0.0
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return float(sum(c.get('CapacityUnits', 0) for c in consumed))
+
+
+def _before_parameter_build(params, model, context, **kwargs):
+    context[_STARTED] = time.perf_counter()
+    context[_TABLE] = _table_name(params)
+    if model.name in CAPACITY_OPERATIONS and 'ReturnConsumedCapacity' not in params:
+        params['ReturnConsumedCapacity'] = 'TOTAL'
+
+
+def _after_call(http_response, parsed, model, context, **kwargs):
+    started = context.get(_STARTED)
+    if started is None:
+        return
+    error = None
+    if http_response is not None and http_response.status_code >= 300:
+        error = parsed.get('Error', {}).get('Code', str(http_response.status_code))
+    record_call(model.service_model.service_name, model.name, context.get(_TABLE),
+                (time.perf_counter() - started) * 1000.0,
+                _items_returned(parsed), _consumed_capacity(parsed), error)
+
+
+def _after_call_error(exception, context, **kwargs):
+    started = context.get(_STARTED)
+    if started is None:
+        return
+    # The operation model is not passed to this event; keep the table at least
+    record_call(None, 'Error', context.get(_TABLE),
+                (time.perf_counter() - started) * 1000.0, error=type(exception).__name__)
+
+
+def instrument_client(client):
+    """Register the recording hooks on a boto3 client"""
+    events = client.meta.events
+    service = client.meta.service_model.service_id.hyphenize()
+    events.register(f'before-parameter-build.{service}', _before_parameter_build,
+                    unique_id=f'stylane-aws-metrics-params-{service}')
+    events.register(f'after-call.{service}', _after_call,
+                    unique_id=f'stylane-aws-metrics-after-{service}')
+    events.register(f'after-call-error.{service}', _after_call_error,
+                    unique_id=f'stylane-aws-metrics-error-{service}')
+    return client
+
+
+def instrument(target):
+    """Instrument a boto3 client or resource, or the local DynamoDB stand-in"""
+    hooks = getattr(target, 'hooks', None)
+    if isinstance(hooks, list):
+        if record_call not in hooks:
+            hooks.append(record_call)
+        return target
+    client = getattr(getattr(target, 'meta', None), 'client', None)
+    return instrument_client(client or target)
+
+
+class Histogram:
+    """Fixed-bucket histogram with running count and sum"""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        labels = [f'le_{b}' for b in self.bounds] + ['inf']
+        return {'count': self.count, 'sum': round(self.sum, 3),
+                'buckets': dict(zip(labels, self.counts))}
+
+
+class RouteStats:
+    """Per-route aggregation of AWS call counts, time and capacity"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+    def observe(self, endpoint, summary):
+        with self._lock:
+            route = self._routes.get(endpoint)
+            if route is None:
+                route = self._routes[endpoint] = {
+                    'requests': 0,
+                    'calls': Histogram(CALL_COUNT_BUCKETS),
+                    'aws_time_ms': Histogram(LATENCY_BUCKETS_MS),
+                    'capacity': 0.0,
+                    'operations': {},
+                }
+            route['requests'] += 1
+            route['calls'].observe(summary['calls'])
+            route['aws_time_ms'].observe(summary['time_ms'])
+            route['capacity'] += summary['rcu'] + summary['wcu']
+            for op, count in summary['operations'].items():
+                route['operations'][op] = route['operations'].get(op, 0) + count
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    'requests': route['requests'],
+                    'calls': route['calls'].snapshot(),
+                    'aws_time_ms': route['aws_time_ms'].snapshot(),
+                    'capacity': round(route['capacity'], 2),
+                    'operations': dict(route['operations']),
+                }
+                for endpoint, route in self._routes.items()
+            }
+
+
+def summarize(calls):
+    """Totals for one request's calls"""
+    operations = {}
+    rcu = wcu = 0.0
+    for call in calls:
+        key = f'{call.operation}:{call.table}' if call.table else call.operation
+        operations[key] = operations.get(key, 0) + 1
+        if call.operation in WRITE_OPERATIONS:
+            wcu += call.capacity
+        else:
+            rcu += call.capacity
+    return {
+        'calls': len(calls),
+        'time_ms': round(sum(c.latency_ms for c in calls), 3),
+        'items': sum(c.items for c in calls),
+        'rcu': round(rcu, 2),
+        'wcu': round(wcu, 2),
+        'errors': sum(1 for c in calls if c.error),
+        'operations': operations,
+    }
+
+
+def init_app(app, *targets):
+    """Instrument the given clients/resources and record calls per request.
+
+    ``AWS_CALLS_HEADER`` (default: ``app.debug``) adds an ``X-AWS-Calls``
+    header; ``AWS_CALLS_LOG`` (default on) emits one JSON log line per request
+    that made AWS calls.
+    """
+    app.config.setdefault('AWS_CALLS_HEADER', None)
+    app.config.setdefault('AWS_CALLS_LOG', True)
+    stats = app.extensions['aws_metrics'] = RouteStats()
+    for target in targets:
+        instrument(target)
+
+    @app.before_request
+    def _start_aws_calls():
+        g.aws_calls = []
+
+    @app.after_request
+    def _finish_aws_calls(response):
+        calls = g.pop('aws_calls', None)
+        if calls is None:
+            return response
+        summary = summarize(calls)
+        endpoint = request.endpoint or 'unknown'
+        stats.observe(endpoint, summary)
+        for call in calls:
+            labels = (call.operation, call.table or '')
+            metrics.AWS_CALLS.inc(labels)
+            if call.error:
+                metrics.AWS_CALL_ERRORS.inc(labels)
+            if call.capacity:
+                metrics.AWS_CAPACITY.inc(labels, call.capacity)
+
+        show_header = app.config['AWS_CALLS_HEADER']
+        if show_header or (show_header is None and app.debug):
+            response.headers['X-AWS-Calls'] = (
+                f"calls={summary['calls']} time_ms={summary['time_ms']} "
+                f"items={summary['items']} rcu={summary['rcu']} wcu={summary['wcu']} "
+                + 'ops=' + ','.join(f'{op}*{n}' for op, n in summary['operations'].items())
+            )
+        if app.config['AWS_CALLS_LOG'] and calls:
+            logger.info(json.dumps(dict(summary, event='aws_calls', endpoint=endpoint,
+                                        method=request.method, path=request.path,
+                                        status=response.status_code)))
+        return response
+
+    return stats
+
+
+def route_stats(app):
+    """Aggregated per-route histograms for an instrumented app"""
+    return app.extensions['aws_metrics'].snapshot()
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks for StyleLane.
+
+Run from the repository root, e.g. ``python -m benchmarks.routes run``.
+"""
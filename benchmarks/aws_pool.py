@@ -0,0 +1,236 @@
+"""
+Threaded load test of the AWS client configuration against a local endpoint.
+
+Starts a small HTTP server that speaks enough of the DynamoDB JSON protocol
+to answer GetItem, with configurable latency, provisioned capacity (requests
+beyond it are throttled, as DynamoDB does) and stalls, then
+hammers it from many threads with a default boto3 client and with the tuned
+client from aws_clients. Reports throughput, latency percentiles, errors,
+connections opened and urllib3 "pool is full" discards; a final scenario
+runs simulated page requests under the per-request deadline.
+
+Usage:
+    python -m benchmarks.aws_pool --threads 32 --calls 100 --latency-ms 10 --capacity 1500
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from flask import Flask
+
+import aws_clients
+from benchmarks.routes import percentile
+
+
+class FakeDynamoServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency, capacity, stall, stall_seconds):
+        super().__init__(('127.0.0.1', 0), FakeDynamoHandler)
+        self.latency = latency
+        self.capacity = capacity
+        self.tokens = capacity
+        self.refilled = time.monotonic()
+        self.stall = stall
+        self.stall_seconds = stall_seconds
+        self.connections = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def admit(self):
+        """Token bucket refilled at ``capacity`` requests/s (one second of burst)"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.refilled) * self.capacity)
+            self.refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class FakeDynamoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        if random.random() < server.stall:
+            time.sleep(server.stall_seconds)
+        time.sleep(server.latency * random.uniform(0.5, 1.5))
+        if not server.admit():
+            self.reply(400, {'__type': 'com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException',
+                             'message': 'Rate of requests exceeds the allowed throughput.'})
+        else:
+            self.reply(200, {'Item': dict(body.get('Key', {}), name={'S': 'Product'})})
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.0')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class PoolFullCounter(logging.Handler):
+    """Counts urllib3's 'Connection pool is full, discarding connection'"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if 'pool is full' in record.getMessage():
+            self.count += 1
+
+
+def run_threads(threads, work):
+    results = [None] * threads
+
+    def target(index):
+        results[index] = work(index)
+
+    workers = [threading.Thread(target=target, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started, results
+
+
+def load(server, client, threads, calls):
+    """Every thread makes ``calls`` GetItem calls through one shared client"""
+    def work(index):
+        latencies, errors = [], 0
+        for n in range(calls):
+            started = time.perf_counter()
+            try:
+                client.get_item(TableName='StyleLaneProducts', Key={'product_id': {'S': f'p{index}-{n}'}})
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000.0)
+        return latencies, errors
+
+    before_conn, before_req = server.connections, server.requests
+    elapsed, results = run_threads(threads, work)
+    latencies = sorted(l for lat, _ in results for l in lat)
+    return {
+        'calls/s': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': latencies[-1],
+        'errors': sum(e for _, e in results),
+        'connections': server.connections - before_conn,
+        'attempts': server.requests - before_req,
+    }
+
+
+def deadline_load(server, client, threads, pages, calls_per_page, budget):
+    """Simulated page requests: sequential calls under one AWS deadline each"""
+    app = Flask(__name__)
+    app.config['AWS_REQUEST_DEADLINE'] = budget
+    aws_clients.init_app(app)
+
+    def work(index):
+        durations, cut_short = [], 0
+        for page in range(pages):
+            with app.test_request_context('/'):
+                app.preprocess_request()
+                started = time.perf_counter()
+                for n in range(calls_per_page):
+                    try:
+                        client.get_item(TableName='StyleLaneProducts',
+                                        Key={'product_id': {'S': f'p{index}-{page}-{n}'}})
+                    except ClientError as e:
+                        if e.response['Error']['Code'] == aws_clients.DEADLINE_ERROR_CODE:
+                            cut_short += 1
+                            break
+                    except Exception:
+                        pass
+                durations.append((time.perf_counter() - started) * 1000.0)
+        return durations, cut_short
+
+    elapsed, results = run_threads(threads, work)
+    durations = sorted(d for ds, _ in results for d in ds)
+    return {
+        'pages/s': len(durations) / elapsed,
+        'p50_ms': percentile(durations, 50),
+        'p99_ms': percentile(durations, 99),
+        'max_ms': durations[-1],
+        'cut_short': sum(c for _, c in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AWS client pool/retry/timeout load test')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--calls', type=int, default=100, help='calls per thread')
+    parser.add_argument('--latency-ms', type=float, default=10.0)
+    parser.add_argument('--capacity', type=float, default=1500, help='requests/s before throttling')
+    parser.add_argument('--stall', type=float, default=0.002, help='fraction of responses that stall')
+    parser.add_argument('--stall-seconds', type=float, default=5.0)
+    parser.add_argument('--deadline', type=float, default=1.0, help='per-page AWS budget (seconds)')
+    args = parser.parse_args(argv)
+
+    server = FakeDynamoServer(args.latency_ms / 1000.0, args.capacity, args.stall, args.stall_seconds)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pool_full = PoolFullCounter()
+    logging.getLogger('urllib3.connectionpool').addHandler(pool_full)
+
+    scenarios = {
+        'default': boto3.client('dynamodb', endpoint_url=server.url, region_name='us-east-1',
+                                config=Config(read_timeout=args.stall_seconds * 2)),
+        'tuned': aws_clients.client('dynamodb', endpoint_url=server.url, region_name='us-east-1',
+                                    max_pool_connections=args.threads + 4,
+                                    read_timeout=min(3.0, args.stall_seconds / 2)),
+    }
+    print(f'{args.threads} threads x {args.calls} GetItem, latency {args.latency_ms} ms, '
+          f'capacity {args.capacity:.0f}/s, stall {args.stall:.1%} ({args.stall_seconds}s)')
+    print(f'{"client":<10} {"calls/s":>9} {"p50 ms":>8} {"p99 ms":>9} {"max ms":>9} '
+          f'{"errors":>7} {"attempts":>9} {"conns":>6} {"pool-full":>10}')
+    for name, client in scenarios.items():
+        pool_full.count = 0
+        r = load(server, client, args.threads, args.calls)
+        print(f'{name:<10} {r["calls/s"]:9.0f} {r["p50_ms"]:8.1f} {r["p99_ms"]:9.1f} {r["max_ms"]:9.1f} '
+              f'{r["errors"]:7d} {r["attempts"]:9d} {r["connections"]:6d} {pool_full.count:10d}')
+
+    r = deadline_load(server, scenarios['tuned'], args.threads, max(1, args.calls // 10), 10, args.deadline)
+    print(f'\npages of 10 sequential calls under a {args.deadline}s deadline (tuned client):')
+    print(f'  {r["pages/s"]:.0f} pages/s, p50 {r["p50_ms"]:.1f} ms, p99 {r["p99_ms"]:.1f} ms, '
+          f'max {r["max_ms"]:.1f} ms, {r["cut_short"]} cut short by the deadline')
+    server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+CPU and memory of decoding DynamoDB list reads, per 10k items.
+
+Builds low-level (typed) product items the way ``Scan`` returns them and
+decodes them three ways:
+
+- resource: the boto3 resource layer's TypeDeserializer over whole items,
+  then the ``int()``/``float()`` conversions the views used to apply;
+- records: dynamo_records' decoder over whole items;
+- projected: dynamo_records' decoder over the attributes the dashboards
+  render, as ``ProjectionExpression`` returns them.
+
+Reports best-of-N CPU time, the memory the decoded list holds (tracemalloc)
+and the size of the response payload.
+
+Usage:
+    python -m benchmarks.deserialize --items 10000 --repeat 5
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from dynamo_records import ProductRecord
+
+FULL_FIELDS = tuple(name for name, _ in ProductRecord.FIELDS)
+SUMMARY_FIELDS = ('product_id', 'store_id', 'name', 'sku', 'category', 'stock_quantity', 'low_stock_threshold')
+
+
+def make_items(n, seed=7):
+    """Typed product items as the low-level client returns them"""
+    rng = random.Random(seed)
+    items = []
+    for i in range(n):
+        items.append({
+            'product_id': {'S': f'prod-{i:06d}'},
+            'store_id': {'S': str(rng.randint(1, 20))},
+            'name': {'S': f'Product {i} ' + rng.choice(['Shirt', 'Dress', 'Jacket', 'Scarf'])},
+            'description': {'S': 'Soft cotton blend, machine washable, relaxed fit. ' * 2},
+            'sku': {'S': f'SKU-{i:06d}'},
+            'category': {'S': rng.choice(['Shirts', 'Dresses', 'Outerwear', 'Accessories'])},
+            'size': {'S': rng.choice(['S', 'M', 'L', 'XL'])},
+            'color': {'S': rng.choice(['Black', 'White', 'Navy', 'Red'])},
+            'price': {'N': f'{rng.uniform(5, 200):.2f}'},
+            'stock_quantity': {'N': str(rng.randint(0, 100))},
+            'low_stock_threshold': {'N': '10'},
+            'image_filename': {'S': f'prod-{i:06d}.jpg'},
+            'created_at': {'S': '2024-01-01T10:00:00'},
+            'updated_at': {'S': '2024-06-01T10:00:00'},
+        })
+    return items
+
+
+def project(items, fields):
+    return [{k: item[k] for k in fields if k in item} for item in items]
+
+
+def decode_resource(items):
+    deserialize = TypeDeserializer().deserialize
+    products = []
+    for item in items:
+        product = {k: deserialize(v) for k, v in item.items()}
+        product['price'] = float(product['price'])
+        product['stock_quantity'] = int(product['stock_quantity'])
+        product['low_stock_threshold'] = int(product['low_stock_threshold'])
+        products.append(product)
+    return products
+
+
+def decoder(fields):
+    decode = ProductRecord.decoder(fields)
+    return lambda items: [decode(item) for item in items]
+
+
+def cpu_ms(func, items, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        func(items)
+        elapsed = (time.process_time() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def held_bytes(func, items):
+    """Bytes still allocated while the decoded list is alive"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    decoded = func(items)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del decoded
+    return held
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DynamoDB item decoding cost')
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    items = make_items(args.items)
+    summary = project(items, SUMMARY_FIELDS)
+    cases = [
+        ('resource', decode_resource, items),
+        ('records', decoder(FULL_FIELDS), items),
+        ('projected', decoder(SUMMARY_FIELDS), summary),
+    ]
+    per_10k = 10000 / args.items
+    results = {}
+    for name, func, payload in cases:
+        results[name] = {
+            'cpu_ms': round(cpu_ms(func, payload, args.repeat) * per_10k, 2),
+            'memory_kb': round(held_bytes(func, payload) * per_10k / 1024, 1),
+            'payload_kb': round(len(json.dumps({'Items': payload})) * per_10k / 1024, 1),
+        }
+
+    print(f"{'per 10k items':<12} {'cpu ms':>9} {'memory KiB':>11} {'payload KiB':>12}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['cpu_ms']:>9} {r['memory_kb']:>11} {r['payload_kb']:>12}")
+    base = results['resource']
+    for name in ('records', 'projected'):
+        r = results[name]
+        print(f"{name}: {base['cpu_ms'] / r['cpu_ms']:.1f}x less CPU, "
+              f"{base['memory_kb'] / r['memory_kb']:.1f}x less memory than resource")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Admin dashboard latency (app_aws.py) with its table reads serial vs fanned out.
+
+Runs the dashboard against the in-process DynamoDB stand-in with a delay
+injected into every call (``--delay-ms``, one value per run), first with the
+reads run one after another in the request thread, as before, and then on
+the default pool. A third variant makes the users scan 20 times
+slower than the rest with ``FANOUT_TIMEOUT`` at 4 times the delay: the page
+comes back at the timeout without the user count instead of waiting for it.
+
+Usage:
+    python -m benchmarks.fanout --delay-ms 10,50,100 --requests 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+
+def serial(view, reads):
+    return {name: read() for name, read in reads.items()}, []
+
+
+def build(delay, slow_table=None, serial_reads=False, **config):
+    import app_aws
+    from dynamo_local import LocalDynamoResource
+    resource = LocalDynamoResource()
+    for n in range(20):
+        resource.Table('StyleLaneStores').put_item(Item={'store_id': f's{n}', 'name': f'Store {n}'})
+        resource.Table('StyleLaneUsers').put_item(Item={'username': f'manager{n}', 'role': 'store_manager'})
+    for n in range(500):
+        resource.Table('StyleLaneProducts').put_item(Item={
+            'product_id': f'p{n}', 'store_id': f's{n % 20}', 'name': f'Tee {n}', 'sku': f'TEE-{n}',
+            'category': 'Tops', 'price': 19, 'stock_quantity': n % 12, 'low_stock_threshold': 5})
+        resource.Table('StyleLaneSales').put_item(Item={
+            'sale_id': f'x{n}', 'product_id': f'p{n}', 'store_id': f's{n % 20}', 'quantity': 1,
+            'total_amount': 19, 'sale_date': f'2024-01-{1 + n % 28:02d}T10:00:00'})
+
+    def inject(service, operation, table, *args):
+        time.sleep(delay * (20 if table == slow_table else 1))
+
+    resource.hooks.append(inject)
+    app = app_aws.create_app(dict({'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None,
+                                   'AWS_CALLS_LOG': False, 'TEMPLATE_CACHE_DIR': ''}, **config))
+    if serial_reads:
+        app.extensions['fanout'].gather = serial
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess.update(username='admin', role='admin')
+    return client
+
+
+def measure(client, requests):
+    """(median ms, status of the last response, whether figures were left out)"""
+    client.get('/admin/dashboard')  # clients, templates and the pool created
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get('/admin/dashboard')
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), response.status_code, b'Not loaded in time' in response.data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Admin dashboard latency, serial vs parallel reads')
+    parser.add_argument('--delay-ms', default='10,50,100', help='injected per-call delays, comma-separated')
+    parser.add_argument('--requests', type=int, default=10)
+    args = parser.parse_args(argv)
+
+    print(f'{"delay ms":>9} {"variant":>20} {"p50 ms":>9} {"status":>7} {"partial":>8}')
+    for delay_ms in (float(d) for d in args.delay_ms.split(',')):
+        delay = delay_ms / 1000.0
+        variants = (
+            ('serial', build(delay, serial_reads=True)),
+            ('parallel', build(delay)),
+            ('parallel, slow users', build(delay, 'StyleLaneUsers', FANOUT_TIMEOUT=4 * delay)),
+        )
+        for name, client in variants:
+            p50, status, partial = measure(client, args.requests)
+            print(f'{delay_ms:9g} {name:>20} {p50:9.1f} {status:>7} {"yes" if partial else "no":>8}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
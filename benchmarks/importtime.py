@@ -0,0 +1,96 @@
+"""
+Cold-start budget for both backends.
+
+Runs ``python -X importtime`` in fresh interpreters for "import <module>;
+<module>.create_app()" and for a bare "import flask", and reports the
+median cold-start import time of each app beyond what Flask itself costs,
+plus the slowest modules it pulls in. Fails (exit 1) when an app exceeds its
+budget or imports a module that must stay lazy (boto3, numpy: they are only
+needed once a request talks to AWS or renders a report).
+
+Usage:
+    python -m benchmarks.importtime --runs 5
+    python -m benchmarks.importtime --budget app_aws=50 --budget app=450
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Milliseconds of imports beyond Flask's own; app.py pays for SQLAlchemy
+BUDGETS_MS = {'app_aws': 50, 'app': 450}
+
+# Modules that must not be imported while the app starts
+LAZY_MODULES = ('boto3', 'numpy')
+
+
+def parse(output):
+    """(self_us, cumulative_us, depth, name) per line of -X importtime output"""
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return entries
+
+
+def cold_start(code):
+    """Import entries of one fresh interpreter running ``code``"""
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return parse(result.stderr)
+
+
+def total_ms(entries):
+    return sum(cumulative for _, cumulative, depth, _ in entries if depth == 0) / 1000.0
+
+
+def measure(module, runs):
+    """Median cold-start import time of ``module`` over Flask's, and the last run's entries"""
+    code = f'import {module}; {module}.create_app()'
+    # Interleaved, after one discarded pair that warms the OS file cache
+    cold_start('import flask'), cold_start(code)
+    baseline, samples, entries = [], [], []
+    for _ in range(runs):
+        baseline.append(total_ms(cold_start('import flask')))
+        entries = cold_start(code)
+        samples.append(total_ms(entries))
+    return statistics.median(samples) - statistics.median(baseline), entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Cold-start import time budget')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8, help='slowest modules to list')
+    parser.add_argument('--budget', action='append', default=[], metavar='MODULE=MS')
+    args = parser.parse_args(argv)
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        module, _, ms = item.partition('=')
+        budgets[module] = float(ms)
+
+    failed = False
+    for module, budget in budgets.items():
+        overhead, entries = measure(module, args.runs)
+        names = {name for _, _, _, name in entries}
+        eager = [lazy for lazy in LAZY_MODULES if lazy in names]
+        ok = overhead <= budget and not eager
+        failed |= not ok
+        print(f'{module:<10} {overhead:7.1f} ms over flask (budget {budget:.0f} ms)  '
+              f'{"ok" if ok else "OVER BUDGET"}')
+        if eager:
+            print(f'  imported at startup, should be lazy: {", ".join(eager)}')
+        for self_us, cumulative_us, _, name in sorted(entries, key=lambda e: -e[0])[:args.top]:
+            print(f'  {self_us / 1000.0:7.1f} ms self {cumulative_us / 1000.0:8.1f} ms cumulative  {name}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
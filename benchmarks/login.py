@@ -0,0 +1,91 @@
+"""
+Server CPU spent per login attempt under attack, with and without the throttle.
+
+Sends ``--requests`` failed logins to app.py's ``/login`` per attack rate,
+spaced ``1 / rate`` seconds apart on the throttle's clock (a virtual clock,
+so the run takes as long as the CPU work, not the attack), and reports the
+process CPU time per attempt and the share answered 429. Attacks:
+
+    brute    one username from one address
+    spray    a different (existing) username for every attempt, from one address
+    botnet   one username from a new address for every attempt
+
+The hash settings are the app's (``PASSWORD_HASH_METHOD``); with the
+throttle off every attempt for an existing user pays a full hash check.
+
+Usage:
+    python -m benchmarks.login --rates 0.05,1,10,100 --requests 100
+"""
+import argparse
+import sys
+import time
+
+ATTACKS = ('brute', 'spray', 'botnet')
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def build(throttle, method, users):
+    from app import create_app
+    from models import db, User
+    config = {'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'LOGIN_THROTTLE': throttle, 'TEMPLATE_CACHE_DIR': ''}
+    if method:
+        config['PASSWORD_HASH_METHOD'] = method
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        first = User(username='user0', email='u0@example.com', role='store_manager')
+        first.set_password('correct horse')  # hashed once, shared by all
+        db.session.add(first)
+        db.session.add_all([User(username=f'user{n}', email=f'u{n}@example.com', role='store_manager',
+                                 password_hash=first.password_hash) for n in range(1, users)])
+        db.session.commit()
+    return app
+
+
+def attack(app, kind, rate, requests):
+    """(CPU ms per attempt, share throttled)"""
+    import passwords
+    clock = VirtualClock()
+    if app.config['LOGIN_THROTTLE']:
+        app.extensions['login_throttle'] = passwords.LoginThrottle(
+            passwords.TokenBuckets(app.config['LOGIN_USER_BURST'], app.config['LOGIN_USER_PER_MINUTE']),
+            passwords.TokenBuckets(app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_PER_MINUTE']), clock)
+    client = app.test_client()
+    throttled = 0
+    started = time.process_time()
+    for n in range(requests):
+        username = f'user{n}' if kind == 'spray' else 'user0'
+        address = f'10.{n // 65536 % 256}.{n // 256 % 256}.{n % 256}' if kind == 'botnet' else '203.0.113.9'
+        response = client.post('/login', data={'username': username, 'password': f'guess {n}'},
+                               environ_base={'REMOTE_ADDR': address})
+        throttled += response.status_code == 429
+        clock.now += 1.0 / rate
+    return (time.process_time() - started) * 1000 / requests, throttled / requests
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Login CPU per attempt at different attack rates')
+    parser.add_argument('--rates', default='0.05,1,10,100', help='attempts per second, comma-separated')
+    parser.add_argument('--requests', type=int, default=100, help='attempts per rate and attack')
+    parser.add_argument('--method', default=None, help='PASSWORD_HASH_METHOD (default: the app default)')
+    args = parser.parse_args(argv)
+
+    apps = {'off': build(False, args.method, args.requests), 'on': build(True, args.method, args.requests)}
+    print(f'{"attack":>7} {"per s":>7} {"off ms":>8} {"on ms":>8} {"429s":>6}')
+    for kind in ATTACKS:
+        for rate in (float(r) for r in args.rates.split(',')):
+            off, _ = attack(apps['off'], kind, rate, args.requests)
+            on, share = attack(apps['on'], kind, rate, args.requests)
+            print(f'{kind:>7} {rate:7g} {off:8.2f} {on:8.2f} {share:6.0%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
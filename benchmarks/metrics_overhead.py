@@ -0,0 +1,92 @@
+"""
+Per-request overhead of the /metrics instrumentation.
+
+Times the recording primitives on their own, then whole WSGI requests to
+a trivial view with and without ``metrics.init_app``, and fails when the
+per-request overhead exceeds the budget.
+
+Usage:
+    python -m benchmarks.metrics_overhead --iterations 200000 --budget-us 5
+"""
+import argparse
+import sys
+import time
+
+from flask import Flask
+from werkzeug.test import EnvironBuilder
+
+import metrics
+
+
+def per_call_us(func, iterations):
+    """Best-of-5 mean microseconds per call"""
+    best = None
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = (time.perf_counter() - started) / iterations * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def make_app(instrumented):
+    app = Flask(__name__)
+    if instrumented:
+        metrics.init_app(app)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    return app
+
+
+def request_costs_us(apps, iterations, rounds=20):
+    """Best per-request cost of each app for /ping, timed in alternating
+    rounds so both see the same machine noise"""
+    environ = EnvironBuilder(path='/ping').get_environ()
+
+    def start_response(status, headers, exc_info=None):
+        pass
+
+    best = [None] * len(apps)
+    for _ in range(rounds):
+        for i, app in enumerate(apps):
+            wsgi_app = app.wsgi_app
+            started = time.perf_counter()
+            for _ in range(iterations):
+                for _ in wsgi_app(dict(environ), start_response):
+                    pass
+            elapsed = (time.perf_counter() - started) / iterations * 1e6
+            best[i] = elapsed if best[i] is None else min(best[i], elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='metrics instrumentation overhead')
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--budget-us', type=float, default=5.0,
+                        help='maximum acceptable per-request overhead in microseconds')
+    args = parser.parse_args(argv)
+    n = args.iterations
+
+    results = {
+        'counter.inc': per_call_us(lambda: metrics.HTTP_IN_FLIGHT.inc(), n),
+        'histogram.observe': per_call_us(lambda: metrics.HTTP_LATENCY.observe(('ping',), 0.012), n),
+        'record_request': per_call_us(
+            lambda: metrics.record_request('GET', 'ping', '200', 0.012, 512), n),
+    }
+    bare, instrumented = request_costs_us([make_app(False), make_app(True)], max(1, n // 200))
+    results['request (bare app)'] = bare
+    results['request (instrumented)'] = instrumented
+    overhead = instrumented - bare
+
+    for name, us in results.items():
+        print(f'{name:<32} {us:8.3f} us')
+    print(f'{"per-request overhead":<32} {overhead:8.3f} us  (budget {args.budget_us} us)')
+    return 1 if overhead > args.budget_us else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Route-level benchmark suite with regression thresholds.
+
+Loads generated datasets at several scales into both backends (SQLite for
+app.py, the in-process DynamoDB stand-in for app_aws.py), drives every
+parameter-less GET route plus login through the Flask test client, and
+records latency percentiles and peak traced memory per route as JSON.
+
+Usage:
+    python -m benchmarks.routes run --scales 10k,100k,1m --output bench.json
+    python -m benchmarks.routes compare baseline.json bench.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Keep the benchmark self-contained: no real AWS calls or credentials needed
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+STORES = 10
+PRODUCTS_PER_STORE = 100
+DAYS = 60
+
+# Session identity per URL prefix, for each backend
+ROLE_PREFIXES = (('/admin', 'admin'), ('/store-manager', 'store_manager'), ('/supplier', 'supplier'))
+
+# Endpoints that only redirect or end the session
+SKIPPED_ENDPOINTS = {'static', 'auth.logout'}
+
+
+def parse_scale(label):
+    """'10k' -> 10000, '1m' -> 1000000"""
+    label = label.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(label[-1], 1)
+    digits = label[:-1] if label[-1] in 'km' else label
+    return int(float(digits) * multiplier)
+
+
+def make_dataset(sales, seed=42):
+    from generate_data import SyntheticDataset
+    return SyntheticDataset(stores=STORES, products_per_store=PRODUCTS_PER_STORE, days=DAYS,
+                            sales_per_day=sales / (STORES * DAYS), seed=seed)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def measure(client, method, path, iterations, data=None):
+    """Latency percentiles (ms), status and peak traced memory for one route"""
+    def call(path, data=None):
+        # Read and close each response, as a server does: streamed pages
+        # keep their request context until closed
+        response = getattr(client, method)(path, data=data)
+        response.get_data()
+        response.close()
+        return response
+
+    response = call(path, data=data)  # warm-up (template compilation, caches)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        response = call(path, data=data)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    timings.sort()
+
+    # Memory is measured separately because tracing slows every allocation
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    call(path, data=data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'status': response.status_code,
+        'bytes': len(response.get_data()),
+        'iterations': iterations,
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': percentile(timings, 50),
+        'p90_ms': percentile(timings, 90),
+        'p99_ms': percentile(timings, 99),
+        'max_ms': timings[-1],
+        'peak_kb': peak / 1024.0,
+    }
+
+
+def get_routes(app):
+    """Parameter-less GET routes, as (endpoint, path) pairs"""
+    routes = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint in SKIPPED_ENDPOINTS or rule.arguments or 'GET' not in rule.methods:
+            continue
+        routes.append((rule.endpoint, rule.rule))
+    return sorted(routes, key=lambda r: r[1])
+
+
+def role_for(path):
+    for prefix, role in ROLE_PREFIXES:
+        if path.startswith(prefix):
+            return role
+    return None
+
+
+def run_routes(app, login, iterations, progress):
+    results = {}
+    for endpoint, path in get_routes(app):
+        client = app.test_client()
+        login(client, role_for(path))
+        results[endpoint] = measure(client, 'get', path, iterations)
+        if progress:
+            r = results[endpoint]
+            print(f'    {endpoint:<36} {r["status"]}  p50 {r["p50_ms"]:9.2f} ms  '
+                  f'p99 {r["p99_ms"]:9.2f} ms  peak {r["peak_kb"]:10.0f} KB', file=sys.stderr)
+    client = app.test_client()
+    results['login [POST]'] = measure(client, 'post', '/login', iterations,
+                                      data={'username': 'nobody', 'password': 'wrong'})
+    return results
+
+
+# ==================== BACKENDS ====================
+
+def bench_sql(dataset, iterations, progress):
+    from generate_data import write_sql
+    from app import create_app
+    from models import User
+
+    write_sql(dataset, progress=False)
+    app = create_app()
+    with app.app_context():
+        ids = {u.role: u.id for u in User.query.order_by(User.id.desc())}
+
+    def login(client, role):
+        if role:
+            with client.session_transaction() as sess:
+                sess['_user_id'] = str(ids[role])
+                sess['_fresh'] = True
+
+    import sql_metrics
+    app.extensions['sql_metrics'].reset()
+    results = run_routes(app, login, iterations, progress)
+    # Average statements and rows per request for each route
+    for endpoint, stats in sql_metrics.route_stats(app).items():
+        if endpoint in results and stats['requests']:
+            results[endpoint]['sql_queries'] = stats['queries'] / stats['requests']
+            results[endpoint]['sql_rows'] = stats['rows'] / stats['requests']
+    return results
+
+
+def bench_aws(dataset, iterations, progress):
+    from generate_data import write_dynamodb
+    from dynamo_local import LocalDynamoResource
+    import app_aws
+
+    resource = LocalDynamoResource()
+    write_dynamodb(dataset, lambda: resource, workers=1, progress=False)
+    app = app_aws.create_app({'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None})
+
+    identities = {
+        'admin': ('admin', None),
+        'store_manager': ('storemanager1', 'store-00001'),
+        'supplier': ('supplier1', None),
+    }
+
+    def login(client, role):
+        if role:
+            username, store_id = identities[role]
+            with client.session_transaction() as sess:
+                sess['username'] = username
+                sess['role'] = role
+                sess['store_id'] = store_id
+
+    app.extensions['aws_metrics'].reset()
+    results = run_routes(app, login, iterations, progress)
+    # Average DynamoDB calls and consumed capacity per request for each route
+    for endpoint, stats in app_aws.aws_metrics.route_stats(app).items():
+        if endpoint in results and stats['requests']:
+            results[endpoint]['aws_calls'] = stats['calls']['sum'] / stats['requests']
+            results[endpoint]['aws_capacity'] = stats['capacity'] / stats['requests']
+    return results
+
+
+BACKENDS = {'sql': bench_sql, 'aws': bench_aws}
+
+
+def iterations_for(sales, requested):
+    """Fewer iterations at large scales so a full run stays practical"""
+    if sales >= 1000000:
+        return max(3, requested // 10)
+    if sales >= 100000:
+        return max(5, requested // 3)
+    return requested
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='stylane-bench-')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'iterations': args.iterations,
+        },
+        'results': {},
+    }
+    for backend in args.backends.split(','):
+        for label in args.scales.split(','):
+            sales = parse_scale(label)
+            iterations = iterations_for(sales, args.iterations)
+            print(f'[{backend} {label}] loading ~{sales:,} sales ...', file=sys.stderr)
+            dataset = make_dataset(sales, args.seed)
+            results = BACKENDS[backend](dataset, iterations, not args.quiet)
+            report['results'].setdefault(backend, {})[label] = results
+
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True)
+    print(f'Results written to {args.output}')
+    return 0
+
+
+def compare(args):
+    """Flag routes whose metric grew by more than the threshold"""
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)['results']
+    with open(args.current) as fh:
+        current = json.load(fh)['results']
+
+    regressions = 0
+    print(f'{"backend/scale/route":<58} {"baseline":>10} {"current":>10} {"change":>8}')
+    for backend, scales in sorted(current.items()):
+        for scale, routes in sorted(scales.items()):
+            for route, metrics in sorted(routes.items()):
+                before = baseline.get(backend, {}).get(scale, {}).get(route)
+                if not before:
+                    continue
+                old, new = before[args.metric], metrics[args.metric]
+                change = (new - old) / old if old else 0.0
+                regressed = change > args.threshold and new - old >= args.min_delta
+                flag = '  REGRESSION' if regressed else ''
+                regressions += regressed
+                print(f'{backend + "/" + scale + "/" + route:<58} {old:10.2f} {new:10.2f} '
+                      f'{change:+8.1%}{flag}')
+
+    print(f'\n{regressions} regression(s) beyond {args.threshold:.0%} on {args.metric}')
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StyleLane route benchmarks')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='benchmark every route at several dataset scales')
+    run_parser.add_argument('--scales', default='10k,100k,1m')
+    run_parser.add_argument('--backends', default='sql,aws')
+    run_parser.add_argument('--iterations', type=int, default=30)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--output', default='bench_results.json')
+    run_parser.add_argument('--quiet', action='store_true')
+
+    compare_parser = sub.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--metric', default='p50_ms',
+                                choices=['mean_ms', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'peak_kb'])
+    compare_parser.add_argument('--threshold', type=float, default=0.2,
+                                help='relative increase that counts as a regression (0.2 = 20%%)')
+    compare_parser.add_argument('--min-delta', type=float, default=0.5,
+                                help='ignore absolute changes smaller than this (noise floor)')
+
+    args = parser.parse_args(argv)
+    return run(args) if args.command == 'run' else compare(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Write bursts and scatter-gather reads of sharded sales keys.
+
+Writes: threads record sales for one flagship store as fast as they can
+against the local stand-in with PartitionThrottle (``--capacity`` write
+units per second per partition key, as DynamoDB's per-partition limit),
+retrying throttled puts with exponential backoff and jitter like the SDK.
+With one shard every sale lands on the same StoreShardIndex partition;
+with N shards the burst spreads over N. Reports accepted writes/s,
+throttled attempts and write latency including retries.
+
+Reads: the newest ``--limit`` sales of the store, gathered from every shard
+with a simulated per-query latency, one shard after another and in
+parallel (ShardedSales.gather).
+
+Usage:
+    python -m benchmarks.sales_shards --shards 1,4,16 --threads 16 --seconds 2
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from botocore.exceptions import ClientError
+
+import dynamo_records
+from benchmarks.routes import percentile
+from dynamo_local import LocalDynamoResource, PartitionThrottle
+from dynamo_records import SaleRecord
+from sales_shards import ShardedSales, shard_key, shard_keys
+
+STORE = 'store-flagship'
+FIELDS = ('sale_id', 'product_id', 'quantity', 'total_amount', 'sale_date')
+
+
+def sale(n, shards):
+    sale_id = f'sale-{n:010d}'
+    return {'sale_id': sale_id, 'store_id': STORE, 'store_shard': shard_key(STORE, sale_id, shards),
+            'product_id': f'prod-{n % 500:08d}', 'quantity': 1, 'unit_price': '19.99',
+            'total_amount': '19.99', 'sale_date': f'2024-11-29T{n // 3600 % 24:02d}:{n // 60 % 60:02d}:{n % 60:02d}'}
+
+
+def write_burst(shards, threads, seconds, capacity):
+    table = LocalDynamoResource().Table('StyleLaneSales')
+    table.throttle = PartitionThrottle(capacity)
+    counter = iter(range(1, 10 ** 9))
+    latencies, lock = [], threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def writer():
+        rng = random.Random()
+        mine = []
+        while time.monotonic() < deadline:
+            with lock:
+                item = sale(next(counter), shards)
+            started = time.perf_counter()
+            for attempt in range(10):
+                try:
+                    table.put_item(Item=item)
+                    break
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'ProvisionedThroughputExceededException':
+                        raise
+                    time.sleep(rng.uniform(0, min(1.0, 0.025 * 2 ** attempt)))
+            mine.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=writer) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {'writes/s': table.throttle.admitted / elapsed, 'throttled': table.throttle.throttled,
+            'throttle_rate': table.throttle.throttled / max(1, table.throttle.admitted + table.throttle.throttled),
+            'p50_ms': percentile(latencies, 50), 'p99_ms': percentile(latencies, 99)}
+
+
+class SlowClient:
+    """Low-level client adding a fixed latency to every query"""
+
+    def __init__(self, client, latency):
+        self.client = client
+        self.latency = latency
+
+    def query(self, **kwargs):
+        time.sleep(self.latency)
+        return self.client.query(**kwargs)
+
+
+def gather_ms(shards, sales, latency, limit, repeat=5):
+    resource = LocalDynamoResource()
+    table = resource.Table('StyleLaneSales')
+    for n in range(1, sales + 1):
+        table.put_item(Item=sale(n, shards))
+    client = SlowClient(resource.meta.client, latency)
+    sharding = ShardedSales(shards, threads=shards)
+
+    def query_shard(key):
+        return dynamo_records.query(client, 'StyleLaneSales', 'StoreShardIndex', 'store_shard', key,
+                                    SaleRecord, FIELDS, limit=limit, ScanIndexForward=False)
+
+    def sequential():
+        results = [query_shard(key) for key in shard_keys(STORE, shards)]
+        return sorted((s for r in results for s in r), key=lambda s: s.sale_date, reverse=True)[:limit]
+
+    timings = {}
+    for name, read in (('sequential', sequential), ('parallel', lambda: sharding.gather(STORE, query_shard, limit))):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = read()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        assert len(rows) == min(limit, sales)
+        timings[name] = best
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='sharded sales keys: write throttling and gather reads')
+    parser.add_argument('--shards', default='1,2,4,8,16', help='comma-separated shard counts')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent writers')
+    parser.add_argument('--seconds', type=float, default=2.0, help='length of each write burst')
+    parser.add_argument('--capacity', type=float, default=1000, help='write units/s per partition key')
+    parser.add_argument('--sales', type=int, default=5000, help='sales stored for the read test')
+    parser.add_argument('--latency-ms', type=float, default=8.0, help='simulated latency per query')
+    parser.add_argument('--limit', type=int, default=50, help='sales per gather read')
+    args = parser.parse_args(argv)
+    counts = [int(n) for n in args.shards.split(',')]
+
+    print(f'{args.threads} writers for {args.seconds}s, {args.capacity:.0f} WCU/s per partition')
+    print(f'{"shards":>6} {"writes/s":>9} {"throttled":>10} {"rate":>6} {"p50 ms":>8} {"p99 ms":>8}')
+    for shards in counts:
+        r = write_burst(shards, args.threads, args.seconds, args.capacity)
+        print(f'{shards:>6} {r["writes/s"]:9.0f} {r["throttled"]:10d} {r["throttle_rate"]:6.1%} '
+              f'{r["p50_ms"]:8.1f} {r["p99_ms"]:8.1f}')
+
+    print(f'\nnewest {args.limit} of {args.sales} sales, {args.latency_ms} ms per query')
+    print(f'{"shards":>6} {"sequential ms":>14} {"parallel ms":>12}')
+    for shards in counts:
+        r = gather_ms(shards, args.sales, args.latency_ms / 1000.0, args.limit)
+        print(f'{shards:>6} {r["sequential"]:14.1f} {r["parallel"]:12.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
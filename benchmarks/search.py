@@ -0,0 +1,106 @@
+"""
+Product search latency on a large synthetic catalog.
+
+Loads ``--products`` products (default 1M) into a temporary SQLite database
+through generate_data.write_sql, so the FTS5 index is filled by its triggers,
+and into search.MemoryIndex, then times a mix of queries: selective words,
+prefixes, SKUs, store-scoped and broad single words. Fails (exit 1) when a
+query's p99 exceeds ``--budget-ms``.
+
+Usage:
+    python -m benchmarks.search
+    python -m benchmarks.search --products 200000 --iterations 50 --backends memory
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.routes import percentile
+
+STORES = 50
+
+# (query, store number or None)
+QUERIES = [
+    ('oxford', None),
+    ('shirt', None),
+    ('sh', None),
+    ('wool scarf', None),
+    ('slim chin khaki', None),
+    ('SHIR-0007', None),
+    ('SHIR-0007-00120', None),
+    ('denim jack', 3),
+    ('black', 12),
+    ('nothing matches this', None),
+]
+
+
+def make_dataset(products):
+    from generate_data import SyntheticDataset
+    return SyntheticDataset(stores=STORES, products_per_store=max(1, products // STORES),
+                            days=1, sales_per_day=1)
+
+
+def timed(search, iterations):
+    search()  # warm caches
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        search()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return sorted(samples)
+
+
+def bench_sql(dataset, iterations):
+    from generate_data import write_sql
+    from app import create_app
+    with tempfile.TemporaryDirectory() as directory:
+        url = 'sqlite:///' + os.path.join(directory, 'search.db')
+        started = time.perf_counter()
+        write_sql(dataset, url, progress=False)
+        print(f'sql: loaded {dataset.n_products:,} products in {time.perf_counter() - started:.1f}s')
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url})
+        index = app.extensions['search']
+        with app.app_context():
+            for query, store in QUERIES:
+                yield query, store, timed(lambda: index.search(query, store), iterations)
+
+
+def bench_memory(dataset, iterations):
+    import search
+    items = [{'product_id': f'prod-{p["id"]:08d}', 'store_id': f'store-{p["store_id"]:05d}',
+              **{field: p[field] for field in search.FIELDS}} for p in dataset.products()]
+    index = search.MemoryIndex(lambda: iter(items))
+    started = time.perf_counter()
+    index.build()
+    print(f'memory: indexed {len(index):,} products in {time.perf_counter() - started:.1f}s')
+    for query, store in QUERIES:
+        store_id = f'store-{store:05d}' if store else None
+        yield query, store, timed(lambda: index.search(query, store_id), iterations)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Product search latency')
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--backends', default='sql,memory')
+    parser.add_argument('--budget-ms', type=float, default=10.0, help='p99 budget per query')
+    args = parser.parse_args(argv)
+
+    dataset = make_dataset(args.products)
+    benches = {'sql': bench_sql, 'memory': bench_memory}
+    failed = False
+    for backend in args.backends.split(','):
+        for query, store, samples in benches[backend](dataset, args.iterations):
+            p50, p99 = percentile(samples, 50), percentile(samples, 99)
+            ok = p99 <= args.budget_ms
+            failed |= not ok
+            label = f'{query!r}' + (f' store {store}' if store else '')
+            print(f'  {backend:<7} {label:<32} p50 {p50:7.2f} ms  p99 {p99:7.2f} ms  '
+                  f'{"ok" if ok else "OVER BUDGET"}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
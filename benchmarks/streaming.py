@@ -0,0 +1,110 @@
+"""
+Time to first byte and memory of the streamed store sales page.
+
+Fills a SQLite database with ``--sales`` sales for one store and requests
+``/store-manager/sales`` through the Flask test client, reading the body
+chunk by chunk as a server would and dropping each chunk once read.
+Compares the streamed view (``streaming.stream_page`` over a ``yield_per``
+query) with the previous one (``.all()`` and ``render_template``): time to
+the first chunk, time to the last, and peak traced memory while serving.
+
+Usage:
+    python -m benchmarks.streaming --sales 10000,50000,200000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+
+def build(path, sales):
+    from app import create_app
+    from models import db, Product, Sale, Store, User
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TESTING': True, 'AUTO_RESTOCK': False})
+    with app.app_context():
+        db.create_all()
+        db.session.add(Store(name='Flagship', address='1 High Street'))
+        manager = User(username='manager', email='m@example.com', role='store_manager', store_id=1)
+        manager.set_password('secret')
+        db.session.add(manager)
+        db.session.add_all([Product(name=f'Tee {i}', sku=f'TEE-{i}', store_id=1, price=19.99,
+                                    stock_quantity=10 ** 6) for i in range(200)])
+        db.session.commit()
+        start = datetime(2020, 1, 1)
+        rows = [{'product_id': 1 + n % 200, 'store_id': 1, 'quantity': 1, 'unit_price': 19.99,
+                 'total_amount': 19.99, 'sale_date': start + timedelta(minutes=n)} for n in range(sales)]
+        db.session.execute(Sale.__table__.insert(), rows)
+        db.session.commit()
+
+        @app.route('/bench/sales-rendered')
+        def rendered():
+            from flask import render_template
+            from sqlalchemy.orm import joinedload
+            products = Product.query.filter_by(store_id=1).all()
+            all_sales = Sale.query.options(joinedload(Sale.product)).filter_by(store_id=1).order_by(
+                Sale.sale_date.desc()).all()
+            return render_template('store_manager/sales.html', products=products, sales=all_sales,
+                                   store=db.session.get(Store, 1))
+    return app
+
+
+def serve(client, path):
+    """(first chunk ms, last chunk ms, bytes) reading the body as a server would"""
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    first = None
+    size = 0
+    for chunk in response.response:
+        if first is None:
+            first = (time.perf_counter() - started) * 1000
+        size += len(chunk)
+    response.close()
+    return first, (time.perf_counter() - started) * 1000, size
+
+
+def run(sales, repeat):
+    directory = tempfile.mkdtemp()
+    try:
+        return _run(directory, sales, repeat)
+    finally:
+        shutil.rmtree(directory)
+
+
+def _run(directory, sales, repeat):
+    app = build(os.path.join(directory, 'bench.db'), sales)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = '1'
+        sess['_fresh'] = True
+    results = {}
+    for name, path in (('rendered', '/bench/sales-rendered'), ('streamed', '/store-manager/sales')):
+        timings = [serve(client, path) for _ in range(repeat)]
+        tracemalloc.start()
+        serve(client, path)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = {'first_ms': min(t[0] for t in timings), 'total_ms': min(t[1] for t in timings),
+                         'bytes': timings[0][2], 'peak_mb': peak / 2 ** 20}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='streamed vs fully rendered sales page')
+    parser.add_argument('--sales', default='10000,50000', help='comma-separated sales counts')
+    parser.add_argument('--repeat', type=int, default=3, help='timed requests per variant (best is kept)')
+    args = parser.parse_args(argv)
+
+    print(f'{"sales":>8} {"variant":>9} {"first ms":>9} {"total ms":>9} {"page MB":>8} {"peak MB":>8}')
+    for sales in (int(n) for n in args.sales.split(',')):
+        for name, r in run(sales, args.repeat).items():
+            print(f'{sales:>8} {name:>9} {r["first_ms"]:9.1f} {r["total_ms"]:9.1f} '
+                  f'{r["bytes"] / 2 ** 20:8.1f} {r["peak_mb"]:8.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+First-request latency of a fresh worker, with and without the template cache.
+
+Builds a small SQLite database with one user per role, then starts a fresh
+interpreter per sample (``--runs`` per mode, interleaved) that creates the
+app and requests each role's dashboard twice. Modes:
+
+    cold     no bytecode cache: every template compiled on first render
+    cached   bytecode cache filled by ``python template_cache.py`` first
+    warmup   cached, plus TEMPLATE_WARMUP (dashboards rendered in create_app)
+
+Reports the median create_app time and, per role, the first and second
+request. The first request is what a user pays after a deploy or scale-out.
+
+Usage:
+    python -m benchmarks.templates --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('cold', 'cached', 'warmup')
+
+
+def build(path):
+    from app import create_app
+    from models import db, Product, Sale, Store, User
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TEMPLATE_CACHE_DIR': ''})
+    with app.app_context():
+        db.create_all()
+        db.session.add(Store(name='Flagship', address='1 High Street'))
+        for role, store_id in (('admin', None), ('store_manager', 1), ('supplier', None)):
+            user = User(username=role, email=f'{role}@example.com', role=role, store_id=store_id)
+            user.set_password('secret')
+            db.session.add(user)
+        products = [Product(name=f'Tee {i}', sku=f'TEE-{i}', store_id=1, price=19.99, stock_quantity=i % 15)
+                    for i in range(50)]
+        db.session.add_all(products)
+        db.session.flush()
+        db.session.add_all([Sale(product_id=products[i % 50].id, store_id=1, quantity=1, unit_price=19.99,
+                                 total_amount=19.99) for i in range(200)])
+        db.session.commit()
+
+
+def child(path, cache_dir, warm):
+    """Runs in the fresh interpreter: timings as one JSON line"""
+    started = time.perf_counter()
+    from app import create_app, warmup_sessions
+    import template_cache
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'TEMPLATE_CACHE_DIR': cache_dir,
+                      'TEMPLATE_WARMUP': warm})
+    result = {'startup': (time.perf_counter() - started) * 1000}
+    with app.app_context():
+        sessions = warmup_sessions()
+    client = app.test_client()
+    for role in template_cache.ROLES:
+        with client.session_transaction() as sess:
+            sess.clear()
+            sess.update(sessions[role])
+        for attempt in ('first', 'second'):
+            started = time.perf_counter()
+            response = client.get(f'/{role.replace("_", "-")}/dashboard')
+            response.close()
+            assert response.status_code == 200, (role, response.status_code)
+            result[f'{role} {attempt}'] = (time.perf_counter() - started) * 1000
+    print(json.dumps(result))
+
+
+def sample(path, cache_dir, warm):
+    code = f'from benchmarks.templates import child; child({path!r}, {cache_dir!r}, {warm!r})'
+    output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='First-request latency with the template cache')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'bench.db')
+        cache_dir = os.path.join(directory, 'jinja_cache')
+        build(path)
+        subprocess.run([sys.executable, 'template_cache.py'], cwd=ROOT, check=True, capture_output=True,
+                       env=dict(os.environ, STYLANE_TEMPLATE_CACHE=cache_dir))
+        settings = {'cold': ('', False), 'cached': (cache_dir, False), 'warmup': (cache_dir, True)}
+        sample(path, *settings['cold'])  # warms the OS file cache
+        samples = {mode: [] for mode in MODES}
+        for _ in range(args.runs):
+            for mode in MODES:
+                samples[mode].append(sample(path, *settings[mode]))
+    finally:
+        shutil.rmtree(directory)
+
+    columns = list(samples['cold'][0])
+    print(f'{"ms (median)":<22}' + ''.join(f'{mode:>10}' for mode in MODES))
+    for column in columns:
+        print(f'{column:<22}' + ''.join(f'{statistics.median(s[column] for s in samples[mode]):10.1f}'
+                                         for mode in MODES))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,325 @@
+"""
+Change data capture for app_aws.py.
+
+Derived state (the product search index, the low-stock view) used to be
+refreshed by rescanning tables. With CDC each web process reads the
+products table's DynamoDB Stream instead: ``StreamConsumer`` polls every
+shard, decodes batches of item-level change records and hands them to
+subscribed handlers, then checkpoints the last sequence number.
+
+Delivery is at least once: a batch whose handler raises is not
+checkpointed and is read again on the next poll, and a restarted consumer
+resumes from its checkpoint. Handlers therefore apply records
+idempotently, as "the item is now this image" (or gone), never as
+increments, so a replayed batch leaves the state unchanged. On start the
+consumer fixes its stream positions first and bootstraps each handler
+with one scan afterwards; changes made during the scan are replayed on top
+of it.
+
+The local stand-in (``LocalDynamoResource(streams=True)``) records the
+app's own writes into the same record shape, so all of this runs in tests.
+"""
+import json
+import os
+import threading
+
+import metrics
+
+
+class ChangeRecord:
+    """One decoded stream record; images are plain items (None when absent)"""
+    __slots__ = ('event_id', 'event_name', 'keys', 'new_image', 'old_image', 'sequence_number')
+
+    def __init__(self, event_id, event_name, keys, new_image, old_image, sequence_number):
+        self.event_id = event_id
+        self.event_name = event_name
+        self.keys = keys
+        self.new_image = new_image
+        self.old_image = old_image
+        self.sequence_number = sequence_number
+
+
+def decode(record, deserializer):
+    """ChangeRecord from a DynamoDB Streams record (typed attribute values)"""
+    change = record['dynamodb']
+
+    def image(name):
+        typed = change.get(name)
+        return None if typed is None else {k: deserializer.deserialize(v) for k, v in typed.items()}
+
+    return ChangeRecord(record['eventID'], record['eventName'], image('Keys'),
+                        image('NewImage'), image('OldImage'), change['SequenceNumber'])
+
+
+# ==================== CHECKPOINTS ====================
+
+class MemoryCheckpoints:
+    """Last processed sequence number per (stream, shard), for this process only"""
+
+    def __init__(self):
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def get(self, stream_arn, shard_id):
+        return self._positions.get(f'{stream_arn}|{shard_id}')
+
+    def save(self, stream_arn, shard_id, sequence_number):
+        with self._lock:
+            self._positions[f'{stream_arn}|{shard_id}'] = sequence_number
+
+
+class FileCheckpoints(MemoryCheckpoints):
+    """Checkpoints kept in a JSON file, rewritten atomically on every save"""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        if os.path.exists(path):
+            with open(path) as fh:
+                self._positions = json.load(fh)
+
+    def save(self, stream_arn, shard_id, sequence_number):
+        with self._lock:
+            self._positions[f'{stream_arn}|{shard_id}'] = sequence_number
+            tmp = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as fh:
+                json.dump(self._positions, fh)
+            os.replace(tmp, self.path)
+
+
+# ==================== CONSUMER ====================
+
+class StreamConsumer:
+    """Polls DynamoDB Streams and feeds change records to handlers.
+
+    ``get_client`` returns a ``dynamodbstreams`` client (or the local
+    stand-in); ``subscribe`` takes a stream ARN, or a function returning it,
+    and handlers with ``apply(records)`` and optionally ``bootstrap()``.
+    All handlers of a stream see each batch before it is checkpointed.
+    Without a checkpoint a shard is read from ``start_position`` (``LATEST``:
+    a handler's bootstrap covers what came before).
+    """
+
+    def __init__(self, get_client, checkpoints=None, batch_size=100, start_position='LATEST'):
+        self.get_client = get_client
+        self.checkpoints = checkpoints if checkpoints is not None else MemoryCheckpoints()
+        self.batch_size = batch_size
+        self.start_position = start_position
+        self.subscriptions = []   # (stream ARN or function, handlers)
+        self._shards = {}         # stream ARN -> shard ids, in DescribeStream order
+        self._iterators = {}      # (stream ARN, shard id) -> next shard iterator, None when closed
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stopping = threading.Event()
+        self._ready = threading.Event()
+
+    def subscribe(self, stream_arn, *handlers):
+        self.subscriptions.append((stream_arn, handlers))
+
+    def _arns(self):
+        for stream_arn, handlers in self.subscriptions:
+            arn = stream_arn() if callable(stream_arn) else stream_arn
+            if arn is None:
+                print(f"CDC: no stream enabled for {', '.join(type(h).__name__ for h in handlers)}")
+                continue
+            yield arn, handlers
+
+    def _iterator(self, client, arn, shard_id, position):
+        """Iterator after the shard's checkpoint, else at ``position``"""
+        sequence_number = self.checkpoints.get(arn, shard_id)
+        if sequence_number is not None:
+            kwargs = {'ShardIteratorType': 'AFTER_SEQUENCE_NUMBER', 'SequenceNumber': sequence_number}
+        else:
+            kwargs = {'ShardIteratorType': position}
+        return client.get_shard_iterator(StreamArn=arn, ShardId=shard_id, **kwargs)['ShardIterator']
+
+    def _discover(self, client, arn, position):
+        """Give shards not seen before an iterator (parents are listed before children)"""
+        shards = client.describe_stream(StreamArn=arn)['StreamDescription']['Shards']
+        known = self._shards.setdefault(arn, [])
+        for shard in shards:
+            if shard['ShardId'] not in known:
+                known.append(shard['ShardId'])
+                self._iterators[(arn, shard['ShardId'])] = self._iterator(client, arn, shard['ShardId'], position)
+
+    def position(self):
+        """Fix a position on every shard; call before bootstrapping handlers"""
+        client = self.get_client()
+        with self._lock:
+            for arn, _ in self._arns():
+                self._discover(client, arn, self.start_position)
+
+    def bootstrap(self):
+        for _, handlers in self.subscriptions:
+            for handler in handlers:
+                if hasattr(handler, 'bootstrap'):
+                    handler.bootstrap()
+
+    def poll(self):
+        """Read every shard to its end once; returns the number of records applied.
+
+        Shards that appear later (splits) are read from their first record.
+        """
+        from boto3.dynamodb.types import TypeDeserializer
+        deserializer = TypeDeserializer()
+        client = self.get_client()
+        applied = 0
+        with self._lock:
+            for arn, handlers in self._arns():
+                self._discover(client, arn, 'TRIM_HORIZON')
+                for shard_id in self._shards[arn]:
+                    applied += self._read_shard(client, arn, shard_id, handlers, deserializer)
+        return applied
+
+    def _read_shard(self, client, arn, shard_id, handlers, deserializer):
+        from botocore.exceptions import ClientError
+        table = arn.split('/')[1] if '/' in arn else arn
+        key = (arn, shard_id)
+        applied = 0
+        while self._iterators.get(key) is not None:
+            try:
+                response = client.get_records(ShardIterator=self._iterators[key], Limit=self.batch_size)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code == 'TrimmedDataAccessException':
+                    # The checkpoint is older than the stream keeps: start over
+                    print(f"CDC: {table} {shard_id} trimmed past its checkpoint, reading from the trim horizon")
+                    self._iterators[key] = client.get_shard_iterator(
+                        StreamArn=arn, ShardId=shard_id, ShardIteratorType='TRIM_HORIZON')['ShardIterator']
+                    continue
+                if code == 'ExpiredIteratorException':
+                    self._iterators[key] = self._iterator(client, arn, shard_id, 'TRIM_HORIZON')
+                    continue
+                raise
+            records = [decode(r, deserializer) for r in response.get('Records', [])]
+            if records:
+                try:
+                    for handler in handlers:
+                        handler.apply(records)
+                except Exception as e:
+                    # Neither checkpointed nor advanced: the same iterator
+                    # returns this batch again on the next poll
+                    print(f"CDC: {type(handler).__name__} failed on {table}: {e}")
+                    metrics.CDC_RECORDS.inc((table, 'failed'), len(records))
+                    break
+                self.checkpoints.save(arn, shard_id, records[-1].sequence_number)
+                metrics.CDC_RECORDS.inc((table, 'applied'), len(records))
+                applied += len(records)
+            self._iterators[key] = response.get('NextShardIterator')
+            if len(records) < self.batch_size:
+                break
+        return applied
+
+    # ---------- background thread ----------
+
+    def start(self, interval=1.0):
+        """Position, bootstrap and poll every ``interval`` seconds in a thread
+        (again in a forked worker process); returns at once if running"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._shards, self._iterators = {}, {}
+            self._stopping.clear()
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='stylane-cdc', daemon=True)
+            self._thread.start()
+
+    def wait_ready(self, timeout=None):
+        """Block until the started consumer has positioned and bootstrapped"""
+        return self._ready.wait(timeout)
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, interval):
+        try:
+            self.position()
+            self.bootstrap()
+        except Exception as e:
+            print(f"CDC: could not start: {e}")
+            return
+        self._ready.set()
+        while not self._stopping.wait(interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"CDC: poll failed: {e}")
+
+
+# ==================== HANDLERS ====================
+
+class IndexSync:
+    """Keeps a search.MemoryIndex current from products changes"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def bootstrap(self):
+        self.index.build()
+
+    def apply(self, records):
+        for record in records:
+            if record.new_image is not None:
+                self.index.add(record.new_image)
+            else:
+                self.index.remove(record.keys['product_id'])
+
+
+def is_low_stock(item):
+    return int(item.get('stock_quantity', 0)) <= int(item.get('low_stock_threshold', 10))
+
+
+class LowStockView:
+    """Products at or below their low-stock threshold, by product id.
+
+    ``load_items`` returns every product for the bootstrap; until then
+    ``ready`` is False and callers fall back to reading the table.
+    """
+
+    def __init__(self, load_items):
+        self.load_items = load_items
+        self.ready = False
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def bootstrap(self):
+        items = {i['product_id']: i for i in self.load_items() if is_low_stock(i)}
+        with self._lock:
+            self._items = items
+            self.ready = True
+
+    def apply(self, records):
+        with self._lock:
+            for record in records:
+                item = record.new_image
+                if item is not None and is_low_stock(item):
+                    self._items[item['product_id']] = item
+                else:
+                    self._items.pop(record.keys['product_id'], None)
+
+    def products(self, store_id=None):
+        """Copies of the low-stock items, lowest stock first"""
+        with self._lock:
+            items = [dict(i) for i in self._items.values() if store_id is None or i.get('store_id') == store_id]
+        return sorted(items, key=lambda i: (int(i.get('stock_quantity', 0)), i['product_id']))
+
+
+def init_app(app, consumer):
+    """Run ``consumer`` in each process from its first request.
+
+    ``CDC_POLL_SECONDS`` (default 1) is the pause between polls.
+    """
+    app.config.setdefault('CDC_POLL_SECONDS', 1.0)
+    app.extensions['cdc'] = consumer
+
+    @app.before_request
+    def start_consumer():
+        consumer.start(app.config['CDC_POLL_SECONDS'])
+
+    return consumer
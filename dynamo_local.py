@@ -0,0 +1,777 @@
+"""
+In-process stand-in for the DynamoDB resource API used by app_aws.py.
+
+Implements the subset of ``boto3.resource('dynamodb')`` the app relies on
+(get/put/update/delete, scan, query, batch_writer, and the client's
+transact_write_items) over plain dicts, so the AWS backend can be seeded,
+benchmarked and tested without network access.
+With ``streams=True`` every write is also appended to a per-table change
+stream that ``LocalStreamsClient`` serves like the DynamoDB Streams API.
+Numbers are returned as ``Decimal`` and floats are rejected, as boto3 does.
+Call hooks receive the same per-call records the botocore instrumentation
+produces, with consumed capacity estimated from item sizes.
+"""
+import contextlib
+import functools
+import math
+import pickle
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from decimal import Decimal
+
+# Partition keys of the StyleLane tables (see AWS_SETUP.md)
+STYLANE_KEY_SCHEMA = {
+    'StyleLaneUsers': 'username',
+    'StyleLaneStores': 'store_id',
+    'StyleLaneProducts': 'product_id',
+    'StyleLaneSales': 'sale_id',
+    'StyleLaneRestockRequests': 'restock_request_id',
+    'StyleLaneShipments': 'shipment_id',
+    'StyleLaneIdempotency': 'idempotency_key',
+    'StyleLaneJobs': 'job',
+}
+
+# Global secondary indexes as {table: {index: (partition key, sort key)}}
+STYLANE_INDEXES = {
+    'StyleLaneProducts': {'StoreIdIndex': ('store_id', None), 'StoreSkuIndex': ('store_id', 'sku')},
+    # Store sales are write-sharded across store_id#N keys (see sales_shards.py)
+    'StyleLaneSales': {'StoreShardIndex': ('store_shard', 'sale_date')},
+    'StyleLaneRestockRequests': {'StoreIdIndex': ('store_id', None)},
+}
+
+
+def _to_dynamo(value):
+    """Normalise a Python value the way the boto3 serializer would accept it"""
+    if isinstance(value, bool) or value is None or isinstance(value, (str, bytes, Decimal)):
+        return value
+    if isinstance(value, int):
+        return Decimal(value)
+    if isinstance(value, float):
+        raise TypeError('Float types are not supported. Use Decimal types instead.')
+    if isinstance(value, dict):
+        return {k: _to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_dynamo(v) for v in value]
+    if isinstance(value, set):
+        return {_to_dynamo(v) for v in value}
+    raise TypeError(f'Unsupported type "{type(value)}" for value "{value}"')
+
+
+_MISSING = object()
+
+
+def _attr(item, name):
+    """Resolve a (possibly dotted) attribute path on an item"""
+    for part in name.split('.'):
+        if not isinstance(item, dict) or part not in item:
+            return _MISSING
+        item = item[part]
+    return item
+
+
+def _compare(op, left, right):
+    if left is _MISSING:
+        return False
+    try:
+        return op(left, _to_dynamo(right))
+    except TypeError:
+        return False
+
+
+_OPERATORS = {
+    'Equals': lambda a, b: a == b,
+    'NotEquals': lambda a, b: a != b,
+    'LessThan': lambda a, b: a < b,
+    'LessThanEquals': lambda a, b: a <= b,
+    'GreaterThan': lambda a, b: a > b,
+    'GreaterThanEquals': lambda a, b: a >= b,
+    'BeginsWith': lambda a, b: isinstance(a, (str, bytes)) and a.startswith(b),
+    'Contains': lambda a, b: b in a,
+}
+
+
+def evaluate(condition, item):
+    """Evaluate a boto3 ``Key``/``Attr`` condition against an item"""
+    kind = type(condition).__name__
+    values = condition._values
+    if kind == 'And':
+        return evaluate(values[0], item) and evaluate(values[1], item)
+    if kind == 'Or':
+        return evaluate(values[0], item) or evaluate(values[1], item)
+    if kind == 'Not':
+        return not evaluate(values[0], item)
+    value = _attr(item, values[0].name)
+    if kind == 'AttributeExists':
+        return value is not _MISSING
+    if kind == 'AttributeNotExists':
+        return value is _MISSING
+    if kind == 'Between':
+        return _compare(lambda a, b: b <= a, value, values[1]) and \
+            _compare(lambda a, b: a <= b, value, values[2])
+    if kind == 'In':
+        return value is not _MISSING and value in [_to_dynamo(v) for v in values[1]]
+    if kind in _OPERATORS:
+        return _compare(_OPERATORS[kind], value, values[1])
+    raise NotImplementedError(f'Condition {kind} is not supported by the local stand-in')
+
+
+_CONDITION_CLAUSE = re.compile(
+    r'^\s*(?:(attribute_exists|attribute_not_exists)\(\s*([#\w.]+)\s*\)'
+    r'|([#\w.]+)\s*(=|<>|<=|>=|<|>)\s*(:\w+))\s*$')
+_CONDITION_METHODS = {'=': 'eq', '<>': 'ne', '<': 'lt', '<=': 'lte', '>': 'gt', '>=': 'gte'}
+
+
+def _condition(expression, names, values):
+    """A ``ConditionExpression`` string of comparisons and attribute_(not_)exists
+    clauses joined by AND, as a boto3 ``Attr`` condition"""
+    from boto3.dynamodb.conditions import Attr
+    names = names or {}
+    condition = None
+    for clause in re.split(r'\s+AND\s+', expression, flags=re.IGNORECASE):
+        match = _CONDITION_CLAUSE.match(clause)
+        if match is None:
+            raise NotImplementedError(f'Condition {clause!r} is not supported by the local stand-in')
+        function, subject, name, op, value = match.groups()
+        if function:
+            attr = Attr(names.get(subject, subject))
+            clause = attr.exists() if function == 'attribute_exists' else attr.not_exists()
+        else:
+            clause = getattr(Attr(names.get(name, name)), _CONDITION_METHODS[op])(values[value])
+        condition = clause if condition is None else condition & clause
+    return condition
+
+
+_UPDATE_CLAUSE = re.compile(r'\b(SET|ADD)\b', re.IGNORECASE)
+_SET_ACTION = re.compile(r'^\s*([#\w.]+)\s*=\s*([#:\w.]+)\s*(?:([+-])\s*([#:\w.]+))?\s*$')
+
+
+def _update(item, expression, names, values):
+    """Apply a ``SET a = b [+|- c], ...`` / ``ADD a :n`` update expression in place"""
+    names = names or {}
+
+    def operand(token):
+        if token.startswith(':'):
+            return _to_dynamo(values[token])
+        value = _attr(item, names.get(token, token))
+        if value is _MISSING:
+            raise _client_error('ValidationException',
+                                'The provided expression refers to an attribute that does not exist in the item',
+                                'UpdateItem')
+        return value
+
+    parts = _UPDATE_CLAUSE.split(expression)
+    for clause, actions in zip(parts[1::2], parts[2::2]):
+        for action in actions.split(','):
+            if clause.upper() == 'SET':
+                match = _SET_ACTION.match(action)
+                if match is None:
+                    raise NotImplementedError(f'Update action {action!r} is not supported by the local stand-in')
+                target, left, op, right = match.groups()
+                value = operand(left)
+                if op:
+                    value = value + operand(right) if op == '+' else value - operand(right)
+            else:
+                target, token = action.split()
+                current = _attr(item, names.get(target, target))
+                value = _to_dynamo(values[token]) + (0 if current is _MISSING else current)
+            item[names.get(target, target)] = value
+
+
+def _client_error(code, message, operation):
+    from botocore.exceptions import ClientError
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def _item_size(item):
+    """Rough DynamoDB item size in bytes (attribute names plus values)"""
+    return sum(len(k) + len(str(v)) for k, v in item.items())
+
+
+def _capacity(operation, result, args, kwargs):
+    """Estimate consumed capacity units the way DynamoDB bills them"""
+    if operation in ('PutItem', 'UpdateItem', 'DeleteItem'):
+        item = kwargs.get('Item') or kwargs.get('Key') or (args[0] if args else {})
+        return float(max(1, math.ceil(_item_size(item) / 1024.0)))
+    if operation == 'BatchWriteItem':
+        return float(sum(max(1, math.ceil(_item_size(payload) / 1024.0))
+                         for _, payload in (args[0] if args else [])))
+    if 'Item' in result:
+        size = _item_size(result['Item'])
+    else:
+        size = sum(_item_size(i) for i in result.get('Items', ()))
+    # Eventually consistent reads: half a unit per 4 KB, rounded up
+    return max(1, math.ceil(size / 4096.0)) * 0.5
+
+
+def _observed(operation):
+    """Report each call to the table's hooks as (service, operation, table,
+    latency_ms, items, capacity, error)"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.hooks:
+                return method(self, *args, **kwargs)
+            started = time.perf_counter()
+            try:
+                result = method(self, *args, **kwargs)
+            except Exception as e:
+                code = getattr(e, 'response', {}).get('Error', {}).get('Code', type(e).__name__)
+                self._emit(operation, started, 0, 0.0, code)
+                raise
+            if 'Items' in result:
+                items = len(result['Items'])
+            elif operation == 'BatchWriteItem':
+                items = len(args[0]) if args else 0
+            else:
+                items = 1 if 'Item' in result or operation in ('PutItem', 'UpdateItem', 'DeleteItem') else 0
+            self._emit(operation, started, items, _capacity(operation, result, args, kwargs), None)
+            return result
+        return wrapper
+    return decorator
+
+
+class LocalTable:
+    """A single DynamoDB table held in memory"""
+
+    def __init__(self, name, hash_key, indexes=None, hooks=None, stream=False):
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.indexes = dict(indexes or {})
+        self.hooks = hooks if hooks is not None else []
+        self.stream = LocalStream(name, hash_key) if stream else None
+        self.throttle = None  # PartitionThrottle limiting put_item, when set
+        self._items = {}
+        self._lock = threading.RLock()
+
+    @property
+    def latest_stream_arn(self):
+        return self.stream.arn if self.stream is not None else None
+
+    def _emit(self, operation, started, items, capacity, error):
+        latency_ms = (time.perf_counter() - started) * 1000.0
+        for hook in self.hooks:
+            hook('dynamodb', operation, self.name, latency_ms, items, capacity, error)
+
+    def _key(self, key):
+        return key[self.hash_key]
+
+    def _project(self, item, projection, attribute_names=None):
+        # Shallow copies: stored values are immutable scalars in practice and
+        # deep-copying every item would dominate scans of large tables
+        if not projection:
+            return dict(item)
+        attribute_names = attribute_names or {}
+        names = [attribute_names.get(n.strip(), n.strip()) for n in projection.split(',')]
+        return {n: item[n] for n in names if n in item}
+
+    @_observed('GetItem')
+    def get_item(self, Key, ProjectionExpression=None, **kwargs):
+        with self._lock:
+            item = self._items.get(self._key(Key))
+            if item is None:
+                return {}
+            return {'Item': self._project(item, ProjectionExpression, kwargs.get('ExpressionAttributeNames'))}
+
+    @_observed('BatchGetItem')
+    def batch_get(self, keys, projection=None, attribute_names=None):
+        """This table's share of a BatchGetItem"""
+        with self._lock:
+            items = [self._items.get(self._key(key)) for key in keys]
+        return {'Items': [self._project(i, projection, attribute_names) for i in items if i is not None]}
+
+    @_observed('PutItem')
+    def put_item(self, Item, ConditionExpression=None, **kwargs):
+        if self.throttle is not None:
+            self.throttle.admit(self, Item)
+        self._put(Item, ConditionExpression)
+        return {}
+
+    @_observed('UpdateItem')
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None,
+                    ReturnValues='NONE', **kwargs):
+        with self._lock:
+            key = self._key(Key)
+            current = self._items.get(key)
+            if ConditionExpression is not None and not evaluate(ConditionExpression, current or {}):
+                raise _client_error('ConditionalCheckFailedException',
+                                    'The conditional request failed', 'UpdateItem')
+            item = dict(current) if current is not None else _to_dynamo(dict(Key))
+            _update(item, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues or {})
+            self._items[key] = item
+            if self.stream is not None:
+                self.stream.append(current, item)
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': dict(item)}
+        if ReturnValues == 'ALL_OLD' and current is not None:
+            return {'Attributes': dict(current)}
+        return {}
+
+    @_observed('DeleteItem')
+    def delete_item(self, Key, ConditionExpression=None, **kwargs):
+        self._delete(Key, ConditionExpression)
+        return {}
+
+    def _put(self, item, condition=None):
+        item = _to_dynamo(item)
+        with self._lock:
+            key = self._key(item)
+            if condition is not None and not evaluate(condition, self._items.get(key, {})):
+                raise _client_error('ConditionalCheckFailedException',
+                                    'The conditional request failed', 'PutItem')
+            old = self._items.get(key)
+            self._items[key] = item
+            if self.stream is not None:
+                self.stream.append(old, item)
+
+    def _delete(self, key, condition=None):
+        with self._lock:
+            key = self._key(key)
+            if condition is not None and not evaluate(condition, self._items.get(key, {})):
+                raise _client_error('ConditionalCheckFailedException',
+                                    'The conditional request failed', 'DeleteItem')
+            old = self._items.pop(key, None)
+            if self.stream is not None:
+                self.stream.append(old, None)
+
+    def _page(self, items, Limit=None, ExclusiveStartKey=None, key_names=None):
+        """Apply DynamoDB-style pagination to an ordered list of items"""
+        key_names = key_names or (self.hash_key,)
+        start = 0
+        if ExclusiveStartKey:
+            marker = tuple(ExclusiveStartKey[k] for k in key_names)
+            for i, item in enumerate(items):
+                if tuple(item.get(k) for k in key_names) == marker:
+                    start = i + 1
+                    break
+        page = items[start:start + Limit] if Limit else items[start:]
+        result = {'Items': page}
+        if Limit and start + Limit < len(items):
+            last = page[-1]
+            result['LastEvaluatedKey'] = {k: last[k] for k in key_names if k in last}
+        return result
+
+    @_observed('Scan')
+    def scan(self, FilterExpression=None, ProjectionExpression=None, Limit=None,
+             ExclusiveStartKey=None, **kwargs):
+        with self._lock:
+            items = list(self._items.values())
+        result = self._page(items, Limit, ExclusiveStartKey)
+        scanned = len(result['Items'])
+        if FilterExpression is not None:
+            result['Items'] = [i for i in result['Items'] if evaluate(FilterExpression, i)]
+        names = kwargs.get('ExpressionAttributeNames')
+        result['Items'] = [self._project(i, ProjectionExpression, names) for i in result['Items']]
+        result['Count'] = len(result['Items'])
+        result['ScannedCount'] = scanned
+        return result
+
+    @_observed('Query')
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ProjectionExpression=None, ScanIndexForward=True, Limit=None,
+              ExclusiveStartKey=None, **kwargs):
+        if IndexName is not None:
+            if IndexName not in self.indexes:
+                raise _client_error('ValidationException',
+                                    'The table does not have the specified index: ' + IndexName,
+                                    'Query')
+            partition, sort = self.indexes[IndexName]
+        else:
+            partition, sort = self.hash_key, None
+        with self._lock:
+            items = [i for i in self._items.values()
+                     if partition in i and evaluate(KeyConditionExpression, i)]
+        if sort:
+            items.sort(key=lambda i: i.get(sort, ''), reverse=not ScanIndexForward)
+        key_names = tuple(k for k in (self.hash_key, partition, sort) if k)
+        result = self._page(items, Limit, ExclusiveStartKey, key_names)
+        scanned = len(result['Items'])
+        if FilterExpression is not None:
+            result['Items'] = [i for i in result['Items'] if evaluate(FilterExpression, i)]
+        names = kwargs.get('ExpressionAttributeNames')
+        result['Items'] = [self._project(i, ProjectionExpression, names) for i in result['Items']]
+        result['Count'] = len(result['Items'])
+        result['ScannedCount'] = scanned
+        return result
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return LocalBatchWriter(self)
+
+    @_observed('BatchWriteItem')
+    def write_batch(self, requests):
+        """Apply buffered ('put' | 'delete', payload) requests as one call"""
+        for action, payload in requests:
+            if action == 'put':
+                self._put(payload)
+            else:
+                self._delete(payload)
+        return {}
+
+    def item_count(self):
+        return len(self._items)
+
+    # Pickle support (locks and hooks are not picklable)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['hooks'] = []
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('stream', None)  # snapshots from before streams
+        state['throttle'] = None
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+
+class PartitionThrottle:
+    """Per-partition write capacity for LocalTable.put_item.
+
+    DynamoDB serves each partition key value from one partition, which
+    accepts about 1,000 write units a second; a GSI partition that falls
+    behind throttles writes to the table as well. Here every key value of
+    the table and of each GSI an item has keys for gets a token bucket of
+    ``capacity`` units per second with one second of burst. A put that
+    would overdraw any of its buckets fails with
+    ProvisionedThroughputExceededException and consumes nothing.
+    """
+
+    def __init__(self, capacity=1000.0, clock=time.monotonic):
+        self.capacity = float(capacity)
+        self.clock = clock
+        self.admitted = 0
+        self.throttled = 0
+        self._buckets = {}  # (index or None, key value) -> (tokens, refilled at)
+        self._lock = threading.Lock()
+
+    def admit(self, table, item):
+        units = max(1, math.ceil(_item_size(item) / 1024.0))
+        keys = [(None, item.get(table.hash_key))]
+        keys += [(index, item[partition]) for index, (partition, _) in table.indexes.items() if partition in item]
+        with self._lock:
+            now = self.clock()
+            levels = []
+            for key in keys:
+                tokens, refilled = self._buckets.get(key, (self.capacity, now))
+                levels.append((key, min(self.capacity, tokens + (now - refilled) * self.capacity)))
+            if any(tokens < units for _, tokens in levels):
+                for key, tokens in levels:
+                    self._buckets[key] = (tokens, now)
+                self.throttled += 1
+                raise _client_error('ProvisionedThroughputExceededException',
+                                    'The level of configured provisioned throughput for the table was exceeded',
+                                    'PutItem')
+            for key, tokens in levels:
+                self._buckets[key] = (tokens - units, now)
+            self.admitted += 1
+
+
+class LocalStream:
+    """Single-shard change stream of one table (NEW_AND_OLD_IMAGES view).
+
+    Records have the shape DynamoDB Streams returns: typed attribute values,
+    string sequence numbers increasing within the shard. Only the latest
+    ``retention`` records are kept, standing in for the 24-hour window.
+    """
+
+    shard_id = 'shardId-00000000000000000001'
+
+    def __init__(self, table_name, hash_key, retention=100000):
+        self.table_name = table_name
+        self.hash_key = hash_key
+        self.arn = f'arn:aws:dynamodb:local:000000000000:table/{table_name}/stream/local'
+        self.retention = retention
+        self._records = deque()
+        self._next = 1
+        self._lock = threading.Lock()
+
+    def append(self, old, new):
+        """Record a write; writes that change nothing produce no record, as in DynamoDB"""
+        if old == new:
+            return
+        from boto3.dynamodb.types import TypeSerializer
+        serialize = TypeSerializer().serialize
+        image = new if new is not None else old
+        change = {'Keys': {self.hash_key: serialize(image[self.hash_key])},
+                  'StreamViewType': 'NEW_AND_OLD_IMAGES',
+                  'ApproximateCreationDateTime': datetime.now(timezone.utc),
+                  'SizeBytes': _item_size(image)}
+        if new is not None:
+            change['NewImage'] = {k: serialize(v) for k, v in new.items()}
+        if old is not None:
+            change['OldImage'] = {k: serialize(v) for k, v in old.items()}
+        with self._lock:
+            sequence = self._next
+            self._next += 1
+            change['SequenceNumber'] = f'{sequence:021d}'
+            self._records.append((sequence, {
+                'eventID': f'{self.table_name}-{sequence}',
+                'eventName': 'INSERT' if old is None else 'REMOVE' if new is None else 'MODIFY',
+                'eventVersion': '1.1',
+                'eventSource': 'aws:dynamodb',
+                'awsRegion': 'local',
+                'dynamodb': change,
+                'eventSourceARN': self.arn,
+            }))
+            while len(self._records) > self.retention:
+                self._records.popleft()
+
+    def bounds(self):
+        """(oldest retained, latest) sequence numbers; oldest > latest when empty"""
+        with self._lock:
+            oldest = self._records[0][0] if self._records else self._next
+            return oldest, self._next - 1
+
+    def read(self, after, limit):
+        with self._lock:
+            oldest = self._records[0][0] if self._records else self._next
+            if after < oldest - 1:
+                raise _client_error('TrimmedDataAccessException',
+                                    'The requested records are beyond the trim horizon', 'GetRecords')
+            start = after - oldest + 1
+            return [record for _, record in list(self._records)[start:start + limit]]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class LocalStreamsClient:
+    """Drop-in for ``boto3.client('dynamodbstreams')`` over a LocalDynamoResource.
+
+    Shard iterators are ``<stream arn>|<sequence number to read after>``.
+    """
+
+    def __init__(self, resource):
+        self.resource = resource
+
+    def _stream(self, arn):
+        for table in list(self.resource.tables.values()):
+            if table.stream is not None and table.stream.arn == arn:
+                return table.stream
+        raise _client_error('ResourceNotFoundException', f'Requested resource not found: {arn}', 'DescribeStream')
+
+    def describe_stream(self, StreamArn, **kwargs):
+        stream = self._stream(StreamArn)
+        oldest, _ = stream.bounds()
+        return {'StreamDescription': {
+            'StreamArn': stream.arn, 'TableName': stream.table_name, 'StreamStatus': 'ENABLED',
+            'StreamViewType': 'NEW_AND_OLD_IMAGES',
+            'Shards': [{'ShardId': stream.shard_id,
+                        'SequenceNumberRange': {'StartingSequenceNumber': f'{oldest:021d}'}}],
+        }}
+
+    def get_shard_iterator(self, StreamArn, ShardId, ShardIteratorType, SequenceNumber=None, **kwargs):
+        stream = self._stream(StreamArn)
+        oldest, latest = stream.bounds()
+        after = {
+            'TRIM_HORIZON': lambda: oldest - 1,
+            'LATEST': lambda: latest,
+            'AT_SEQUENCE_NUMBER': lambda: int(SequenceNumber) - 1,
+            'AFTER_SEQUENCE_NUMBER': lambda: int(SequenceNumber),
+        }[ShardIteratorType]()
+        if after < oldest - 1:
+            raise _client_error('TrimmedDataAccessException',
+                                'The requested sequence number is beyond the trim horizon', 'GetShardIterator')
+        return {'ShardIterator': f'{stream.arn}|{after}'}
+
+    def get_records(self, ShardIterator, Limit=1000, **kwargs):
+        arn, after = ShardIterator.rsplit('|', 1)
+        records = self._stream(arn).read(int(after), Limit)
+        if records:
+            after = int(records[-1]['dynamodb']['SequenceNumber'])
+        return {'Records': records, 'NextShardIterator': f'{arn}|{after}'}
+
+
+class LocalBatchWriter:
+    """Buffers writes like boto3's BatchWriter and flushes in groups of 25"""
+
+    flush_amount = 25
+
+    def __init__(self, table):
+        self._table = table
+        self._buffer = []
+
+    def put_item(self, Item):
+        self._buffer.append(('put', Item))
+        if len(self._buffer) >= self.flush_amount:
+            self._flush()
+
+    def delete_item(self, Key):
+        self._buffer.append(('delete', Key))
+        if len(self._buffer) >= self.flush_amount:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._table.write_batch(self._buffer)
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._flush()
+
+
+class LocalDynamoClient:
+    """The low-level ``dynamodb`` client's scan, query and transact_write_items
+    over a LocalDynamoResource.
+
+    Items come back as typed attribute values (``{'S': ...}``, ``{'N': ...}``),
+    as the real client returns them. Key conditions are strings of
+    ``name = :value`` clauses joined by AND.
+    """
+
+    def __init__(self, resource):
+        self.resource = resource
+
+    @staticmethod
+    def _codec():
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+        return TypeSerializer().serialize, TypeDeserializer().deserialize
+
+    def _typed(self, result, serialize):
+        result = dict(result)
+        result['Items'] = [{k: serialize(v) for k, v in item.items()} for item in result['Items']]
+        if 'LastEvaluatedKey' in result:
+            result['LastEvaluatedKey'] = {k: serialize(v) for k, v in result['LastEvaluatedKey'].items()}
+        return result
+
+    def _paging(self, kwargs, deserialize):
+        start = kwargs.pop('ExclusiveStartKey', None)
+        if start is not None:
+            kwargs['ExclusiveStartKey'] = {k: deserialize(v) for k, v in start.items()}
+        return kwargs
+
+    def scan(self, TableName, **kwargs):
+        serialize, deserialize = self._codec()
+        table = self.resource.Table(TableName)
+        return self._typed(table.scan(**self._paging(kwargs, deserialize)), serialize)
+
+    def query(self, TableName, KeyConditionExpression, ExpressionAttributeValues=None, **kwargs):
+        from boto3.dynamodb.conditions import Key
+        serialize, deserialize = self._codec()
+        names = kwargs.get('ExpressionAttributeNames') or {}
+        condition = None
+        for clause in KeyConditionExpression.split(' AND '):
+            name, value = (part.strip() for part in clause.split('='))
+            clause = Key(names.get(name, name)).eq(deserialize(ExpressionAttributeValues[value]))
+            condition = clause if condition is None else condition & clause
+        table = self.resource.Table(TableName)
+        return self._typed(table.query(condition, **self._paging(kwargs, deserialize)), serialize)
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        """Put, Update, Delete and ConditionCheck actions applied all together,
+        or none of them when any condition fails"""
+        _, deserialize = self._codec()
+        actions = []
+        for entry in TransactItems:
+            (kind, request), = entry.items()
+            table = self.resource.Table(request['TableName'])
+            values = {k: deserialize(v) for k, v in request.get('ExpressionAttributeValues', {}).items()}
+            names = request.get('ExpressionAttributeNames')
+            condition = request.get('ConditionExpression')
+            condition = _condition(condition, names, values) if condition else None
+            item = {k: deserialize(v) for k, v in (request.get('Item') or request['Key']).items()}
+            actions.append((table, kind, item, condition, request.get('UpdateExpression'), names, values))
+        tables = sorted({action[0].name: action[0] for action in actions}.items())
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for _, table in tables:
+                stack.enter_context(table._lock)
+            reasons = [{'Code': 'None'} if condition is None or evaluate(condition, table._items.get(
+                table._key(item), {})) else {'Code': 'ConditionalCheckFailed'}
+                for table, _, item, condition, *_ in actions]
+            if any(reason['Code'] != 'None' for reason in reasons):
+                from botocore.exceptions import ClientError
+                codes = ', '.join(reason['Code'] for reason in reasons)
+                error = ClientError({'Error': {'Code': 'TransactionCanceledException', 'Message':
+                                               f'Transaction cancelled, please refer cancellation reasons '
+                                               f'for specific reasons [{codes}]'},
+                                     'CancellationReasons': reasons}, 'TransactWriteItems')
+                actions[0][0]._emit('TransactWriteItems', started, 0, 0.0, 'TransactionCanceledException')
+                raise error
+            for table, kind, item, _, expression, names, values in actions:
+                key = table._key(item)
+                old = table._items.get(key)
+                if kind == 'Put':
+                    new = _to_dynamo(item)
+                elif kind == 'Update':
+                    new = dict(old) if old is not None else _to_dynamo(dict(item))
+                    _update(new, expression, names, values)
+                elif kind == 'Delete':
+                    new = None
+                else:  # ConditionCheck
+                    continue
+                if new is None:
+                    table._items.pop(key, None)
+                else:
+                    table._items[key] = new
+                if table.stream is not None:
+                    table.stream.append(old, new)
+        # Transactional writes cost two write units per KB of each item
+        capacity = sum(2.0 * max(1, math.ceil(_item_size(item) / 1024.0)) for _, _, item, *_ in actions)
+        actions[0][0]._emit('TransactWriteItems', started, len(actions), capacity, None)
+        return {}
+
+
+class _ResourceMeta:
+    def __init__(self, client):
+        self.client = client
+
+
+class LocalDynamoResource:
+    """Drop-in for ``boto3.resource('dynamodb')`` backed by LocalTable objects"""
+
+    # Shape of boto3 resources: ``resource.meta.client`` is the low-level client
+    meta = property(lambda self: _ResourceMeta(LocalDynamoClient(self)))
+
+    def __init__(self, key_schema=None, indexes=None, streams=False):
+        self.key_schema = dict(STYLANE_KEY_SCHEMA if key_schema is None else key_schema)
+        self.index_schema = dict(STYLANE_INDEXES if indexes is None else indexes)
+        self.streams = streams
+        self.tables = {}
+        self.hooks = []
+        self._lock = threading.Lock()
+
+    def Table(self, name):
+        with self._lock:
+            if name not in self.tables:
+                if name not in self.key_schema:
+                    raise _client_error('ResourceNotFoundException',
+                                        f'Requested resource not found: {name}', 'DescribeTable')
+                self.tables[name] = LocalTable(name, self.key_schema[name],
+                                               self.index_schema.get(name), self.hooks, self.streams)
+            return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for name, request in RequestItems.items():
+            responses[name] = self.Table(name).batch_get(
+                request['Keys'], request.get('ProjectionExpression'), request.get('ExpressionAttributeNames'))['Items']
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def save(self, path):
+        """Write every table to a snapshot file"""
+        with open(path, 'wb') as fh:
+            pickle.dump(self.tables, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """Restore a resource from a snapshot written by ``save``"""
+        resource = cls()
+        with open(path, 'rb') as fh:
+            resource.tables = pickle.load(fh)
+        for table in resource.tables.values():
+            table.hooks = resource.hooks
+        return resource
@@ -0,0 +1,153 @@
+"""
+Lean DynamoDB reads for the list views of app_aws.py.
+
+The boto3 resource layer returns whole items and turns every number into a
+``Decimal`` through a generic deserializer; the views then convert each
+field again with ``int()``/``float()``. List views here ask for only the
+attributes they render (``ProjectionExpression``), read through the
+low-level client and decode each typed attribute value straight into a
+``__slots__`` record with the field's Python type: about an eighth of the
+CPU and under a third of the memory per item (``benchmarks/deserialize.py``).
+
+Records read like the item dicts they replace: attribute access for
+templates, ``get`` for code written against dicts. Fields that were not
+projected are None.
+"""
+
+
+def _string(value):
+    return value.get('S')
+
+
+def _int(value):
+    number = value.get('N') or value.get('S')
+    if number is None:
+        return None
+    try:
+        return int(number)
+    except ValueError:
+        return int(float(number))
+
+
+def _float(value):
+    # Prices written by forms are strings, generated ones numbers
+    number = value.get('N') or value.get('S')
+    return float(number) if number is not None else None
+
+
+class Record:
+    """Base for typed item records.
+
+    Subclasses list FIELDS as (name, type) and may add slots of their own
+    for values the views attach (the sale's product, say).
+    """
+    __slots__ = ()
+    FIELDS = ()
+    _CONVERTERS = {str: _string, int: _int, float: _float}
+    _decoders = {}
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name, _ in self.FIELDS}
+
+    @classmethod
+    def decoder(cls, fields):
+        """Function turning a low-level item into a record with ``fields`` set"""
+        key = (cls, fields)
+        decode = Record._decoders.get(key)
+        if decode is None:
+            types = dict(cls.FIELDS)
+            converters = tuple((name, cls._CONVERTERS[types[name]]) for name in fields)
+            unset = tuple(name for name in cls.__slots__ if name not in fields)
+            new = object.__new__
+
+            def decode(item):
+                record = new(cls)
+                for name, convert in converters:
+                    value = item.get(name)
+                    setattr(record, name, None if value is None or 'NULL' in value else convert(value))
+                for name in unset:
+                    setattr(record, name, None)
+                return record
+
+            Record._decoders[key] = decode
+        return decode
+
+
+class ProductRecord(Record):
+    FIELDS = (
+        ('product_id', str), ('store_id', str), ('name', str), ('description', str), ('sku', str),
+        ('category', str), ('size', str), ('color', str), ('price', float), ('stock_quantity', int),
+        ('low_stock_threshold', int), ('image_filename', str), ('version', int),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS) + ('store',)
+
+    @property
+    def id(self):
+        return self.product_id
+
+    @property
+    def is_low_stock(self):
+        return (self.stock_quantity or 0) <= (10 if self.low_stock_threshold is None else self.low_stock_threshold)
+
+
+class SaleRecord(Record):
+    FIELDS = (
+        ('sale_id', str), ('product_id', str), ('store_id', str), ('quantity', int),
+        ('unit_price', float), ('total_amount', float), ('sale_date', str),
+    )
+    __slots__ = tuple(name for name, _ in FIELDS) + ('product', 'store')
+
+
+def _projection(fields):
+    # Placeholders for every name: 'name', 'size' and others are reserved words
+    names = {f'#{i}': field for i, field in enumerate(fields)}
+    return ', '.join(names), names
+
+
+def _pages(call, kwargs):
+    while True:
+        page = call(**kwargs)
+        yield page.get('Items', [])
+        if 'LastEvaluatedKey' not in page:
+            return
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def scan(client, table_name, record_class, fields):
+    """Every item of a table as records with only ``fields`` read"""
+    decode = record_class.decoder(fields)
+    projection, names = _projection(fields)
+    kwargs = {'TableName': table_name, 'ProjectionExpression': projection, 'ExpressionAttributeNames': names}
+    return [decode(item) for page in _pages(client.scan, kwargs) for item in page]
+
+
+def query(client, table_name, index_name, key, value, record_class, fields, limit=None, **kwargs):
+    """Items of a GSI partition (``key`` = ``value``, a string) as records.
+
+    ``limit`` stops reading once that many are in; other keyword arguments
+    (``ScanIndexForward``) go to the query as they are.
+    """
+    decode = record_class.decoder(fields)
+    projection, names = _projection(fields)
+    names['#k'] = key
+    kwargs.update({'TableName': table_name, 'IndexName': index_name, 'KeyConditionExpression': '#k = :v',
+                   'ExpressionAttributeValues': {':v': {'S': value}}, 'ProjectionExpression': projection,
+                   'ExpressionAttributeNames': names})
+    if limit is not None:
+        kwargs['Limit'] = limit
+    records = []
+    for page in _pages(client.query, kwargs):
+        records.extend(decode(item) for item in page)
+        if limit is not None and len(records) >= limit:
+            return records[:limit]
+    return records
@@ -0,0 +1,204 @@
+"""
+Faceted inventory filtering with precomputed counts (app.py).
+
+The admin inventory narrows products by category, size, color and stock
+status and shows how many products each choice leaves, e.g. "Shoes (1,203)".
+The counts come from ``product_facet_counts``, one row per store and
+combination of facet values that occurs (a few hundred rows per store, not
+one per product). SQLite triggers on ``products`` move a product between
+rows as it is inserted, deleted or changes a facet column, so every write
+path (the ORM, bulk statements, generate_data.py) keeps the counts exact
+without recounting the products table. A stock change that leaves the
+status alone touches no count row.
+
+Counts for one facet honour the filters chosen on the others (choosing
+"Shoes" narrows the sizes to shoe sizes) but not its own, so the other
+values of the chosen facet stay visible. Other databases count with a
+GROUP BY over products instead.
+"""
+from collections import OrderedDict
+
+FACETS = OrderedDict([
+    ('category', 'Category'),
+    ('size', 'Size'),
+    ('color', 'Color'),
+    ('stock_status', 'Stock Status'),
+])
+
+# Query-string value selecting products without a category, size or color
+NONE = '(none)'
+
+
+def _status_sql(row):
+    # Same rules as Product.stock_status
+    return (f"CASE WHEN {row}.stock_quantity = 0 THEN 'Out of Stock' "
+            f"WHEN {row}.stock_quantity <= {row}.low_stock_threshold THEN 'Low Stock' "
+            f"ELSE 'In Stock' END")
+
+
+def _key_sql(row):
+    """The count-row key of a products row, NULLs as '' so they group together"""
+    return (f"{row}.store_id, coalesce({row}.category, ''), coalesce({row}.size, ''), "
+            f"coalesce({row}.color, ''), {_status_sql(row)}")
+
+
+_KEY_COLUMNS = 'store_id, category, size, color, stock_status'
+
+_FACET_DDL = (
+    f"""CREATE TABLE IF NOT EXISTS product_facet_counts (
+        store_id INTEGER NOT NULL, category TEXT NOT NULL, size TEXT NOT NULL,
+        color TEXT NOT NULL, stock_status TEXT NOT NULL, count INTEGER NOT NULL,
+        PRIMARY KEY ({_KEY_COLUMNS}))""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_facets_insert AFTER INSERT ON products BEGIN
+        INSERT INTO product_facet_counts ({_KEY_COLUMNS}, count) VALUES ({_key_sql('new')}, 1)
+        ON CONFLICT ({_KEY_COLUMNS}) DO UPDATE SET count = count + 1;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS product_facets_delete AFTER DELETE ON products BEGIN
+        UPDATE product_facet_counts SET count = count - 1
+        WHERE ({_KEY_COLUMNS}) = ({_key_sql('old')});
+    END""",
+    # Fires for every sale, but only writes when the product changes row
+    f"""CREATE TRIGGER IF NOT EXISTS product_facets_update
+    AFTER UPDATE OF store_id, category, size, color, stock_quantity, low_stock_threshold ON products
+    WHEN ({_key_sql('old')}) <> ({_key_sql('new')}) BEGIN
+        UPDATE product_facet_counts SET count = count - 1
+        WHERE ({_KEY_COLUMNS}) = ({_key_sql('old')});
+        INSERT INTO product_facet_counts ({_KEY_COLUMNS}, count) VALUES ({_key_sql('new')}, 1)
+        ON CONFLICT ({_KEY_COLUMNS}) DO UPDATE SET count = count + 1;
+    END""",
+)
+
+_REBUILD = (
+    'DELETE FROM product_facet_counts',
+    f"""INSERT INTO product_facet_counts ({_KEY_COLUMNS}, count)
+        SELECT {_key_sql('p')}, count(*) FROM products AS p GROUP BY 1, 2, 3, 4, 5""",
+)
+
+
+def parse_filters(args):
+    """{facet: value} chosen in the query string; empty values mean any"""
+    return {facet: args[facet] for facet in FACETS if args.get(facet)}
+
+
+def stock_status_expression(model):
+    from sqlalchemy import case
+    return case((model.stock_quantity == 0, 'Out of Stock'),
+                (model.stock_quantity <= model.low_stock_threshold, 'Low Stock'),
+                else_='In Stock')
+
+
+def _column(model, facet):
+    return stock_status_expression(model) if facet == 'stock_status' else getattr(model, facet)
+
+
+def matches(product, filters):
+    """Whether a loaded product has every chosen facet value"""
+    for facet, value in filters.items():
+        actual = getattr(product, facet) or NONE
+        if actual != value:
+            return False
+    return True
+
+
+def _tally(rows, filters):
+    """counts() of (category, size, color, stock_status, count) rows"""
+    totals = {facet: {} for facet in FACETS}
+    for row in rows:
+        values = [value or NONE for value in row[:-1]]
+        chosen = [filters.get(facet) in (None, value) for facet, value in zip(FACETS, values)]
+        for i, facet in enumerate(FACETS):
+            if all(chosen[:i]) and all(chosen[i + 1:]):
+                totals[facet][values[i]] = totals[facet].get(values[i], 0) + row[-1]
+    return {facet: sorted(by_value.items()) for facet, by_value in totals.items()}
+
+
+def count_products(products, filters=None):
+    """Facet counts over loaded products (e.g. search matches), same rules as FacetCounts.counts"""
+    return _tally([[getattr(p, facet) for facet in FACETS] + [1] for p in products], filters or {})
+
+
+class FacetCounts:
+    """Facet counts and filters over the products table (app.py)"""
+
+    def __init__(self, db, model):
+        from sqlalchemy import event
+        self.db = db
+        self.model = model
+        self._enabled = None
+        # Created and dropped together with the products table
+        table = model.__table__
+        if not event.contains(table, 'after_create', _create_counts):
+            event.listen(table, 'after_create', _create_counts)
+            event.listen(table, 'before_drop', _drop_counts)
+
+    def enabled(self):
+        """Create the counts for a database made before they existed; False off SQLite"""
+        if self._enabled is None:
+            with self.db.engine.begin() as conn:
+                self._enabled = _create_counts(None, conn, rebuild=True)
+        return self._enabled
+
+    def rebuild(self):
+        with self.db.engine.begin() as conn:
+            for statement in _REBUILD:
+                conn.exec_driver_sql(statement)
+
+    def _rows(self, store_id):
+        """(category, size, color, stock_status, count) per combination in use"""
+        from sqlalchemy import text
+        if self.enabled():
+            where = 'WHERE store_id = :store_id' if store_id is not None else ''
+            return self.db.session.execute(text(
+                f'SELECT category, size, color, stock_status, sum(count) FROM product_facet_counts '
+                f'{where} GROUP BY category, size, color, stock_status HAVING sum(count) > 0'
+            ), {'store_id': store_id}).all()
+        from sqlalchemy import func
+        model = self.model
+        columns = [func.coalesce(_column(model, facet), '') for facet in FACETS]
+        query = self.db.session.query(*columns, func.count(model.id)).group_by(*columns)
+        if store_id is not None:
+            query = query.filter(model.store_id == store_id)
+        return query.all()
+
+    def counts(self, store_id=None, filters=None):
+        """{facet: [(value, count), ...]} by value, each facet narrowed by the
+        other facets' filters; products without a value count under NONE"""
+        return _tally(self._rows(store_id), filters or {})
+
+    def filter(self, query, filters):
+        """Narrow a Product query to the chosen facet values"""
+        from sqlalchemy import or_
+        model = self.model
+        for facet, value in filters.items():
+            column = _column(model, facet)
+            if value == NONE:
+                query = query.filter(or_(column.is_(None), column == ''))
+            else:
+                query = query.filter(column == value)
+        return query
+
+
+def _create_counts(target, connection, rebuild=False, **kw):
+    if connection.dialect.name != 'sqlite':
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'product_facets_update'").first()
+    if exists:
+        return True
+    for statement in _FACET_DDL:
+        connection.exec_driver_sql(statement)
+    if rebuild:
+        for statement in _REBUILD:
+            connection.exec_driver_sql(statement)
+    return True
+
+
+def _drop_counts(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('DROP TABLE IF EXISTS product_facet_counts')
+
+
+def init_app(app, counts):
+    """Use ``counts`` (FacetCounts) for the admin inventory facets"""
+    app.extensions['facets'] = counts
+    return counts
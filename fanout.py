@@ -0,0 +1,83 @@
+"""
+Independent reads of one view run in parallel (app_aws.py).
+
+The admin dashboard scans five tables one after another and so takes as long
+as all five together. ``gather`` runs reads like these on a shared thread
+pool, each in a copy of the request's context so the AWS call accounting and
+the request's AWS deadline (aws_clients.py) apply to them, and waits up to
+``FANOUT_TIMEOUT`` seconds or what is left of the AWS budget, whichever is
+less. A read that has not finished by then, or that failed, is left out of
+the results and named in ``missing``, and the view renders what it has.
+
+The pool has ``FANOUT_THREADS`` threads, by default the size of the boto3
+connection pool (``STYLANE_AWS_MAX_POOL``), so a process never has more
+reads in flight than it has connections for them. A read left behind at
+the deadline cannot be stopped and holds its thread until its AWS call
+returns (at most the request's AWS deadline). Reads queue for a free
+thread like any other, except while every thread is held by such abandoned
+reads: then nothing would start before the deadline, and the view's reads
+are reported missing at once, as ``busy``. ``stylane_fanout_abandoned_reads``
+counts the reads still running after their view gave up on them.
+"""
+import contextvars
+import os
+from concurrent.futures import wait
+
+from flask import current_app
+
+import aws_clients
+import metrics
+from pools import ThreadPool
+
+
+class FanOut:
+    def __init__(self, threads, timeout):
+        self.timeout = timeout
+        self.pool = ThreadPool(threads, 'stylane-fanout')
+
+    def deadline(self):
+        """Seconds the caller waits: the timeout, or less if the AWS budget is nearly spent"""
+        left = aws_clients.remaining()
+        return self.timeout if left is None else max(0.0, min(self.timeout, left))
+
+    def gather(self, view, reads):
+        """({name: result}, [missing names]) of ``reads`` ({name: callable}) run in parallel"""
+        if self.pool.abandoned >= self.pool.threads:
+            futures = dict.fromkeys(reads)
+        else:
+            futures = {name: self.pool.submit(contextvars.copy_context().run, read)
+                       for name, read in reads.items()}
+        wait([future for future in futures.values() if future is not None], timeout=self.deadline())
+        results, missing = {}, []
+        for name, future in futures.items():
+            if future is None:
+                outcome = 'busy'
+            elif not future.done():
+                outcome = 'timeout'
+                if not future.cancel():
+                    # Running: it keeps its thread until the call returns
+                    self.pool.abandon(future)
+                    metrics.FANOUT_ABANDONED.inc((view,))
+                    future.add_done_callback(lambda _: metrics.FANOUT_ABANDONED.dec((view,)))
+            elif future.exception() is not None:
+                print(f"{view}: reading {name} failed: {future.exception()}")
+                outcome = 'error'
+            else:
+                results[name] = future.result()
+                outcome = 'ok'
+            if outcome != 'ok':
+                missing.append(name)
+            metrics.FANOUT_READS.inc((view, name, outcome))
+        return results, missing
+
+
+def gather(view, reads):
+    return current_app.extensions['fanout'].gather(view, reads)
+
+
+def init_app(app):
+    """Pool for ``gather`` (``app.extensions['fanout']``)"""
+    app.config.setdefault('FANOUT_THREADS', aws_clients.settings()['max_pool_connections'])
+    app.config.setdefault('FANOUT_TIMEOUT', float(os.environ.get('STYLANE_FANOUT_TIMEOUT', 4.0)))
+    fanout = app.extensions['fanout'] = FanOut(app.config['FANOUT_THREADS'], app.config['FANOUT_TIMEOUT'])
+    return fanout
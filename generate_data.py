@@ -0,0 +1,421 @@
+"""
+Synthetic data generator for sizing StyleLane on either backend.
+
+Generates a deterministic, realistically skewed dataset (lognormal store
+sizes, Zipf product popularity, weekly seasonality, daytime peaks) and
+bulk-loads it into SQLite/SQL through SQLAlchemy Core ``executemany`` or
+into DynamoDB (or the in-process stand-in) through ``batch_writer``.
+
+Examples:
+    python generate_data.py --stores 50 --products-per-store 500 --days 365 --sales-per-day 150
+    python generate_data.py --backend dynamodb --endpoint-url http://localhost:8000
+    python generate_data.py --backend local --snapshot stylane_local.pkl
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+
+from sales_shards import shard_key
+
+# (category, product names, sizes, colors, min price, max price)
+CATALOG = [
+    ('Shirts', ['Classic White Shirt', 'Oxford Shirt', 'Linen Shirt', 'Polo Shirt', 'Flannel Shirt'],
+     ['S', 'M', 'L', 'XL'], ['White', 'Blue', 'Black', 'Pink'], 25, 90),
+    ('Pants', ['Denim Jeans', 'Slim Fit Chinos', 'Cargo Pants', 'Wool Trousers'],
+     ['30', '32', '34', '36'], ['Blue', 'Khaki', 'Olive', 'Black'], 40, 120),
+    ('Jackets', ['Leather Jacket', 'Denim Jacket', 'Bomber Jacket', 'Rain Coat'],
+     ['S', 'M', 'L', 'XL'], ['Black', 'Brown', 'Navy'], 90, 300),
+    ('Shoes', ['Running Shoes', 'Sneakers', 'Loafers', 'Chelsea Boots'],
+     ['8', '9', '10', '11'], ['White', 'Black', 'Brown'], 50, 200),
+    ('Sweaters', ['Wool Sweater', 'Hoodie', 'Cardigan', 'Turtleneck'],
+     ['S', 'M', 'L', 'XL'], ['Navy', 'Gray', 'Cream', 'Green'], 35, 130),
+    ('Accessories', ['Leather Belt', 'Wool Scarf', 'Baseball Cap', 'Canvas Tote'],
+     ['One Size'], ['Black', 'Brown', 'Red', 'Beige'], 10, 60),
+]
+
+ZIPF_EXPONENT = 1.1
+WEEKDAY_FACTOR = np.array([0.85, 0.8, 0.85, 0.95, 1.15, 1.4, 1.2])
+
+
+class SyntheticDataset:
+    """Deterministic generator for stores, users, products, sales and restocks.
+
+    Entities are numbered from 1 so the same dataset can be written with
+    integer keys (SQL) or formatted string keys (DynamoDB).
+    """
+
+    def __init__(self, stores=10, products_per_store=100, days=90, sales_per_day=50,
+                 seed=42, end=None):
+        self.n_stores = stores
+        self.products_per_store = products_per_store
+        self.days = days
+        self.sales_per_day = sales_per_day
+        self.seed = seed
+        self.end = (end or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = self.end - timedelta(days=days)
+
+        rng = np.random.default_rng(seed)
+        # Flagship stores sell far more than the long tail
+        weights = rng.lognormal(0.0, 0.75, stores)
+        self.store_weights = weights / weights.sum()
+        # Zipf popularity over product rank, shuffled so best sellers vary by store
+        ranks = np.arange(1, products_per_store + 1, dtype=np.float64)
+        popularity = ranks ** -ZIPF_EXPONENT
+        self.rank_cdf = np.cumsum(popularity) / popularity.sum()
+        self.rank_to_slot = rng.permutation(products_per_store)
+        self._product_columns(rng)
+
+    @property
+    def n_products(self):
+        return self.n_stores * self.products_per_store
+
+    def _product_columns(self, rng):
+        n = self.n_products
+        self.product_catalog = rng.integers(0, len(CATALOG), n)
+        self.product_variant = rng.integers(0, 1 << 16, n)
+        low = np.array([c[4] for c in CATALOG], dtype=np.float64)[self.product_catalog]
+        high = np.array([c[5] for c in CATALOG], dtype=np.float64)[self.product_catalog]
+        self.product_price = np.round(low + (high - low) * rng.random(n), 0) - 0.01
+        self.product_stock = rng.integers(0, 80, n)
+        self.product_threshold = rng.choice([5, 10, 15], n, p=[0.3, 0.5, 0.2])
+
+    def stores(self):
+        for i in range(1, self.n_stores + 1):
+            yield {
+                'id': i,
+                'name': f'StyleLane #{i:04d}',
+                'address': f'{100 + i} Market Street, Suite {i}, NY 100{i % 100:02d}',
+                'phone': f'555-{i % 10000:04d}',
+            }
+
+    def users(self):
+        """Admin, one manager per store and a pool of suppliers"""
+        # Hash once per password; hashing per user would dominate load time
+        admin_hash = generate_password_hash('admin123')
+        manager_hash = generate_password_hash('store123')
+        supplier_hash = generate_password_hash('supplier123')
+        yield {'username': 'admin', 'email': 'admin@stylane.com', 'role': 'admin',
+               'password_hash': admin_hash, 'store_id': None}
+        for i in range(1, self.n_stores + 1):
+            yield {'username': f'storemanager{i}', 'email': f'manager{i}@stylane.com',
+                   'role': 'store_manager', 'password_hash': manager_hash, 'store_id': i}
+        for i in range(1, max(2, self.n_stores // 10) + 1):
+            yield {'username': f'supplier{i}', 'email': f'supplier{i}@fashion.com',
+                   'role': 'supplier', 'password_hash': supplier_hash, 'store_id': None}
+
+    def products(self):
+        for i in range(self.n_products):
+            category, names, sizes, colors = CATALOG[self.product_catalog[i]][:4]
+            variant = int(self.product_variant[i])
+            name = names[variant % len(names)]
+            yield {
+                'id': i + 1,
+                'store_id': i // self.products_per_store + 1,
+                'name': name,
+                'description': f'{name} from the {category.lower()} collection',
+                'category': category,
+                'size': sizes[variant % len(sizes)],
+                'color': colors[(variant // 7) % len(colors)],
+                'sku': f'{category[:4].upper()}-{i // self.products_per_store + 1:04d}-{i + 1:08d}',
+                'price': float(self.product_price[i]),
+                'stock_quantity': int(self.product_stock[i]),
+                'low_stock_threshold': int(self.product_threshold[i]),
+            }
+
+    def sales_chunks(self, chunk_days=30):
+        """Yield sales as dicts of NumPy columns, one chunk of days at a time"""
+        for first_day in range(0, self.days, chunk_days):
+            # Each chunk has its own stream so chunks can be generated independently
+            rng = np.random.default_rng([self.seed, first_day])
+            n_days = min(chunk_days, self.days - first_day)
+            day_index = np.arange(first_day, first_day + n_days)
+            weekday = (self.start.weekday() + day_index) % 7
+            expected = self.sales_per_day * self.n_stores * WEEKDAY_FACTOR[weekday]
+            per_day = rng.poisson(expected)
+            total = int(per_day.sum())
+            if not total:
+                continue
+
+            day = np.repeat(day_index, per_day)
+            store = rng.choice(self.n_stores, total, p=self.store_weights)
+            rank = np.searchsorted(self.rank_cdf, rng.random(total))
+            slot = (self.rank_to_slot[rank] + store * 7) % self.products_per_store
+            product = store * self.products_per_store + slot
+            quantity = np.minimum(rng.geometric(0.65, total), 6)
+            # Trading hours 09:00-21:00, peaking mid-afternoon
+            seconds = np.clip(rng.normal(14.5 * 3600, 3 * 3600, total), 9 * 3600, 21 * 3600 - 1)
+            offsets = day.astype('timedelta64[D]').astype('timedelta64[s]') + \
+                seconds.astype('timedelta64[s]')
+            unit_price = self.product_price[product]
+            yield {
+                'product_id': product + 1,
+                'store_id': store + 1,
+                'quantity': quantity,
+                'unit_price': unit_price,
+                'total_amount': np.round(unit_price * quantity, 2),
+                'sale_date': np.datetime64(self.start, 's') + offsets,
+            }
+
+    def restock_requests(self):
+        """A pending request for low-stock products; every fifth is already approved"""
+        low = np.flatnonzero(self.product_stock <= self.product_threshold)
+        for n, i in enumerate(low, start=1):
+            store_id = int(i) // self.products_per_store + 1
+            yield {
+                'id': n,
+                'store_id': store_id,
+                'product_id': int(i) + 1,
+                'requested_quantity': int(self.product_threshold[i]) * 3,
+                'status': 'approved' if n % 5 == 0 else 'pending',
+                'manager_index': store_id,
+                'notes': 'Generated restock request',
+            }
+
+
+class Throughput:
+    """Accumulates row counts and elapsed time per table"""
+
+    def __init__(self):
+        self.tables = {}
+        self.started = time.perf_counter()
+
+    def add(self, table, rows, elapsed):
+        count, total = self.tables.get(table, (0, 0.0))
+        self.tables[table] = (count + rows, total + elapsed)
+
+    def report(self, out=sys.stdout):
+        elapsed = time.perf_counter() - self.started
+        rows = 0
+        for table, (count, spent) in self.tables.items():
+            rows += count
+            rate = count / spent if spent else 0
+            print(f'  {table:<20} {count:>12,} rows  {spent:8.2f}s  {rate:>12,.0f} rows/sec', file=out)
+        print(f'  {"total":<20} {rows:>12,} rows  {elapsed:8.2f}s  '
+              f'{rows / elapsed if elapsed else 0:>12,.0f} rows/sec', file=out)
+
+
+def _timed(stats, table, write, rows):
+    started = time.perf_counter()
+    write(rows)
+    stats.add(table, len(rows), time.perf_counter() - started)
+
+
+# ==================== SQL BACKEND ====================
+
+def write_sql(dataset, database_url=None, progress=True):
+    """Recreate the schema and bulk-load the dataset with Core executemany"""
+    from app import create_app, db
+    from models import User, Store, Product, Sale, RestockRequest, Shipment
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': database_url} if database_url else None)
+    stats = Throughput()
+    now = datetime.utcnow()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        with db.engine.begin() as conn:
+            if conn.dialect.name == 'sqlite':
+                conn.exec_driver_sql('PRAGMA synchronous = OFF')
+
+            def insert(table):
+                return lambda rows: conn.execute(table.__table__.insert(), rows)
+
+            _timed(stats, 'stores', insert(Store),
+                   [dict(s, created_at=now) for s in dataset.stores()])
+            users = [dict(u, id=n, created_at=now, is_active=True)
+                     for n, u in enumerate(dataset.users(), start=1)]
+            _timed(stats, 'users', insert(User), users)
+            _timed(stats, 'products', insert(Product),
+                   [dict(p, created_at=now, updated_at=now) for p in dataset.products()])
+
+            for chunk in dataset.sales_chunks():
+                rows = [
+                    {'product_id': p, 'store_id': s, 'quantity': q, 'unit_price': u,
+                     'total_amount': t, 'sale_date': d}
+                    for p, s, q, u, t, d in zip(
+                        chunk['product_id'].tolist(), chunk['store_id'].tolist(),
+                        chunk['quantity'].tolist(), chunk['unit_price'].tolist(),
+                        chunk['total_amount'].tolist(), chunk['sale_date'].tolist())
+                ]
+                _timed(stats, 'sales', insert(Sale), rows)
+                if progress:
+                    print(f'  ... {stats.tables["sales"][0]:,} sales', file=sys.stderr)
+
+            # Store managers are users 2..n_stores+1, suppliers follow them
+            first_supplier = dataset.n_stores + 2
+            requests, shipments = [], []
+            for r in dataset.restock_requests():
+                supplier = first_supplier if r['status'] == 'approved' else None
+                requests.append({
+                    'id': r['id'], 'store_id': r['store_id'], 'product_id': r['product_id'],
+                    'requested_quantity': r['requested_quantity'], 'status': r['status'],
+                    'supplier_id': supplier, 'requested_by': r['manager_index'] + 1,
+                    'notes': r['notes'], 'created_at': now, 'updated_at': now,
+                })
+                if supplier:
+                    shipments.append({
+                        'restock_request_id': r['id'], 'supplier_id': supplier,
+                        'status': 'preparing', 'tracking_number': f'TRK{r["id"]:09d}',
+                        'expected_delivery_date': now + timedelta(days=7),
+                        'notes': 'Generated shipment', 'created_at': now, 'updated_at': now,
+                    })
+            if requests:
+                _timed(stats, 'restock_requests', insert(RestockRequest), requests)
+            if shipments:
+                _timed(stats, 'shipments', insert(Shipment), shipments)
+    return stats
+
+
+# ==================== DYNAMODB BACKEND ====================
+
+def _store_key(i):
+    return f'store-{i:05d}'
+
+
+def _product_key(i):
+    return f'prod-{i:08d}'
+
+
+def _money(value):
+    return Decimal(f'{value:.2f}')
+
+
+def _put_all(table, items):
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.put_item(Item=item)
+
+
+def write_dynamodb(dataset, make_resource, workers=4, progress=True, sales_shards=1):
+    """Fill the StyleLane tables through batch_writer.
+
+    ``make_resource`` returns a DynamoDB resource; it is called once per
+    worker thread because boto3 resources must not be shared across threads.
+    Sales are spread over ``sales_shards`` store shards (see sales_shards.py).
+    """
+    stats = Throughput()
+    now = datetime.utcnow().isoformat()
+    resource = make_resource()
+
+    stores = [{'store_id': _store_key(s['id']), 'name': s['name'], 'address': s['address'],
+               'phone': s['phone'], 'created_at': now} for s in dataset.stores()]
+    _timed(stats, 'stores', lambda rows: _put_all(resource.Table('StyleLaneStores'), rows), stores)
+
+    users = [{'username': u['username'], 'email': u['email'], 'role': u['role'],
+              'password_hash': u['password_hash'],
+              'store_id': _store_key(u['store_id']) if u['store_id'] else None,
+              'created_at': now} for u in dataset.users()]
+    _timed(stats, 'users', lambda rows: _put_all(resource.Table('StyleLaneUsers'), rows), users)
+
+    products = []
+    for p in dataset.products():
+        p['product_id'] = _product_key(p.pop('id'))
+        p['store_id'] = _store_key(p['store_id'])
+        p['price'] = _money(p['price'])
+        products.append(dict(p, image_filename=None, created_at=now))
+    _timed(stats, 'products', lambda rows: _put_all(resource.Table('StyleLaneProducts'), rows), products)
+
+    def load_chunk(args):
+        offset, chunk = args
+        table = make_resource().Table('StyleLaneSales')
+        items = [
+            {'sale_id': f'sale-{offset + n:010d}', 'product_id': _product_key(p),
+             'store_id': _store_key(s), 'quantity': q, 'unit_price': _money(u),
+             'total_amount': _money(t), 'sale_date': d.isoformat()}
+            for n, (p, s, q, u, t, d) in enumerate(zip(
+                chunk['product_id'].tolist(), chunk['store_id'].tolist(),
+                chunk['quantity'].tolist(), chunk['unit_price'].tolist(),
+                chunk['total_amount'].tolist(), chunk['sale_date'].tolist()))
+        ]
+        for item in items:
+            item['store_shard'] = shard_key(item['store_id'], item['sale_id'], sales_shards)
+        _put_all(table, items)
+        return len(items)
+
+    def numbered_chunks():
+        offset = 1
+        for chunk in dataset.sales_chunks():
+            yield offset, chunk
+            offset += len(chunk['product_id'])
+
+    started = time.perf_counter()
+    loaded = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rows in pool.map(load_chunk, numbered_chunks()):
+            loaded += rows
+            if progress:
+                print(f'  ... {loaded:,} sales', file=sys.stderr)
+    # Workers overlap, so throughput is measured on wall-clock time
+    stats.add('sales', loaded, time.perf_counter() - started)
+
+    requests = []
+    for r in dataset.restock_requests():
+        requests.append({
+            'restock_request_id': f'restock-{r["id"]:08d}', 'store_id': _store_key(r['store_id']),
+            'product_id': _product_key(r['product_id']), 'requested_quantity': r['requested_quantity'],
+            'status': r['status'], 'requested_by': f'storemanager{r["manager_index"]}',
+            'supplier_id': 'supplier1' if r['status'] == 'approved' else None,
+            'notes': r['notes'], 'created_at': now,
+        })
+    if requests:
+        _timed(stats, 'restock_requests',
+               lambda rows: _put_all(resource.Table('StyleLaneRestockRequests'), rows), requests)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic StyleLane dataset.')
+    parser.add_argument('--backend', choices=['sql', 'dynamodb', 'local'], default='sql',
+                        help='sql (app.py), dynamodb (app_aws.py) or local (in-process stand-in)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stores', type=int, default=10)
+    parser.add_argument('--products-per-store', type=int, default=100)
+    parser.add_argument('--days', type=int, default=90, help='days of sales history')
+    parser.add_argument('--sales-per-day', type=int, default=50, help='average sales per store per day')
+    parser.add_argument('--database-url', help='SQLAlchemy URL (defaults to the app configuration)')
+    parser.add_argument('--endpoint-url', help='DynamoDB endpoint, e.g. http://localhost:8000')
+    parser.add_argument('--region', default='us-east-1')
+    parser.add_argument('--workers', type=int, default=4, help='parallel DynamoDB sales writers')
+    parser.add_argument('--sales-shards', type=int, default=1, help='store shards of the sales key')
+    parser.add_argument('--snapshot', default='stylane_local.pkl',
+                        help='file the local stand-in is saved to')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    dataset = SyntheticDataset(stores=args.stores, products_per_store=args.products_per_store,
+                               days=args.days, sales_per_day=args.sales_per_day, seed=args.seed)
+    expected = args.stores * args.days * args.sales_per_day
+    print(f'Generating ~{expected:,} sales for {args.stores} stores x '
+          f'{args.products_per_store} products over {args.days} days (seed {args.seed})')
+
+    if args.backend == 'sql':
+        stats = write_sql(dataset, args.database_url, progress=not args.quiet)
+    elif args.backend == 'dynamodb':
+        import boto3
+
+        def make_resource():
+            return boto3.session.Session().resource(
+                'dynamodb', region_name=args.region, endpoint_url=args.endpoint_url)
+        stats = write_dynamodb(dataset, make_resource, args.workers, progress=not args.quiet,
+                               sales_shards=args.sales_shards)
+    else:
+        from dynamo_local import LocalDynamoResource
+        resource = LocalDynamoResource()
+        stats = write_dynamodb(dataset, lambda: resource, args.workers, progress=not args.quiet,
+                               sales_shards=args.sales_shards)
+        resource.save(args.snapshot)
+        print(f'Local DynamoDB snapshot written to {args.snapshot}')
+
+    print('Done.')
+    stats.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Idempotency keys for sale and restock submissions (both apps).
+
+A client sends a key it generated with a write, in the ``Idempotency-Key``
+header or an ``idempotency_key`` form/JSON field; the forms render a fresh
+one each time they are shown. The first request with a key claims it with
+a conditional write: an INSERT against the primary key of
+``idempotency_keys`` (app.py, ``SqlKeyStore``) or a PutItem with
+``attribute_not_exists`` on StyleLaneIdempotency (app_aws.py,
+``DynamoKeyStore``). It runs the view and stores the response (status,
+body, redirect target and flashed messages); a retry with the same key gets
+that response back, marked ``Idempotent-Replayed: true``, and the view does
+not run again. So a double-clicked till or a proxy retry records one sale.
+
+A retry arriving while the first request still runs gets 409 with
+Retry-After; a key reused for a different request (other form values) gets
+422. Keys are scoped to the user and endpoint and stored as a hash. A claim
+is a lease of ``IDEMPOTENCY_LEASE_SECONDS``, so the key of a worker that
+died mid-request can be claimed again; views that raise, answer 5xx or
+answer with Retry-After (nothing done, try again) release their key.
+Responses are kept for ``IDEMPOTENCY_TTL`` seconds (default a day):
+expired rows are purged by the ``purge_idempotency_keys`` job in SQL and
+by DynamoDB TTL on ``expires_at``.
+"""
+import functools
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Response, current_app, flash, jsonify, request, session
+
+import metrics
+
+HEADER = 'Idempotency-Key'
+FIELD = 'idempotency_key'
+MAX_KEY_LENGTH = 255
+
+
+def _hash(*parts):
+    return hashlib.sha256('\0'.join(parts).encode()).hexdigest()[:32]
+
+
+def _fingerprint():
+    """Hash of what the request asks for, to catch a key reused for another"""
+    digest = hashlib.sha256(f'{request.method} {request.full_path}'.encode())
+    if request.form:
+        for name, value in sorted(request.form.items(multi=True)):
+            if name != FIELD:
+                digest.update(f'\0{name}={value}'.encode())
+    else:
+        digest.update(request.get_data())
+    return digest.hexdigest()[:32]
+
+
+def _request_key():
+    key = request.headers.get(HEADER) or request.form.get(FIELD)
+    if not key and request.is_json:
+        key = (request.get_json(silent=True) or {}).get(FIELD)
+    return key
+
+
+# ==================== STORES ====================
+
+class SqlKeyStore:
+    """Rows in ``idempotency_keys``: claimed by INSERT, taken over once expired"""
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self._created = False
+
+    def _table(self):
+        table = self.model.__table__
+        if not self._created:
+            # Databases created before idempotency_keys existed
+            table.create(self.db.engine, checkfirst=True)
+            self._created = True
+        return table
+
+    def claim(self, key, fingerprint, lease):
+        """None when the key is now ours, else its (fingerprint, response)"""
+        from sqlalchemy.exc import IntegrityError
+        table = self._table()
+        now = datetime.utcnow()
+        values = dict(fingerprint=fingerprint, response=None, expires_at=now + timedelta(seconds=lease))
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(table.insert().values(key=key, **values))
+            return None
+        except IntegrityError:
+            pass
+        with self.db.engine.begin() as conn:
+            taken = conn.execute(table.update().where(
+                table.c.key == key, table.c.expires_at < now
+            ).values(**values)).rowcount
+            if taken:
+                return None
+            row = conn.execute(table.select().where(table.c.key == key)).first()
+        if row is None:
+            return self.claim(key, fingerprint, lease)  # purged in between
+        return row.fingerprint, json.loads(row.response) if row.response else None
+
+    def complete(self, key, response, ttl):
+        table = self._table()
+        with self.db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.key == key).values(
+                response=json.dumps(response), expires_at=datetime.utcnow() + timedelta(seconds=ttl)))
+
+    def release(self, key):
+        table = self._table()
+        with self.db.engine.begin() as conn:
+            conn.execute(table.delete().where(table.c.key == key, table.c.response.is_(None)))
+
+    def purge(self):
+        """Delete expired keys; returns how many"""
+        table = self._table()
+        with self.db.engine.begin() as conn:
+            return conn.execute(table.delete().where(table.c.expires_at < datetime.utcnow())).rowcount
+
+
+class DynamoKeyStore:
+    """Items in StyleLaneIdempotency, removed by DynamoDB TTL on ``expires_at``"""
+
+    def __init__(self, get_table):
+        self.get_table = get_table
+
+    def claim(self, key, fingerprint, lease):
+        from boto3.dynamodb.conditions import Attr
+        from botocore.exceptions import ClientError
+        table = self.get_table()
+        now = int(time.time())
+        try:
+            # TTL deletes lag expiry by up to days, so an expired item counts as absent
+            table.put_item(
+                Item={'idempotency_key': key, 'fingerprint': fingerprint, 'expires_at': now + int(lease)},
+                ConditionExpression=Attr('idempotency_key').not_exists() | Attr('expires_at').lt(now))
+            return None
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+        item = table.get_item(Key={'idempotency_key': key}, ConsistentRead=True).get('Item')
+        if item is None:
+            return self.claim(key, fingerprint, lease)
+        response = item.get('response')
+        return item.get('fingerprint'), json.loads(response) if response else None
+
+    def complete(self, key, response, ttl):
+        self.get_table().update_item(
+            Key={'idempotency_key': key}, UpdateExpression='SET #r = :r, expires_at = :e',
+            ExpressionAttributeNames={'#r': 'response'},
+            ExpressionAttributeValues={':r': json.dumps(response), ':e': int(time.time()) + int(ttl)})
+
+    def release(self, key):
+        from boto3.dynamodb.conditions import Attr
+        from botocore.exceptions import ClientError
+        try:
+            self.get_table().delete_item(Key={'idempotency_key': key},
+                                         ConditionExpression=Attr('response').not_exists())
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+
+# ==================== VIEWS ====================
+
+def _replay(stored):
+    for category, message in stored.get('flashes', ()):
+        flash(message, category)
+    response = Response(stored['body'], stored['status'], mimetype=stored['mimetype'])
+    if stored.get('location'):
+        response.headers['Location'] = stored['location']
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """Run ``view`` at most once per idempotency key sent with the request.
+
+    Requests without a key run as before. Goes below the login and role
+    decorators, since keys are scoped to the signed-in user.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = _request_key()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{HEADER} is longer than {MAX_KEY_LENGTH} characters'}), 400
+        app = current_app
+        store, scope = app.extensions['idempotency']
+        scoped = _hash(str(scope()), request.endpoint, key)
+        fingerprint = _fingerprint()
+
+        existing = store.claim(scoped, fingerprint, app.config['IDEMPOTENCY_LEASE_SECONDS'])
+        if existing is not None:
+            stored_fingerprint, stored = existing
+            if stored_fingerprint != fingerprint:
+                metrics.IDEMPOTENT_REQUESTS.inc(('mismatch',))
+                return jsonify({'error': f'{HEADER} was already used for a different request'}), 422
+            if stored is None:
+                metrics.IDEMPOTENT_REQUESTS.inc(('in_progress',))
+                response = jsonify({'error': 'a request with this idempotency key is still being processed'})
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+            metrics.IDEMPOTENT_REQUESTS.inc(('replayed',))
+            return _replay(stored)
+
+        flashed = len(session.get('_flashes', ()))
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except Exception:
+            store.release(scoped)
+            raise
+        if response.status_code >= 500 or response.is_streamed or 'Retry-After' in response.headers:
+            store.release(scoped)
+            return response
+        store.complete(scoped, {
+            'status': response.status_code, 'mimetype': response.mimetype,
+            'body': response.get_data(as_text=True), 'location': response.headers.get('Location'),
+            'flashes': [list(f) for f in session.get('_flashes', ())[flashed:]],
+        }, app.config['IDEMPOTENCY_TTL'])
+        metrics.IDEMPOTENT_REQUESTS.inc(('executed',))
+        return response
+    return wrapper
+
+
+def init_app(app, store, scope):
+    """Keep claimed keys in ``store``; ``scope()`` names the signed-in user.
+
+    Adds ``idempotency_key()`` for forms to render into a hidden field, and
+    a purge job when the store needs one (call after scheduler.init_app).
+    """
+    app.config.setdefault('IDEMPOTENCY_TTL', 24 * 3600)
+    app.config.setdefault('IDEMPOTENCY_LEASE_SECONDS', 60)
+    app.extensions['idempotency'] = (store, scope)
+    app.jinja_env.globals['idempotency_key'] = lambda: uuid.uuid4().hex
+    if hasattr(store, 'purge') and 'scheduler' in app.extensions:
+        app.extensions['scheduler'].add('purge_idempotency_keys', store.purge, every=3600, jitter=300, timeout=600)
+    return store
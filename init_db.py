@@ -1,12 +1,13 @@
 """
 Database initialization script with sample data
 """
-from app import app, db
+from app import create_app, db
 from models import User, Store, Product, Sale, RestockRequest, Shipment
 from datetime import datetime, timedelta
 
 def init_database():
     """Initialize database with sample data"""
+    app = create_app()
     with app.app_context():
         # Drop all tables and recreate
         db.drop_all()
@@ -0,0 +1,461 @@
+"""
+Prometheus-style runtime metrics for app.py and app_aws.py.
+
+Counters, gauges and histograms are recorded into per-thread shards, so the
+request path never takes a lock; shards are merged only when scraped. With
+``METRICS_DIR`` set (e.g. one directory shared by all gunicorn workers),
+every process periodically writes its snapshot there and ``/metrics`` merges
+the snapshots of all processes.
+"""
+import atexit
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+import weakref
+
+from flask import Response
+from jinja2.utils import LRUCache
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+_REQUEST_KEY = 'stylane.metrics.request'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+
+
+def _fold(total, values):
+    """Add a shard's values into ``total`` (numbers, or lists of numbers added element-wise)"""
+    for key, value in dict(values).items():
+        current = total.get(key)
+        if current is None:
+            total[key] = list(value) if isinstance(value, list) else value
+        elif isinstance(value, list):
+            total[key] = [a + b for a, b in zip(current, value)]
+        else:
+            total[key] = current + value
+
+
+class Registry:
+    """Metric definitions plus one value shard per recording thread.
+
+    A thread's shard lives as long as the thread: once it has exited, its
+    values are folded into one per-process total, so a server starting a
+    thread per request does not pile up shards.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.composites = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []  # (weak reference to the thread, its values)
+        self._finished = {}  # values of threads that have exited
+
+    def shard(self):
+        """This thread's value dict, keyed by (metric name, label values)"""
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._retire_finished()
+                self._shards.append((weakref.ref(threading.current_thread()), values))
+            return values
+
+    def _retire_finished(self):
+        # Caller holds _lock; a finished thread no longer writes to its shard
+        live = []
+        for ref, values in self._shards:
+            thread = ref()
+            if thread is None or not thread.is_alive():
+                _fold(self._finished, values)
+            else:
+                live.append((ref, values))
+        self._shards = live
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(self, name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(self, name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(self, name, help, labels, buckets))
+
+    def reset(self):
+        with self._lock:
+            for _, values in self._shards:
+                values.clear()
+            self._finished = {}
+
+    def snapshot(self):
+        """{name: {label values: value}} merged across this process's threads"""
+        with self._lock:
+            self._retire_finished()
+            # _fold replaces the values it changes, so a shallow copy is stable
+            shards = [values for _, values in self._shards] + [dict(self._finished)]
+        merged = {}
+        for values in shards:
+            # dict() copies at C level, so a concurrent insert cannot break it
+            for (name, labels), value in dict(values).items():
+                composite = self.composites.get(name)
+                samples = composite.expand(labels, value) if composite else [(name, labels, value)]
+                for name, labels, value in samples:
+                    by_labels = merged.setdefault(name, {})
+                    by_labels[labels] = self.metrics[name].merge(by_labels.get(labels), value)
+        return merged
+
+
+class Counter:
+    """Monotonic counter"""
+    kind = 'counter'
+
+    def __init__(self, registry, name, help, labels=()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+
+    def inc(self, labels=(), amount=1):
+        values = self.registry.shard()
+        key = (self.name, labels)
+        values[key] = values.get(key, 0) + amount
+
+    def merge(self, current, value):
+        return value if current is None else current + value
+
+    def render(self, labels, value):
+        return [f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}']
+
+
+class Gauge(Counter):
+    """Value that goes up and down; merged by summing (e.g. in-flight requests)"""
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    """Fixed-bucket histogram; stored as per-bucket counts followed by the sum"""
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        values = self.registry.shard()
+        key = (self.name, labels)
+        counts = values.get(key)
+        if counts is None:
+            counts = values[key] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def merge(self, current, value):
+        if current is None:
+            return list(value)
+        return [a + b for a, b in zip(current, value)]
+
+    def render(self, labels, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), value[:-1]):
+            cumulative += count
+            le = bound if isinstance(bound, str) else _format_value(bound)
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels + ("le",), labels + (le,))} {cumulative}')
+        label_text = _format_labels(self.labels, labels)
+        lines.append(f'{self.name}_sum{label_text} {_format_value(value[-1])}')
+        lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+# ==================== METRICS ====================
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'stylane_http_requests_total', 'HTTP requests by endpoint and status', ('method', 'endpoint', 'status'))
+HTTP_LATENCY = REGISTRY.histogram(
+    'stylane_http_request_duration_seconds', 'Request latency', ('endpoint',), LATENCY_BUCKETS)
+HTTP_RESPONSE_SIZE = REGISTRY.histogram(
+    'stylane_http_response_size_bytes', 'Response body size', ('endpoint',), SIZE_BUCKETS)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'stylane_http_requests_in_flight', 'Requests currently being served')
+CACHE_REQUESTS = REGISTRY.counter(
+    'stylane_cache_requests_total', 'Cache lookups by cache and result (hit/miss)', ('cache', 'result'))
+DB_QUERIES = REGISTRY.counter(
+    'stylane_db_queries_total', 'SQL statements executed', ('endpoint',))
+DB_QUERY_SECONDS = REGISTRY.counter(
+    'stylane_db_query_seconds_total', 'Time spent executing SQL statements', ('endpoint',))
+AWS_CALLS = REGISTRY.counter(
+    'stylane_aws_calls_total', 'AWS API calls', ('operation', 'table'))
+AWS_CALL_ERRORS = REGISTRY.counter(
+    'stylane_aws_call_errors_total', 'AWS API calls that failed', ('operation', 'table'))
+AWS_CAPACITY = REGISTRY.counter(
+    'stylane_aws_consumed_capacity_total', 'DynamoDB capacity units consumed', ('operation', 'table'))
+JOB_RUNS = REGISTRY.counter(
+    'stylane_job_runs_total', 'Scheduled job runs by outcome', ('job', 'outcome'))
+JOB_DURATION = REGISTRY.histogram(
+    'stylane_job_duration_seconds', 'Scheduled job run time', ('job',), JOB_BUCKETS)
+LOW_STOCK_EVENTS = REGISTRY.counter(
+    'stylane_low_stock_events_total', 'Products processed by the restock worker, by outcome', ('outcome',))
+CDC_RECORDS = REGISTRY.counter(
+    'stylane_cdc_records_total', 'Stream change records handled by the CDC consumer', ('table', 'outcome'))
+IDEMPOTENT_REQUESTS = REGISTRY.counter(
+    'stylane_idempotent_requests_total', 'Requests sent with an idempotency key, by outcome', ('outcome',))
+LOGIN_ATTEMPTS = REGISTRY.counter(
+    'stylane_login_attempts_total', 'Login attempts: success, failure or throttled', ('outcome',))
+FANOUT_READS = REGISTRY.counter(
+    'stylane_fanout_reads_total', 'Parallel reads of a view: ok, timeout, error or busy (all threads abandoned)',
+    ('view', 'read', 'outcome'))
+FANOUT_ABANDONED = REGISTRY.gauge(
+    'stylane_fanout_abandoned_reads', 'Parallel reads past their view\'s deadline, still holding a thread', ('view',))
+
+
+def record_cache(cache, hit):
+    """Count a cache lookup; the hit ratio is hits / (hits + misses)"""
+    CACHE_REQUESTS.inc((cache, 'hit' if hit else 'miss'))
+
+
+class RequestRecord:
+    """Compact per-(method, endpoint, status) record behind the three HTTP
+    metrics, so a finished request costs one dict lookup: the count, then
+    latency bucket counts and sum, then size bucket counts and sum"""
+    name = 'stylane_http_request_record'
+    latency_slots = len(LATENCY_BUCKETS) + 2
+
+    def expand(self, labels, value):
+        split = 1 + self.latency_slots
+        return [
+            (HTTP_REQUESTS.name, labels, value[0]),
+            (HTTP_LATENCY.name, labels[1:2], value[1:split]),
+            (HTTP_RESPONSE_SIZE.name, labels[1:2], value[split:]),
+        ]
+
+
+REGISTRY.composites[RequestRecord.name] = RequestRecord()
+_RECORD_SIZE = 1 + RequestRecord.latency_slots + len(SIZE_BUCKETS) + 2
+_SIZE_OFFSET = 1 + RequestRecord.latency_slots
+
+
+def record_request(method, endpoint, status, seconds, size):
+    """Record one finished request"""
+    values = REGISTRY.shard()
+    key = (RequestRecord.name, (method, endpoint, status))
+    record = values.get(key)
+    if record is None:
+        record = values[key] = [0] * _RECORD_SIZE
+    record[0] += 1
+    record[1 + bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    record[_SIZE_OFFSET - 1] += seconds
+    record[_SIZE_OFFSET + bisect.bisect_left(SIZE_BUCKETS, size)] += 1
+    record[-1] += size
+
+
+_IN_FLIGHT = (HTTP_IN_FLIGHT.name, ())
+
+
+# ==================== MULTI-PROCESS ====================
+
+def write_snapshot(directory, registry=REGISTRY):
+    """Atomically write this process's merged values to ``directory``"""
+    samples = [[name, list(labels), value]
+               for name, by_labels in registry.snapshot().items()
+               for labels, value in by_labels.items()]
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as fh:
+        json.dump({'pid': os.getpid(), 'samples': samples}, fh)
+    os.replace(tmp, path)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect(directory=None, registry=REGISTRY):
+    """Merged values of this process and, if given, every process in ``directory``"""
+    if not directory:
+        return registry.snapshot()
+    write_snapshot(directory, registry)
+    merged = {}
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        try:
+            with open(path) as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        alive = _pid_alive(data['pid'])
+        for name, labels, value in data['samples']:
+            metric = registry.metrics.get(name)
+            # Counters of exited workers still count; their gauges do not
+            if metric is None or (metric.kind == 'gauge' and not alive):
+                continue
+            samples = merged.setdefault(name, {})
+            labels = tuple(labels)
+            samples[labels] = metric.merge(samples.get(labels), value)
+    return merged
+
+
+def render(values, registry=REGISTRY):
+    """Prometheus text exposition format"""
+    lines = []
+    for name, metric in registry.metrics.items():
+        lines.append(f'# HELP {name} {metric.help}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, value in sorted(values.get(name, {}).items()):
+            lines.extend(metric.render(labels, value))
+    return '\n'.join(lines) + '\n'
+
+
+# ==================== FLASK ====================
+
+class _CountingTemplateCache(LRUCache):
+    """Jinja template cache that records hits and misses"""
+
+    def get(self, key, default=None):
+        value = super().get(key, default)
+        record_cache('templates', value is not None)
+        return value
+
+
+class _RequestMixin:
+    """Keeps the Flask request in the WSGI environ so the middleware can
+    read its endpoint without a before/after_request hook pair"""
+
+    def __init__(self, environ, *args, **kwargs):
+        super().__init__(environ, *args, **kwargs)
+        environ[_REQUEST_KEY] = self
+
+
+class _StreamedBody:
+    """Body of a response without Content-Length (a streamed page): its
+    size and latency are recorded once the server has sent all of it"""
+
+    def __init__(self, body, finish):
+        self.body = body
+        self.finish = finish
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.body:
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            self.finish(self.size)
+
+
+class MetricsMiddleware:
+    """WSGI middleware recording latency, size, status and in-flight requests"""
+
+    def __init__(self, wsgi_app, directory=None, flush_seconds=5):
+        self.wsgi_app = wsgi_app
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._flushed = time.perf_counter()
+
+    def __call__(self, environ, start_response):
+        captured = []
+
+        def _start_response(status, headers, exc_info=None):
+            captured.append(status)
+            captured.append(headers)
+            return start_response(status, headers, exc_info)
+
+        values = REGISTRY.shard()
+        values[_IN_FLIGHT] = values.get(_IN_FLIGHT, 0) + 1
+        started = time.perf_counter()
+
+        def finish(size=None):
+            elapsed = time.perf_counter() - started
+            # The shard of the thread that started the request
+            values[_IN_FLIGHT] -= 1
+            req = environ.get(_REQUEST_KEY)
+            rule = req.url_rule if req is not None else None
+            if captured:
+                status = captured[0][:3]
+                if size is None:
+                    size = next((int(value) for name, value in captured[1] if name == 'Content-Length'), 0)
+            else:
+                status = '500'
+            record_request(environ.get('REQUEST_METHOD', ''), rule.endpoint if rule else 'unknown',
+                           status, elapsed, size or 0)
+            if self.directory and started - self._flushed >= self.flush_seconds:
+                self._flushed = started
+                write_snapshot(self.directory)
+
+        try:
+            body = self.wsgi_app(environ, _start_response)
+        except BaseException:
+            finish()
+            raise
+        if captured and not any(name == 'Content-Length' for name, _ in captured[1]):
+            return _StreamedBody(body, finish)
+        finish()
+        return body
+
+
+def init_app(app):
+    """Record request metrics and serve them at ``/metrics``.
+
+    ``METRICS_DIR`` (default: the ``STYLANE_METRICS_DIR`` environment
+    variable) enables multi-process mode; each process flushes its values
+    there at most every ``METRICS_FLUSH_SECONDS`` (default 5).
+    """
+    app.config.setdefault('METRICS_DIR', os.environ.get('STYLANE_METRICS_DIR'))
+    app.config.setdefault('METRICS_FLUSH_SECONDS', 5)
+    directory = app.config['METRICS_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        atexit.register(write_snapshot, directory)
+
+    app.request_class = type('MetricsRequest', (_RequestMixin, app.request_class), {})
+    app.wsgi_app = MetricsMiddleware(app.wsgi_app, directory, app.config['METRICS_FLUSH_SECONDS'])
+    if type(app.jinja_env.cache) is LRUCache:
+        app.jinja_env.cache = _CountingTemplateCache(app.jinja_env.cache.capacity)
+
+    def metrics_view():
+        return Response(render(collect(app.config['METRICS_DIR'])), mimetype=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    return REGISTRY
@@ -1,10 +1,111 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy import event
+
+import passwords
 
 db = SQLAlchemy()
 
+# Columns added to a table after its first release: create_all() creates
+# missing tables only, so databases made before get them on connect
+ADDED_COLUMNS = (
+    ('products', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('job_locks', 'runs', 'INTEGER NOT NULL DEFAULT 0'),
+    ('job_locks', 'failures', 'INTEGER NOT NULL DEFAULT 0'),
+    ('job_locks', 'last_run', 'DATETIME'),
+    ('job_locks', 'last_outcome', 'VARCHAR(20)'),
+    ('job_locks', 'last_duration', 'FLOAT'),
+    ('job_locks', 'last_error', 'TEXT'),
+)
+
+# Unique constraints dropped from a table since its first release, as
+# (table, columns): SQLite cannot drop one in place, so the table is rebuilt
+DROPPED_UNIQUE = (
+    ('products', ('sku',)),  # SKUs are unique per store now, see Product
+)
+
+def _add_columns(cursor):
+    for table, column, ddl in ADDED_COLUMNS:
+        present = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+        if present and column not in present:  # no table yet: create_all() makes it whole
+            try:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}')
+            except Exception as e:
+                # Another process added it first
+                if 'duplicate column' not in str(e):
+                    raise
+
+def _has_unique(cursor, table, columns):
+    """Whether ``table`` still has a UNIQUE constraint on exactly ``columns``"""
+    for _, name, unique, origin, *_ in cursor.execute(f'PRAGMA index_list({table})').fetchall():
+        if unique and origin == 'u':
+            if tuple(row[2] for row in cursor.execute(f'PRAGMA index_info({name})')) == tuple(columns):
+                return True
+    return False
+
+def _rebuild(cursor, table):
+    """Recreate ``table`` from its model, keeping its rows, indexes and triggers"""
+    import re
+    from sqlalchemy.dialects import sqlite
+    from sqlalchemy.schema import CreateTable
+    model = db.metadata.tables[table]
+    present = {row[1] for row in cursor.execute(f'PRAGMA table_info({table})')}
+    columns = ', '.join(c.name for c in model.columns if c.name in present)
+    create = re.sub(rf'CREATE TABLE {table}\b', f'CREATE TABLE _{table}_rebuild',
+                    str(CreateTable(model).compile(dialect=sqlite.dialect())), count=1)
+    kept = [sql for (sql,) in cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL",
+        (table,))]
+    cursor.execute(create)
+    cursor.execute(f'INSERT INTO _{table}_rebuild ({columns}) SELECT {columns} FROM {table}')
+    cursor.execute(f'DROP TABLE {table}')
+    cursor.execute(f'ALTER TABLE _{table}_rebuild RENAME TO {table}')
+    for sql in kept:
+        cursor.execute(sql)
+
+def _drop_unique(cursor):
+    for table, columns in DROPPED_UNIQUE:
+        if not _has_unique(cursor, table, columns):
+            continue
+        # Another process may be rebuilding: take the write lock, then look again
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            if _has_unique(cursor, table, columns):
+                _rebuild(cursor, table)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+
+def _create_indexes(cursor):
+    """Indexes declared on the models that older databases lack"""
+    from sqlalchemy.dialects import sqlite
+    from sqlalchemy.schema import CreateIndex
+    existing = {name for (name,) in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    tables = {name for (name,) in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if table.name in tables and index.name not in existing:
+                cursor.execute(str(CreateIndex(index, if_not_exists=True).compile(dialect=sqlite.dialect())))
+
+def _upgrade(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        _add_columns(cursor)
+        _drop_unique(cursor)
+        _create_indexes(cursor)
+    finally:
+        cursor.close()
+
+def upgrade_schema(app):
+    """Bring older SQLite databases up to the models as connections are
+    opened: ADDED_COLUMNS, DROPPED_UNIQUE and any missing indexes"""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _upgrade):
+                event.listen(engine, 'connect', _upgrade)
+
 class User(UserMixin, db.Model):
     """User model with role-based access"""
     __tablename__ = 'users'
@@ -23,11 +124,14 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
     
     def check_password(self, password):
-        """Check password against hash"""
-        return check_password_hash(self.password_hash, password)
+        """Check password against hash; re-hash it if made with other settings"""
+        matches, new_hash = passwords.verify(self.password_hash, password)
+        if new_hash:
+            self.password_hash = new_hash
+        return matches
     
     def __repr__(self):
         return f'<User {self.username} ({self.role})>'
@@ -59,7 +163,7 @@ class Product(db.Model):
     category = db.Column(db.String(50))  # e.g., 'Shirts', 'Pants', 'Shoes', etc.
     size = db.Column(db.String(20))  # e.g., 'S', 'M', 'L', 'XL', etc.
     color = db.Column(db.String(30))
-    sku = db.Column(db.String(50), unique=True, nullable=False)
+    sku = db.Column(db.String(50), nullable=False)  # unique per store, see __table_args__
     price = db.Column(db.Float, nullable=False)
     stock_quantity = db.Column(db.Integer, default=0, nullable=False)
     low_stock_threshold = db.Column(db.Integer, default=10, nullable=False)
@@ -67,9 +171,14 @@ class Product(db.Model):
     store_id = db.Column(db.Integer, db.ForeignKey('stores.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Bumped by every write; edits compare-and-set on it (see app.py)
+    version = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     
     # Relationships
     sales = db.relationship('Sale', backref='product', lazy=True, cascade='all, delete-orphan')
+
+    # Point-of-sale lookups resolve (store_id, sku) through this index
+    __table_args__ = (db.Index('ix_products_store_sku', 'store_id', 'sku', unique=True),)
     
     @property
     def is_low_stock(self):
@@ -152,3 +261,33 @@ class Shipment(db.Model):
     
     def __repr__(self):
         return f'<Shipment {self.id} - Status: {self.status}>'
+
+class JobLock(db.Model):
+    """Leader lock for a scheduled job: one row per job, held until expires_at,
+    with the job's runs as recorded by every process"""
+    __tablename__ = 'job_locks'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    runs = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    failures = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    last_run = db.Column(db.DateTime)
+    last_outcome = db.Column(db.String(20))  # 'ok', 'error' or 'timeout'
+    last_duration = db.Column(db.Float)  # seconds
+    last_error = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<JobLock {self.name} - {self.owner}>'
+
+class IdempotencyKey(db.Model):
+    """Claimed idempotency key (hashed) and the response to replay for it"""
+    __tablename__ = 'idempotency_keys'
+    
+    key = db.Column(db.String(32), primary_key=True)
+    fingerprint = db.Column(db.String(32), nullable=False)
+    response = db.Column(db.Text)  # JSON; NULL while the first request runs
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key}>'
@@ -0,0 +1,143 @@
+"""
+Password hashing settings and login throttling for both apps.
+
+Hashes are made with ``PASSWORD_HASH_METHOD`` (a werkzeug method string,
+env ``STYLANE_PASSWORD_HASH``, default ``scrypt:32768:8:1``). A hash is
+checked at whatever cost it was made with, so raising (or lowering) the
+setting alone changes nothing for existing users: ``verify`` also returns a
+new hash when the stored one was made with other settings, and the login
+views save it, moving each user to the current settings on their next
+successful login.
+
+Every login attempt first takes a token from two buckets, one for the
+username and one for the client address (``LOGIN_USER_BURST`` /
+``LOGIN_USER_PER_MINUTE``, ``LOGIN_IP_BURST`` / ``LOGIN_IP_PER_MINUTE``). An
+attempt finding either bucket empty is answered 429 before the user is
+looked up or any hash is computed, so hammering ``/login`` costs the server
+next to nothing. Buckets are per process: with N workers an address gets up
+to N times the burst.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from flask import current_app, has_app_context, request
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import metrics
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+# ==================== HASHING ====================
+
+@lru_cache(maxsize=8)
+def _prefix(method):
+    """How ``method`` is written in the hashes it makes ('pbkdf2' -> 'pbkdf2:sha256:600000')"""
+    return generate_password_hash('', method).split('$', 1)[0]
+
+
+def _method():
+    return current_app.config['PASSWORD_HASH_METHOD'] if has_app_context() else DEFAULT_METHOD
+
+
+def hash_password(password):
+    return generate_password_hash(password, _method())
+
+
+def needs_rehash(stored_hash):
+    return stored_hash.split('$', 1)[0] != _prefix(_method())
+
+
+def verify(stored_hash, password):
+    """(matches, new hash or None): a new hash when ``stored_hash`` used other settings"""
+    if not stored_hash or not check_password_hash(stored_hash, password):
+        return False, None
+    return True, hash_password(password) if needs_rehash(stored_hash) else None
+
+
+# ==================== THROTTLING ====================
+
+class TokenBuckets:
+    """Token bucket per key: ``burst`` attempts at once, refilled at ``per_minute``.
+
+    Only the ``max_keys`` most recently used keys are kept; a dropped key
+    comes back with a full bucket.
+    """
+
+    def __init__(self, burst, per_minute, max_keys=10000):
+        self.burst = burst
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, at)
+
+    def level(self, key, now):
+        tokens, at = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - at) * self.rate)
+
+    def take(self, key, tokens, now):
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def wait(self, tokens):
+        """Seconds until a bucket holding ``tokens`` has a whole one"""
+        return (1 - tokens) / self.rate if self.rate else math.inf
+
+
+class LoginThrottle:
+    def __init__(self, user_buckets, ip_buckets, clock=time.monotonic):
+        self.user_buckets = user_buckets
+        self.ip_buckets = ip_buckets
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def acquire(self, username, address):
+        """Take an attempt for ``username`` from ``address``; 0, or seconds to wait (nothing taken)"""
+        with self._lock:
+            now = self.clock()
+            pairs = ((self.user_buckets, username), (self.ip_buckets, address))
+            levels = [buckets.level(key, now) for buckets, key in pairs]
+            waits = [buckets.wait(tokens) for (buckets, _), tokens in zip(pairs, levels) if tokens < 1]
+            if waits:
+                return max(waits)
+            for (buckets, key), tokens in zip(pairs, levels):
+                buckets.take(key, tokens, now)
+            return 0
+
+
+def throttle(username):
+    """0 when this login attempt may go ahead, else whole seconds to wait"""
+    limiter = current_app.extensions.get('login_throttle')
+    if limiter is None:
+        return 0
+    wait = limiter.acquire(username or '', request.remote_addr)
+    if not wait:
+        return 0
+    metrics.LOGIN_ATTEMPTS.inc(('throttled',))
+    return min(math.ceil(wait), 3600)
+
+
+def record(success):
+    metrics.LOGIN_ATTEMPTS.inc(('success' if success else 'failure',))
+
+
+def init_app(app):
+    """Hash settings and the login throttle (``LOGIN_THROTTLE = False`` turns it off)"""
+    app.config.setdefault('PASSWORD_HASH_METHOD', os.environ.get('STYLANE_PASSWORD_HASH', DEFAULT_METHOD))
+    app.config.setdefault('LOGIN_THROTTLE', True)
+    app.config.setdefault('LOGIN_USER_BURST', 5)
+    app.config.setdefault('LOGIN_USER_PER_MINUTE', 5)
+    # Higher: a store's tills and back office usually share one address
+    app.config.setdefault('LOGIN_IP_BURST', 20)
+    app.config.setdefault('LOGIN_IP_PER_MINUTE', 20)
+    app.config.setdefault('LOGIN_THROTTLE_MAX_KEYS', 10000)
+    if app.config['LOGIN_THROTTLE']:
+        max_keys = app.config['LOGIN_THROTTLE_MAX_KEYS']
+        app.extensions['login_throttle'] = LoginThrottle(
+            TokenBuckets(app.config['LOGIN_USER_BURST'], app.config['LOGIN_USER_PER_MINUTE'], max_keys),
+            TokenBuckets(app.config['LOGIN_IP_BURST'], app.config['LOGIN_IP_PER_MINUTE'], max_keys))
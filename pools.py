@@ -0,0 +1,54 @@
+"""
+Thread pools for parallel AWS reads (sales_shards.py, fanout.py).
+
+A ``ThreadPool`` creates its executor on first use, and again in a child
+process after a fork, since threads do not survive one. A call past its
+caller's deadline cannot be stopped and keeps its thread until it returns;
+``abandon`` counts it until then, so callers can tell a pool that is only
+busy from one whose threads are all held by calls nobody waits for.
+"""
+import os
+import threading
+
+
+class ThreadPool:
+    def __init__(self, threads, name):
+        self.threads = threads
+        self.name = name
+        self._executor = None
+        self._pid = None
+        self._abandoned = 0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        # One pool per process: threads do not survive a fork
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    from concurrent.futures import ThreadPoolExecutor
+                    self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix=self.name)
+                    self._abandoned = 0
+                    self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, fn, *args):
+        """Run ``fn(*args)`` on the pool, queued if every thread is busy"""
+        return self._current().submit(fn, *args)
+
+    @property
+    def abandoned(self):
+        """Calls of this process still running after their caller gave up"""
+        return self._abandoned if self._pid == os.getpid() else 0
+
+    def abandon(self, future):
+        """Count ``future``, still running, as abandoned until it returns"""
+        with self._lock:
+            self._abandoned += 1
+            pid = self._pid
+
+        def returned(_):
+            with self._lock:
+                if self._pid == pid:
+                    self._abandoned -= 1
+
+        future.add_done_callback(returned)
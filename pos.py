@@ -0,0 +1,107 @@
+"""
+SKU lookups for scanner-driven point-of-sale tills (both apps).
+
+A till sends the scanned SKU; ``(store_id, sku)`` resolves through the
+unique ``ix_products_store_sku`` index (app.py) or the ``StoreSkuIndex``
+GSI (app_aws.py). In front of that sits an LRU of hot SKUs mapping
+``(store_id, sku)`` to the product id only: the product itself, and so its
+stock, is always re-read by primary key, which is as cheap as the index
+lookup in SQL and, unlike a GSI query, strongly consistent in DynamoDB.
+A cached id whose product was deleted or re-keyed is dropped and looked up
+again, so the cache needs no invalidation from other processes.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+
+import metrics
+
+
+class SkuCache:
+    """Thread-safe LRU of ``(store_id, sku) -> product id`` with a TTL"""
+
+    def __init__(self, size=10000, ttl=300.0):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, store_id, sku):
+        key = (store_id, sku)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                metrics.record_cache('pos_sku', True)
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+        metrics.record_cache('pos_sku', False)
+        return None
+
+    def put(self, store_id, sku, product_id):
+        with self._lock:
+            self._entries[(store_id, sku)] = (product_id, time.monotonic() + self.ttl)
+            self._entries.move_to_end((store_id, sku))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def discard(self, store_id, sku):
+        with self._lock:
+            self._entries.pop((store_id, sku), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def lookup(store_id, sku, find, fetch):
+    """The product with this SKU in the store, or None.
+
+    ``fetch(product_id)`` re-reads a cached product by primary key and
+    returns None if it no longer has this store and SKU; ``find(store_id,
+    sku)`` goes through the index and returns ``(product_id, product)`` or
+    None.
+    """
+    cache = current_app.extensions['pos']
+    product_id = cache.get(store_id, sku)
+    if product_id is not None:
+        product = fetch(product_id)
+        if product is not None:
+            return product
+        cache.discard(store_id, sku)
+    found = find(store_id, sku)
+    if found is None:
+        return None
+    cache.put(store_id, sku, found[0])
+    return found[1]
+
+
+def parse_quantity(data):
+    """``quantity`` from a JSON body or form: None when absent (lookup only),
+    a positive int, or ValueError"""
+    value = data.get('quantity')
+    if value in (None, ''):
+        return None
+    quantity = int(value)
+    if quantity < 1:
+        raise ValueError('quantity must be at least 1')
+    return quantity
+
+
+def init_app(app):
+    """Hot-SKU cache for the till lookup endpoint.
+
+    ``POS_SKU_CACHE_SIZE`` (default 10000) entries are kept for at most
+    ``POS_SKU_CACHE_TTL`` seconds (300).
+    """
+    app.config.setdefault('POS_SKU_CACHE_SIZE', 10000)
+    app.config.setdefault('POS_SKU_CACHE_TTL', 300.0)
+    cache = app.extensions['pos'] = SkuCache(app.config['POS_SKU_CACHE_SIZE'],
+                                             app.config['POS_SKU_CACHE_TTL'])
+    return cache
@@ -0,0 +1,298 @@
+"""
+Opt-in profiling of live requests.
+
+A request is profiled when it carries a valid ``X-Stylane-Profile`` header
+(an expiring token signed with the app's SECRET_KEY, handed out on the admin
+profiles page) or when it falls into the ``PROFILE_SAMPLE_RATE`` fraction.
+Profiled requests run under a statistical stack sampler (or cProfile with
+``PROFILE_MODE = 'cprofile'``) and tracemalloc; results are written to
+``PROFILE_DIR`` as flamegraph-compatible collapsed stacks, an allocation
+summary and a JSON index entry.
+"""
+import cProfile
+import hashlib
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+HEADER = 'X-Stylane-Profile'
+_ENVIRON_KEY = 'HTTP_' + HEADER.upper().replace('-', '_')
+
+# Files written per profile, by suffix
+SUFFIXES = ('.json', '.collapsed', '.alloc.txt', '.pstats.txt')
+
+
+# ==================== TOKENS ====================
+
+def _signature(secret, expires):
+    return hmac.new(str(secret).encode(), f'profile:{expires}'.encode(), hashlib.sha256).hexdigest()
+
+
+def make_token(secret, ttl=600):
+    """Header value that enables profiling for ``ttl`` seconds"""
+    expires = int(time.time()) + ttl
+    return f'{expires}.{_signature(secret, expires)}'
+
+
+def check_token(secret, token):
+    expires, _, signature = (token or '').partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(signature, _signature(secret, expires))
+
+
+# ==================== PROFILERS ====================
+
+def _frame_label(frame):
+    code = frame.f_code
+    label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+    return label.replace(';', ':')
+
+
+def collapse(frame):
+    """Root-to-leaf stack string in the collapsed (flamegraph.pl) format"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(labels))
+
+
+class StackSampler:
+    """Samples one thread's stack every ``interval`` seconds from a helper thread"""
+
+    def __init__(self, thread_id, interval=0.002):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stylane-profiler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = collapse(frame)
+            self.counts[stack] = self.counts.get(stack, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in
+                       sorted(self.counts.items(), key=lambda item: -item[1]))
+
+
+class CallProfiler:
+    """cProfile wrapper; exact call counts, but no full stacks to collapse"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.samples = 0
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.stats = pstats.Stats(self.profile)
+        self.samples = self.stats.total_calls
+
+    def collapsed(self):
+        # Flat: one frame per function, weighted by its own time in ms
+        lines = []
+        for func, (cc, nc, tt, ct, callers) in self.stats.stats.items():
+            label = f'{func[2]} ({os.path.basename(func[0])}:{func[1]})'.replace(';', ':')
+            lines.append(f'{label} {max(1, int(tt * 1000))}')
+        return '\n'.join(lines) + '\n'
+
+    def report(self, limit=40):
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats('cumulative').print_stats(limit)
+        return out.getvalue()
+
+
+def allocation_summary(before, after, limit=25):
+    """Top allocation sites (by net size) between two tracemalloc snapshots"""
+    # Leave out the profiler's own bookkeeping
+    ignore = [tracemalloc.Filter(False, module.__file__)
+              for module in (tracemalloc, cProfile, pstats, sys.modules[__name__])]
+    diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), 'lineno')
+    lines = []
+    for stat in diff[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f'{stat.size_diff / 1024:10.1f} KiB {stat.count_diff:+8d} blocks  '
+                     f'{frame.filename}:{frame.lineno}')
+    total = sum(stat.size_diff for stat in diff)
+    return total, lines
+
+
+# ==================== MIDDLEWARE ====================
+
+class ProfilingMiddleware:
+    """Profiles requests that carry a valid token or are sampled"""
+
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self._lock = threading.Lock()
+
+    def wants_profile(self, environ):
+        token = environ.get(_ENVIRON_KEY)
+        if token:
+            return 'header' if check_token(self.app.secret_key, token) else None
+        rate = self.app.config['PROFILE_SAMPLE_RATE']
+        if rate and random.random() < rate:
+            return 'sampled'
+        return None
+
+    def __call__(self, environ, start_response):
+        trigger = self.wants_profile(environ)
+        # One profiled request at a time: tracemalloc is process-wide
+        if trigger is None or not self._lock.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self._profile(environ, start_response, trigger)
+        finally:
+            self._lock.release()
+
+    def _profile(self, environ, start_response, trigger):
+        config = self.app.config
+        captured = []
+
+        def _start_response(status, headers, exc_info=None):
+            captured.append(status)
+            return start_response(status, headers, exc_info)
+
+        if config['PROFILE_MODE'] == 'cprofile':
+            profiler = CallProfiler()
+        else:
+            profiler = StackSampler(threading.get_ident(), config['PROFILE_INTERVAL_MS'] / 1000.0)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(config['PROFILE_TRACEMALLOC_FRAMES'])
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            # Consume the body inside the profile so template rendering of
+            # streamed responses is included
+            body = self.wsgi_app(environ, _start_response)
+            try:
+                chunks = list(body)
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+        finally:
+            profiler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000.0
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+            try:
+                write_profile(config['PROFILE_DIR'], environ, captured, trigger, duration_ms,
+                              profiler, before, after, peak, config['PROFILE_KEEP'])
+            except OSError as e:
+                print(f"Error writing profile: {e}")
+        return chunks
+
+
+def _slug(path):
+    return re.sub(r'[^A-Za-z0-9]+', '-', path).strip('-')[:60] or 'root'
+
+
+def write_profile(directory, environ, captured, trigger, duration_ms, profiler, before, after, peak, keep):
+    os.makedirs(directory, exist_ok=True)
+    now = datetime.utcnow()
+    name = f'{now:%Y%m%dT%H%M%S}-{now.microsecond:06d}-{_slug(environ.get("PATH_INFO", "/"))}'
+    base = os.path.join(directory, name)
+
+    with open(base + '.collapsed', 'w') as fh:
+        fh.write(profiler.collapsed())
+    if isinstance(profiler, CallProfiler):
+        with open(base + '.pstats.txt', 'w') as fh:
+            fh.write(profiler.report())
+    net, lines = allocation_summary(before, after)
+    with open(base + '.alloc.txt', 'w') as fh:
+        fh.write(f'net {net / 1024:.1f} KiB, peak traced {peak / 1024:.1f} KiB\n')
+        fh.write('\n'.join(lines) + '\n')
+    with open(base + '.json', 'w') as fh:
+        json.dump({
+            'name': name,
+            'created_at': now.isoformat(),
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'query': environ.get('QUERY_STRING', ''),
+            'status': captured[0] if captured else None,
+            'trigger': trigger,
+            'mode': 'cprofile' if isinstance(profiler, CallProfiler) else 'sampling',
+            'duration_ms': round(duration_ms, 3),
+            'samples': profiler.samples,
+            'alloc_net_kb': round(net / 1024, 1),
+            'alloc_peak_kb': round(peak / 1024, 1),
+            'top_allocations': lines[:5],
+        }, fh)
+    prune(directory, keep)
+
+
+def prune(directory, keep):
+    """Delete all but the newest ``keep`` profiles"""
+    names = sorted(f[:-5] for f in os.listdir(directory) if f.endswith('.json'))
+    for name in names[:-keep] if keep else []:
+        for suffix in SUFFIXES:
+            path = os.path.join(directory, name + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def list_profiles(app):
+    """Index entries of stored profiles, newest first"""
+    directory = app.config['PROFILE_DIR']
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for filename in sorted(os.listdir(directory), reverse=True):
+        if filename.endswith('.json'):
+            try:
+                with open(os.path.join(directory, filename)) as fh:
+                    profiles.append(json.load(fh))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+
+def init_app(app):
+    """Install the profiling middleware.
+
+    ``PROFILE_DIR`` (default ``<instance>/profiles``), ``PROFILE_SAMPLE_RATE``
+    (default 0: only signed requests), ``PROFILE_MODE`` ('sampling' or
+    'cprofile'), ``PROFILE_INTERVAL_MS`` (sampler period, default 2) and
+    ``PROFILE_KEEP`` (profiles retained, default 200).
+    """
+    app.config.setdefault('PROFILE_DIR', os.environ.get(
+        'STYLANE_PROFILE_DIR', os.path.join(app.instance_path, 'profiles')))
+    app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.environ.get('STYLANE_PROFILE_SAMPLE_RATE', 0)))
+    app.config.setdefault('PROFILE_MODE', 'sampling')
+    app.config.setdefault('PROFILE_INTERVAL_MS', 2)
+    app.config.setdefault('PROFILE_TRACEMALLOC_FRAMES', 1)
+    app.config.setdefault('PROFILE_KEEP', 200)
+    app.wsgi_app = ProfilingMiddleware(app, app.wsgi_app)
@@ -0,0 +1,206 @@
+"""
+Automatic restock requests from low-stock events (app.py).
+
+A session hook compares each flushed Product's stock with its
+``low_stock_threshold``; when a product goes from above the threshold to at
+or below it (a sale, an edit, a raised threshold), its id is queued once
+the transaction commits. A background worker waits ``RESTOCK_COALESCE_SECONDS``
+to gather a batch, merges repeated events per product, skips products that
+already have an open request or have recovered, and inserts the new
+RestockRequest rows in one statement. Nothing scans the products table.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+
+import metrics
+from models import db, Product, RestockRequest, User
+
+logger = logging.getLogger('stylane.restock')
+
+# A restock already in progress for a product
+OPEN_STATUSES = ('pending', 'approved', 'shipped')
+
+_SESSION_KEY = 'stylane_low_stock'
+
+
+def _is_low(stock, threshold):
+    return stock is not None and threshold is not None and stock <= threshold
+
+
+def _before(state, attribute):
+    history = state.attrs[attribute].history
+    if history.deleted:
+        return history.deleted[0]
+    return history.unchanged[0] if history.unchanged else None
+
+
+def crossed_threshold(product):
+    """True when this flush takes the product from above its threshold to at/below it"""
+    state = inspect(product)
+    if not (state.attrs.stock_quantity.history.has_changes()
+            or state.attrs.low_stock_threshold.history.has_changes()):
+        return False
+    return (_is_low(product.stock_quantity, product.low_stock_threshold)
+            and not _is_low(_before(state, 'stock_quantity'), _before(state, 'low_stock_threshold')))
+
+
+def stock_adjusted(product_id, before, after):
+    """Queue a crossing made by an UPDATE statement, which the flush hook
+    does not see; ``before``/``after`` are (stock, threshold) pairs"""
+    if not has_app_context() or 'restock' not in current_app.extensions:
+        return
+    if _is_low(*after) and not _is_low(*before):
+        db.session.info.setdefault(_SESSION_KEY, set()).add(product_id)
+
+
+# ==================== SESSION HOOKS ====================
+
+def _after_flush(session, flush_context):
+    if not has_app_context() or 'restock' not in current_app.extensions:
+        return
+    for obj in session.dirty:
+        if isinstance(obj, Product) and crossed_threshold(obj):
+            session.info.setdefault(_SESSION_KEY, set()).add(obj.id)
+
+
+def _after_commit(session):
+    product_ids = session.info.pop(_SESSION_KEY, None)
+    if product_ids and has_app_context() and 'restock' in current_app.extensions:
+        current_app.extensions['restock'].submit(product_ids)
+
+
+def _after_rollback(session, previous_transaction):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def _install_session_hooks():
+    session_class = db.session.session_factory.class_
+    if not event.contains(session_class, 'after_flush', _after_flush):
+        event.listen(session_class, 'after_flush', _after_flush)
+        event.listen(session_class, 'after_commit', _after_commit)
+        event.listen(session_class, 'after_soft_rollback', _after_rollback)
+
+
+# ==================== WORKER ====================
+
+class RestockWorker:
+    """Background thread turning queued product ids into restock requests"""
+
+    def __init__(self, app):
+        self.app = app
+        self.queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, product_ids):
+        self._ensure_thread()
+        for product_id in product_ids:
+            self.queue.put(product_id)
+
+    def wait(self):
+        """Block until every submitted event has been processed"""
+        self.queue.join()
+
+    def _ensure_thread(self):
+        # Started on first use, and again in a forked worker process
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='stylane-restock', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        config = self.app.config
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + config['RESTOCK_COALESCE_SECONDS']
+            while len(batch) < config['RESTOCK_BATCH_SIZE']:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    create_requests(set(batch), config['RESTOCK_TARGET_FACTOR'])
+            except Exception:
+                logger.exception('Error creating restock requests for %s', sorted(set(batch)))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
+def create_requests(product_ids, target_factor=2):
+    """Insert one restock request per product that is still low and has none open.
+
+    The quantity brings stock back up to ``target_factor`` times the threshold.
+    Requests are raised on behalf of the store's manager (or an admin).
+    """
+    products = Product.query.filter(Product.id.in_(product_ids)).all()
+    open_ids = {product_id for (product_id,) in db.session.query(RestockRequest.product_id).filter(
+        RestockRequest.product_id.in_(product_ids), RestockRequest.status.in_(OPEN_STATUSES))}
+    low = [p for p in products if p.id not in open_ids and _is_low(p.stock_quantity, p.low_stock_threshold)]
+    already_open = len([p for p in products if p.id in open_ids])
+    metrics.LOW_STOCK_EVENTS.inc(('open_request',), already_open)
+    metrics.LOW_STOCK_EVENTS.inc(('recovered',), len(products) - already_open - len(low))
+    if not low:
+        return []
+
+    requesters = dict(db.session.query(User.store_id, User.id).filter(
+        User.role == 'store_manager', User.is_active.is_(True),
+        User.store_id.in_({p.store_id for p in low})).order_by(User.id.desc()))
+    admin = db.session.query(User.id).filter_by(role='admin').order_by(User.id).first()
+    now = datetime.utcnow()
+    rows = []
+    for product in low:
+        requested_by = requesters.get(product.store_id) or (admin and admin[0])
+        if requested_by is None:
+            logger.warning(json.dumps({'event': 'auto_restock_skipped', 'product_id': product.id,
+                                       'reason': 'no store manager or admin'}))
+            continue
+        rows.append({
+            'store_id': product.store_id,
+            'product_id': product.id,
+            'requested_quantity': max(1, target_factor * product.low_stock_threshold - product.stock_quantity),
+            'requested_by': requested_by,
+            'notes': f'Auto-generated: stock {product.stock_quantity} at or below threshold '
+                     f'{product.low_stock_threshold}',
+            'created_at': now,
+            'updated_at': now,
+        })
+    if rows:
+        db.session.execute(RestockRequest.__table__.insert(), rows)
+        db.session.commit()
+        metrics.LOW_STOCK_EVENTS.inc(('requested',), len(rows))
+        logger.info(json.dumps({'event': 'auto_restock', 'products': [r['product_id'] for r in rows]}))
+    return rows
+
+
+def init_app(app):
+    """Queue low-stock crossings and raise restock requests in the background.
+
+    ``RESTOCK_COALESCE_SECONDS`` (default 1) is how long the worker gathers
+    events before writing a batch of at most ``RESTOCK_BATCH_SIZE`` (500);
+    ``RESTOCK_TARGET_FACTOR`` (2) sets the requested quantity as a multiple
+    of the product's threshold. ``AUTO_RESTOCK = False`` disables it.
+    """
+    app.config.setdefault('AUTO_RESTOCK', True)
+    app.config.setdefault('RESTOCK_COALESCE_SECONDS', 1.0)
+    app.config.setdefault('RESTOCK_BATCH_SIZE', 500)
+    app.config.setdefault('RESTOCK_TARGET_FACTOR', 2)
+    if not app.config['AUTO_RESTOCK']:
+        return None
+    _install_session_hooks()
+    worker = app.extensions['restock'] = RestockWorker(app)
+    return worker
@@ -1,10 +1,11 @@
 """
 Quick start script for StyleLane
 """
-from app import app, db
+from app import create_app, db
 from models import User, Store, Product, Sale, RestockRequest, Shipment
 
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         # Create tables if they don't exist
         db.create_all()
@@ -0,0 +1,249 @@
+"""
+Hot/cold tiering for sales, shared by both apps.
+
+Sales older than ``SALES_HOT_DAYS`` (default 365) leave the sales table
+(SQLite ``sales``, DynamoDB StyleLaneSales) for an archive of compressed
+NumPy files, one per month (``sales-YYYY-MM.npz`` in ``SALES_ARCHIVE_DIR``).
+Before they are written they are folded into daily summaries: one row per
+day, store and product with the units, revenue and number of sales, which
+is all the reports use. The ``archive_sales`` job runs nightly.
+
+``manifest.json`` holds the watermark, the first day not archived. Reports
+read hot sales from the watermark on and archived summaries before it, so
+a sale is never counted twice: a run that stops after writing the files
+but before deleting the hot rows leaves summaries past the old watermark,
+which readers ignore and the next run overwrites. Reads for a date range
+open only the month files that overlap it.
+
+The archive is a directory, while the sales table may be shared by several
+hosts (StyleLaneSales always is). Hot sales are therefore only deleted when
+``SALES_ARCHIVE_SHARED`` says every host reads the same directory and the
+job's leader lock holds across hosts. Otherwise a table with a TTL
+(StyleLaneSales) has the archived rows expire ``SALES_ARCHIVE_EXPIRE_DAYS``
+later, and the job runs on every host, so each archives them into its own
+directory first; a table without one keeps the hot rows, with a warning
+each run, so no other host loses them.
+"""
+import json
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+
+COLUMNS = ('day', 'store_id', 'product_id', 'quantity', 'amount', 'transactions')
+
+logger = logging.getLogger('stylane.sales_archive')
+
+
+def _day(value):
+    """Date of a sale_date (datetime, or ISO string as stored in DynamoDB)"""
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+def midnight(day):
+    return datetime.combine(day, time())
+
+
+def _month_bounds(key):
+    year, month = (int(part) for part in key.split('-'))
+    first = date(year, month, 1)
+    return first, date(year + month // 12, month % 12 + 1, 1)
+
+
+def fold(rows):
+    """Daily summaries, as columns, of ``(product_id, store_id, quantity,
+    total_amount, sale_date)`` rows"""
+    import numpy as np
+    totals = {}
+    for product_id, store_id, quantity, amount, sale_date in rows:
+        key = (_day(sale_date), str(store_id), str(product_id))
+        total = totals.get(key)
+        if total is None:
+            totals[key] = [int(quantity or 0), float(amount or 0), 1]
+        else:
+            total[0] += int(quantity or 0)
+            total[1] += float(amount or 0)
+            total[2] += 1
+    keys = sorted(totals)
+    return {
+        'day': np.array([k[0] for k in keys], dtype='datetime64[D]'),
+        'store_id': np.array([k[1] for k in keys], dtype=str),
+        'product_id': np.array([k[2] for k in keys], dtype=str),
+        'quantity': np.array([totals[k][0] for k in keys], dtype=np.int64),
+        'amount': np.array([totals[k][1] for k in keys], dtype=np.float64),
+        'transactions': np.array([totals[k][2] for k in keys], dtype=np.int64),
+    }
+
+
+def _concat(parts):
+    import numpy as np
+    return {c: np.concatenate([p[c] for p in parts]) for c in COLUMNS}
+
+
+def _select(columns, mask):
+    return {c: columns[c][mask] for c in COLUMNS}
+
+
+class SalesArchive:
+    """Monthly files of daily sales summaries in ``directory``"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def watermark(self):
+        """First day still in the hot table (None before the first run)"""
+        try:
+            with open(self._path('manifest.json')) as fh:
+                return date.fromisoformat(json.load(fh)['watermark'])
+        except FileNotFoundError:
+            return None
+
+    def _replace(self, name, write):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = self._path(f'.{name}.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as fh:
+            write(fh)
+        os.replace(tmp, self._path(name))
+
+    def partitions(self, start=None, end=None):
+        """(month, path) of the files overlapping [start, end), by month"""
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith('sales-') and name.endswith('.npz')):
+                continue
+            month = name[len('sales-'):-len('.npz')]
+            first, following = _month_bounds(month)
+            if (start is not None and following <= start) or (end is not None and first >= end):
+                continue
+            result.append((month, self._path(name)))
+        return result
+
+    def _load(self, path):
+        import numpy as np
+        with np.load(path) as data:
+            return {c: data[c] for c in COLUMNS}
+
+    def read(self, start=None, end=None, store_id=None):
+        """Summaries for days in [start, end) (dates; None leaves that side
+        open), for one store or all; None when nothing is archived there"""
+        import numpy as np
+        watermark = self.watermark()
+        if watermark is None:
+            return None
+        end = watermark if end is None else min(end, watermark)
+        parts = []
+        for _, path in self.partitions(start, end):
+            columns = self._load(path)
+            mask = columns['day'] < np.datetime64(end, 'D')
+            if start is not None:
+                mask &= columns['day'] >= np.datetime64(start, 'D')
+            if store_id is not None:
+                mask &= columns['store_id'] == str(store_id)
+            parts.append(_select(columns, mask))
+        return _concat(parts) if parts else None
+
+    def write(self, summaries, watermark):
+        """Add summaries (see ``fold``) of the days up to ``watermark``, then
+        move the watermark there"""
+        import numpy as np
+        previous = self.watermark()
+        months = np.datetime_as_string(summaries['day'].astype('datetime64[M]'))
+        for month in sorted(set(months.tolist())):
+            part = _select(summaries, months == month)
+            path = self._path(f'sales-{month}.npz')
+            if os.path.exists(path):
+                kept = self._load(path)
+                if previous is not None:
+                    # Summaries past the watermark are left from an interrupted run
+                    kept = _select(kept, kept['day'] < np.datetime64(previous, 'D'))
+                part = _concat([kept, part])
+            self._replace(f'sales-{month}.npz', lambda fh: np.savez_compressed(fh, **part))
+        self._replace('manifest.json', lambda fh: fh.write(json.dumps({'watermark': watermark.isoformat()}).encode()))
+
+
+def archive_sales(archive, horizon_days, load, delete, today=None):
+    """Move sales dated more than ``horizon_days`` ago into ``archive``;
+    returns the number of sales moved.
+
+    ``load(before)`` yields ``(product_id, store_id, quantity, total_amount,
+    sale_date)`` for the hot sales dated before ``before`` (a datetime) and
+    ``delete(before)`` removes them; with ``delete`` None they are kept.
+    """
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=horizon_days)
+    watermark = archive.watermark()
+    moved = 0
+    if watermark is None or cutoff > watermark:
+        rows = [r for r in load(midnight(cutoff)) if watermark is None or _day(r[4]) >= watermark]
+        archive.write(fold(rows), cutoff)
+        moved = len(rows)
+    else:
+        cutoff = watermark
+    if delete is not None:
+        # Also removes rows an interrupted run archived but did not delete
+        delete(midnight(cutoff))
+    return moved
+
+
+def parse_range(args):
+    """(start, end) dates from the ``from``/``to`` query arguments (both
+    inclusive, YYYY-MM-DD); None where not given. Raises ValueError."""
+    start = date.fromisoformat(args['from']) if args.get('from') else None
+    end = date.fromisoformat(args['to']) + timedelta(days=1) if args.get('to') else None
+    return start, end
+
+
+def hot_since(archive, start):
+    """First moment of the hot sales a read from ``start`` needs"""
+    watermark = archive.watermark()
+    days = [d for d in (watermark, start) if d is not None]
+    return midnight(max(days)) if days else None
+
+
+def init_app(app, load, delete, shared=False, expire=None):
+    """The app's archive and its nightly ``archive_sales`` job (``load`` and
+    ``delete`` as for ``archive_sales``); call after scheduler.init_app.
+
+    ``shared`` is the default of ``SALES_ARCHIVE_SHARED`` (env
+    ``STYLANE_SALES_ARCHIVE_SHARED=1``): whether every host serving the
+    sales table reads ``SALES_ARCHIVE_DIR``. ``expire(before, seconds)``,
+    for a table with a TTL, marks the hot sales before ``before`` to be
+    removed that many seconds from now; with it and an unshared directory
+    the job runs on every host, under a lock in its archive directory.
+    """
+    app.config.setdefault('SALES_ARCHIVE_DIR', os.path.join(app.instance_path, 'sales_archive'))
+    app.config.setdefault('SALES_ARCHIVE_SHARED',
+                          os.environ.get('STYLANE_SALES_ARCHIVE_SHARED', '1' if shared else '0') == '1')
+    app.config.setdefault('SALES_ARCHIVE_EXPIRE_DAYS', 7)
+    app.config.setdefault('SALES_HOT_DAYS', 365)
+    archive = app.extensions['sales_archive'] = SalesArchive(app.config['SALES_ARCHIVE_DIR'])
+    jobs = app.extensions['scheduler']
+    lock = None
+    if expire is not None and not app.config['SALES_ARCHIVE_SHARED']:
+        # One run per archive directory, so every host archives before rows expire
+        from scheduler import FileLock
+        lock = FileLock(app.config['SALES_ARCHIVE_DIR'])
+
+    def run():
+        if app.config['SALES_ARCHIVE_SHARED'] and getattr(jobs.lock_of(job), 'shared', False):
+            remove, note = delete, ''
+        elif expire is not None:
+            days = app.config['SALES_ARCHIVE_EXPIRE_DAYS']
+            remove, note = (lambda before: expire(before, days * 86400)), f'; hot rows expire in {days} days'
+        else:
+            if not app.config['SALES_ARCHIVE_SHARED']:
+                kept = 'SALES_ARCHIVE_DIR is not shared by every host (SALES_ARCHIVE_SHARED)'
+            else:
+                kept = "the job's leader lock holds on this host only"
+            logger.warning(f'Hot sales kept in the sales table, since {kept}; it keeps growing')
+            remove, note = None, '; hot rows kept'
+        moved = archive_sales(archive, app.config['SALES_HOT_DAYS'], load, remove)
+        print(f"Archived {moved} sales before {archive.watermark()}{note}")
+
+    job = jobs.add('archive_sales', run, cron='40 3 * * *', jitter=300, timeout=3600, lock=lock)
+    return archive
@@ -0,0 +1,113 @@
+"""
+Write-sharded store keys for StyleLaneSales (app_aws.py).
+
+A store's sales are read through a GSI. Keyed on ``store_id`` alone, every
+sale of a busy store lands on one GSI partition, which accepts about 1,000
+write units a second; in a Black Friday burst DynamoDB throttles the rest,
+and a GSI that cannot keep up throttles writes to the table too. Each sale
+therefore carries ``store_shard`` = ``<store_id>#<n>``, with ``n`` a hash of
+the sale id, and ``StoreShardIndex`` (store_shard, sale_date) spreads a
+store over that many partitions. Reads query every shard of the store in
+parallel and merge the results by sale_date.
+
+``SALES_WRITE_SHARDS`` (default 1) is the shard count of every store and
+``SALES_STORE_SHARDS`` ({store_id: count}) raises it for the busy ones.
+Counts may grow, since readers query the lower shards as well, but must not
+shrink while sales written with more shards are kept. Sales written before
+the shard key existed are given one by ``python sales_shards.py backfill``.
+"""
+import argparse
+import contextvars
+import heapq
+import itertools
+import os
+import zlib
+
+from pools import ThreadPool
+
+
+def shard_key(store_id, sale_id, shards):
+    """``store_id#n`` for a sale; crc32, unlike hash(), is the same in every process"""
+    return f'{store_id}#{zlib.crc32(str(sale_id).encode()) % shards}'
+
+
+def shard_keys(store_id, shards):
+    return [f'{store_id}#{n}' for n in range(shards)]
+
+
+def _sale_date(sale):
+    return sale.get('sale_date') or ''
+
+
+class ShardedSales:
+    """Shard counts per store and the thread pool shards are read with"""
+
+    def __init__(self, shards=1, store_shards=None, threads=8):
+        self.shards = shards
+        self.store_shards = dict(store_shards or {})
+        self.pool = ThreadPool(threads, 'stylane-shards')
+
+    def count(self, store_id):
+        return int(self.store_shards.get(store_id, self.shards))
+
+    def key(self, store_id, sale_id):
+        return shard_key(store_id, sale_id, self.count(store_id))
+
+    def gather(self, store_id, query_shard, limit=None, newest_first=True):
+        """Sales from ``query_shard(key)`` over all of a store's shards, merged
+        by sale_date; each shard's results must already be in that order.
+
+        Shards are queried in parallel, each in a copy of the caller's
+        context so the request's AWS call accounting and deadline apply.
+        """
+        keys = shard_keys(store_id, self.count(store_id))
+        if len(keys) == 1:
+            results = [query_shard(keys[0])]
+        else:
+            futures = [self.pool.submit(contextvars.copy_context().run, query_shard, key) for key in keys]
+            results = [future.result() for future in futures]
+        merged = heapq.merge(*results, key=_sale_date, reverse=newest_first)
+        return list(itertools.islice(merged, limit))
+
+
+def backfill(table, sharding):
+    """Give sales written before sharding their store_shard; returns the count"""
+    from boto3.dynamodb.conditions import Attr
+    kwargs = {'FilterExpression': Attr('store_shard').not_exists(), 'ProjectionExpression': 'sale_id, store_id'}
+    updated = 0
+    while True:
+        page = table.scan(**kwargs)
+        for sale in page.get('Items', []):
+            table.update_item(Key={'sale_id': sale['sale_id']}, UpdateExpression='SET store_shard = :s',
+                              ExpressionAttributeValues={':s': sharding.key(sale['store_id'], sale['sale_id'])})
+            updated += 1
+        if 'LastEvaluatedKey' not in page:
+            return updated
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+def init_app(app):
+    """Shard settings for app_aws.py (``app.extensions['sales_shards']``)"""
+    app.config.setdefault('SALES_WRITE_SHARDS', int(os.environ.get('STYLANE_SALES_SHARDS', 1)))
+    app.config.setdefault('SALES_STORE_SHARDS', {})
+    app.config.setdefault('SALES_SHARD_THREADS', 8)
+    sharding = app.extensions['sales_shards'] = ShardedSales(
+        app.config['SALES_WRITE_SHARDS'], app.config['SALES_STORE_SHARDS'], app.config['SALES_SHARD_THREADS'])
+    return sharding
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='StyleLaneSales shard keys')
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--shards', type=int, default=int(os.environ.get('STYLANE_SALES_SHARDS', 1)))
+    parser.add_argument('--endpoint-url', help='DynamoDB endpoint, e.g. http://localhost:8000')
+    parser.add_argument('--region', default='us-east-1')
+    args = parser.parse_args(argv)
+
+    import boto3
+    table = boto3.resource('dynamodb', region_name=args.region, endpoint_url=args.endpoint_url).Table('StyleLaneSales')
+    print(f'Gave {backfill(table, ShardedSales(args.shards)):,} sales a store_shard key')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,583 @@
+"""
+In-process job scheduler for both apps.
+
+Jobs run on an interval (``every=seconds``) or a cron expression
+(``cron='*/15 * * * *'``, minute hour day month weekday, UTC), with random
+jitter so workers started together do not fire together, and a timeout
+after which a run is reported as overdue and later runs are skipped until
+it finishes. Before each run a job takes a leader lock, so when several
+processes run the scheduler only one of them runs each job: a row in
+``job_locks`` for app.py (``DatabaseLock``), an item in StyleLaneJobs taken
+by a conditional write for app_aws.py (``DynamoLock``), both shared by every
+host, or an flock'd file (``FileLock``, one host). A job added with its own
+``lock`` takes that one instead, e.g. a FileLock for work each host does.
+
+The web app starts the scheduler only with ``SCHEDULER_ENABLED`` (env
+``STYLANE_SCHEDULER=1``); ``python worker.py`` runs it in its own process.
+Each run's outcome is recorded next to the job's lock, so ``/admin/jobs``
+shows run counts, durations and errors from whichever process ran the job.
+"""
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import metrics
+
+
+# ==================== SCHEDULES ====================
+
+class Interval:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def next_after(self, moment):
+        return moment + timedelta(seconds=self.seconds)
+
+    def __str__(self):
+        return f'every {self.seconds:g}s'
+
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(','):
+        spec, _, step = part.partition('/')
+        if spec == '*':
+            start, end = low, high
+        elif '-' in spec:
+            start, end = (int(v) for v in spec.split('-'))
+        else:
+            start = end = int(spec)
+            if step:
+                end = high
+        if start < low or end > high or start > end:
+            raise ValueError(f'cron field {field!r} out of range {low}-{high}')
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return values
+
+
+class Cron:
+    """Five-field cron expression; day-of-month and weekday match either, as in cron"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'cron expression needs 5 fields: {expression!r}')
+        self.expression = expression
+        self.minutes = _parse_field(fields[0], 0, 59)
+        self.hours = _parse_field(fields[1], 0, 23)
+        self.days = _parse_field(fields[2], 1, 31)
+        self.months = _parse_field(fields[3], 1, 12)
+        # 0 and 7 are both Sunday; datetime.weekday() has Monday = 0
+        self.weekdays = {(d - 1) % 7 for d in _parse_field(fields[4], 0, 7)}
+        self.any_day = fields[2] == '*'
+        self.any_weekday = fields[4] == '*'
+
+    def _day_matches(self, moment):
+        day, weekday = moment.day in self.days, moment.weekday() in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f'cron expression never matches: {self.expression!r}')
+
+    def __str__(self):
+        return f'cron {self.expression}'
+
+
+# ==================== LEADER LOCKS ====================
+#
+# A lock also keeps each job's run statistics: ``record`` adds a run and
+# ``stats`` returns {job: {runs, failures, last_run, last_outcome,
+# last_duration, last_error, running}} as recorded by every holder.
+# ``shared`` is whether it excludes holders on other hosts too. A lock with
+# a TTL is renewed by its holder while the job runs, so it only lapses when
+# the holder dies.
+
+class FileLock:
+    """flock on ``<directory>/<job>.lock``: one holder per host; statistics
+    in ``<job>.json`` beside it"""
+    shared = False
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._files = {}
+
+    def acquire(self, name, ttl):
+        import fcntl
+        os.makedirs(self.directory, exist_ok=True)
+        fh = open(os.path.join(self.directory, f'{name}.lock'), 'w')
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        self._files[name] = fh
+        return True
+
+    def renew(self, name, ttl):
+        return name in self._files  # held until released, or the process exits
+
+    def release(self, name):
+        fh = self._files.pop(name, None)
+        if fh is not None:
+            fh.close()
+
+    def _read(self, path):
+        try:
+            with open(path) as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def record(self, name, outcome, duration, error):
+        path = os.path.join(self.directory, f'{name}.json')
+        stats = self._read(path) or {'runs': 0, 'failures': 0}
+        stats.update(runs=stats['runs'] + 1, failures=stats['failures'] + (outcome != 'ok'),
+                     last_run=datetime.utcnow().isoformat(), last_outcome=outcome,
+                     last_duration=duration, last_error=error)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(f'{path}.tmp', 'w') as fh:
+            json.dump(stats, fh)
+        os.replace(f'{path}.tmp', path)
+
+    def stats(self):
+        if not os.path.isdir(self.directory):
+            return {}
+        found = {}
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.json'):
+                stats = self._read(os.path.join(self.directory, filename))
+                if stats is not None:
+                    found[filename[:-len('.json')]] = dict(stats, running=False)  # only this process knows
+        return found
+
+
+class DatabaseLock:
+    """Row per job in ``job_locks``; a holder that dies loses it after ``ttl``"""
+    shared = True
+
+    def __init__(self, db, model):
+        self.db = db
+        self.model = model
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._created = False
+
+    def _table(self):
+        table = self.model.__table__
+        if not self._created:
+            # Databases created before job_locks existed
+            table.create(self.db.engine, checkfirst=True)
+            self._created = True
+        return table
+
+    def acquire(self, name, ttl):
+        from sqlalchemy.exc import IntegrityError
+        table = self._table()
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=ttl)
+        with self.db.engine.begin() as conn:
+            taken = conn.execute(table.update().where(
+                table.c.name == name, table.c.expires_at < now
+            ).values(owner=self.owner, expires_at=expires)).rowcount
+        if taken:
+            return True
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(table.insert().values(name=name, owner=self.owner, expires_at=expires))
+            return True
+        except IntegrityError:
+            return False
+
+    def renew(self, name, ttl):
+        """Push the expiry ``ttl`` on; False if the lock is no longer ours"""
+        table = self._table()
+        with self.db.engine.begin() as conn:
+            return bool(conn.execute(table.update().where(table.c.name == name, table.c.owner == self.owner)
+                                     .values(expires_at=datetime.utcnow() + timedelta(seconds=ttl))).rowcount)
+
+    def release(self, name):
+        table = self.model.__table__
+        with self.db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.name == name, table.c.owner == self.owner)
+                         .values(expires_at=datetime.utcnow()))
+
+    def record(self, name, outcome, duration, error):
+        table = self._table()
+        with self.db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.name == name).values(
+                runs=table.c.runs + 1, failures=table.c.failures + int(outcome != 'ok'),
+                last_run=datetime.utcnow(), last_outcome=outcome, last_duration=duration, last_error=error))
+
+    def stats(self):
+        table = self._table()
+        now = datetime.utcnow()
+        with self.db.engine.connect() as conn:
+            rows = conn.execute(table.select()).mappings().all()
+        return {row['name']: {
+            'runs': row['runs'],
+            'failures': row['failures'],
+            'last_run': row['last_run'].isoformat() if row['last_run'] else None,
+            'last_outcome': row['last_outcome'],
+            'last_duration': row['last_duration'],
+            'last_error': row['last_error'],
+            'running': row['expires_at'] > now,
+        } for row in rows}
+
+
+class DynamoLock:
+    """Item per job in StyleLaneJobs (app_aws.py), taken by a conditional
+    write: one holder across every host; a holder that dies loses it after ``ttl``"""
+    shared = True
+
+    def __init__(self, get_table):
+        self.get_table = get_table
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+
+    @staticmethod
+    def _now():
+        return Decimal(f'{time.time():.3f}')
+
+    def acquire(self, name, ttl):
+        from boto3.dynamodb.conditions import Attr
+        from botocore.exceptions import ClientError
+        now = self._now()
+        try:
+            self.get_table().update_item(
+                Key={'job': name}, UpdateExpression='SET #o = :o, expires_at = :e',
+                ConditionExpression=Attr('expires_at').not_exists() | Attr('expires_at').lte(now),
+                ExpressionAttributeNames={'#o': 'owner'},
+                ExpressionAttributeValues={':o': self.owner, ':e': now + Decimal(str(ttl))})
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+
+    def renew(self, name, ttl):
+        """Push the expiry ``ttl`` on; False if the lock is no longer ours"""
+        from boto3.dynamodb.conditions import Attr
+        from botocore.exceptions import ClientError
+        try:
+            self.get_table().update_item(
+                Key={'job': name}, UpdateExpression='SET expires_at = :e',
+                ConditionExpression=Attr('owner').eq(self.owner),
+                ExpressionAttributeValues={':e': self._now() + Decimal(str(ttl))})
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            return False
+
+    def release(self, name):
+        from boto3.dynamodb.conditions import Attr
+        from botocore.exceptions import ClientError
+        try:
+            self.get_table().update_item(
+                Key={'job': name}, UpdateExpression='SET expires_at = :e',
+                ConditionExpression=Attr('owner').eq(self.owner),
+                ExpressionAttributeValues={':e': self._now()})
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    def record(self, name, outcome, duration, error):
+        self.get_table().update_item(
+            Key={'job': name},
+            UpdateExpression='SET last_run = :t, last_outcome = :o, last_duration = :d, last_error = :x '
+                             'ADD runs :one, failures :f',
+            ExpressionAttributeValues={':t': datetime.utcnow().isoformat(), ':o': outcome,
+                                       ':d': Decimal(str(duration)), ':x': error, ':one': 1,
+                                       ':f': int(outcome != 'ok')})
+
+    def stats(self):
+        table = self.get_table()
+        now = self._now()
+        response = table.scan(ConsistentRead=True)
+        items = response['Items']
+        while 'LastEvaluatedKey' in response:
+            response = table.scan(ConsistentRead=True, ExclusiveStartKey=response['LastEvaluatedKey'])
+            items.extend(response['Items'])
+        return {item['job']: {
+            'runs': int(item.get('runs', 0)),
+            'failures': int(item.get('failures', 0)),
+            'last_run': item.get('last_run'),
+            'last_outcome': item.get('last_outcome'),
+            'last_duration': float(item['last_duration']) if item.get('last_duration') is not None else None,
+            'last_error': item.get('last_error'),
+            'running': item.get('expires_at', 0) > now,
+        } for item in items}
+
+
+# ==================== SCHEDULER ====================
+
+class Job:
+    """A scheduled function and the statistics of its runs in this process"""
+
+    def __init__(self, name, func, schedule, jitter=0.0, timeout=300.0, lock_ttl=None, lock=None):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.jitter = jitter
+        self.timeout = timeout
+        self.lock = lock  # None: the scheduler's
+        # Past the timeout a run is only reported. The lock is renewed every
+        # third of its TTL while the run lasts, so it lapses only when the
+        # holder has died
+        self.lock_ttl = lock_ttl or timeout * 2
+        self.next_run = None
+        self.running_since = None
+        self.overdue = False
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_outcome = None
+        self.last_duration = None
+        self.last_error = None
+
+    def schedule_next(self, now):
+        self.next_run = self.schedule.next_after(now) + timedelta(seconds=random.uniform(0, self.jitter))
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'schedule': str(self.schedule),
+            'jitter': self.jitter,
+            'timeout': self.timeout,
+            'next_run': self.next_run.isoformat() if self.next_run else None,
+            'running': self.running_since is not None,
+            'runs': self.runs,
+            'failures': self.failures,
+            'last_run': self.last_run.isoformat() if self.last_run else None,
+            'last_outcome': self.last_outcome,
+            'last_duration': self.last_duration,
+            'last_error': self.last_error,
+        }
+
+
+class Scheduler:
+    """Runs due jobs on a small thread pool, one run of each job at a time"""
+
+    def __init__(self, app, lock, threads=4):
+        self.app = app
+        self.lock = lock
+        self.jobs = {}
+        self.threads = threads
+        self._executor = None
+        self._thread = None
+        self._pid = None
+        self._guard = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def add(self, name, func, every=None, cron=None, jitter=0.0, timeout=300.0, lock=None):
+        if (every is None) == (cron is None):
+            raise ValueError('a job needs exactly one of every= or cron=')
+        job = self.jobs[name] = Job(name, func, Interval(every) if every else Cron(cron), jitter, timeout,
+                                    lock=lock)
+        job.schedule_next(datetime.utcnow())
+        return job
+
+    def job(self, name=None, **schedule):
+        """Decorator form of add()"""
+        def decorator(func):
+            self.add(name or func.__name__, func, **schedule)
+            return func
+        return decorator
+
+    # --- running ---
+
+    def start(self):
+        """Start the scheduler thread (again after a fork)"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._guard:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='stylane-job')
+            self._thread = threading.Thread(target=self.run_forever, name='stylane-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run_forever(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='stylane-job')
+        while not self._stop.is_set():
+            self.tick()
+            now = datetime.utcnow()
+            upcoming = [job.next_run for job in self.jobs.values()]
+            delay = min([(t - now).total_seconds() for t in upcoming] + [1.0])
+            self._wake.wait(max(0.05, delay))
+            self._wake.clear()
+
+    def tick(self, now=None):
+        """Submit due jobs and flag runs past their timeout"""
+        now = now or datetime.utcnow()
+        for job in list(self.jobs.values()):
+            if job.running_since is not None:
+                if not job.overdue and (now - job.running_since).total_seconds() > job.timeout:
+                    job.overdue = True
+                    self._record(job, 'timeout', job.timeout, f'still running after {job.timeout:g}s')
+                if job.next_run <= now:
+                    job.schedule_next(now)
+                    metrics.JOB_RUNS.inc((job.name, 'overlap'))
+                continue
+            if job.next_run <= now:
+                job.schedule_next(now)
+                self.submit(job)
+
+    def submit(self, job):
+        job.running_since = datetime.utcnow()
+        job.overdue = False
+        return self._executor.submit(self._run, job)
+
+    def run_now(self, name):
+        """Queue a job immediately, unless it is already running"""
+        job = self.jobs[name]
+        if job.running_since is not None:
+            return False
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.threads, thread_name_prefix='stylane-job')
+        self.submit(job)
+        return True
+
+    def _run(self, job):
+        started = time.perf_counter()
+        try:
+            with self.app.app_context():
+                self._run_locked(job, started)
+        except Exception as e:
+            print(f"Error running job {job.name}: {e}")
+        finally:
+            job.running_since = None
+
+    def lock_of(self, job):
+        return job.lock or self.lock
+
+    def _run_locked(self, job, started):
+        lock = self.lock_of(job)
+        if not lock.acquire(job.name, job.lock_ttl):
+            metrics.JOB_RUNS.inc((job.name, 'not_leader'))
+            return
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, lock, stop),
+                                     name=f'stylane-lock-{job.name}', daemon=True)
+        heartbeat.start()
+        try:
+            job.func()
+            outcome, error = 'ok', None
+        except Exception as e:
+            outcome, error = 'error', f'{type(e).__name__}: {e}'
+            traceback.print_exc()
+        finally:
+            stop.set()
+            heartbeat.join()
+            lock.release(job.name)
+        duration = time.perf_counter() - started
+        if not job.overdue:
+            self._record(job, outcome, duration, error)
+        metrics.JOB_DURATION.observe((job.name,), duration)
+
+    def _heartbeat(self, job, lock, stop):
+        """Renew the job's lock every third of its TTL until ``stop`` is set"""
+        with self.app.app_context():
+            while not stop.wait(job.lock_ttl / 3):
+                try:
+                    if not lock.renew(job.name, job.lock_ttl):
+                        print(f"Job {job.name} lost its leader lock while running")
+                except Exception as e:
+                    print(f"Error renewing the lock of job {job.name}: {e}")
+
+    def _record(self, job, outcome, duration, error):
+        job.runs += 1
+        job.failures += outcome != 'ok'
+        job.last_run = datetime.utcnow()
+        job.last_outcome = outcome
+        job.last_duration = round(duration, 3)
+        job.last_error = error
+        metrics.JOB_RUNS.inc((job.name, outcome))
+        try:
+            with self.app.app_context():
+                self.lock.record(job.name, outcome, job.last_duration, error)
+        except Exception as e:
+            print(f"Error recording run of job {job.name}: {e}")
+
+    def stats(self):
+        """Jobs with the run statistics recorded by every process, through the lock"""
+        try:
+            recorded = self.lock.stats()
+        except Exception as e:
+            print(f"Error reading job statistics: {e}")
+            recorded = {}
+        jobs = []
+        for job in sorted(self.jobs.values(), key=lambda j: j.name):
+            stats = job.as_dict()
+            if job.name in recorded:
+                shared = dict(recorded[job.name])
+                shared['running'] = stats['running'] or shared['running']
+                stats.update(shared)
+            jobs.append(stats)
+        return jobs
+
+
+# ==================== BUILT-IN JOBS ====================
+
+def warm_templates(app):
+    """Compile every template into the Jinja cache"""
+    env = app.jinja_env
+    for name in env.list_templates(extensions=['html']):
+        env.get_template(name)
+
+
+def prune_profiles(app):
+    import profiling
+    if os.path.isdir(app.config['PROFILE_DIR']):
+        profiling.prune(app.config['PROFILE_DIR'], app.config['PROFILE_KEEP'])
+
+
+def init_app(app, lock=None):
+    """Create the app's scheduler with the shared maintenance jobs.
+
+    ``lock`` defaults to a FileLock in ``<instance>/scheduler``.
+    ``SCHEDULER_ENABLED`` starts it with the first request of each process;
+    ``SCHEDULER_THREADS`` (default 4) sizes the job pool.
+    """
+    app.config.setdefault('SCHEDULER_ENABLED', os.environ.get('STYLANE_SCHEDULER') == '1')
+    app.config.setdefault('SCHEDULER_THREADS', 4)
+    app.config.setdefault('SCHEDULER_LOCK_DIR', os.path.join(app.instance_path, 'scheduler'))
+    sched = app.extensions['scheduler'] = Scheduler(
+        app, lock or FileLock(app.config['SCHEDULER_LOCK_DIR']), app.config['SCHEDULER_THREADS'])
+    sched.add('warm_templates', lambda: warm_templates(app), every=3600, jitter=60, timeout=60)
+    sched.add('prune_profiles', lambda: prune_profiles(app), cron='17 * * * *', jitter=30, timeout=60)
+
+    if app.config['SCHEDULER_ENABLED']:
+        @app.before_request
+        def _start_scheduler():
+            sched.start()
+
+    return sched
@@ -0,0 +1,199 @@
+"""
+SQLAlchemy query instrumentation and slow-query log for app.py.
+
+``before_cursor_execute``/``after_cursor_execute`` hooks attribute every
+statement to the active Flask endpoint and record count and time; rows are
+the DBAPI rowcount of writes and, for SELECTs, the rows fetched from the
+statement's cursor as the caller reads them (nothing is read ahead).
+Statements slower than ``SLOW_QUERY_MS`` are logged with their query plan,
+and a statement repeated ``N_PLUS_ONE_THRESHOLD`` times in one request is
+reported as a likely N+1 pattern.
+"""
+import json
+import logging
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+import metrics
+
+logger = logging.getLogger('stylane.sql')
+
+
+class QueryRecord:
+    """One statement executed during a request"""
+    __slots__ = ('statement', 'duration_ms', 'rows')
+
+    def __init__(self, statement, duration_ms, rows):
+        self.statement = statement
+        self.duration_ms = duration_ms
+        self.rows = rows
+
+
+class _CountingCursor:
+    """DBAPI cursor that adds the rows fetched through it to a QueryRecord"""
+    __slots__ = ('_cursor', '_record')
+
+    def __init__(self, cursor, record):
+        self._cursor = cursor
+        self._record = record
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._record.rows += 1
+        return row
+
+    def fetchmany(self, *size):
+        rows = self._cursor.fetchmany(*size)
+        self._record.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._record.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class RouteQueryStats:
+    """Per-endpoint totals of statements, time, rows, slow queries and N+1s"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def reset(self):
+        with self._lock:
+            self._routes = {}
+
+    def observe(self, endpoint, queries, slow, n_plus_one):
+        with self._lock:
+            route = self._routes.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'time_ms': 0.0, 'rows': 0,
+                'max_queries': 0, 'slow_queries': 0, 'n_plus_one': 0,
+            })
+            route['requests'] += 1
+            route['queries'] += len(queries)
+            route['time_ms'] += sum(q.duration_ms for q in queries)
+            route['rows'] += sum(q.rows for q in queries)
+            route['max_queries'] = max(route['max_queries'], len(queries))
+            route['slow_queries'] += slow
+            route['n_plus_one'] += n_plus_one
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: dict(route, time_ms=round(route['time_ms'], 3))
+                    for endpoint, route in self._routes.items()}
+
+
+def explain(connection, statement, parameters):
+    """Query plan for a statement, using a raw cursor so no events fire"""
+    if connection.dialect.name == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif connection.dialect.name in ('postgresql', 'mysql', 'mariadb'):
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+
+
+def find_repeated(queries, threshold):
+    """(statement, count) for statements run at least ``threshold`` times"""
+    counts = {}
+    for q in queries:
+        counts[q.statement] = counts.get(q.statement, 0) + 1
+    return [(s, n) for s, n in counts.items() if n >= threshold]
+
+
+def init_app(app, db):
+    """Instrument every engine of ``db`` and report per Flask request.
+
+    ``SLOW_QUERY_MS`` (default 100) is the slow-query log threshold and
+    ``N_PLUS_ONE_THRESHOLD`` (default 5) the number of identical statements
+    in one request that triggers an N+1 warning.
+    """
+    app.config.setdefault('SLOW_QUERY_MS', 100)
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', 5)
+    stats = app.extensions['sql_metrics'] = RouteQueryStats()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # On the execution context, not the pooled connection: a statement
+        # that raises never reaches after_cursor_execute
+        if context is not None:
+            context.stylane_query_start = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, 'stylane_query_start', None)
+        if started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000.0
+        if not has_request_context():
+            return
+        queries = g.get('sql_queries')
+        if queries is None:
+            return
+        if cursor.description is None:
+            queries.append(QueryRecord(statement, duration_ms, max(cursor.rowcount, 0)))
+        else:
+            # SELECT rowcount is -1 on most drivers: count what the result fetches
+            record = QueryRecord(statement, duration_ms, 0)
+            queries.append(record)
+            context.cursor = _CountingCursor(cursor, record)
+        if duration_ms >= app.config['SLOW_QUERY_MS']:
+            g.sql_slow = g.get('sql_slow', 0) + 1
+            plan = None if executemany else explain(conn, statement, parameters)
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'endpoint': request.endpoint,
+                'duration_ms': round(duration_ms, 3),
+                'statement': statement,
+                'plan': plan,
+            }))
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', after_cursor_execute)
+
+    @app.before_request
+    def _start_sql_queries():
+        g.sql_queries = []
+
+    @app.teardown_request
+    def _finish_sql_queries(exc=None):
+        # teardown (not after_request) so lazy loads during template rendering count
+        queries = g.pop('sql_queries', None)
+        if queries is None:
+            return
+        endpoint = request.endpoint or 'unknown'
+        repeated = find_repeated(queries, app.config['N_PLUS_ONE_THRESHOLD'])
+        for statement, count in repeated:
+            logger.warning(json.dumps({
+                'event': 'n_plus_one',
+                'endpoint': endpoint,
+                'count': count,
+                'statement': statement,
+            }))
+        stats.observe(endpoint, queries, g.pop('sql_slow', 0), len(repeated))
+        if queries:
+            metrics.DB_QUERIES.inc((endpoint,), len(queries))
+            metrics.DB_QUERY_SECONDS.inc((endpoint,), sum(q.duration_ms for q in queries) / 1000.0)
+
+    return stats
+
+
+def route_stats(app):
+    """Aggregated per-route query statistics for an instrumented app"""
+    return app.extensions['sql_metrics'].snapshot()
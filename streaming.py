@@ -0,0 +1,64 @@
+"""
+Streamed rendering of long list pages (app.py).
+
+``render_template`` builds the whole page before the first byte is sent,
+so a store with years of sales waits seconds for a blank screen and the
+worker holds every row and the full HTML in memory at once. ``stream_page``
+renders with Jinja streaming instead, over a query iterated in batches of
+``STREAM_YIELD_PER`` rows (``rows()``, SQLAlchemy ``yield_per``): memory
+stays flat whatever the row count.
+
+Output is sent in chunks of about ``STREAM_CHUNK_SIZE`` characters rather
+than one per template fragment. A template calls ``{{ stream_flush() }}``
+where it is about to wait on the database (before the table rows), and
+everything rendered so far, the page header, goes out straight away.
+Status and headers are sent before the rows are read: an error half way
+through ends the page early rather than turning it into a 500.
+"""
+from flask import Response, current_app, stream_with_context
+from markupsafe import Markup
+
+# Stripped from the output; never reaches the browser when streamed
+FLUSH = '<!--stylane:flush-->'
+
+
+def _chunks(pieces, size):
+    buffer, buffered = [], 0
+    for piece in pieces:
+        if FLUSH in piece:
+            head, _, tail = piece.partition(FLUSH)
+            buffer.append(head)
+            yield ''.join(buffer)
+            buffer, buffered = [tail], len(tail)
+            continue
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+    if buffered:
+        yield ''.join(buffer)
+
+
+def rows(query):
+    """Iterate ``query`` in batches instead of loading every row first"""
+    return query.yield_per(current_app.config['STREAM_YIELD_PER'])
+
+
+def stream_page(template_name, **context):
+    """Response rendering ``template_name`` while it is being sent.
+
+    Like flask.stream_template, but the request context is re-entered once
+    per chunk rather than once per template fragment (tens per table row).
+    """
+    app = current_app._get_current_object()
+    template = app.jinja_env.get_or_select_template(template_name)
+    app.update_template_context(context)
+    chunks = _chunks(template.generate(context), app.config['STREAM_CHUNK_SIZE'])
+    return Response(stream_with_context(chunks), mimetype='text/html')
+
+
+def init_app(app):
+    app.config.setdefault('STREAM_CHUNK_SIZE', 16384)
+    app.config.setdefault('STREAM_YIELD_PER', 500)
+    app.jinja_env.globals['stream_flush'] = lambda: Markup(FLUSH)
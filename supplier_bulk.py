@@ -0,0 +1,190 @@
+"""
+Bulk supplier operations for app.py.
+
+Approving a purchase order or advancing a batch of shipments one POST at a
+time costs a lazy relationship walk and a commit per item. These functions
+apply a whole batch in one transaction: rows are loaded with one IN query,
+stock increments for delivered shipments are summed per product and written
+as one UPDATE per product (sent as a single executemany), and every item
+gets its own result, so invalid items are reported without failing the rest.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam
+from sqlalchemy.orm import joinedload
+
+from models import db, Product, RestockRequest, Shipment
+
+SHIPMENT_STATUSES = ('preparing', 'shipped', 'delivered', 'cancelled')
+
+
+def ok(item_id, **fields):
+    return dict(id=item_id, ok=True, **fields)
+
+
+def failed(item_id, error):
+    return {'id': item_id, 'ok': False, 'error': error}
+
+
+def parse_ids(values):
+    """Integer ids from form/JSON values, plus results for the invalid ones"""
+    ids, errors = [], []
+    for value in values:
+        try:
+            item_id = int(value)
+        except (TypeError, ValueError):
+            errors.append(failed(value, 'invalid id'))
+            continue
+        if item_id not in ids:
+            ids.append(item_id)
+    return ids, errors
+
+
+def parse_updates(updates):
+    """Shipment update dicts with integer ids, plus results for the invalid ones"""
+    parsed, errors, seen = [], [], set()
+    for update in updates:
+        if not isinstance(update, dict):
+            errors.append(failed(update, 'invalid update'))
+            continue
+        ids, invalid = parse_ids([update.get('id')])
+        errors += invalid
+        if ids and ids[0] not in seen:
+            seen.add(ids[0])
+            parsed.append(dict(update, id=ids[0]))
+    return parsed, errors
+
+
+def summarize(results):
+    succeeded = sum(1 for r in results if r['ok'])
+    return {'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}
+
+
+def _load(model, ids, *options):
+    query = model.query.options(*options) if options else model.query
+    return {row.id: row for row in query.filter(model.id.in_(ids)).all()} if ids else {}
+
+
+def _commit():
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def approve_requests(ids, supplier_id, tracking_number='', notes='', expected_delivery=False):
+    """Approve pending restock requests and create their shipments"""
+    now = datetime.utcnow()
+    requests = _load(RestockRequest, ids)
+    results, approved = [], {}
+    for request_id in ids:
+        request_obj = requests.get(request_id)
+        if request_obj is None:
+            results.append(failed(request_id, 'not found'))
+            continue
+        if request_obj.status != 'pending':
+            results.append(failed(request_id, f'already {request_obj.status}'))
+            continue
+        request_obj.status = 'approved'
+        request_obj.supplier_id = supplier_id
+        request_obj.updated_at = now
+        approved[request_id] = len(results)
+        results.append(ok(request_id, status='approved'))
+    if approved:
+        # One executemany instead of an INSERT ... RETURNING per shipment
+        db.session.execute(Shipment.__table__.insert(), [{
+            'restock_request_id': request_id,
+            'supplier_id': supplier_id,
+            'tracking_number': tracking_number,
+            'expected_delivery_date': now + timedelta(days=7) if expected_delivery else None,
+            'notes': notes,
+        } for request_id in approved])
+        created = db.session.query(Shipment.restock_request_id, Shipment.id).filter(
+            Shipment.restock_request_id.in_(list(approved)))
+        for request_id, shipment_id in created:
+            results[approved[request_id]]['shipment_id'] = shipment_id
+    _commit()
+    return results
+
+
+def reject_requests(ids, supplier_id, reason=''):
+    """Reject pending restock requests"""
+    now = datetime.utcnow()
+    requests = _load(RestockRequest, ids)
+    results = []
+    for request_id in ids:
+        request_obj = requests.get(request_id)
+        if request_obj is None:
+            results.append(failed(request_id, 'not found'))
+            continue
+        if request_obj.status != 'pending':
+            results.append(failed(request_id, f'already {request_obj.status}'))
+            continue
+        request_obj.status = 'rejected'
+        request_obj.supplier_id = supplier_id
+        request_obj.notes = reason
+        request_obj.updated_at = now
+        results.append(ok(request_id, status='rejected'))
+    _commit()
+    return results
+
+
+def update_shipments(updates, supplier_id):
+    """Apply status changes to many shipments in one transaction.
+
+    ``updates`` is a list of dicts with ``id`` and ``status`` and optionally
+    ``tracking_number`` / ``notes``. Same transitions as the single-shipment
+    route: 'shipped' stamps the date and marks the restock request shipped,
+    the first 'delivered' adds the requested quantity to the product's stock.
+    """
+    now = datetime.utcnow()
+    shipments = _load(Shipment, [u['id'] for u in updates], joinedload(Shipment.restock_request))
+    results, deltas = [], {}
+    for update in updates:
+        shipment_id, status = update['id'], update.get('status')
+        shipment = shipments.get(shipment_id)
+        if shipment is None:
+            results.append(failed(shipment_id, 'not found'))
+            continue
+        if shipment.supplier_id != supplier_id:
+            results.append(failed(shipment_id, 'not your shipment'))
+            continue
+        if status not in SHIPMENT_STATUSES:
+            results.append(failed(shipment_id, f'invalid status {status!r}'))
+            continue
+
+        restock_request = shipment.restock_request
+        shipment.status = status
+        if status == 'shipped' and not shipment.shipped_date:
+            shipment.shipped_date = now
+            restock_request.status = 'shipped'
+        stock_added = 0
+        if status == 'delivered' and not shipment.actual_delivery_date:
+            shipment.actual_delivery_date = now
+            stock_added = restock_request.requested_quantity
+            deltas[restock_request.product_id] = deltas.get(restock_request.product_id, 0) + stock_added
+        if update.get('tracking_number') is not None:
+            shipment.tracking_number = update['tracking_number']
+        if update.get('notes') is not None:
+            shipment.notes = update['notes']
+        shipment.updated_at = now
+        results.append(ok(shipment_id, status=status, product_id=restock_request.product_id,
+                          stock_added=stock_added))
+    add_stock(deltas, now)
+    _commit()
+    return results
+
+
+def add_stock(deltas, now):
+    """One UPDATE per product (a single executemany), in id order"""
+    if not deltas:
+        return
+    products = Product.__table__
+    statement = products.update().where(products.c.id == bindparam('pid')).values(
+        stock_quantity=products.c.stock_quantity + bindparam('delta'),
+        version=products.c.version + 1,
+        updated_at=bindparam('now'))
+    # Sorted so concurrent batches lock rows in the same order
+    db.session.execute(statement, [{'pid': product_id, 'delta': delta, 'now': now}
+                                   for product_id, delta in sorted(deltas.items())])
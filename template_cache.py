@@ -0,0 +1,111 @@
+"""
+Compiled template cache and worker warmup for both apps.
+
+Jinja compiles each template to Python the first time it is rendered, in
+every worker, so after a deploy or a scale-out the first request to each
+page also pays for compiling its template, base.html and their includes.
+With ``TEMPLATE_CACHE_DIR`` set (default ``<instance>/jinja_cache``, env
+``STYLANE_TEMPLATE_CACHE``, empty to disable) the compiled bytecode is kept
+on disk, shared by the workers on a host and kept across restarts; a
+template whose source has changed is compiled again. Fill it at deploy
+time, from the directory the app will run in (cache keys include the
+template's path):
+
+    python template_cache.py          # app.py templates
+    python template_cache.py --aws    # app_aws.py templates
+
+With ``TEMPLATE_WARMUP`` (env ``STYLANE_TEMPLATE_WARMUP=1``) create_app also
+loads every template and renders each role's dashboard once before the
+worker takes traffic, so routing, the database or AWS clients and the
+template globals are warm too. A failing warmup is printed, not raised.
+"""
+import argparse
+import os
+import sys
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+ROLES = ('admin', 'store_manager', 'supplier')
+
+
+def precompile(app):
+    """Compile every template of ``app`` (into the bytecode cache if set); returns the count"""
+    env = app.jinja_env
+    names = [name for name in env.list_templates() if name.endswith('.html')]
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+def warmup(app, sessions):
+    """Load every template, then GET each role's dashboard as that role.
+
+    ``sessions()`` runs in an app context and returns ``{role: session
+    values}`` for the roles that can be rendered.
+    """
+    started = time.perf_counter()
+    try:
+        count = precompile(app)
+        with app.app_context():
+            accounts = sessions()
+        client = app.test_client()
+        statuses = []
+        for role in ROLES:
+            if role not in accounts:
+                continue
+            with client.session_transaction() as sess:
+                sess.clear()
+                sess.update(accounts[role])
+            response = client.get(f'/{role.replace("_", "-")}/dashboard')
+            response.close()
+            statuses.append(f'{role} {response.status_code}')
+    except Exception as e:
+        print(f"Template warmup failed: {e}")
+        return
+    print(f"Template warmup: {count} templates, {', '.join(statuses) or 'no dashboards'} "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def init_app(app, sessions):
+    """Attach the bytecode cache; run the warmup when ``TEMPLATE_WARMUP`` is set.
+
+    Call after the blueprints, filters and context processors are registered.
+    """
+    app.config.setdefault('TEMPLATE_CACHE_DIR', os.environ.get(
+        'STYLANE_TEMPLATE_CACHE', os.path.join(app.instance_path, 'jinja_cache')))
+    app.config.setdefault('TEMPLATE_WARMUP', os.environ.get('STYLANE_TEMPLATE_WARMUP') == '1')
+    directory = app.config['TEMPLATE_CACHE_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    if app.config['TEMPLATE_WARMUP']:
+        warmup(app, sessions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile templates into the bytecode cache')
+    parser.add_argument('--aws', action='store_true', help="app_aws.py's templates (same files)")
+    parser.add_argument('--clear', action='store_true', help='drop cached bytecode first')
+    args = parser.parse_args(argv)
+
+    if args.aws:
+        from app_aws import create_app
+    else:
+        from app import create_app
+    app = create_app({'TEMPLATE_WARMUP': False})
+    cache = app.jinja_env.bytecode_cache
+    if cache is None:
+        print("TEMPLATE_CACHE_DIR is empty: nothing to fill")
+        return 1
+    if args.clear:
+        cache.clear()
+    started = time.perf_counter()
+    count = precompile(app)
+    print(f"Compiled {count} templates into {app.config['TEMPLATE_CACHE_DIR']} "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import unittest
+from datetime import datetime, timedelta
+
+from analytics import SalesColumns
+
+
+class TestSalesColumns(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime(2024, 6, 30, 12, 0, 0)
+        products = [
+            (1, 1, 'Shirt', 'SKU-1', 'Shirts', 10, 5),
+            (2, 1, 'Jeans', 'SKU-2', 'Pants', 2, 5),
+            (3, 1, 'Socks', 'SKU-3', None, 50, 5),
+            (4, 2, 'Jacket', 'SKU-4', 'Jackets', 0, 2),
+            (5, 2, 'Hoodie', 'SKU-5', 'Sweaters', 8, 2),
+        ]
+        sales = [
+            (1, 1, 8, 800.0, self.now - timedelta(days=1)),
+            (2, 1, 2, 150.0, self.now - timedelta(days=40)),
+            (3, 1, 1, 50.0, self.now - timedelta(days=2)),
+            (4, 2, 1, 200.0, self.now - timedelta(days=35)),
+            (4, 2, 1, 300.0, self.now - timedelta(days=3)),
+            (99, 2, 1, 999.0, self.now),  # unknown product is ignored
+        ]
+        self.columns = SalesColumns(products, sales, {1: 'Downtown', 2: 'Uptown'})
+
+    def test_sales_by_store(self):
+        self.assertEqual(self.columns.sales_by_store(),
+                         [('Downtown', 1000.0, 3), ('Uptown', 500.0, 2)])
+
+    def test_low_stock_by_store(self):
+        self.assertEqual(self.columns.low_stock_by_store(), [('Downtown', 1), ('Uptown', 1)])
+
+    def test_abc_classification(self):
+        summary = {row[0]: row[1:] for row in self.columns.abc_summary()}
+        # Shirt (800) and Jacket (500) cover the first 80% of 1500 in revenue
+        self.assertEqual(summary['A'][0], 2)
+        self.assertEqual(summary['B'][0], 1)
+        self.assertEqual(summary['C'][0], 2)
+        self.assertAlmostEqual(sum(row[2] for row in summary.values()), 1.0)
+
+    def test_sell_through_by_category(self):
+        rows = {row[0]: row[1:] for row in self.columns.sell_through_by_category()}
+        self.assertEqual(rows['Shirts'], (8, 10, 8 / 18))
+        self.assertEqual(rows['Uncategorized'][0], 1)
+        self.assertEqual(rows['Sweaters'][2], 0.0)
+
+    def test_top_n_per_store(self):
+        top = self.columns.top_products(1, store_id=1)
+        self.assertEqual(top, [('Shirt', 'SKU-1', 8, 800.0)])
+        self.assertEqual([row[0] for row in self.columns.top_products(10, store_id=2)], ['Jacket'])
+        self.assertEqual(self.columns.top_products(10, store_id=3), [])
+
+    def test_period_growth(self):
+        growth = {row[0]: row[1:] for row in self.columns.period_growth(30, now=self.now)}
+        self.assertEqual(growth['Downtown'], (850.0, 150.0, 700.0 / 150.0))
+        self.assertEqual(growth['Uptown'], (300.0, 200.0, 0.5))
+
+    def test_from_items_handles_strings_and_decimals(self):
+        from decimal import Decimal
+        columns = SalesColumns.from_items(
+            [{'product_id': 'p1', 'store_id': 's1', 'name': 'Tee', 'sku': 'T-1',
+              'stock_quantity': Decimal('3'), 'low_stock_threshold': Decimal('10')}],
+            [{'product_id': 'p1', 'store_id': 's1', 'quantity': Decimal('2'),
+              'total_amount': Decimal('19.98'), 'sale_date': '2024-06-01T10:00:00.123456'}],
+            [{'store_id': 's1', 'name': 'Mall'}],
+        )
+        self.assertEqual(columns.store_totals('s1'), (19.98, 1))
+        self.assertEqual(columns.low_stock_by_store(), [('Mall', 1)])
+
+    def test_empty_inputs(self):
+        columns = SalesColumns([], [])
+        report = columns.report()
+        self.assertEqual(report['sales_by_store'], [])
+        self.assertEqual(report['top_products'], [])
+        self.assertEqual(columns.store_totals(1), (0.0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
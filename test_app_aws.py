@@ -2,6 +2,8 @@ import unittest
 from unittest.mock import MagicMock, patch
 import sys
 import os
+import subprocess
+import tempfile
 
 # Set dummy AWS credentials to avoid NoCredentialsError during import
 os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
@@ -17,39 +19,45 @@ except ImportError:
     sys.path.append(os.getcwd())
     import app_aws
 
+import boto3
+from botocore.stub import Stubber
 from werkzeug.security import generate_password_hash
 
+import aws_metrics
+import profiling
+from dynamo_local import LocalDynamoResource
+
 class TestAppAws(unittest.TestCase):
     def setUp(self):
-        self.app = app_aws.app.test_client()
-        self.app.testing = True
-        app_aws.app.config['PROPAGATE_EXCEPTIONS'] = True
-        
-        # Mock DynamoDB Tables attached to the module
+        # Mock DynamoDB Tables, handed out by a mock resource
         self.users_table_mock = MagicMock()
-        app_aws.users_table = self.users_table_mock
-        
         self.stores_table_mock = MagicMock()
-        app_aws.stores_table = self.stores_table_mock
-        
         self.products_table_mock = MagicMock()
-        app_aws.products_table = self.products_table_mock
-        
         self.sales_table_mock = MagicMock()
-        app_aws.sales_table = self.sales_table_mock
-
         self.restock_requests_table_mock = MagicMock()
-        app_aws.restock_requests_table = self.restock_requests_table_mock
-
         self.shipments_table_mock = MagicMock()
-        app_aws.shipments_table = self.shipments_table_mock
-        
+        resource = MagicMock()
+        resource.Table.side_effect = {
+            'StyleLaneUsers': self.users_table_mock,
+            'StyleLaneStores': self.stores_table_mock,
+            'StyleLaneProducts': self.products_table_mock,
+            'StyleLaneSales': self.sales_table_mock,
+            'StyleLaneRestockRequests': self.restock_requests_table_mock,
+            'StyleLaneShipments': self.shipments_table_mock,
+        }.__getitem__
+
         # Mock SNS client
         self.sns_mock = MagicMock()
-        app_aws.sns = self.sns_mock
-        
-        # Set SNS ARN for testing
-        app_aws.SNS_TOPIC_ARN = 'arn:aws:sns:us-east-1:123456789012:TestTopic'
+
+        self.flask_app = app_aws.create_app({
+            'TESTING': True,
+            'PROPAGATE_EXCEPTIONS': True,
+            'DYNAMODB_RESOURCE': resource,
+            'SNS_CLIENT': self.sns_mock,
+            # Set SNS ARN for testing
+            'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:123456789012:TestTopic',
+        })
+        self.app = self.flask_app.test_client()
 
     def tearDown(self):
         # Clean up session
@@ -140,15 +148,141 @@ class TestAppAws(unittest.TestCase):
             # 'image': file_storage # Handling file upload mocking is complex, skip for now or use simplified
         }
         
-        # We need to mock os.path.exists or make sure UPLOAD FOLDER exists effectively
-        # app_aws.py creates it on import: os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-        # So it should be fine.
-        
         response = self.app.post('/store-manager/products/create', data=data, follow_redirects=True)
         
         self.assertEqual(response.status_code, 200)
         self.products_table_mock.put_item.assert_called()
         self.sns_mock.publish.assert_called() # Notification for new product
 
+    def reports_app(self):
+        resource = LocalDynamoResource()
+        resource.Table('StyleLaneStores').put_item(Item={'store_id': 's1', 'name': 'Mall Store'})
+        for i in range(3):
+            resource.Table('StyleLaneProducts').put_item(Item={
+                'product_id': f'p{i}', 'store_id': 's1', 'name': 'Tee', 'sku': f'TEE-{i}',
+                'category': 'Shirts', 'stock_quantity': 3, 'low_stock_threshold': 10})
+            resource.Table('StyleLaneSales').put_item(Item={
+                'sale_id': f'x{i}', 'product_id': f'p{i}', 'store_id': 's1', 'store_shard': 's1#0',
+                'quantity': 2, 'total_amount': '40.00', 'sale_date': '2024-01-01T10:00:00'})
+        app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None})
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['username'] = 'admin'
+            sess['role'] = 'admin'
+        return app, client
+
+    def test_admin_reports(self):
+        app, client = self.reports_app()
+        response = client.get('/admin/reports')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Mall Store', response.data)
+        self.assertIn(b'TEE-1', response.data)
+        self.assertIn(b'ABC Classification', response.data)
+
+    def test_reports_read_every_page(self):
+        from dynamo_local import LocalTable
+        page = LocalTable._page
+
+        def one_item_pages(table, items, Limit=None, *args):
+            # As if each item filled a 1 MB page
+            return page(table, items, Limit or 1, *args)
+
+        app, client = self.reports_app()
+        with patch.object(LocalTable, '_page', one_item_pages), app.test_request_context('/admin/reports'):
+            columns = app_aws.load_sales_columns()
+            self.assertEqual((columns.n_products, columns.sales_by_store()), (3, [('Mall Store', 120.0, 3)]))
+            self.assertEqual(app_aws.load_sales_columns('s1').store_totals('s1'), (120.0, 3))
+
+    def test_aws_calls_header_and_route_stats(self):
+        resource = LocalDynamoResource()
+        resource.Table('StyleLaneStores').put_item(Item={'store_id': 's1', 'name': 'Mall Store'})
+        flask_app = app_aws.create_app({'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None,
+                                        'AWS_CALLS_HEADER': True})
+        self.app = flask_app.test_client()
+
+        with self.app.session_transaction() as sess:
+            sess['username'] = 'admin'
+            sess['role'] = 'admin'
+        response = self.app.get('/admin/reports')
+
+        header = response.headers['X-AWS-Calls']
+        self.assertIn('calls=3 ', header)
+        self.assertIn('Scan:StyleLaneStores*1', header)
+        stats = aws_metrics.route_stats(flask_app)['admin.reports']
+        self.assertGreaterEqual(stats['calls']['sum'], 3)
+
+    def test_signed_header_profiles_request(self):
+        profile_dir = tempfile.mkdtemp()
+        self.flask_app.config['PROFILE_DIR'] = profile_dir
+
+        self.app.get('/login', headers={profiling.HEADER: 'forged.token'})
+        self.assertEqual(os.listdir(profile_dir), [])
+
+        token = profiling.make_token(self.flask_app.secret_key)
+        response = self.app.get('/login', headers={profiling.HEADER: token})
+        self.assertEqual(response.status_code, 200)
+        files = os.listdir(profile_dir)
+        self.assertEqual(len([f for f in files if f.endswith('.collapsed')]), 1)
+        self.assertEqual(len([f for f in files if f.endswith('.alloc.txt')]), 1)
+
+        with self.app.session_transaction() as sess:
+            sess['username'] = 'admin'
+            sess['role'] = 'admin'
+        page = self.app.get('/admin/profiles')
+        self.assertEqual(page.status_code, 200)
+        self.assertIn(b'GET /login', page.data)
+        name = profiling.list_profiles(self.flask_app)[0]['name']
+        self.assertEqual(self.app.get(f'/admin/profiles/{name}.alloc.txt').status_code, 200)
+        self.assertEqual(self.app.get('/admin/profiles/../app_aws.py').status_code, 404)
+
+    def test_services_created_on_first_use(self):
+        resource = MagicMock()
+        flask_app = app_aws.create_app({'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None})
+        resource.Table.assert_not_called()
+
+        client = flask_app.test_client()
+        client.post('/login', data={'username': 'nobody', 'password': 'x'})
+        client.post('/login', data={'username': 'nobody', 'password': 'x'})
+        # One table handle per process, reused across requests
+        resource.Table.assert_called_once_with('StyleLaneUsers')
+
+    def test_cold_start_defers_boto3_and_numpy(self):
+        code = ('import sys, app_aws; app_aws.create_app(); '
+                'print(sorted(m for m in ("boto3", "numpy") if m in sys.modules))')
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_blueprint_endpoints(self):
+        with self.flask_app.test_request_context():
+            from flask import url_for
+            self.assertEqual(url_for('admin.reports'), '/admin/reports')
+            self.assertEqual(url_for('store_manager.create_product'), '/store-manager/products/create')
+            self.assertEqual(url_for('supplier.dashboard'), '/supplier/dashboard')
+            self.assertEqual(url_for('auth.login'), '/login')
+
+    def test_botocore_hooks_record_consumed_capacity(self):
+        client = boto3.client('dynamodb', region_name='us-east-1')
+        aws_metrics.instrument_client(client)
+        sent = []
+        client.meta.events.register_first('before-call.*.*',
+                                          lambda params, **kwargs: sent.append(params['body']))
+        stubber = Stubber(client)
+        stubber.add_response('get_item', {
+            'Item': {'username': {'S': 'admin'}},
+            'ConsumedCapacity': {'TableName': 'StyleLaneUsers', 'CapacityUnits': 0.5},
+        })
+
+        with stubber, self.flask_app.test_request_context('/'):
+            from flask import g
+            g.aws_calls = []
+            client.get_item(TableName='StyleLaneUsers', Key={'username': {'S': 'admin'}})
+            call = g.aws_calls[0]
+
+        self.assertIn(b'ReturnConsumedCapacity', sent[0])
+        self.assertEqual((call.operation, call.table, call.items, call.capacity),
+                         ('GetItem', 'StyleLaneUsers', 1, 0.5))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import os
+import time
+
+os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+os.environ['AWS_DEFAULT_REGION'] = 'us-east-1'
+
+from botocore.exceptions import ClientError
+from flask import Flask, g
+
+import aws_clients
+
+
+class TestAwsClients(unittest.TestCase):
+    def test_settings_from_environment(self):
+        options = aws_clients.settings({'STYLANE_WORKER_THREADS': '32', 'STYLANE_AWS_READ_TIMEOUT': '2'})
+        self.assertEqual(options['max_pool_connections'], 36)
+        self.assertEqual(options['read_timeout'], 2.0)
+        self.assertEqual(options['retry_mode'], 'adaptive')
+
+    def test_client_config(self):
+        client = aws_clients.client('dynamodb', region_name='us-east-1', max_pool_connections=48)
+        config = client.meta.config
+        self.assertEqual(config.max_pool_connections, 48)
+        self.assertEqual(config.retries['mode'], 'adaptive')
+        self.assertEqual(config.retries['total_max_attempts'], 4)
+        self.assertTrue(config.tcp_keepalive)
+        self.assertEqual(config.connect_timeout, 1.0)
+
+    def test_deadline_fails_fast_without_network(self):
+        app = Flask(__name__)
+        app.config['AWS_REQUEST_DEADLINE'] = 0.5
+        aws_clients.init_app(app)
+        # Nothing listens on port 9: a call that got as far as sending would hang or refuse
+        client = aws_clients.client('dynamodb', region_name='us-east-1',
+                                    endpoint_url='http://127.0.0.1:9', max_attempts=1)
+        with app.test_request_context('/'):
+            app.preprocess_request()
+            self.assertGreater(aws_clients.remaining(), 0)
+            g.aws_deadline = time.monotonic() - 0.1
+            with self.assertRaises(ClientError) as ctx:
+                client.get_item(TableName='StyleLaneProducts', Key={'product_id': {'S': 'p1'}})
+        self.assertEqual(ctx.exception.response['Error']['Code'], aws_clients.DEADLINE_ERROR_CODE)
+
+    def test_no_deadline_outside_requests(self):
+        self.assertIsNone(aws_clients.remaining())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from botocore.exceptions import ClientError
+
+import app_aws
+import cdc
+from dynamo_local import LocalDynamoResource, LocalStreamsClient
+
+
+class Recorder:
+    """Handler keeping the latest image per product, failing on demand"""
+
+    def __init__(self):
+        self.items = {}
+        self.batches = []
+        self.fail = False
+
+    def apply(self, records):
+        self.batches.append([r.event_name for r in records])
+        if self.fail:
+            raise RuntimeError('handler down')
+        for r in records:
+            if r.new_image is None:
+                self.items.pop(r.keys['product_id'], None)
+            else:
+                self.items[r.keys['product_id']] = r.new_image
+
+
+class TestLocalStream(unittest.TestCase):
+    def setUp(self):
+        self.resource = LocalDynamoResource(streams=True)
+        self.table = self.resource.Table('StyleLaneProducts')
+        self.client = LocalStreamsClient(self.resource)
+        self.arn = self.table.latest_stream_arn
+
+    def read(self, iterator_type='TRIM_HORIZON', **kwargs):
+        shard = self.client.describe_stream(StreamArn=self.arn)['StreamDescription']['Shards'][0]['ShardId']
+        iterator = self.client.get_shard_iterator(StreamArn=self.arn, ShardId=shard,
+                                                  ShardIteratorType=iterator_type, **kwargs)['ShardIterator']
+        return self.client.get_records(ShardIterator=iterator)['Records']
+
+    def test_records_have_streams_shape(self):
+        item = {'product_id': 'p1', 'name': 'Scarf', 'stock_quantity': 5}
+        self.table.put_item(Item=item)
+        self.table.put_item(Item=item)  # unchanged: no record
+        self.table.update_item(Key={'product_id': 'p1'}, UpdateExpression='SET stock_quantity = :s',
+                               ExpressionAttributeValues={':s': 4})
+        self.table.delete_item(Key={'product_id': 'p1'})
+
+        records = self.read()
+        self.assertEqual([r['eventName'] for r in records], ['INSERT', 'MODIFY', 'REMOVE'])
+        modify = records[1]['dynamodb']
+        self.assertEqual(modify['Keys'], {'product_id': {'S': 'p1'}})
+        self.assertEqual((modify['OldImage']['stock_quantity'], modify['NewImage']['stock_quantity']),
+                         ({'N': '5'}, {'N': '4'}))
+        self.assertNotIn('NewImage', records[2]['dynamodb'])
+        self.assertEqual(self.read('AFTER_SEQUENCE_NUMBER', SequenceNumber=modify['SequenceNumber']), records[2:])
+        self.assertEqual(self.read('LATEST'), [])
+
+    def test_trimmed_records(self):
+        self.table.stream.retention = 2
+        for i in range(3):
+            self.table.put_item(Item={'product_id': f'p{i}'})
+        self.assertEqual(len(self.read()), 2)
+        with self.assertRaises(ClientError):
+            self.read('AFTER_SEQUENCE_NUMBER', SequenceNumber='0')
+
+
+class TestStreamConsumer(unittest.TestCase):
+    def setUp(self):
+        self.resource = LocalDynamoResource(streams=True)
+        self.table = self.resource.Table('StyleLaneProducts')
+        self.client = LocalStreamsClient(self.resource)
+
+    def consumer(self, checkpoints=None, batch_size=2):
+        consumer = cdc.StreamConsumer(lambda: self.client, checkpoints, batch_size=batch_size)
+        handler = Recorder()
+        consumer.subscribe(self.table.latest_stream_arn, handler)
+        return consumer, handler
+
+    def test_starts_at_latest_and_batches(self):
+        self.table.put_item(Item={'product_id': 'old'})
+        consumer, handler = self.consumer()
+        consumer.position()
+        for i in range(5):
+            self.table.put_item(Item={'product_id': f'p{i}', 'stock_quantity': i})
+        self.assertEqual(consumer.poll(), 5)
+        self.assertEqual(sorted(handler.items), ['p0', 'p1', 'p2', 'p3', 'p4'])
+        self.assertEqual([len(b) for b in handler.batches], [2, 2, 1])
+        self.assertEqual(consumer.poll(), 0)
+
+    def test_failed_batch_is_redelivered(self):
+        consumer, handler = self.consumer()
+        consumer.position()
+        self.table.put_item(Item={'product_id': 'p1', 'stock_quantity': 1})
+        handler.fail = True
+        self.assertEqual(consumer.poll(), 0)
+        handler.fail = False
+        self.table.delete_item(Key={'product_id': 'p1'})
+        self.table.put_item(Item={'product_id': 'p2', 'stock_quantity': 2})
+        self.assertEqual(consumer.poll(), 3)
+        self.assertEqual(handler.batches, [['INSERT'], ['INSERT', 'REMOVE'], ['INSERT']])
+        self.assertEqual(list(handler.items), ['p2'])
+
+    def test_resumes_from_file_checkpoint(self):
+        path = os.path.join(tempfile.mkdtemp(), 'checkpoints.json')
+        consumer, handler = self.consumer(cdc.FileCheckpoints(path))
+        consumer.position()
+        self.table.put_item(Item={'product_id': 'p1'})
+        consumer.poll()
+        self.table.put_item(Item={'product_id': 'p2'})
+
+        # A new process: reads on after the checkpoint, not from LATEST
+        consumer, handler = self.consumer(cdc.FileCheckpoints(path))
+        consumer.position()
+        self.assertEqual(consumer.poll(), 1)
+        self.assertEqual(list(handler.items), ['p2'])
+
+
+class TestAppCdc(unittest.TestCase):
+    def setUp(self):
+        self.resource = LocalDynamoResource(streams=True)
+        self.products = self.resource.Table('StyleLaneProducts')
+        self.products.put_item(Item={'product_id': 'prod-1', 'store_id': '1', 'name': 'Wool Scarf',
+                                     'sku': 'SCAR-0001', 'price': '12.50', 'stock_quantity': 12,
+                                     'low_stock_threshold': 10})
+        self.app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': self.resource,
+                                       'SNS_TOPIC_ARN': None, 'CDC_ENABLED': True, 'CDC_POLL_SECONDS': 3600})
+        self.consumer = self.app.extensions['cdc']
+        self.addCleanup(self.consumer.stop)
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess.update(username='manager', role='store_manager', store_id='1')
+
+    def test_views_follow_the_stream(self):
+        self.client.get('/store-manager/pos/sku/SCAR-0001')  # first request starts the consumer
+        self.assertTrue(self.consumer.wait_ready(5))
+        index, low_stock = self.app.extensions['search'], self.app.extensions['low_stock']
+        self.assertEqual(low_stock.products(), [])
+
+        # A sale through this app, and a product written by another process
+        self.client.post('/store-manager/pos/sku/SCAR-0001', json={'quantity': 3})
+        self.products.put_item(Item={'product_id': 'prod-2', 'store_id': '1', 'name': 'Leather Belt',
+                                     'sku': 'BELT-0001', 'price': '30.00', 'stock_quantity': 2,
+                                     'low_stock_threshold': 5})
+        self.consumer.poll()
+        self.assertEqual([p['product_id'] for p in low_stock.products('1')], ['prod-2', 'prod-1'])
+        self.assertEqual(index.search('belt'), ['prod-2'])
+
+        self.products.delete_item(Key={'product_id': 'prod-2'})
+        self.consumer.poll()
+        self.assertEqual([p['product_id'] for p in low_stock.products()], ['prod-1'])
+        self.assertEqual(index.search('belt'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
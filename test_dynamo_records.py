@@ -0,0 +1,97 @@
+import os
+import unittest
+from decimal import Decimal
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import app_aws
+import dynamo_records
+from dynamo_local import LocalDynamoResource
+from dynamo_records import ProductRecord, SaleRecord
+
+
+class TestRecords(unittest.TestCase):
+    def test_decoder_types_and_missing_fields(self):
+        decode = ProductRecord.decoder(('product_id', 'name', 'price', 'stock_quantity', 'low_stock_threshold'))
+        record = decode({'product_id': {'S': 'p1'}, 'name': {'S': 'Scarf'}, 'price': {'S': '12.50'},
+                         'stock_quantity': {'N': '3'}, 'low_stock_threshold': {'NULL': True}})
+        self.assertEqual((record.id, record.price, record.stock_quantity), ('p1', 12.5, 3))
+        self.assertIsNone(record.low_stock_threshold)
+        self.assertIsNone(record.sku)  # not projected
+        self.assertTrue(record.is_low_stock)  # threshold defaults to 10
+        self.assertEqual(record.get('sku', 'n/a'), 'n/a')
+        self.assertIs(ProductRecord.decoder(('product_id', 'name', 'price', 'stock_quantity',
+                                             'low_stock_threshold')), decode)
+        with self.assertRaises(AttributeError):
+            record.extra = 1
+
+    def test_scan_and_query_pages_with_projection(self):
+        resource = LocalDynamoResource()
+        table = resource.Table('StyleLaneProducts')
+        for i in range(5):
+            table.put_item(Item={'product_id': f'p{i}', 'store_id': str(i % 2), 'name': f'Tee {i}',
+                                 'size': 'M', 'price': Decimal('9.99'), 'stock_quantity': i})
+        client = resource.meta.client
+        pages = []
+        real_scan = client.scan
+        client.scan = lambda **kw: pages.append(kw) or real_scan(Limit=2, **kw)
+
+        records = dynamo_records.scan(client, 'StyleLaneProducts', ProductRecord, ('product_id', 'name', 'size'))
+        self.assertEqual(sorted(r.name for r in records), [f'Tee {i}' for i in range(5)])
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(set(pages[0]['ExpressionAttributeNames'].values()), {'product_id', 'name', 'size'})
+        self.assertIsNone(records[0].price)
+
+        store = dynamo_records.query(client, 'StyleLaneProducts', 'StoreIdIndex', 'store_id', '0',
+                                     ProductRecord, ('product_id', 'price'))
+        self.assertEqual(sorted(r.product_id for r in store), ['p0', 'p2', 'p4'])
+        self.assertEqual({r.price for r in store}, {9.99})
+
+
+class TestListViews(unittest.TestCase):
+    def setUp(self):
+        self.resource = LocalDynamoResource()
+        self.resource.Table('StyleLaneStores').put_item(Item={'store_id': '1', 'name': 'Mall Store'})
+        products = self.resource.Table('StyleLaneProducts')
+        products.put_item(Item={'product_id': 'p1', 'store_id': '1', 'name': 'Wool Scarf', 'sku': 'SCAR-1',
+                                'price': '12.50', 'stock_quantity': 2, 'low_stock_threshold': 5})
+        products.put_item(Item={'product_id': 'p2', 'store_id': '2', 'name': 'Leather Belt', 'sku': 'BELT-1',
+                                'price': '30.00', 'stock_quantity': 40, 'low_stock_threshold': 5})
+        sales = self.resource.Table('StyleLaneSales')
+        for i in range(12):
+            sales.put_item(Item={'sale_id': f's{i}', 'product_id': 'p1', 'store_id': '1', 'store_shard': '1#0',
+                                 'quantity': 1, 'unit_price': '12.50', 'total_amount': '12.50',
+                                 'sale_date': f'2024-01-{i + 1:02d}T10:00:00'})
+        self.app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': self.resource,
+                                       'SNS_TOPIC_ARN': None, 'AWS_CALLS_HEADER': True})
+        self.client = self.app.test_client()
+
+    def login(self, role, store_id=None):
+        with self.client.session_transaction() as sess:
+            sess.update(username=role, role=role, store_id=store_id)
+
+    def test_store_manager_pages(self):
+        self.login('store_manager', '1')
+        page = self.client.get('/store-manager/products').get_data(as_text=True)
+        self.assertIn('$12.50', page)
+        self.assertNotIn('Leather Belt', page)
+
+        response = self.client.get('/store-manager/dashboard')
+        page = response.get_data(as_text=True)
+        self.assertIn('2024-01-12', page)
+        self.assertNotIn('2024-01-02', page)  # only the ten newest
+        self.assertEqual(page.count('Wool Scarf'), 11)  # low stock row and each recent sale
+        self.assertNotIn('GetItem:StyleLaneProducts', response.headers['X-AWS-Calls'])
+
+    def test_admin_dashboard(self):
+        self.login('admin')
+        response = self.client.get('/admin/dashboard')
+        page = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Mall Store', page)
+        self.assertIn('$12.50', page)
+        self.assertNotIn('GetItem', response.headers['X-AWS-Calls'])
+
+
+if __name__ == '__main__':
+    unittest.main()
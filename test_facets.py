@@ -0,0 +1,105 @@
+import unittest
+
+from sqlalchemy import func
+
+from app import create_app
+from models import db, User, Store, Product
+import facets
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, 'AUTO_RESTOCK': False})
+
+CATALOG = [
+    # name, category, size, color, stock, store
+    ('Running Shoes', 'Shoes', '10', 'White', 12, 1),
+    ('Loafers', 'Shoes', '9', 'Brown', 0, 1),
+    ('Oxford Shirt', 'Shirts', 'M', 'White', 30, 1),
+    ('Polo Shirt', 'Shirts', 'L', None, 4, 1),
+    ('Sneakers', 'Shoes', '10', 'Black', 25, 2),
+]
+
+
+class TestFacetCounts(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([Store(name=f'Store {i}', address='1 High Street') for i in (1, 2)])
+            admin = User(username='admin', email='a@example.com', role='admin')
+            admin.set_password('secret')
+            db.session.add(admin)
+            for i, (name, category, size, color, stock, store_id) in enumerate(CATALOG):
+                db.session.add(Product(name=name, sku=f'SKU-{i}', category=category, size=size, color=color,
+                                       price=10.0, stock_quantity=stock, low_stock_threshold=10,
+                                       store_id=store_id))
+            db.session.commit()
+            self.admin_id = admin.id
+        self.counts = app.extensions['facets']
+
+    def recount(self, store_id=None):
+        """Counts straight from the products table, for comparison"""
+        with app.app_context():
+            query = Product.query if store_id is None else Product.query.filter_by(store_id=store_id)
+            result = {}
+            for facet in facets.FACETS:
+                column = facets.stock_status_expression(Product) if facet == 'stock_status' \
+                    else func.coalesce(getattr(Product, facet), facets.NONE)
+                result[facet] = sorted(query.with_entities(column, func.count()).group_by(column).all())
+            return result
+
+    def facet_counts(self, store_id=None, filters=None):
+        with app.app_context():
+            return self.counts.counts(store_id, filters)
+
+    def test_counts_match_products(self):
+        self.assertEqual(self.facet_counts(), self.recount())
+        self.assertEqual(self.facet_counts(1), self.recount(1))
+        self.assertEqual(self.facet_counts()['category'], [('Shirts', 2), ('Shoes', 3)])
+
+    def test_writes_keep_counts_in_sync(self):
+        with app.app_context():
+            shirt = Product.query.filter_by(sku='SKU-2').one()
+            shirt.category = 'Tops'
+            shirt.stock_quantity = 5          # In Stock -> Low Stock
+            Product.query.filter_by(sku='SKU-0').one().stock_quantity = 11  # still In Stock
+            db.session.delete(Product.query.filter_by(sku='SKU-4').one())
+            db.session.commit()
+            # Bulk statements bypass the ORM but not the triggers
+            products = Product.__table__
+            db.session.execute(products.update().where(products.c.sku == 'SKU-1').values(stock_quantity=20))
+            db.session.commit()
+        self.assertEqual(self.facet_counts(), self.recount())
+        self.assertEqual(self.facet_counts()['stock_status'], [('In Stock', 2), ('Low Stock', 2)])
+
+    def test_drill_down(self):
+        counts = self.facet_counts(filters={'category': 'Shoes', 'color': 'White'})
+        # The chosen facet keeps its other values; the others are narrowed
+        self.assertEqual(counts['category'], [('Shirts', 1), ('Shoes', 1)])
+        self.assertEqual(counts['color'], [('Black', 1), ('Brown', 1), ('White', 1)])
+        self.assertEqual(counts['size'], [('10', 1)])
+        self.assertEqual(self.facet_counts(1, {'category': 'Shirts'})['color'], [(facets.NONE, 1), ('White', 1)])
+
+    def test_inventory_filters(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin_id)
+            sess['_fresh'] = True
+        body = client.get('/admin/inventory?category=Shoes&size=10&format=json').get_json()
+        self.assertEqual(sorted(p['name'] for p in body['products']), ['Running Shoes', 'Sneakers'])
+        self.assertEqual(body['facets']['stock_status'], [['In Stock', 2]])
+        body = client.get(f'/admin/inventory?store_id=1&color={facets.NONE}&format=json').get_json()
+        self.assertEqual([p['name'] for p in body['products']], ['Polo Shirt'])
+
+        # Searching: same shape, counts over the matches
+        body = client.get('/admin/inventory?q=shirt&color=White&format=json').get_json()
+        self.assertEqual([p['name'] for p in body['products']], ['Oxford Shirt'])
+        self.assertEqual(body['facets']['category'], [['Shirts', 1]])
+        self.assertEqual(body['facets']['color'], [[facets.NONE, 1], ['White', 1]])
+
+        page = client.get('/admin/inventory?category=Shoes').get_data(as_text=True)
+        self.assertIn('Shoes (3)', page)
+        self.assertIn('Out of Stock (1)', page)
+        self.assertNotIn('Oxford Shirt', page)
+
+
+if __name__ == '__main__':
+    unittest.main()
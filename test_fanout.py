@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+import unittest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from flask import Flask, g
+
+import app_aws
+import aws_clients
+import fanout
+import metrics
+from dynamo_local import LocalDynamoResource
+
+
+def slow(seconds, value):
+    def read():
+        time.sleep(seconds)
+        return value
+    return read
+
+
+def failing():
+    raise RuntimeError('table gone')
+
+
+class TestGather(unittest.TestCase):
+    def test_partial_results_at_the_deadline(self):
+        metrics.REGISTRY.reset()
+        pool = fanout.FanOut(threads=4, timeout=0.2)
+        started = time.monotonic()
+        results, missing = pool.gather('page', {'a': slow(0.05, 1), 'b': slow(0.05, 2), 'late': slow(1, 3),
+                                                'broken': failing})
+        self.assertLess(time.monotonic() - started, 0.5)  # not the sum, nor the slowest
+        self.assertEqual(results, {'a': 1, 'b': 2})
+        self.assertEqual(missing, ['late', 'broken'])
+        text = metrics.render(metrics.REGISTRY.snapshot())
+        self.assertIn('stylane_fanout_reads_total{view="page",read="late",outcome="timeout"} 1', text)
+        self.assertIn('stylane_fanout_reads_total{view="page",read="broken",outcome="error"} 1', text)
+
+    def test_abandoned_reads_hold_their_threads(self):
+        metrics.REGISTRY.reset()
+        pool = fanout.FanOut(threads=2, timeout=0.05)
+        release = threading.Event()
+        self.assertEqual(pool.gather('page', {'a': release.wait, 'b': release.wait})[1], ['a', 'b'])
+        started = time.monotonic()
+        self.assertEqual(pool.gather('page', {'c': slow(0, 3)}), ({}, ['c']))
+        self.assertLess(time.monotonic() - started, 0.04)  # not queued to time out behind a and b
+        text = metrics.render(metrics.REGISTRY.snapshot())
+        self.assertIn('stylane_fanout_abandoned_reads{view="page"} 2', text)
+        self.assertIn('stylane_fanout_reads_total{view="page",read="c",outcome="busy"} 1', text)
+
+        release.set()
+        for _ in range(100):
+            if 'stylane_fanout_abandoned_reads{view="page"} 0' in metrics.render(metrics.REGISTRY.snapshot()):
+                break
+            time.sleep(0.01)
+        self.assertEqual(pool.gather('page', {'c': slow(0, 3)}), ({'c': 3}, []))
+
+    def test_overlapping_gathers_queue_rather_than_drop(self):
+        pool = fanout.FanOut(threads=5, timeout=2)
+        reads = {name: slow(0.05, name) for name in 'abcde'}
+        outcomes = []
+        views = [threading.Thread(target=lambda: outcomes.append(pool.gather('page', reads))) for _ in range(2)]
+        for view in views:
+            view.start()
+        for view in views:
+            view.join()
+        self.assertEqual(outcomes, [({name: name for name in 'abcde'}, [])] * 2)
+
+    def test_reads_share_the_request_context_and_deadline(self):
+        app = Flask(__name__)
+        aws_clients.init_app(app)
+        pool = fanout.init_app(app)
+        app.config['AWS_REQUEST_DEADLINE'] = 0.1
+        with app.test_request_context():
+            app.preprocess_request()
+            g.user = 'admin'
+            self.assertLessEqual(pool.deadline(), 0.1)
+            results, missing = pool.gather('page', {'user': lambda: g.user, 'late': slow(1, None)})
+        self.assertEqual((results, missing), ({'user': 'admin'}, ['late']))
+
+
+class TestAdminDashboard(unittest.TestCase):
+    def test_renders_without_the_slow_table(self):
+        resource = LocalDynamoResource()
+        resource.Table('StyleLaneStores').put_item(Item={'store_id': 's1', 'name': 'Mall Store'})
+        for name in ('ann', 'bob'):
+            resource.Table('StyleLaneUsers').put_item(Item={'username': name, 'role': 'supplier'})
+
+        def delay(service, operation, table, *args):
+            time.sleep(1.0 if table == 'StyleLaneUsers' else 0.05)
+
+        resource.hooks.append(delay)
+        aws_app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None,
+                                      'FANOUT_TIMEOUT': 0.4, 'AWS_CALLS_HEADER': True})
+        client = aws_app.test_client()
+        with client.session_transaction() as sess:
+            sess.update(username='admin', role='admin')
+        started = time.monotonic()
+        response = client.get('/admin/dashboard')
+        self.assertLess(time.monotonic() - started, 0.9)  # five 50 ms scans in one go, users dropped
+        page = response.get_data(as_text=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('left out of the figures below: users.', page)
+        self.assertIn('<h3>1</h3>', page)  # stores
+        self.assertTrue(response.headers['X-AWS-Calls'].startswith('calls=4 '))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from dynamo_local import LocalDynamoResource
+from generate_data import SyntheticDataset, write_dynamodb
+
+
+class TestSyntheticDataset(unittest.TestCase):
+    def setUp(self):
+        self.end = datetime(2024, 6, 1)
+
+    def test_same_seed_is_deterministic(self):
+        first = SyntheticDataset(stores=3, products_per_store=20, days=10, seed=7, end=self.end)
+        second = SyntheticDataset(stores=3, products_per_store=20, days=10, seed=7, end=self.end)
+        a = list(first.sales_chunks())[0]
+        b = list(second.sales_chunks())[0]
+        self.assertEqual(a['product_id'].tolist(), b['product_id'].tolist())
+        self.assertEqual(list(first.products()), list(second.products()))
+
+    def test_sales_are_skewed_and_consistent(self):
+        dataset = SyntheticDataset(stores=4, products_per_store=50, days=30,
+                                   sales_per_day=100, seed=1, end=self.end)
+        chunk = next(dataset.sales_chunks())
+        # Every sale belongs to a product of the same store
+        self.assertTrue(((chunk['product_id'] - 1) // 50 + 1 == chunk['store_id']).all())
+        self.assertTrue((chunk['sale_date'] >= dataset.start).all())
+        # Zipf popularity: the best seller in a store outsells the median product
+        counts = sorted(((chunk['product_id'] - 1) % 50).tolist().count(s) for s in range(50))
+        self.assertGreater(counts[-1], 5 * counts[25])
+
+    def test_write_local_dynamodb(self):
+        dataset = SyntheticDataset(stores=2, products_per_store=10, days=5,
+                                   sales_per_day=5, seed=3, end=self.end)
+        resource = LocalDynamoResource()
+        stats = write_dynamodb(dataset, lambda: resource, workers=2, progress=False)
+
+        self.assertEqual(resource.Table('StyleLaneProducts').item_count(), 20)
+        self.assertEqual(resource.Table('StyleLaneSales').item_count(), stats.tables['sales'][0])
+        user = resource.Table('StyleLaneUsers').get_item(Key={'username': 'storemanager1'})['Item']
+        self.assertEqual(user['store_id'], 'store-00001')
+
+
+class TestLocalDynamoResource(unittest.TestCase):
+    def setUp(self):
+        self.table = LocalDynamoResource().Table('StyleLaneProducts')
+        for n in range(5):
+            self.table.put_item(Item={'product_id': f'p{n}', 'store_id': 's1' if n < 3 else 's2',
+                                      'stock_quantity': n})
+
+    def test_numbers_come_back_as_decimal(self):
+        item = self.table.get_item(Key={'product_id': 'p2'})['Item']
+        self.assertEqual(item['stock_quantity'], Decimal(2))
+        with self.assertRaises(TypeError):
+            self.table.put_item(Item={'product_id': 'bad', 'price': 1.5})
+
+    def test_scan_filter_and_pagination(self):
+        low = self.table.scan(FilterExpression=Attr('stock_quantity').lte(1))['Items']
+        self.assertEqual(sorted(i['product_id'] for i in low), ['p0', 'p1'])
+        page = self.table.scan(Limit=2)
+        self.assertEqual(len(page['Items']), 2)
+        rest = self.table.scan(ExclusiveStartKey=page['LastEvaluatedKey'])
+        self.assertEqual(len(rest['Items']), 3)
+
+    def test_query_index_and_conditional_put(self):
+        items = self.table.query(IndexName='StoreIdIndex',
+                                 KeyConditionExpression=Key('store_id').eq('s2'))['Items']
+        self.assertEqual(len(items), 2)
+        with self.assertRaises(ClientError):
+            self.table.put_item(Item={'product_id': 'p0'},
+                                ConditionExpression=Attr('product_id').not_exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
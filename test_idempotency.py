@@ -0,0 +1,123 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import app_aws
+import idempotency
+from app import create_app
+from dynamo_local import LocalDynamoResource
+from models import db, User, Store, Product, Sale, RestockRequest, IdempotencyKey
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, 'AUTO_RESTOCK': False})
+
+
+class TestSqlIdempotency(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            store = Store(name='Mall Store', address='1 High Street')
+            db.session.add(store)
+            db.session.flush()
+            manager = User(username='manager', email='m@example.com', role='store_manager', store_id=store.id)
+            manager.set_password('secret')
+            db.session.add_all([manager, Product(name='Scarf', sku='SCAR-1', store_id=store.id,
+                                                 price=12.5, stock_quantity=10)])
+            db.session.commit()
+            self.manager_id = manager.id
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.manager_id)
+            sess['_fresh'] = True
+
+    def state(self):
+        with app.app_context():
+            return Sale.query.count(), db.session.get(Product, 1).stock_quantity
+
+    def test_retried_sale_form_runs_once(self):
+        form = {'product_id': '1', 'quantity': '2', 'idempotency_key': 'k-1'}
+        first = self.client.post('/store-manager/sales/create', data=form)
+        with self.client.session_transaction() as sess:
+            sess.pop('_flashes')  # the cashier never saw the first response
+        retry = self.client.post('/store-manager/sales/create', data=form)
+        self.assertEqual(self.state(), (1, 8))
+        self.assertEqual((retry.status_code, retry.location), (first.status_code, first.location))
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess['_flashes'], [('success', 'Sale recorded successfully. Total: $25.00')])
+
+        # Same key, different sale; a new key records again
+        response = self.client.post('/store-manager/sales/create', data=dict(form, quantity='3'))
+        self.assertEqual(response.status_code, 422)
+        self.client.post('/store-manager/sales/create', data=dict(form, idempotency_key='k-2'))
+        self.assertEqual(self.state(), (2, 6))
+
+    def test_pos_header_and_restock(self):
+        headers = {'Idempotency-Key': 'till-7'}
+        first = self.client.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 1}, headers=headers)
+        retry = self.client.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 1}, headers=headers)
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.get_json()), (201, first.get_json()))
+        self.assertEqual(self.state(), (1, 9))
+
+        form = {'product_id': '1', 'quantity': '20', 'idempotency_key': 'r-1'}
+        for _ in range(2):
+            self.client.post('/store-manager/restock-requests/create', data=form)
+        with app.app_context():
+            self.assertEqual(RestockRequest.query.count(), 1)
+
+    def test_in_flight_retry_and_expired_lease(self):
+        store = app.extensions['idempotency'][0]
+        with app.test_request_context('/store-manager/pos/sku/SCAR-1', method='POST', json={'quantity': 1}):
+            key = idempotency._hash(str(self.manager_id), 'store_manager.pos_sku', 'till-8')
+            self.assertIsNone(store.claim(key, idempotency._fingerprint(), 60))
+        headers = {'Idempotency-Key': 'till-8'}
+        response = self.client.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 1}, headers=headers)
+        self.assertEqual((response.status_code, response.headers['Retry-After']), (409, '1'))
+        self.assertEqual(self.state(), (0, 10))
+
+        # The first worker died: once its lease runs out the key is free again
+        with app.app_context():
+            IdempotencyKey.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+            db.session.commit()
+        response = self.client.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 1}, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.state(), (1, 9))
+
+    def test_purge_job(self):
+        for key in ('a', 'b'):
+            self.client.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 1}, headers={'Idempotency-Key': key})
+        with app.app_context():
+            db.session.get(IdempotencyKey, IdempotencyKey.query.first().key).expires_at = datetime(2000, 1, 1)
+            db.session.commit()
+            self.assertEqual(app.extensions['scheduler'].jobs['purge_idempotency_keys'].func(), 1)
+            self.assertEqual(IdempotencyKey.query.count(), 1)
+
+
+class TestDynamoIdempotency(unittest.TestCase):
+    def test_till_retry_records_one_sale(self):
+        resource = LocalDynamoResource()
+        resource.Table('StyleLaneProducts').put_item(Item={
+            'product_id': 'p1', 'store_id': '1', 'name': 'Wool Scarf', 'sku': 'SCAR-1',
+            'price': '12.50', 'stock_quantity': 5, 'low_stock_threshold': 1})
+        aws_app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None})
+        client = aws_app.test_client()
+        with client.session_transaction() as sess:
+            sess.update(username='manager', role='store_manager', store_id='1')
+
+        responses = [client.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 2, 'idempotency_key': 'k'})
+                     for _ in range(2)]
+        self.assertEqual([r.status_code for r in responses], [201, 201])
+        self.assertEqual(responses[0].get_json(), responses[1].get_json())
+        self.assertEqual(resource.Table('StyleLaneSales').item_count(), 1)
+        self.assertEqual(resource.Table('StyleLaneProducts').get_item(Key={'product_id': 'p1'})['Item']
+                         ['stock_quantity'], 3)
+        stored = resource.Table('StyleLaneIdempotency').scan()['Items']
+        self.assertEqual(len(stored), 1)
+        self.assertGreater(stored[0]['expires_at'], datetime.utcnow().timestamp() + 3600)
+
+
+if __name__ == '__main__':
+    unittest.main()
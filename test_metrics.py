@@ -0,0 +1,89 @@
+import unittest
+import json
+import os
+import tempfile
+
+from flask import Flask
+
+import metrics
+
+
+def make_app(directory=None):
+    app = Flask(__name__)
+    app.config['METRICS_DIR'] = directory
+    metrics.init_app(app)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    return app
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.REGISTRY.reset()
+
+    def test_request_metrics_rendered(self):
+        client = make_app().test_client()
+        for _ in range(3):
+            client.get('/ping')
+        client.get('/missing')
+        text = client.get('/metrics').get_data(as_text=True)
+        self.assertIn('stylane_http_requests_total{method="GET",endpoint="ping",status="200"} 3', text)
+        self.assertIn('stylane_http_requests_total{method="GET",endpoint="unknown",status="404"} 1', text)
+        self.assertIn('stylane_http_request_duration_seconds_count{endpoint="ping"} 3', text)
+        self.assertIn('stylane_http_request_duration_seconds_bucket{endpoint="ping",le="+Inf"} 3', text)
+        self.assertIn('stylane_http_response_size_bytes_sum{endpoint="ping"} 12', text)
+        # the scrape itself is in flight while rendering
+        self.assertIn('stylane_http_requests_in_flight 1', text)
+
+    def test_shards_of_finished_threads_folded(self):
+        import threading
+        registry = metrics.Registry()
+        counter = registry.counter('jobs_total', 'Jobs', ('kind',))
+        histogram = registry.histogram('job_seconds', 'Job time', buckets=(1.0,))
+        for _ in range(50):
+            thread = threading.Thread(target=lambda: (counter.inc(('a',)), histogram.observe((), 0.5)))
+            thread.start()
+            thread.join()
+        counter.inc(('a',))
+        self.assertEqual(len(registry._shards), 1)  # only this thread's
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot['jobs_total'][('a',)], 51)
+        self.assertEqual(snapshot['job_seconds'][()], [50, 0, 25.0])
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics.HTTP_LATENCY.observe(('x',), 0.003)
+        metrics.HTTP_LATENCY.observe(('x',), 0.2)
+        lines = metrics.render(metrics.REGISTRY.snapshot()).splitlines()
+        self.assertIn('stylane_http_request_duration_seconds_bucket{endpoint="x",le="0.005"} 1', lines)
+        self.assertIn('stylane_http_request_duration_seconds_bucket{endpoint="x",le="0.25"} 2', lines)
+        self.assertIn('stylane_http_request_duration_seconds_count{endpoint="x"} 2', lines)
+
+    def test_cache_hits_and_misses(self):
+        metrics.record_cache('sku', True)
+        metrics.record_cache('sku', True)
+        metrics.record_cache('sku', False)
+        samples = metrics.REGISTRY.snapshot()['stylane_cache_requests_total']
+        self.assertEqual(samples[('sku', 'hit')], 2)
+        self.assertEqual(samples[('sku', 'miss')], 1)
+
+    def test_processes_merged_through_directory(self):
+        directory = tempfile.mkdtemp()
+        metrics.AWS_CALLS.inc(('Query', 'StyleLaneSales'), 2)
+        metrics.HTTP_IN_FLIGHT.inc()
+        # Snapshot left behind by a worker that has since exited
+        with open(os.path.join(directory, 'metrics-999999999.json'), 'w') as fh:
+            json.dump({'pid': 999999999, 'samples': [
+                ['stylane_aws_calls_total', ['Query', 'StyleLaneSales'], 5],
+                ['stylane_http_requests_in_flight', [], 4],
+            ]}, fh)
+        merged = metrics.collect(directory)
+        self.assertEqual(merged['stylane_aws_calls_total'][('Query', 'StyleLaneSales')], 7)
+        self.assertEqual(merged['stylane_http_requests_in_flight'][()], 1)
+        self.assertTrue(os.path.exists(os.path.join(directory, f'metrics-{os.getpid()}.json')))
+
+
+if __name__ == '__main__':
+    unittest.main()
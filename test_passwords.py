@@ -0,0 +1,109 @@
+import os
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from werkzeug.security import generate_password_hash
+
+import app_aws
+import metrics
+import passwords
+from app import create_app
+from dynamo_local import LocalDynamoResource
+from models import db, User
+
+OLD_HASH = 'pbkdf2:sha256:1000'
+NEW_HASH = 'scrypt:16384:8:1'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestLoginThrottle(unittest.TestCase):
+    def test_user_and_address_buckets(self):
+        clock = Clock()
+        throttle = passwords.LoginThrottle(passwords.TokenBuckets(2, 6), passwords.TokenBuckets(3, 60), clock)
+        self.assertEqual([throttle.acquire('ann', '10.0.0.1') for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(throttle.acquire('ann', '10.0.0.1'), 10.0)  # one token per 10s
+        self.assertEqual(throttle.acquire('bob', '10.0.0.1'), 0)  # the refused attempt took nothing
+        self.assertAlmostEqual(throttle.acquire('cat', '10.0.0.1'), 1.0)  # the address is spent
+        self.assertEqual(throttle.acquire('cat', '10.0.0.2'), 0)
+        clock.now += 10
+        self.assertEqual(throttle.acquire('ann', '10.0.0.1'), 0)
+
+    def test_least_recent_keys_dropped(self):
+        buckets = passwords.TokenBuckets(1, 1, max_keys=2)
+        for key in ('a', 'b', 'c'):
+            buckets.take(key, buckets.level(key, 0), 0)
+        self.assertEqual(list(buckets._buckets), ['b', 'c'])
+        self.assertEqual(buckets.level('a', 0), 1)
+
+
+class TestSqlLogin(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True,
+                               'PASSWORD_HASH_METHOD': NEW_HASH, 'LOGIN_USER_BURST': 3})
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(User(username='admin', email='a@example.com', role='admin',
+                                password_hash=generate_password_hash('secret', OLD_HASH)))
+            db.session.commit()
+
+    def stored_hash(self):
+        with self.app.app_context():
+            return User.query.one().password_hash
+
+    def test_rehash_on_successful_login(self):
+        client = self.app.test_client()
+        client.post('/login', data={'username': 'admin', 'password': 'wrong'})
+        self.assertTrue(self.stored_hash().startswith(OLD_HASH + '$'))
+        response = client.post('/login', data={'username': 'admin', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(self.stored_hash().startswith(NEW_HASH + '$'))
+        with self.app.app_context():
+            self.assertTrue(User.query.one().check_password('secret'))
+
+    def test_excess_attempts_rejected_before_hashing(self):
+        metrics.REGISTRY.reset()
+        client = self.app.test_client()
+        with patch('passwords.check_password_hash', return_value=False) as check:
+            statuses = [client.post('/login', data={'username': 'admin', 'password': 'guess'}).status_code
+                        for _ in range(5)]
+        self.assertEqual(statuses, [200, 200, 200, 429, 429])
+        self.assertEqual(check.call_count, 3)
+        response = client.post('/login', data={'username': 'admin', 'password': 'secret'})
+        self.assertEqual(response.headers['Retry-After'], '12')
+        self.assertIn(b'Too many login attempts', response.data)
+        text = metrics.render(metrics.REGISTRY.snapshot())
+        self.assertIn('stylane_login_attempts_total{outcome="throttled"} 3', text)
+        self.assertIn('stylane_login_attempts_total{outcome="failure"} 3', text)
+
+
+class TestDynamoLogin(unittest.TestCase):
+    def test_rehash_on_successful_login(self):
+        resource = LocalDynamoResource()
+        users = resource.Table('StyleLaneUsers')
+        users.put_item(Item={'username': 'manager', 'role': 'store_manager', 'store_id': 's1',
+                             'password_hash': generate_password_hash('secret', OLD_HASH)})
+        aws_app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None,
+                                      'PASSWORD_HASH_METHOD': NEW_HASH})
+        client = aws_app.test_client()
+        client.post('/login', data={'username': 'manager', 'password': 'wrong'})
+        stored = users.get_item(Key={'username': 'manager'})['Item']['password_hash']
+        self.assertTrue(stored.startswith(OLD_HASH + '$'))
+        response = client.post('/login', data={'username': 'manager', 'password': 'secret'})
+        self.assertEqual(response.status_code, 302)
+        stored = users.get_item(Key={'username': 'manager'})['Item']['password_hash']
+        self.assertTrue(stored.startswith(NEW_HASH + '$'))
+        with aws_app.app_context():
+            self.assertEqual(passwords.verify(stored, 'secret'), (True, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
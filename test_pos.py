@@ -0,0 +1,207 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+import uuid
+from unittest.mock import patch
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import app_aws
+import metrics
+from app import create_app
+
+from dynamo_local import LocalDynamoResource
+from models import db, User, Store, Product, Sale
+from pos import SkuCache
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, 'AUTO_RESTOCK': False})
+
+
+def cache_count(result):
+    return metrics.REGISTRY.snapshot().get('stylane_cache_requests_total', {}).get(('pos_sku', result), 0)
+
+
+class TestSkuCache(unittest.TestCase):
+    def test_lru_and_ttl(self):
+        cache = SkuCache(size=2, ttl=60)
+        cache.put(1, 'A', 10)
+        cache.put(1, 'B', 11)
+        self.assertEqual(cache.get(1, 'A'), 10)
+        cache.put(2, 'A', 12)  # evicts (1, 'B'), the least recently used
+        self.assertIsNone(cache.get(1, 'B'))
+        self.assertEqual((cache.get(1, 'A'), cache.get(2, 'A')), (10, 12))
+
+        expired = SkuCache(ttl=0)
+        expired.put(1, 'A', 10)
+        self.assertIsNone(expired.get(1, 'A'))
+        self.assertEqual(len(expired), 0)
+
+
+class TestSqlPos(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            stores = [Store(name=f'Store {i}', address='1 High Street') for i in (1, 2)]
+            db.session.add_all(stores)
+            db.session.flush()
+            manager = User(username='manager', email='m@example.com', role='store_manager', store_id=stores[0].id)
+            manager.set_password('secret')
+            # The same SKU may be stocked by several stores
+            db.session.add_all([manager] + [Product(name=f'Scarf {s.id}', sku='SCAR-0001', store_id=s.id,
+                                                    price=12.5, stock_quantity=5) for s in stores])
+            db.session.commit()
+            self.manager_id = manager.id
+        app.extensions['pos'].clear()
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.manager_id)
+            sess['_fresh'] = True
+
+    def test_lookup_is_store_scoped_and_cached(self):
+        misses, hits = cache_count('miss'), cache_count('hit')
+        response = self.client.get('/store-manager/pos/sku/SCAR-0001')
+        self.assertEqual(response.status_code, 200)
+        product = response.get_json()['product']
+        self.assertEqual((product['name'], product['stock_quantity']), ('Scarf 1', 5))
+        self.client.get('/store-manager/pos/sku/SCAR-0001')
+        self.assertEqual((cache_count('miss') - misses, cache_count('hit') - hits), (1, 1))
+        self.assertEqual(self.client.get('/store-manager/pos/sku/NOPE').status_code, 404)
+
+    def test_sale_in_same_request(self):
+        response = self.client.post('/store-manager/pos/sku/SCAR-0001', json={'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        body = response.get_json()
+        self.assertEqual((body['product']['stock_quantity'], body['sale']['total_amount']), (3, 25.0))
+
+        response = self.client.post('/store-manager/pos/sku/SCAR-0001', data={'quantity': '4'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['product']['stock_quantity'], 3)
+        self.assertEqual(self.client.post('/store-manager/pos/sku/SCAR-0001', json={'quantity': 0}).status_code, 400)
+        with app.app_context():
+            self.assertEqual([(s.store_id, s.quantity) for s in Sale.query], [(1, 2)])
+
+    def test_deleted_product_drops_cached_id(self):
+        self.client.get('/store-manager/pos/sku/SCAR-0001')
+        with app.app_context():
+            product = Product.query.filter_by(store_id=1, sku='SCAR-0001').one()
+            db.session.delete(product)
+            db.session.commit()
+            db.session.add(Product(name='New Scarf', sku='SCAR-0001', store_id=1, price=15.0, stock_quantity=9))
+            db.session.commit()
+        product = self.client.get('/store-manager/pos/sku/SCAR-0001').get_json()['product']
+        self.assertEqual((product['name'], product['stock_quantity']), ('New Scarf', 9))
+
+
+# products as created before SKUs were unique per store (and before versions)
+OLD_PRODUCTS = """
+CREATE TABLE products (
+    id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, description TEXT, category VARCHAR(50),
+    size VARCHAR(20), color VARCHAR(30), sku VARCHAR(50) NOT NULL, price FLOAT NOT NULL,
+    stock_quantity INTEGER NOT NULL, low_stock_threshold INTEGER NOT NULL, image_filename VARCHAR(255),
+    store_id INTEGER NOT NULL, created_at DATETIME, updated_at DATETIME,
+    PRIMARY KEY (id), UNIQUE (sku), FOREIGN KEY(store_id) REFERENCES stores (id)
+);
+CREATE INDEX products_by_name ON products (name);
+CREATE TRIGGER products_touch AFTER UPDATE OF price ON products BEGIN
+    UPDATE products SET updated_at = '2000-01-01' WHERE id = new.id;
+END;
+INSERT INTO products (id, name, sku, price, stock_quantity, low_stock_threshold, store_id)
+VALUES (1, 'Scarf 1', 'SCAR-0001', 12.5, 5, 3, 1);
+"""
+
+
+class TestSchemaUpgrade(unittest.TestCase):
+    def test_sku_unique_per_store_on_older_databases(self):
+        from sqlalchemy import inspect
+        from sqlalchemy.exc import IntegrityError
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stylane.db')
+            fresh = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+            with fresh.app_context():
+                db.create_all()
+                db.session.add_all([Store(id=1, name='Store 1', address='1 High Street'),
+                                    Store(id=2, name='Store 2', address='2 High Street')])
+                db.session.commit()
+                db.engine.dispose()
+            connection = sqlite3.connect(path)
+            connection.executescript('DROP TABLE products;' + OLD_PRODUCTS)
+            connection.close()
+
+            upgraded = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+            with upgraded.app_context():
+                db.create_all()
+                indexes = {index['name']: index['unique'] for index in inspect(db.engine).get_indexes('products')}
+                self.assertEqual(indexes, {'ix_products_store_sku': 1, 'products_by_name': 0})
+                db.session.add(Product(name='Scarf 2', sku='SCAR-0001', store_id=2, price=14.0))
+                db.session.commit()  # another store may use the same SKU
+                db.session.add(Product(name='Scarf 3', sku='SCAR-0001', store_id=2, price=14.0))
+                self.assertRaises(IntegrityError, db.session.commit)
+                db.session.rollback()
+                product = db.session.get(Product, 1)
+                self.assertEqual((product.name, product.stock_quantity, product.version), ('Scarf 1', 5, 1))
+                product.price = 13.0
+                db.session.commit()
+                db.session.refresh(product)
+                self.assertEqual(str(product.updated_at)[:10], '2000-01-01')  # the trigger was kept
+                db.engine.dispose()
+
+
+class TestAwsPos(unittest.TestCase):
+    def setUp(self):
+        self.resource = LocalDynamoResource()
+        products = self.resource.Table('StyleLaneProducts')
+        for store_id in ('1', '2'):
+            products.put_item(Item={'product_id': f'prod-{store_id}', 'store_id': store_id, 'name': 'Scarf',
+                                    'sku': 'SCAR-0001', 'price': '12.50', 'stock_quantity': 5})
+        aws_app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': self.resource, 'SNS_TOPIC_ARN': None})
+        self.client = aws_app.test_client()
+        with self.client.session_transaction() as sess:
+            sess.update(username='manager', role='store_manager', store_id='2')
+
+    def test_lookup_and_conditional_sale(self):
+        product = self.client.get('/store-manager/pos/sku/SCAR-0001').get_json()['product']
+        self.assertEqual((product['id'], product['stock_quantity']), ('prod-2', 5))
+
+        response = self.client.post('/store-manager/pos/sku/SCAR-0001', json={'quantity': 5})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['sale']['total_amount'], 62.5)
+        response = self.client.post('/store-manager/pos/sku/SCAR-0001', json={'quantity': 1})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['product']['stock_quantity'], 0)
+
+        sales = self.resource.Table('StyleLaneSales').scan()['Items']
+        self.assertEqual([(s['product_id'], s['quantity']) for s in sales], [('prod-2', 5)])
+        stock = self.resource.Table('StyleLaneProducts').get_item(Key={'product_id': 'prod-1'})['Item']
+        self.assertEqual(stock['stock_quantity'], 5)
+
+    def test_stock_and_sale_written_together(self):
+        products = self.resource.Table('StyleLaneProducts')
+        self.client.get('/store-manager/pos/sku/SCAR-0001')  # cached at 12.50
+        products.update_item(Key={'product_id': 'prod-2'}, UpdateExpression='SET price = :p',
+                             ExpressionAttributeValues={':p': '15.00'})
+        response = self.client.post('/store-manager/pos/sku/SCAR-0001', json={'quantity': 1})
+        self.assertEqual(response.get_json()['sale']['total_amount'], 15.0)  # charged at the current price
+
+        # The sale cannot be written (its id is taken): no stock is taken either,
+        # and the till is told to retry rather than shown an error page
+        taken = uuid.UUID(int=1)
+        self.resource.Table('StyleLaneSales').put_item(Item={'sale_id': str(taken)})
+        headers = {'Idempotency-Key': 'till-1'}
+        with patch('uuid.uuid4', return_value=taken), patch('time.sleep') as sleep:
+            response = self.client.post('/store-manager/pos/sku/SCAR-0001', json={'quantity': 1}, headers=headers)
+        self.assertEqual((response.status_code, response.headers['Retry-After']), (409, '1'))
+        self.assertEqual(sleep.call_count, app_aws.SALE_ATTEMPTS - 1)
+        item = products.get_item(Key={'product_id': 'prod-2'})['Item']
+        self.assertEqual((item['stock_quantity'], item['version']), (4, 1))
+        self.assertEqual(len(self.resource.Table('StyleLaneSales').scan()['Items']), 2)
+
+        # The key was released, so the retry records the sale
+        response = self.client.post('/store-manager/pos/sku/SCAR-0001', json={'quantity': 1}, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(products.get_item(Key={'product_id': 'prod-2'})['Item']['stock_quantity'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import io
+import os
+import sqlite3
+import tempfile
+import unittest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import app_aws
+from app import create_app, record_sale
+from dynamo_local import LocalDynamoResource
+from models import db, User, Store, Product, RestockRequest, Shipment
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, 'AUTO_RESTOCK': False})
+
+EDIT = {'name': 'Wool Scarf', 'description': '', 'category': 'Accessories', 'size': 'M', 'color': 'Red',
+        'price': '12.5', 'stock_quantity': '10', 'low_stock_threshold': '3'}
+
+
+class TestSqlProductVersions(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            store = Store(name='Mall Store', address='1 High Street')
+            db.session.add(store)
+            db.session.flush()
+            manager = User(username='manager', email='m@example.com', role='store_manager', store_id=store.id)
+            supplier = User(username='supplier', email='s@example.com', role='supplier')
+            for user in (manager, supplier):
+                user.set_password('secret')
+            db.session.add_all([manager, supplier, Product(
+                name='Wool Scarf', category='Accessories', size='M', color='Red', sku='SCAR-1',
+                store_id=store.id, price=12.5, stock_quantity=10, low_stock_threshold=3)])
+            db.session.commit()
+            self.user_ids = manager.id, supplier.id
+
+    def client(self, user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        return client
+
+    def product(self):
+        with app.app_context():
+            product = db.session.get(Product, 1)
+            return product.name, product.price, product.stock_quantity, product.version
+
+    def test_edit_writes_changed_fields_at_its_version(self):
+        manager = self.client(self.user_ids[0])
+        response = manager.post('/store-manager/products/1/update', data=dict(EDIT, price='14', version='1'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.product(), ('Wool Scarf', 14.0, 10, 2))
+
+    def test_edit_after_a_sale_is_reported_not_applied(self):
+        manager = self.client(self.user_ids[0])
+        # The form was rendered at version 1 showing 10 in stock; a till sells 2
+        manager.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 2})
+        manager.post('/store-manager/products/1/update', data=dict(EDIT, name='Silk Scarf', version='1'))
+        self.assertEqual(self.product(), ('Wool Scarf', 12.5, 8, 2))
+        with manager.session_transaction() as sess:
+            category, message = sess['_flashes'][-1]
+        self.assertEqual(category, 'error')
+        self.assertIn('stock is now 8', message)
+
+        manager.post('/store-manager/products/1/update', data=dict(EDIT, name='Silk Scarf', stock_quantity='8',
+                                                                    version='2'))
+        self.assertEqual(self.product(), ('Silk Scarf', 12.5, 8, 3))
+
+    def test_edit_without_version_or_at_an_old_one_saves_nothing(self):
+        manager = self.client(self.user_ids[0])
+        response = manager.post('/store-manager/products/1/update', data=dict(EDIT, price='14'))
+        self.assertEqual(response.status_code, 400)
+        with tempfile.TemporaryDirectory() as uploads:
+            app.config['UPLOAD_FOLDER'] = uploads
+            try:
+                manager.post('/store-manager/products/1/update', data=dict(
+                    EDIT, price='14', version='0', image=(io.BytesIO(b'GIF89a'), 'scarf.gif')))
+                self.assertEqual(os.listdir(uploads), [])
+                manager.post('/store-manager/products/1/update', data=dict(
+                    EDIT, price='14', version='1', image=(io.BytesIO(b'GIF89a'), 'scarf.gif')))
+                self.assertEqual(len(os.listdir(uploads)), 1)
+            finally:
+                app.config['UPLOAD_FOLDER'] = os.path.join('static', 'uploads', 'products')
+        self.assertEqual(self.product(), ('Wool Scarf', 14.0, 10, 2))
+
+    def test_version_column_added_to_older_databases(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stylane.db')
+            old = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+            with old.app_context():
+                db.create_all()
+                db.session.add(Store(name='Mall Store', address='1 High Street'))
+                db.session.add(Product(name='Wool Scarf', sku='SCAR-1', store_id=1, price=12.5))
+                db.session.commit()
+                db.engine.dispose()
+            connection = sqlite3.connect(path)
+            connection.execute('ALTER TABLE products DROP COLUMN version')  # as made before versions
+            connection.close()
+
+            upgraded = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'})
+            with upgraded.app_context():
+                self.assertEqual(Product.query.one().version, 1)
+                db.engine.dispose()
+
+    def test_stock_changes_are_deltas(self):
+        with app.app_context():
+            stale = db.session.get(Product, 1)
+            stale.stock_quantity  # loaded at 10
+            Product.query.filter_by(id=1).update({'stock_quantity': 1})
+            self.assertIsNone(record_sale(stale, 2))  # checked in SQL, not against the stale 10
+            self.assertEqual(stale.stock_quantity, 1)
+            self.assertIsNotNone(record_sale(stale, 1))
+            db.session.commit()
+
+            db.session.add(RestockRequest(store_id=1, product_id=1, requested_by=self.user_ids[0],
+                                          requested_quantity=20, status='approved'))
+            db.session.add(Shipment(restock_request_id=1, supplier_id=self.user_ids[1], status='pending'))
+            db.session.commit()
+        self.client(self.user_ids[1]).post('/supplier/shipments/1/update-status', data={'status': 'delivered'})
+        self.assertEqual(self.product(), ('Wool Scarf', 12.5, 20, 3))
+
+
+class TestDynamoProductVersions(unittest.TestCase):
+    def setUp(self):
+        self.resource = LocalDynamoResource()
+        self.products = self.resource.Table('StyleLaneProducts')
+        self.products.put_item(Item={
+            'product_id': 'p1', 'store_id': '1', 'name': 'Wool Scarf', 'category': 'Accessories', 'size': 'M',
+            'color': 'Red', 'description': '', 'sku': 'SCAR-1', 'price': '12.50', 'stock_quantity': 10,
+            'low_stock_threshold': 3})  # written before versions
+        self.app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': self.resource, 'SNS_TOPIC_ARN': None})
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess.update(username='manager', role='store_manager', store_id='1')
+
+    def item(self):
+        return self.products.get_item(Key={'product_id': 'p1'})['Item']
+
+    def test_compare_and_set(self):
+        self.client.post('/store-manager/products/p1/update', data=dict(EDIT, price='14', version='0'))
+        item = self.item()
+        self.assertEqual((item['price'], item['stock_quantity'], item['version']), (14, 10, 1))
+        self.assertEqual(item['name'], 'Wool Scarf')
+
+        self.client.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 2})
+        self.assertEqual((self.item()['stock_quantity'], self.item()['version']), (8, 2))
+        self.client.post('/store-manager/products/p1/update', data=dict(EDIT, price='15', version='1'))
+        self.assertEqual((self.item()['price'], self.item()['stock_quantity']), (14, 8))
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess['_flashes'][-1][0], 'error')
+
+        response = self.client.post('/store-manager/products/p1/update', data=dict(EDIT, price='15'))
+        self.assertEqual(response.status_code, 400)
+
+        with self.app.test_request_context():
+            self.assertIsNone(app_aws.update_product(self.item(), 1, {'price': 15}))
+            self.assertEqual(app_aws.update_product(self.item(), 2, {'price': 15})['version'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+
+from app import create_app
+from models import db, User, Store, Product, RestockRequest
+import restock
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True,
+                  'RESTOCK_COALESCE_SECONDS': 0.05})
+
+
+class TestAutoRestock(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            store = Store(name='Store 1', address='1 High Street')
+            db.session.add(store)
+            db.session.flush()
+            manager = User(username='manager', email='m@example.com', role='store_manager', store_id=store.id)
+            manager.set_password('secret')
+            products = [Product(name=f'Product {i}', sku=f'SKU-{i}', store_id=store.id, price=10.0,
+                                stock_quantity=15, low_stock_threshold=10) for i in range(3)]
+            db.session.add_all([manager] + products)
+            db.session.commit()
+            self.manager_id = manager.id
+            self.product_ids = [p.id for p in products]
+        self.worker = app.extensions['restock']
+        self.addCleanup(self.worker.wait)
+
+    def sell(self, product_id, quantity):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.manager_id)
+            sess['_fresh'] = True
+        return client.post('/store-manager/sales/create',
+                           data={'product_id': product_id, 'quantity': quantity})
+
+    def auto_requests(self):
+        with app.app_context():
+            return [(r.product_id, r.requested_quantity, r.requested_by)
+                    for r in RestockRequest.query.order_by(RestockRequest.product_id)]
+
+    def test_sale_crossing_threshold_creates_request(self):
+        self.sell(self.product_ids[0], 3)
+        self.worker.wait()
+        self.assertEqual(self.auto_requests(), [])
+
+        self.sell(self.product_ids[0], 4)  # 12 -> 8, crosses 10
+        self.worker.wait()
+        self.assertEqual(self.auto_requests(), [(self.product_ids[0], 12, self.manager_id)])
+
+    def test_events_coalesced_and_open_requests_skipped(self):
+        first, second, third = self.product_ids
+        with app.app_context():
+            db.session.add(RestockRequest(store_id=1, product_id=second, requested_by=self.manager_id,
+                                          requested_quantity=5))
+            db.session.commit()
+            # Several crossings of the same product in one batch
+            for stock in (9, 20, 8):
+                db.session.get(Product, first).stock_quantity = stock
+                db.session.commit()
+            db.session.get(Product, second).stock_quantity = 2
+            # Raising the threshold above the stock is a crossing too
+            db.session.get(Product, third).low_stock_threshold = 16
+            db.session.commit()
+        self.worker.wait()
+
+        created = [r for r in self.auto_requests() if r[1] != 5]
+        self.assertEqual(created, [(first, 12, self.manager_id), (third, 17, self.manager_id)])
+
+    def test_rolled_back_changes_are_not_queued(self):
+        with app.app_context():
+            db.session.get(Product, self.product_ids[0]).stock_quantity = 1
+            db.session.flush()
+            db.session.rollback()
+        self.worker.wait()
+        self.assertEqual(self.auto_requests(), [])
+
+    def test_crossed_threshold(self):
+        with app.app_context():
+            product = db.session.get(Product, self.product_ids[0])
+            product.stock_quantity = 10
+            self.assertTrue(restock.crossed_threshold(product))
+            db.session.commit()
+            product.stock_quantity = 4
+            self.assertFalse(restock.crossed_threshold(product))
+            db.session.rollback()
+
+
+if __name__ == '__main__':
+    unittest.main()
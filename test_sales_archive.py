@@ -0,0 +1,217 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import date, datetime, timedelta
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import sales_archive
+from dynamo_local import LocalDynamoResource
+from sales_archive import SalesArchive
+
+TODAY = date(2024, 6, 30)
+
+
+def day(days_ago, hour=10):
+    return datetime.combine(TODAY - timedelta(days=days_ago), datetime.min.time()).replace(hour=hour)
+
+
+class HotTable:
+    """Sales rows standing in for a sales table"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.fail_delete = False
+
+    def load(self, before):
+        return [r for r in self.rows if r[4] < before]
+
+    def delete(self, before):
+        if self.fail_delete:
+            raise RuntimeError('delete interrupted')
+        self.rows = [r for r in self.rows if r[4] >= before]
+
+
+class TestSalesArchive(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.archive = SalesArchive(self.directory)
+        self.hot = HotTable([
+            ('1', '1', 2, 20.0, day(100)), ('1', '1', 1, 10.0, day(100, 15)),  # same day: one summary
+            ('2', '1', 1, 5.0, day(70)), ('1', '2', 3, 30.0, day(40)), ('2', '1', 1, 5.0, day(2)),
+        ])
+
+    def run_job(self, horizon, today=TODAY):
+        return sales_archive.archive_sales(self.archive, horizon, self.hot.load, self.hot.delete, today)
+
+    def test_folds_into_monthly_partitions(self):
+        self.assertEqual(self.run_job(30), 4)
+        self.assertEqual(len(self.hot.rows), 1)
+        self.assertEqual(self.archive.watermark(), TODAY - timedelta(days=30))
+        self.assertEqual([m for m, _ in self.archive.partitions()], ['2024-03', '2024-04', '2024-05'])
+
+        archived = self.archive.read()
+        self.assertEqual(len(archived['day']), 3)
+        self.assertEqual(int(archived['transactions'].sum()), 4)
+        self.assertEqual(float(archived['amount'].sum()), 65.0)
+        self.assertEqual(self.archive.read(store_id='2')['quantity'].tolist(), [3])
+        # Nothing new to archive: the run only re-checks the hot table
+        self.assertEqual(self.run_job(30), 0)
+
+    def test_date_range_prunes_partitions(self):
+        self.run_job(30)
+        start, end = sales_archive.parse_range({'from': '2024-04-01', 'to': '2024-04-30'})
+        self.assertEqual([m for m, _ in self.archive.partitions(start, end)], ['2024-04'])
+        self.assertEqual(self.archive.read(start, end)['amount'].tolist(), [5.0])
+        self.assertIsNone(self.archive.read(date(2024, 6, 1)))
+        with self.assertRaises(ValueError):
+            sales_archive.parse_range({'from': 'last week'})
+
+    def test_interrupted_run_is_not_counted_twice(self):
+        self.run_job(80)
+        self.hot.fail_delete = True
+        with self.assertRaises(RuntimeError):
+            self.run_job(30)
+        # Files were written and the watermark moved, but the rows remain hot
+        self.assertEqual(len(self.hot.rows), 3)
+        self.hot.fail_delete = False
+        self.assertEqual(self.run_job(30), 0)
+        self.assertEqual(len(self.hot.rows), 1)
+        self.assertEqual(int(self.archive.read()['transactions'].sum()), 4)
+
+        # A run stopped before moving the watermark leaves summaries past it
+        self.archive = SalesArchive(self.directory)
+        self.hot.rows.append(('2', '1', 1, 5.0, day(10)))
+        stale = sales_archive.fold([('2', '1', 1, 5.0, day(10))])
+        month = str(stale['day'][0])[:7]
+        self.archive.write(stale, self.archive.watermark())  # same watermark: summaries past it are ignored
+        self.assertEqual(int(self.archive.read()['transactions'].sum()), 4)
+        self.assertEqual(self.run_job(5), 1)
+        self.assertEqual(int(self.archive.read()['transactions'].sum()), 5)
+        self.assertIn(month, [m for m, _ in self.archive.partitions()])
+
+
+class TestReportsReadBothTiers(unittest.TestCase):
+    def setUp(self):
+        from app import create_app
+        from models import db, User, Store, Product, Sale
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, 'AUTO_RESTOCK': False,
+                               'SALES_ARCHIVE_DIR': self.directory, 'SALES_HOT_DAYS': 30})
+        self.db, self.Sale = db, Sale
+        now = datetime.utcnow()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Store(name='Mall Store', address='1 High Street'))
+            admin = User(username='admin', email='a@example.com', role='admin')
+            admin.set_password('secret')
+            db.session.add(admin)
+            db.session.add(Product(name='Tee', sku='TEE-1', price=10.0, stock_quantity=50, store_id=1))
+            for days_ago in (400, 100, 95, 3, 1):
+                db.session.add(Sale(product_id=1, store_id=1, quantity=1, unit_price=10.0, total_amount=10.0,
+                                    sale_date=now - timedelta(days=days_ago)))
+            db.session.commit()
+            self.admin_id = admin.id
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin_id)
+            sess['_fresh'] = True
+
+    def totals(self, **range_args):
+        from app import load_sales_columns
+        query = '&'.join(f'{k}={v}' for k, v in range_args.items())
+        with self.app.test_request_context(f'/admin/reports?{query}'):
+            from app import report_range
+            start, end = report_range()
+            return load_sales_columns(1, start, end).store_totals(1)
+
+    def test_reports_match_after_archiving(self):
+        since = (datetime.utcnow() - timedelta(days=120)).date().isoformat()
+        before = self.totals(), self.totals(**{'from': since})
+        with self.app.app_context():
+            self.app.extensions['scheduler'].jobs['archive_sales'].func()
+        with self.app.app_context():
+            self.assertEqual(self.Sale.query.count(), 2)
+        self.assertEqual((self.totals(), self.totals(**{'from': since})), before)
+        self.assertEqual(before, ((50.0, 5), (40.0, 4)))
+
+        page = self.client.get('/admin/reports').get_data(as_text=True)
+        self.assertIn('$50.00', page)
+        self.assertEqual(self.client.get('/admin/reports?from=yesterday').status_code, 400)
+
+    def test_kept_sales_warned_on_every_run(self):
+        self.app.config['SALES_ARCHIVE_SHARED'] = False
+        for _ in range(2):
+            with self.assertLogs('stylane.sales_archive', level='WARNING') as logs, self.app.app_context():
+                self.app.extensions['scheduler'].jobs['archive_sales'].func()
+                self.assertEqual(self.Sale.query.count(), 5)
+            self.assertIn('SALES_ARCHIVE_SHARED', logs.output[0])
+
+
+class TestDynamoArchive(unittest.TestCase):
+    def host(self, resource, **config):
+        import app_aws
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return app_aws.create_app(dict({'TESTING': True, 'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None,
+                                        'SALES_ARCHIVE_DIR': directory, 'SALES_HOT_DAYS': 30}, **config))
+
+    def run_job(self, app):
+        with app.app_context():
+            app.extensions['scheduler'].jobs['archive_sales'].func()
+
+    def totals(self, app):
+        import app_aws
+        with app.test_request_context('/store-manager/reports'):
+            return app_aws.load_sales_columns('1').store_totals('1')
+
+    def test_job_moves_old_sales(self):
+        resource = LocalDynamoResource()
+        resource.Table('StyleLaneProducts').put_item(Item={'product_id': 'p1', 'store_id': '1', 'name': 'Tee'})
+        sales = resource.Table('StyleLaneSales')
+        now = datetime.utcnow()
+        for i, days_ago in enumerate((200, 60, 1)):
+            sales.put_item(Item={'sale_id': f's{i}', 'product_id': 'p1', 'store_id': '1', 'store_shard': '1#0',
+                                 'quantity': 2, 'total_amount': '20.00',
+                                 'sale_date': (now - timedelta(days=days_ago)).isoformat()})
+
+        # The directory is not shared: each host archives into its own, under
+        # a lock there, and the archived rows expire a week later by table TTL
+        first, second = self.host(resource), self.host(resource)
+        job = first.extensions['scheduler'].jobs['archive_sales']
+        lock = first.extensions['scheduler'].lock_of(job)
+        self.assertEqual((lock.shared, lock.directory), (False, first.config['SALES_ARCHIVE_DIR']))
+        self.run_job(first)
+        expiry = {s['sale_id']: s.get('expires_at') for s in sales.scan()['Items']}
+        self.assertEqual(expiry['s2'], None)
+        for sale_id in ('s0', 's1'):
+            self.assertAlmostEqual(int(expiry[sale_id]), time.time() + 7 * 86400, delta=60)
+        self.run_job(second)
+        self.assertEqual({s['sale_id']: s.get('expires_at') for s in sales.scan()['Items']}, expiry)
+
+        for sale_id, expires_at in expiry.items():  # what TTL removes
+            if expires_at is not None:
+                sales.delete_item(Key={'sale_id': sale_id})
+        self.assertEqual((self.totals(first), self.totals(second)), ((60.0, 3), (60.0, 3)))
+
+    def test_shared_directory_deletes_sales(self):
+        resource = LocalDynamoResource()
+        resource.Table('StyleLaneProducts').put_item(Item={'product_id': 'p1', 'store_id': '1', 'name': 'Tee'})
+        sales = resource.Table('StyleLaneSales')
+        now = datetime.utcnow()
+        for i, days_ago in enumerate((200, 1)):
+            sales.put_item(Item={'sale_id': f's{i}', 'product_id': 'p1', 'store_id': '1', 'store_shard': '1#0',
+                                 'quantity': 2, 'total_amount': '20.00',
+                                 'sale_date': (now - timedelta(days=days_ago)).isoformat()})
+        app = self.host(resource, SALES_ARCHIVE_SHARED=True)
+        self.run_job(app)
+        self.assertEqual([s['sale_id'] for s in sales.scan()['Items']], ['s1'])
+        self.assertEqual(self.totals(app), (40.0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import unittest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from botocore.exceptions import ClientError
+from flask import Flask, current_app
+
+import app_aws
+import sales_shards
+from dynamo_local import LocalDynamoResource, PartitionThrottle
+from sales_shards import ShardedSales
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPartitionThrottle(unittest.TestCase):
+    def test_hot_gsi_partition_throttles(self):
+        clock = Clock()
+        table = LocalDynamoResource().Table('StyleLaneSales')
+        table.throttle = PartitionThrottle(capacity=2, clock=clock)
+
+        def put(n, shard):
+            table.put_item(Item={'sale_id': f's{n}', 'store_id': '1', 'store_shard': shard, 'sale_date': '2024'})
+
+        put(1, '1#0')
+        put(2, '1#0')
+        with self.assertRaises(ClientError) as raised:
+            put(3, '1#0')  # distinct sale ids, one index partition
+        self.assertEqual(raised.exception.response['Error']['Code'], 'ProvisionedThroughputExceededException')
+        put(3, '1#1')
+        clock.now = 0.5  # one unit refilled
+        put(4, '1#0')
+        self.assertEqual((table.throttle.admitted, table.throttle.throttled), (4, 1))
+        self.assertEqual(table.item_count(), 4)
+
+
+class TestShardedSales(unittest.TestCase):
+    def test_keys_and_counts(self):
+        sharding = ShardedSales(2, {'flagship': 8})
+        keys = {sharding.key('flagship', f'sale-{n}') for n in range(200)}
+        self.assertEqual(keys, set(sales_shards.shard_keys('flagship', 8)))
+        self.assertEqual(sharding.key('flagship', 'sale-1'), sharding.key('flagship', 'sale-1'))
+        self.assertEqual(sharding.count('corner-shop'), 2)
+
+    def test_gather_merges_shards_in_context(self):
+        app = Flask(__name__)
+        app.config['MARKER'] = 'request'
+        shards = {'s#0': [{'sale_date': '2024-03'}, {'sale_date': '2024-01'}],
+                  's#1': [{'sale_date': '2024-04'}, {'sale_date': '2024-02'}], 's#2': []}
+
+        def query_shard(key):
+            self.assertEqual(current_app.config['MARKER'], 'request')
+            return shards[key]
+
+        with app.app_context():
+            sales = ShardedSales(3).gather('s', query_shard, limit=3)
+        self.assertEqual([s['sale_date'] for s in sales], ['2024-04', '2024-03', '2024-02'])
+
+
+class TestAppSharding(unittest.TestCase):
+    def setUp(self):
+        self.resource = LocalDynamoResource()
+        self.resource.Table('StyleLaneProducts').put_item(Item={
+            'product_id': 'p1', 'store_id': '1', 'name': 'Wool Scarf', 'sku': 'SCAR-1',
+            'price': '12.50', 'stock_quantity': 50, 'low_stock_threshold': 5})
+        self.sales = self.resource.Table('StyleLaneSales')
+        self.app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': self.resource,
+                                       'SNS_TOPIC_ARN': None, 'SALES_STORE_SHARDS': {'1': 4}})
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess.update(username='manager', role='store_manager', store_id='1')
+
+    def test_sales_spread_and_read_back(self):
+        for _ in range(12):
+            self.assertEqual(self.client.post('/store-manager/pos/sku/SCAR-1', json={'quantity': 1}).status_code, 201)
+        shards = {s['store_shard'] for s in self.sales.scan()['Items']}
+        self.assertGreater(len(shards), 1)
+        self.assertTrue(shards <= set(sales_shards.shard_keys('1', 4)))
+
+        with self.app.test_request_context():
+            sales = app_aws.list_sales('1', limit=10)
+            self.assertEqual(len(sales), 10)
+            dates = [s.sale_date for s in sales]
+            self.assertEqual(dates, sorted(dates, reverse=True))
+            self.assertEqual(len(app_aws.get_sales_by_store('1')), 12)
+
+    def test_backfill(self):
+        self.sales.put_item(Item={'sale_id': 'old', 'store_id': '1', 'product_id': 'p1', 'sale_date': '2024-01-01'})
+        self.assertEqual(sales_shards.backfill(self.sales, self.app.extensions['sales_shards']), 1)
+        self.assertIn(self.sales.get_item(Key={'sale_id': 'old'})['Item']['store_shard'],
+                      sales_shards.shard_keys('1', 4))
+        self.assertEqual(sales_shards.backfill(self.sales, self.app.extensions['sales_shards']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
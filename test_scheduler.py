@@ -0,0 +1,209 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from app import create_app
+from dynamo_local import LocalDynamoResource
+from models import db, User, JobLock
+import scheduler
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+
+
+class TestCron(unittest.TestCase):
+    def test_next_after(self):
+        start = datetime(2024, 1, 31, 10, 7, 30)
+        cases = {
+            '*/15 * * * *': datetime(2024, 1, 31, 10, 15),
+            '17 * * * *': datetime(2024, 1, 31, 10, 17),
+            '0 3 * * *': datetime(2024, 2, 1, 3, 0),
+            '30 9 1 * *': datetime(2024, 2, 1, 9, 30),
+            '0 0 * * 0': datetime(2024, 2, 4, 0, 0),      # next Sunday
+            '0 0 29 2 *': datetime(2024, 2, 29, 0, 0),
+            '0 12 15 * 5': datetime(2024, 2, 2, 12, 0),   # 15th or a Friday
+            '0-10/5 8-9 * 3 1-5': datetime(2024, 3, 1, 8, 0),
+        }
+        for expression, expected in cases.items():
+            with self.subTest(expression=expression):
+                self.assertEqual(scheduler.Cron(expression).next_after(start), expected)
+
+    def test_invalid_expressions(self):
+        for expression in ('* * * *', '60 * * * *', '* * 0 * *', '5-1 * * * *'):
+            with self.subTest(expression=expression):
+                self.assertRaises(ValueError, scheduler.Cron, expression)
+
+
+class TestLocks(unittest.TestCase):
+    def test_database_lock_excludes_other_owners_until_expiry(self):
+        with app.app_context():
+            db.drop_all()
+            first = scheduler.DatabaseLock(db, JobLock)
+            second = scheduler.DatabaseLock(db, JobLock)
+            second.owner = 'other-host:1'
+            # Creates job_locks on first use
+            self.assertTrue(first.acquire('nightly', 60))
+            self.assertFalse(second.acquire('nightly', 60))
+            first.release('nightly')
+            self.assertTrue(second.acquire('nightly', 60))
+            # An abandoned lock is taken over once it expires
+            db.session.query(JobLock).update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+            db.session.commit()
+            self.assertTrue(first.acquire('nightly', 60))
+
+    def test_dynamo_lock_excludes_other_hosts_until_expiry(self):
+        table = LocalDynamoResource().Table('StyleLaneJobs')
+        first, second = scheduler.DynamoLock(lambda: table), scheduler.DynamoLock(lambda: table)
+        second.owner = 'other-host:1'
+        self.assertTrue(first.acquire('nightly', 60))
+        self.assertFalse(second.acquire('nightly', 60))
+        second.release('nightly')  # not its lock
+        self.assertTrue(first.stats()['nightly']['running'])
+        self.assertTrue(first.renew('nightly', 60))
+        self.assertFalse(second.renew('nightly', 60))
+        first.record('nightly', 'error', 0.25, 'ValueError: bad row')
+        first.release('nightly')
+        self.assertTrue(second.acquire('nightly', 60))
+        table.update_item(Key={'job': 'nightly'}, UpdateExpression='SET expires_at = :e',
+                          ExpressionAttributeValues={':e': 0})
+        self.assertTrue(first.acquire('nightly', 60))
+        first.record('nightly', 'ok', 0.5, None)
+        self.assertEqual(second.stats()['nightly'], {
+            'runs': 2, 'failures': 1, 'last_run': second.stats()['nightly']['last_run'], 'last_outcome': 'ok',
+            'last_duration': 0.5, 'last_error': None, 'running': True})
+
+    def test_file_lock(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first, second = scheduler.FileLock(directory), scheduler.FileLock(directory)
+            self.assertTrue(first.acquire('nightly', 60))
+            self.assertFalse(second.acquire('nightly', 60))
+            first.release('nightly')
+            self.assertTrue(second.acquire('nightly', 60))
+            second.release('nightly')
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.create_all()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.sched = scheduler.Scheduler(app, scheduler.FileLock(self.directory.name), threads=2)
+
+    def wait(self, job):
+        for _ in range(200):
+            if job.running_since is None:
+                return
+            threading.Event().wait(0.01)
+        self.fail(f'{job.name} still running')
+
+    def test_tick_runs_due_jobs_in_app_context(self):
+        calls = []
+        job = self.sched.add('count_users', lambda: calls.append(User.query.count()), every=60)
+        self.sched.run_now('count_users')
+        self.wait(job)
+        self.sched.tick(job.next_run - timedelta(seconds=1))
+        self.wait(job)
+        self.assertEqual(len(calls), 1)
+
+        self.sched.tick(job.next_run)
+        self.wait(job)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((job.runs, job.failures, job.last_outcome), (2, 0, 'ok'))
+
+    def test_runs_shown_by_every_process(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+        runner = scheduler.Scheduler(app, scheduler.DatabaseLock(db, JobLock), threads=1)
+        other = scheduler.Scheduler(app, scheduler.DatabaseLock(db, JobLock), threads=1)
+        for sched in (runner, other):
+            sched.add('failing', lambda: 1 / 0, every=60)
+        runner.run_now('failing')
+        self.wait(runner.jobs['failing'])
+        with app.app_context():
+            stats, = other.stats()
+        self.assertEqual((stats['runs'], stats['failures'], stats['last_outcome'], stats['running']),
+                         (1, 1, 'error', False))
+        self.assertIn('ZeroDivisionError', stats['last_error'])
+        self.assertEqual(other.jobs['failing'].runs, 0)
+
+    def test_lock_renewed_while_a_run_outlasts_its_ttl(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+        release, calls = threading.Event(), []
+        runner = scheduler.Scheduler(app, scheduler.DatabaseLock(db, JobLock), threads=1)
+        other = scheduler.Scheduler(app, scheduler.DatabaseLock(db, JobLock), threads=1)
+        other.lock.owner = 'other-host:1'
+        for sched in (runner, other):
+            sched.add('nightly', lambda: calls.append(release.wait(5)), every=60, timeout=0.1)
+            sched.jobs['nightly'].lock_ttl = 0.2
+        runner.run_now('nightly')
+        threading.Event().wait(0.7)  # three TTLs
+        other.run_now('nightly')
+        self.wait(other.jobs['nightly'])
+        self.assertEqual(calls, [])  # not started a second time
+        release.set()
+        self.wait(runner.jobs['nightly'])
+        other.run_now('nightly')
+        self.wait(other.jobs['nightly'])
+        self.assertEqual(calls, [True, True])
+
+    def test_errors_and_timeouts_are_recorded(self):
+        release = threading.Event()
+        failing = self.sched.add('failing', lambda: 1 / 0, cron='* * * * *')
+        slow = self.sched.add('slow', release.wait, every=60, timeout=0.5)
+        self.sched.run_now('failing')
+        self.sched.run_now('slow')
+        self.wait(failing)
+        self.assertEqual(failing.last_outcome, 'error')
+        self.assertIn('ZeroDivisionError', failing.last_error)
+
+        # Still running: reported once, and not started a second time
+        self.assertFalse(self.sched.run_now('slow'))
+        self.sched.tick(datetime.utcnow() + timedelta(seconds=1))
+        self.sched.tick(datetime.utcnow() + timedelta(seconds=2))
+        self.assertEqual((slow.runs, slow.last_outcome), (1, 'timeout'))
+        release.set()
+        self.wait(slow)
+        self.assertEqual(slow.runs, 1)
+
+
+class TestJobsPage(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            admin = User(username='admin', email='a@example.com', role='admin')
+            admin.set_password('secret')
+            db.session.add(admin)
+            db.session.commit()
+            self.admin_id = admin.id
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.admin_id)
+            sess['_fresh'] = True
+
+    def test_jobs_page_and_run_now(self):
+        response = self.client.get('/admin/jobs')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'warm_templates', response.data)
+
+        response = self.client.post('/admin/jobs/warm_templates/run')
+        self.assertEqual(response.status_code, 302)
+        job = app.extensions['scheduler'].jobs['warm_templates']
+        for _ in range(500):
+            if job.runs:
+                break
+            threading.Event().wait(0.01)
+        stats = {j['name']: j for j in self.client.get('/admin/jobs?format=json').get_json()}
+        self.assertEqual(stats['warm_templates']['last_outcome'], 'ok')
+        self.assertEqual(self.client.post('/admin/jobs/missing/run').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+
+from app import create_app
+import app_aws
+from dynamo_local import LocalDynamoResource
+from models import db, User, Store, Product
+import search
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+
+CATALOG = [
+    # name, description, sku, category, color, store
+    ('Oxford Shirt', 'Button-down cotton shirt', 'SHIR-0001', 'Shirts', 'Blue', 1),
+    ('Linen Trousers', 'Pairs well with an oxford shirt', 'PANT-0002', 'Pants', 'Cream', 1),
+    ('Denim Jacket', 'Classic trucker jacket', 'JACK-0003', 'Jackets', 'Blue', 1),
+    ('Oxford Shoes', 'Leather brogues, café collection', 'SHOE-0004', 'Shoes', 'Brown', 2),
+]
+
+
+class TestFtsSearch(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add_all([Store(name='Store 1', address='1 High Street'),
+                                Store(name='Store 2', address='2 High Street')])
+            db.session.flush()
+            manager = User(username='manager', email='m@example.com', role='store_manager', store_id=1)
+            manager.set_password('secret')
+            db.session.add(manager)
+            db.session.add_all([Product(name=n, description=d, sku=s, category=c, color=col, store_id=st,
+                                        price=10.0, stock_quantity=20) for n, d, s, c, col, st in CATALOG])
+            db.session.commit()
+            self.manager_id = manager.id
+        self.index = app.extensions['search']
+
+    def names(self, query, **kwargs):
+        with app.app_context():
+            ids = self.index.search(query, **kwargs)
+            return [db.session.get(Product, i).name for i in ids]
+
+    def test_prefix_matching_and_ranking(self):
+        self.assertTrue(self.index.enabled())
+        # A name match ranks above a description match
+        self.assertEqual(self.names('oxf shirt'), ['Oxford Shirt', 'Linen Trousers'])
+        self.assertEqual(self.names('JACK-0003'), ['Denim Jacket'])
+        self.assertEqual(sorted(self.names('blue')), ['Denim Jacket', 'Oxford Shirt'])
+        self.assertEqual(self.names('cafe'), ['Oxford Shoes'])
+        self.assertEqual(self.names('oxford', store_id=2), ['Oxford Shoes'])
+        # Quotes and FTS operators are searched as plain words
+        self.assertEqual(self.names('shirt" OR NOT *'), [])
+        self.assertEqual(self.names('  '), [])
+
+    def test_triggers_keep_index_in_sync(self):
+        with app.app_context():
+            jacket = Product.query.filter_by(sku='JACK-0003').one()
+            jacket.name = 'Bomber Jacket'
+            db.session.delete(Product.query.filter_by(sku='SHOE-0004').one())
+            db.session.commit()
+        self.assertEqual(self.names('bomber'), ['Bomber Jacket'])
+        self.assertEqual(self.names('denim'), [])
+        self.assertEqual(self.names('shoes'), [])
+
+    def test_broad_query_skips_ranking(self):
+        # Over rank_limit matches: newest first instead of bm25
+        self.assertEqual(self.names('oxford', rank_limit=1), ['Oxford Shoes', 'Linen Trousers', 'Oxford Shirt'])
+        self.assertEqual(self.names('oxford', rank_limit=3), ['Oxford Shirt', 'Oxford Shoes', 'Linen Trousers'])
+
+    def test_store_manager_search_is_scoped(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(self.manager_id)
+            sess['_fresh'] = True
+        body = client.get('/store-manager/products?q=oxford&format=json').get_json()
+        self.assertEqual([p['sku'] for p in body], ['SHIR-0001', 'PANT-0002'])
+        response = client.get('/store-manager/products?q=denim')
+        self.assertIn(b'JACK-0003', response.data)
+        self.assertNotIn(b'SHIR-0001', response.data)
+
+
+class TestMemoryIndex(unittest.TestCase):
+    def setUp(self):
+        self.items = [{'product_id': f'prod-{i}', 'name': n, 'description': d, 'sku': s,
+                       'category': c, 'color': col, 'store_id': f'store-{st}'}
+                      for i, (n, d, s, c, col, st) in enumerate(CATALOG, start=1)]
+        self.loads = 0
+        self.index = search.MemoryIndex(self.load)
+
+    def load(self):
+        self.loads += 1
+        return iter(self.items)
+
+    def test_search_matches_fts_behaviour(self):
+        self.assertEqual(self.index.search('oxf shirt'), ['prod-1', 'prod-2'])
+        self.assertEqual(self.index.search('jack-0003'), ['prod-3'])
+        self.assertEqual(self.index.search('cafe'), ['prod-4'])
+        self.assertEqual(self.index.search('oxford', store_id='store-2'), ['prod-4'])
+        self.assertEqual(self.index.search('o'), [])
+        self.assertEqual(self.index.search('oxford', rank_limit=2, limit=5), ['prod-1', 'prod-4'])
+        self.assertEqual(self.loads, 1)
+
+    def test_incremental_updates(self):
+        self.index.search('shirt')
+        self.index.add({'product_id': 'prod-5', 'name': 'Flannel Shirt', 'sku': 'SHIR-0005',
+                        'store_id': 'store-2'})
+        self.index.add(dict(self.items[0], name='Polo Shirt'))
+        self.index.remove('prod-2')
+        self.assertEqual(sorted(self.index.search('shirt')), ['prod-1', 'prod-5'])
+        self.assertEqual(self.index.search('polo'), ['prod-1'])
+        self.assertEqual(self.index.search('oxford'), ['prod-4'])
+        self.assertEqual(self.loads, 1)
+
+
+class TestAwsSearchRoute(unittest.TestCase):
+    def test_products_page_searches_index(self):
+        resource = LocalDynamoResource()
+        products = resource.Table('StyleLaneProducts')
+        for i, (n, d, s, c, col, st) in enumerate(CATALOG, start=1):
+            products.put_item(Item={'product_id': f'prod-{i}', 'name': n, 'description': d, 'sku': s,
+                                    'category': c, 'color': col, 'store_id': str(st), 'price': '10.00',
+                                    'stock_quantity': 20, 'low_stock_threshold': 10})
+        resource.Table('StyleLaneStores').put_item(Item={'store_id': '1', 'name': 'Store 1'})
+        aws_app = app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None})
+        client = aws_app.test_client()
+        with client.session_transaction() as sess:
+            sess.update(username='manager', role='store_manager', store_id='1')
+
+        body = client.get('/store-manager/products?q=oxford&format=json').get_json()
+        self.assertEqual([p['id'] for p in body], ['prod-1', 'prod-2'])
+
+        client.post('/store-manager/products/create', data={
+            'name': 'Oxford Blazer', 'sku': 'JACK-0009', 'price': '99.00', 'category': 'Jackets'})
+        body = client.get('/store-manager/products?q=blazer&format=json').get_json()
+        self.assertEqual([p['sku'] for p in body], ['JACK-0009'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+
+from app import create_app
+from models import db, User, Store, Product, RestockRequest
+import sql_metrics
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+
+
+class TestSqlMetrics(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['N_PLUS_ONE_THRESHOLD'] = 5
+        app.config['SLOW_QUERY_MS'] = 100
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            store = Store(name='Store 1', address='1 High Street')
+            manager = User(username='manager', email='m@example.com', role='store_manager')
+            supplier = User(username='supplier', email='s@example.com', role='supplier')
+            admin = User(username='admin', email='a@example.com', role='admin')
+            for user in (manager, supplier, admin):
+                user.set_password('secret')
+            db.session.add_all([store, manager, supplier, admin])
+            db.session.flush()
+            for i in range(6):
+                product = Product(name=f'Product {i}', sku=f'SKU-{i}', store_id=store.id,
+                                  price=10.0, stock_quantity=1)
+                db.session.add(product)
+                db.session.flush()
+                db.session.add(RestockRequest(store_id=store.id, product_id=product.id,
+                                              requested_by=manager.id, requested_quantity=5))
+            db.session.commit()
+            self.supplier_id = supplier.id
+            self.admin_id = admin.id
+        app.extensions['sql_metrics'].reset()
+
+    def login(self, user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        return client
+
+    def test_counts_queries_and_rows_per_route(self):
+        response = self.login(self.supplier_id).get('/supplier/restock-requests')
+        self.assertEqual(response.status_code, 200)
+        stats = sql_metrics.route_stats(app)['supplier.restock_requests']
+        self.assertEqual(stats['requests'], 1)
+        # user load + request list + one lazy product load per row (+ the store)
+        self.assertGreaterEqual(stats['queries'], 8)
+        self.assertGreaterEqual(stats['rows'], 6)
+
+    def test_rows_counted_from_results_and_failed_statements_forgotten(self):
+        from flask import g
+        from sqlalchemy import text
+        with app.test_request_context():
+            app.preprocess_request()
+            self.assertEqual(len(Product.query.all()), 6)
+            with self.assertRaises(Exception):
+                db.session.execute(text('SELECT * FROM no_such_table'))
+            db.session.rollback()
+            self.assertEqual([q.rows for q in g.sql_queries], [6])
+            connection = db.session.connection()
+            self.assertNotIn('stylane_query_start', connection.connection.info)
+
+    def test_rows_counted_per_statement_as_fetched(self):
+        from flask import g
+        from sqlalchemy.orm import selectinload
+        with app.test_request_context():
+            app.preprocess_request()
+            # One ORM execute, two statements: each gets its own rows
+            stores = Store.query.options(selectinload(Store.products)).all()
+            self.assertEqual(len(stores[0].products), 6)
+            self.assertEqual([q.rows for q in g.sql_queries], [1, 6])
+
+            # Streamed results are counted as they are read, not up front
+            g.sql_queries = []
+            result = db.session.execute(db.select(Product).execution_options(yield_per=2))
+            self.assertEqual(next(result.scalars()).name, 'Product 0')
+            self.assertEqual([q.rows for q in g.sql_queries], [2])
+            result.close()
+
+    def test_repeated_lazy_loads_reported_as_n_plus_one(self):
+        with self.assertLogs('stylane.sql', level='WARNING') as logs:
+            self.login(self.supplier_id).get('/supplier/restock-requests')
+        self.assertTrue(any('"n_plus_one"' in line and 'products' in line for line in logs.output))
+        self.assertEqual(sql_metrics.route_stats(app)['supplier.restock_requests']['n_plus_one'], 1)
+
+    def test_slow_query_logged_with_plan(self):
+        app.config['SLOW_QUERY_MS'] = 0
+        with self.assertLogs('stylane.sql', level='WARNING') as logs:
+            self.login(self.admin_id).get('/admin/inventory')
+        slow = [line for line in logs.output if '"slow_query"' in line]
+        self.assertTrue(slow)
+        self.assertIn('SCAN', ''.join(slow))
+
+    def test_admin_sql_stats_endpoint(self):
+        client = self.login(self.admin_id)
+        client.get('/admin/inventory')
+        response = client.get('/admin/sql-stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('admin.inventory', response.get_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
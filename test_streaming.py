@@ -0,0 +1,114 @@
+import unittest
+from datetime import datetime, timedelta
+
+from flask import Flask, stream_with_context
+
+import metrics
+import streaming
+from app import create_app
+from models import db, User, Store, Product, Sale, RestockRequest, Shipment
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True, 'AUTO_RESTOCK': False,
+                  'STREAM_CHUNK_SIZE': 2048, 'STREAM_YIELD_PER': 10})
+
+
+class TestChunks(unittest.TestCase):
+    def test_buffers_and_flushes_at_marker(self):
+        pieces = ['<h1>', 'Sales', '</h1>' + streaming.FLUSH + '<tr>', 'a' * 5, 'b' * 5, 'c']
+        self.assertEqual(list(streaming._chunks(pieces, 12)),
+                         ['<h1>Sales</h1>', '<tr>aaaaabbbbb', 'c'])
+
+
+class TestStreamedPages(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            store = Store(name='Mall Store', address='1 High Street')
+            db.session.add(store)
+            db.session.flush()
+            manager = User(username='manager', email='m@example.com', role='store_manager', store_id=store.id)
+            supplier = User(username='supplier', email='s@example.com', role='supplier')
+            for user in (manager, supplier):
+                user.set_password('secret')
+            db.session.add_all([manager, supplier])
+            products = [Product(name=f'Tee {i}', sku=f'TEE-{i}', store_id=store.id, price=10.0,
+                                stock_quantity=50) for i in range(3)]
+            db.session.add_all(products)
+            db.session.flush()
+            start = datetime(2024, 1, 1)
+            db.session.add_all([Sale(product_id=products[i % 3].id, store_id=store.id, quantity=1,
+                                     unit_price=10.0, total_amount=10.0, sale_date=start + timedelta(hours=i))
+                                for i in range(120)])
+            restock = RestockRequest(store_id=store.id, product_id=products[0].id, requested_by=manager.id,
+                                     requested_quantity=7, status='approved')
+            db.session.add(restock)
+            db.session.flush()
+            db.session.add(Shipment(restock_request_id=restock.id, supplier_id=supplier.id))
+            db.session.commit()
+            self.user_ids = manager.id, supplier.id
+
+    def client(self, user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+            sess['_fresh'] = True
+        return client
+
+    def test_sales_page_streams_header_first(self):
+        response = self.client(self.user_ids[0]).get('/store-manager/sales', buffered=False)
+        self.assertTrue(response.is_streamed)
+        chunks = [chunk.decode() for chunk in response.response]
+        response.close()
+        self.assertIn('Sales - Mall Store', chunks[0])
+        self.assertNotIn('2024-01-0', chunks[0])  # no rows before the header is out
+        self.assertGreater(len(chunks), 3)
+        page = ''.join(chunks)
+        self.assertNotIn(streaming.FLUSH, page)
+        self.assertEqual(page.count('$10.00'), 120 * 2)
+        self.assertLess(page.index('2024-01-05'), page.index('2024-01-01'))  # newest first
+
+    def test_inventory_and_shipments(self):
+        metrics.REGISTRY.reset()
+        admin = User(username='admin', email='a@example.com', role='admin')
+        admin.set_password('secret')
+        with app.app_context():
+            db.session.add(admin)
+            db.session.commit()
+            admin_id = admin.id
+        response = self.client(admin_id).get('/admin/inventory?store_id=1')
+        self.assertEqual(response.get_data(as_text=True).count('TEE-'), 3)
+        response.close()
+        response = self.client(self.user_ids[1]).get('/supplier/shipments')
+        page = response.get_data(as_text=True)
+        response.close()
+        self.assertIn('<td>7</td>', page)
+
+        # Size of the streamed page reaches the metrics once it is sent
+        text = metrics.render(metrics.REGISTRY.snapshot())
+        self.assertIn(f'stylane_http_response_size_bytes_sum{{endpoint="supplier.shipments"}} '
+                      f'{len(page.encode())}', text)
+
+
+class TestStreamedBodyMetrics(unittest.TestCase):
+    def test_recorded_on_close(self):
+        metrics.REGISTRY.reset()
+        plain = Flask(__name__)
+        metrics.init_app(plain)
+
+        @plain.route('/rows')
+        def rows():
+            return plain.response_class(stream_with_context(iter(['a' * 10, 'b' * 5])))
+
+        response = plain.test_client().get('/rows', buffered=False)
+        self.assertNotIn('stylane_http_requests_total{method="GET",endpoint="rows"',
+                         metrics.render(metrics.REGISTRY.snapshot()))
+        self.assertEqual(response.get_data(), b'a' * 10 + b'b' * 5)
+        response.close()
+        text = metrics.render(metrics.REGISTRY.snapshot())
+        self.assertIn('stylane_http_requests_total{method="GET",endpoint="rows",status="200"} 1', text)
+        self.assertIn('stylane_http_response_size_bytes_sum{endpoint="rows"} 15', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+
+from app import create_app
+from models import db, User, Store, Product, RestockRequest, Shipment
+import sql_metrics
+
+app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True})
+
+
+class TestSupplierBulk(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            store = Store(name='Store 1', address='1 High Street')
+            manager = User(username='manager', email='m@example.com', role='store_manager')
+            supplier = User(username='supplier', email='s@example.com', role='supplier')
+            other = User(username='other', email='o@example.com', role='supplier')
+            for user in (manager, supplier, other):
+                user.set_password('secret')
+            db.session.add_all([store, manager, supplier, other])
+            db.session.flush()
+            products = [Product(name=f'Product {i}', sku=f'SKU-{i}', store_id=store.id,
+                                price=10.0, stock_quantity=1) for i in range(2)]
+            db.session.add_all(products)
+            db.session.flush()
+            # Ten requests alternating between the two products, five units each
+            requests = [RestockRequest(store_id=store.id, product_id=products[i % 2].id,
+                                       requested_by=manager.id, requested_quantity=5)
+                        for i in range(10)]
+            db.session.add_all(requests)
+            db.session.commit()
+            self.supplier_id, self.other_id = supplier.id, other.id
+            self.product_ids = [p.id for p in products]
+            self.request_ids = [r.id for r in requests]
+        app.extensions['sql_metrics'].reset()
+
+    def client(self, user_id=None):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id or self.supplier_id)
+            sess['_fresh'] = True
+        return client
+
+    def approve_all(self, client):
+        return client.post('/supplier/restock-requests/bulk',
+                           json={'action': 'approve', 'request_ids': self.request_ids}).get_json()
+
+    def test_bulk_approve_reports_each_item(self):
+        client = self.client()
+        client.post('/supplier/restock-requests/bulk',
+                    json={'action': 'reject', 'request_ids': self.request_ids[:1],
+                          'rejection_reason': 'discontinued'})
+
+        body = client.post('/supplier/restock-requests/bulk', json={
+            'action': 'approve', 'request_ids': self.request_ids + [9999, 'abc'],
+        }).get_json()
+
+        self.assertEqual((body['succeeded'], body['failed']), (9, 3))
+        errors = {r['id']: r['error'] for r in body['results'] if not r['ok']}
+        self.assertEqual(errors, {self.request_ids[0]: 'already rejected',
+                                  9999: 'not found', 'abc': 'invalid id'})
+        with app.app_context():
+            self.assertEqual(Shipment.query.count(), 9)
+            self.assertEqual(RestockRequest.query.filter_by(status='approved').count(), 9)
+
+    def test_bulk_delivery_aggregates_stock_updates(self):
+        client = self.client()
+        self.approve_all(client)
+        with app.app_context():
+            shipment_ids = [s.id for s in Shipment.query.all()]
+        app.extensions['sql_metrics'].reset()
+
+        body = client.post('/supplier/shipments/bulk-update-status',
+                           json={'shipment_ids': shipment_ids, 'status': 'delivered'}).get_json()
+
+        self.assertEqual(body['succeeded'], 10)
+        self.assertTrue(all(r['stock_added'] == 5 for r in body['results']))
+        stats = sql_metrics.route_stats(app)['supplier.bulk_update_shipments']
+        # user, shipments + requests (joined), one executemany, shipment/request UPDATEs
+        self.assertLessEqual(stats['queries'], 6)
+        with app.app_context():
+            self.assertEqual([db.session.get(Product, pid).stock_quantity for pid in self.product_ids],
+                             [26, 26])
+
+        # Delivering again does not add stock twice
+        body = client.post('/supplier/shipments/bulk-update-status',
+                           json={'updates': [{'id': shipment_ids[0], 'status': 'delivered'}]}).get_json()
+        self.assertEqual(body['results'][0]['stock_added'], 0)
+
+    def test_bulk_shipments_check_owner_and_status(self):
+        client = self.client()
+        self.approve_all(client)
+        with app.app_context():
+            first, second = [s.id for s in Shipment.query.limit(2)]
+
+        body = self.client(self.other_id).post('/supplier/shipments/bulk-update-status', json={
+            'updates': [{'id': first, 'status': 'shipped'}],
+        }).get_json()
+        self.assertEqual(body['results'][0]['error'], 'not your shipment')
+
+        body = client.post('/supplier/shipments/bulk-update-status', json={
+            'updates': [{'id': first, 'status': 'lost'},
+                        {'id': second, 'status': 'shipped', 'tracking_number': 'TRK-2'}],
+        }).get_json()
+        self.assertEqual([r['ok'] for r in body['results']], [False, True])
+        with app.app_context():
+            shipment = db.session.get(Shipment, second)
+            self.assertEqual(shipment.tracking_number, 'TRK-2')
+            self.assertEqual(shipment.restock_request.status, 'shipped')
+
+    def test_form_post_flashes_summary(self):
+        response = self.client().post('/supplier/restock-requests/bulk', data={
+            'action': 'approve', 'request_ids': [str(i) for i in self.request_ids[:3]],
+        }, follow_redirects=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'Approved: 3 succeeded, 0 failed.', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
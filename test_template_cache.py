@@ -0,0 +1,77 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from jinja2 import Environment
+
+import app as app_module
+import app_aws
+import template_cache
+from dynamo_local import LocalDynamoResource
+from models import db, User, Store
+
+
+class TestBytecodeCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def make_app(self, **config):
+        return app_module.create_app(dict({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True,
+                                           'TEMPLATE_CACHE_DIR': self.directory}, **config))
+
+    def test_second_worker_loads_compiled_templates(self):
+        with patch.object(Environment, 'compile', autospec=True, side_effect=Environment.compile) as compile:
+            count = template_cache.precompile(self.make_app())
+            self.assertEqual(compile.call_count, count)
+            self.assertEqual(len(os.listdir(self.directory)), count)
+            self.assertIn('admin/dashboard.html', self.make_app().jinja_env.list_templates())
+
+            compile.reset_mock()
+            template_cache.precompile(app_aws.create_app({'TESTING': True, 'TEMPLATE_CACHE_DIR': self.directory}))
+            self.assertEqual(compile.call_count, 0)
+
+    def test_disabled_and_failed_warmup(self):
+        self.assertIsNone(self.make_app(TEMPLATE_CACHE_DIR='').jinja_env.bytecode_cache)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.make_app(TEMPLATE_WARMUP=True)  # no tables yet
+        self.assertIn('Template warmup failed', out.getvalue())
+
+
+class TestWarmup(unittest.TestCase):
+    def test_sql_dashboards(self):
+        app = app_module.create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'TESTING': True,
+                                     'TEMPLATE_CACHE_DIR': ''})
+        with app.app_context():
+            db.create_all()
+            db.session.add(Store(name='Mall Store', address='1 High Street'))
+            for role, store_id in (('admin', None), ('store_manager', 1), ('supplier', None)):
+                user = User(username=role, email=f'{role}@example.com', role=role, store_id=store_id)
+                user.set_password('secret')
+                db.session.add(user)
+            db.session.commit()
+        out = io.StringIO()
+        with redirect_stdout(out):
+            template_cache.warmup(app, app_module.warmup_sessions)
+        self.assertIn('18 templates, admin 200, store_manager 200, supplier 200', out.getvalue())
+        self.assertEqual(len(app.jinja_env.cache), 18)
+
+    def test_aws_dashboards(self):
+        resource = LocalDynamoResource()
+        resource.Table('StyleLaneStores').put_item(Item={'store_id': 's1', 'name': 'Mall Store'})
+        out = io.StringIO()
+        with redirect_stdout(out):
+            app_aws.create_app({'TESTING': True, 'DYNAMODB_RESOURCE': resource, 'SNS_TOPIC_ARN': None,
+                                'TEMPLATE_CACHE_DIR': '', 'TEMPLATE_WARMUP': True})
+        self.assertIn('store_manager 200, supplier 200', out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+"""
+Background job worker for StyleLane
+
+Runs the scheduled jobs (see scheduler.py and /admin/jobs) in their own
+process, so web workers do not need STYLANE_SCHEDULER=1:
+
+    python worker.py          # app.py jobs, leader lock in the database
+    python worker.py --aws    # app_aws.py jobs, leader lock in StyleLaneJobs
+
+Several workers can run at once; each job still runs in only one of them.
+"""
+import sys
+
+if __name__ == '__main__':
+    if '--aws' in sys.argv[1:]:
+        from app_aws import create_app
+        app = create_app({'SCHEDULER_ENABLED': True})
+    else:
+        from app import create_app, db
+        app = create_app({'SCHEDULER_ENABLED': True})
+        with app.app_context():
+            db.create_all()
+
+    sched = app.extensions['scheduler']
+    print(f"StyleLane worker running {len(sched.jobs)} jobs: {', '.join(sorted(sched.jobs))}")
+    try:
+        sched.run_forever()
+    except KeyboardInterrupt:
+        sched.stop()